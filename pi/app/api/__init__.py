@@ -2,7 +2,7 @@ from fastapi import APIRouter
 
 router = APIRouter(prefix="/api/v1")
 
-from . import routes_state, routes_anchors, routes_fixtures, routes_calibration, routes_health, routes_tracking, routes_settings, routes_devices, routes_events, routes_dmx, routes_ofl  # noqa: F401
+from . import routes_state, routes_anchors, routes_fixtures, routes_calibration, routes_health, routes_tracking, routes_settings, routes_devices, routes_events, routes_dmx, routes_ofl, routes_groups, routes_stream, routes_commands, routes_metrics  # noqa: F401
 
 router.include_router(routes_state.router)
 router.include_router(routes_anchors.router)
@@ -15,3 +15,7 @@ router.include_router(routes_devices.router)
 router.include_router(routes_events.router)
 router.include_router(routes_dmx.router)
 router.include_router(routes_ofl.router)
+router.include_router(routes_groups.router)
+router.include_router(routes_stream.router)
+router.include_router(routes_commands.router)
+router.include_router(routes_metrics.router)
@@ -0,0 +1,87 @@
+"""Version-keyed response cache with ETag / If-None-Match support.
+
+``cached_json`` serializes a route's response once per version of the
+resource families it depends on. While the versions are unchanged, repeated
+GETs reuse the cached body, and clients that send the current ETag get an
+empty 304.
+"""
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Sequence, Tuple
+
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+
+from app.db.async_persistence import get_async_persistence
+from app.db.database import get_live_db_path
+from app.db.versions import BOOT_ID, versions
+
+MAX_ENTRIES = 256
+
+_lock = threading.Lock()
+_bodies: "OrderedDict[Tuple[Tuple[str, ...], str], Tuple[Tuple[int, ...], bytes]]" = OrderedDict()
+
+
+def _etag(families: Tuple[str, ...], ver: Tuple[int, ...], key: str) -> str:
+    tag = "-".join(families) + "-" + BOOT_ID + "-" + ".".join(str(v) for v in ver)
+    tag += "-" + hashlib.sha1(key.encode("utf-8")).hexdigest()[:10]
+    return f'W/"{tag}"'
+
+
+def _matches(request: Request, etag: str) -> bool:
+    inm = request.headers.get("if-none-match")
+    if not inm:
+        return False
+    tags = [t.strip() for t in inm.split(",")]
+    return "*" in tags or etag in tags
+
+
+def _lookup(request: Request, families: Sequence[str], key: str):
+    families = tuple(families)
+    # versions are per process; scope entries to the database they were read from
+    key = get_live_db_path() + "|" + key
+    ver = versions(*families)
+    etag = _etag(families, ver, key)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if _matches(request, etag):
+        return (families, key), ver, headers, Response(status_code=304, headers=headers)
+    with _lock:
+        entry = _bodies.get((families, key))
+    if entry is not None and entry[0] == ver:
+        return (families, key), ver, headers, Response(content=entry[1], media_type="application/json", headers=headers)
+    return (families, key), ver, headers, None
+
+
+def _store(cache_key, ver: Tuple[int, ...], headers, data: Any) -> Response:
+    body = json.dumps(jsonable_encoder(data)).encode("utf-8")
+    # only keep it if no write landed while building
+    if versions(*cache_key[0]) == ver:
+        with _lock:
+            _bodies[cache_key] = (ver, body)
+            _bodies.move_to_end(cache_key)
+            while len(_bodies) > MAX_ENTRIES:
+                _bodies.popitem(last=False)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+def cached_json(request: Request, families: Sequence[str], build: Callable[[], Any], key: str = "") -> Response:
+    """Return ``build()`` as JSON, cached until one of ``families`` is bumped."""
+    cache_key, ver, headers, hit = _lookup(request, families, key)
+    if hit is not None:
+        return hit
+    return _store(cache_key, ver, headers, build())
+
+
+async def cached_json_async(request: Request, families: Sequence[str], build: Callable[[], Any], key: str = "") -> Response:
+    """Like ``cached_json`` for ``async def`` routes; ``build`` runs on the DB thread."""
+    cache_key, ver, headers, hit = _lookup(request, families, key)
+    if hit is not None:
+        return hit
+    return _store(cache_key, ver, headers, await get_async_persistence().run(build))
+
+
+def clear():
+    with _lock:
+        _bodies.clear()
@@ -1,12 +1,14 @@
 from fastapi import APIRouter, HTTPException, Request
 from ..db import connect_db
-from pydantic import BaseModel
-from typing import Optional
-import json
+from pydantic import BaseModel, Field
+from typing import Dict, List, Optional
 import time
 from app.core.state_manager import StateManager
 from app.db.persistence import get_persistence
 from app.core.anchor_positions import load_anchor_offsets
+from app.core.self_survey import SurveyCollector, self_survey
+from app.db.versions import bump_tables
+from .cache import cached_json_async
 
 router = APIRouter()
 
@@ -19,6 +21,27 @@ class AnchorPos(BaseModel):
     alias: Optional[str] = None
 
 
+class SurveyStart(BaseModel):
+    duration_ms: int = Field(10000, ge=1000, le=120000)
+
+
+class SurveyRange(BaseModel):
+    a: str
+    b: str
+    d_cm: float = Field(..., gt=0)
+
+
+class SurveySolve(BaseModel):
+    # ranges from a file/test; without them the ranges collected since survey/start are used
+    ranges: Optional[List[SurveyRange]] = None
+    origin: str
+    x_axis: str
+    xy_plane: Optional[str] = None
+    heights_cm: Dict[str, float] = Field(default_factory=dict)
+    height_sigma_cm: float = Field(2.0, gt=0, le=100)
+    apply: bool = False
+
+
 def _normalize_mac(mac: str) -> str:
     import re
     if not mac:
@@ -41,72 +64,120 @@ def _mac_variants(mac: str) -> list[str]:
 
 
 @router.get('/anchors')
-def list_anchors():
-    alias_map = {}
-    idx_map = {}
-    try:
-        p = get_persistence()
-        for d in p.list_devices():
-            if d.get("alias") and d.get("mac"):
-                alias_map[_normalize_mac(d.get("mac"))] = d.get("alias")
-            mac_norm = _normalize_mac(d.get("mac"))
-            if mac_norm:
-                try:
-                    idx = p.get_device_setting(mac_norm, "anchor_index", "")
-                    if idx != "":
-                        idx_map[mac_norm] = int(idx)
-                except Exception:
-                    pass
-    except Exception:
-        pass
-    db = connect_db()
-    try:
-        offsets = load_anchor_offsets(db)
+async def list_anchors(request: Request):
+    return await cached_json_async(request, ("anchors",), _build_anchor_list)
+
+
+def _build_anchor_list():
+    anchors = []
+    for r in get_persistence().list_anchor_view():
+        dx = r["dx_cm"] if r["dx_cm"] is not None else 0.0
+        dy = r["dy_cm"] if r["dy_cm"] is not None else 0.0
+        dz = r["dz_cm"] if r["dz_cm"] is not None else 0.0
+        idx = None
         try:
-            rows = db.execute("SELECT mac, alias FROM anchors WHERE alias IS NOT NULL AND alias != ''").fetchall()
-            for r in rows:
-                nm = _normalize_mac(r["mac"])
-                if nm and nm not in alias_map:
-                    alias_map[nm] = r["alias"]
+            if r["anchor_index"] not in (None, ""):
+                idx = int(r["anchor_index"])
         except Exception:
             pass
-        # prefer anchor_positions table if present
+        anchors.append(
+            {
+                'mac': r['mac'],
+                'alias': r['alias'],
+                'anchor_index': idx,
+                'position_cm': {'x': r['x_cm'] + dx, 'y': r['y_cm'] + dy, 'z': r['z_cm'] + dz},
+                'position_base_cm': {'x': r['x_cm'], 'y': r['y_cm'], 'z': r['z_cm']},
+                'offset_cm': {'x': dx, 'y': dy, 'z': dz},
+                'last_seen_at_ms': r['updated_at_ms']
+            }
+        )
+    return {'anchors': anchors}
+
+
+@router.post('/anchors/survey/start')
+def survey_start(payload: SurveyStart, request: Request):
+    if StateManager().get_state() == 'LIVE':
+        raise HTTPException(status_code=409, detail={'code': 'LIVE_GUARD', 'message': 'Anchor survey blocked in LIVE'})
+    mc = getattr(request.app.state, "mqtt_client", None)
+    client = getattr(mc, "_client", None) if mc else None
+    if not client:
+        raise HTTPException(status_code=503, detail='mqtt not connected')
+    macs = [_normalize_mac(m) for m in get_persistence().list_anchor_macs()]
+    macs = sorted({m for m in macs if m})
+    mc.survey_collector = SurveyCollector()
+    cmd_ids = []
+    for mac in macs:
+        fields = {"duration_ms": payload.duration_ms, "peers": [m for m in macs if m != mac]}
+        cmd_ids.append(mc.commands.submit(mac, "survey_ranging", fields, prefix="survey").cmd_id)
+    return {'ok': True, 'anchors': macs, 'duration_ms': payload.duration_ms, 'cmd_ids': cmd_ids}
+
+
+@router.get('/anchors/survey')
+def survey_status(request: Request):
+    mc = getattr(request.app.state, "mqtt_client", None)
+    col = getattr(mc, "survey_collector", None) if mc else None
+    if col is None:
+        return {'running': False, 'pairs': 0, 'ranges': []}
+    ranges = [{'a': a, 'b': b, 'd_cm': d} for (a, b), d in sorted(col.ranges().items())]
+    return {'running': True, **col.status(), 'ranges': ranges}
+
+
+@router.post('/anchors/survey/solve')
+def survey_solve(payload: SurveySolve, request: Request):
+    if payload.ranges is not None:
+        raw = [(r.a, r.b, r.d_cm) for r in payload.ranges]
+    else:
+        mc = getattr(request.app.state, "mqtt_client", None)
+        col = getattr(mc, "survey_collector", None) if mc else None
+        if col is None:
+            raise HTTPException(status_code=400, detail='no ranges: pass ranges or run /anchors/survey/start first')
+        raw = [(a, b, d) for (a, b), d in col.ranges().items()]
+    ranges = {}
+    for a, b, d in raw:
+        a, b = _normalize_mac(a), _normalize_mac(b)
+        if a and b and a != b:
+            ranges[(min(a, b), max(a, b))] = d
+    heights = {_normalize_mac(m): float(h) for m, h in payload.heights_cm.items() if _normalize_mac(m)}
+    try:
+        res = self_survey(
+            ranges,
+            origin=_normalize_mac(payload.origin),
+            x_axis=_normalize_mac(payload.x_axis),
+            xy_plane=_normalize_mac(payload.xy_plane) if payload.xy_plane else None,
+            heights_cm=heights,
+            height_sigma_cm=payload.height_sigma_cm,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    applied = 0
+    if payload.apply:
+        if StateManager().get_state() == 'LIVE':
+            raise HTTPException(status_code=409, detail={'code': 'LIVE_GUARD', 'message': 'Anchor position changes blocked in LIVE'})
+        ts = int(time.time() * 1000)
+        db = connect_db()
         try:
-            rows = db.execute('SELECT mac, x_cm, y_cm, z_cm, updated_at_ms FROM anchor_positions').fetchall()
-            anchors = []
-            for r in rows:
-                dx, dy, dz = offsets.get(r["mac"], (0.0, 0.0, 0.0))
-                anchors.append(
-                    {
-                        'mac': r['mac'],
-                        'alias': alias_map.get(_normalize_mac(r['mac'])),
-                        'anchor_index': idx_map.get(_normalize_mac(r['mac'])),
-                        'position_cm': {'x': r['x_cm'] + dx, 'y': r['y_cm'] + dy, 'z': r['z_cm'] + dz},
-                        'position_base_cm': {'x': r['x_cm'], 'y': r['y_cm'], 'z': r['z_cm']},
-                        'offset_cm': {'x': dx, 'y': dy, 'z': dz},
-                        'last_seen_at_ms': r['updated_at_ms']
-                    }
+            for mac, pos in res.positions_cm.items():
+                variants = _mac_variants(mac)
+                placeholders = ",".join(["?"] * len(variants))
+                db.execute(f"DELETE FROM anchor_positions WHERE mac IN ({placeholders})", variants)
+                # the survey gives absolute positions: calibration offsets on top no longer apply
+                db.execute(f"DELETE FROM anchor_position_offsets WHERE mac IN ({placeholders})", variants)
+                db.execute(
+                    'INSERT INTO anchor_positions(mac,x_cm,y_cm,z_cm,updated_at_ms) VALUES(?,?,?,?,?)',
+                    (mac, int(round(pos["x"])), int(round(pos["y"])), int(round(pos["z"])), ts),
                 )
+                applied += 1
+            db.commit()
+            bump_tables("anchor_positions", "anchor_position_offsets")
+        finally:
+            db.close()
+        try:
+            get_persistence().invalidate_calibrations(ts)
+            StateManager().set_state('SETUP')
         except Exception:
-            # fallback to anchors table
-            rows = db.execute('SELECT mac, alias, pos_x_cm, pos_y_cm, pos_z_cm, last_seen_at_ms FROM anchors').fetchall()
-            anchors = []
-            for r in rows:
-                dx, dy, dz = offsets.get(r["mac"], (0.0, 0.0, 0.0))
-                anchors.append(
-                    {
-                        'mac': r['mac'],
-                        'alias': alias_map.get(_normalize_mac(r['mac'])) or (r['alias'] if 'alias' in r.keys() else None),
-                        'anchor_index': idx_map.get(_normalize_mac(r['mac'])),
-                        'position_cm': {'x': r['pos_x_cm'] + dx, 'y': r['pos_y_cm'] + dy, 'z': r['pos_z_cm'] + dz},
-                        'position_base_cm': {'x': r['pos_x_cm'], 'y': r['pos_y_cm'], 'z': r['pos_z_cm']},
-                        'offset_cm': {'x': dx, 'y': dy, 'z': dz},
-                        'last_seen_at_ms': r['last_seen_at_ms'] if 'last_seen_at_ms' in r.keys() else None
-                    }
-                )
-    finally:
-        db.close()
-    return {'anchors': anchors}
+            pass
+    return {'ok': True, **res.as_dict(), 'applied': applied}
 
 
 @router.get('/anchors/{mac}')
@@ -168,6 +239,7 @@ def upsert_anchor(pos: AnchorPos, request: Request):
         db.execute('CREATE TABLE IF NOT EXISTS anchor_positions (mac TEXT PRIMARY KEY, x_cm INTEGER, y_cm INTEGER, z_cm INTEGER, updated_at_ms INTEGER)')
         db.execute('INSERT OR REPLACE INTO anchor_positions(mac,x_cm,y_cm,z_cm,updated_at_ms) VALUES(?,?,?,?,?)', (pos.mac, pos.x_cm, pos.y_cm, pos.z_cm, ts))
         db.commit()
+        bump_tables("anchor_positions")
     finally:
         db.close()
     try:
@@ -196,13 +268,7 @@ def upsert_anchor(pos: AnchorPos, request: Request):
         mc = getattr(request.app.state, "mqtt_client", None)
         client = getattr(mc, "_client", None) if mc else None
         if client:
-            payload = {
-                "type": "cmd",
-                "cmd": "apply_settings",
-                "cmd_id": f"alias_{int(time.time()*1000)}",
-                "settings": {"alias": alias_to_send},
-            }
-            client.publish(f"dev/{mac_norm}/cmd", json.dumps(payload), qos=1)
+            mc.commands.submit(mac_norm, "apply_settings", {"settings": {"alias": alias_to_send}}, prefix="alias")
     return {'ok': True, 'mac': pos.mac, 'position_cm': {'x': pos.x_cm, 'y': pos.y_cm, 'z': pos.z_cm}}
 
 
@@ -227,6 +293,7 @@ def delete_anchor(mac: str, request: Request):
             removed_anchors = cur.rowcount or 0
         db.execute("DELETE FROM device_settings WHERE mac=?", (mac_norm,))
         db.commit()
+        bump_tables("anchor_positions", "anchors", "device_settings")
     finally:
         db.close()
     removed_device = False
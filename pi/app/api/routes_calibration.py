@@ -2,7 +2,6 @@ from fastapi import APIRouter, HTTPException, Request
 from pydantic import BaseModel, Field
 from typing import Dict, Optional
 from ..db import connect_db
-import math
 import time
 import asyncio
 import json
@@ -10,8 +9,9 @@ import json
 from app.core.calibration_manager import CalibrationManager
 from app.core.state_manager import StateManager
 from app.core.anchor_positions import load_anchor_positions, load_anchor_offsets, ensure_anchor_offsets_table
-from app.core.trilateration import solve_3d
+from app.core.bundle_adjust import bundle_adjust
 from app.db.persistence import get_persistence
+from app.db.versions import bump_tables
 
 router = APIRouter()
 
@@ -30,9 +30,96 @@ def ensure_calibration_table(db):
         committed_at_ms INTEGER,
         discarded_at_ms INTEGER
     )''')
+    # normalized venue points (see migrations/0010_calibration_points.sql)
+    db.execute('''CREATE TABLE IF NOT EXISTS calibration_points (
+        run_id INTEGER PRIMARY KEY,
+        tag_mac TEXT NOT NULL,
+        session_id TEXT,
+        point_id TEXT NOT NULL,
+        x_cm REAL,
+        y_cm REAL,
+        z_cm REAL,
+        grid_cm INTEGER,
+        label TEXT,
+        started_at_ms INTEGER,
+        ended_at_ms INTEGER,
+        result TEXT,
+        samples INTEGER
+    )''')
+    db.execute('''CREATE TABLE IF NOT EXISTS calibration_point_anchor_stats (
+        run_id INTEGER NOT NULL,
+        anchor_mac TEXT NOT NULL,
+        median_d_m REAL,
+        mean_d_m REAL,
+        mad_d_m REAL,
+        std_d_m REAL,
+        min_d_m REAL,
+        max_d_m REAL,
+        count INTEGER,
+        PRIMARY KEY (run_id, anchor_mac)
+    ) WITHOUT ROWID''')
+    db.execute('CREATE INDEX IF NOT EXISTS idx_calibration_points_tag_session_point ON calibration_points(tag_mac, session_id, point_id)')
+    db.execute('CREATE INDEX IF NOT EXISTS idx_calibration_points_tag_started ON calibration_points(tag_mac, started_at_ms)')
+    db.execute('CREATE INDEX IF NOT EXISTS idx_calibration_runs_status_id ON calibration_runs(status, id)')
+    db.execute('CREATE INDEX IF NOT EXISTS idx_calibration_runs_tag_id ON calibration_runs(tag_mac, id)')
     db.commit()
 
 
+_STAT_COLUMNS = ("median_d_m", "mean_d_m", "mad_d_m", "std_d_m", "min_d_m", "max_d_m", "count")
+
+
+def _store_point(db, run_id: int, tag_mac: str, params: dict, summary: dict, started_at_ms: int, ended_at_ms: int):
+    pos = params.get("position_cm") or {}
+    db.execute(
+        "INSERT OR REPLACE INTO calibration_points(run_id, tag_mac, session_id, point_id, x_cm, y_cm, z_cm, grid_cm, "
+        "label, started_at_ms, ended_at_ms, result, samples) VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?)",
+        (
+            run_id, tag_mac, params.get("session_id"), params.get("point_id"),
+            pos.get("x"), pos.get("y"), pos.get("z"), params.get("grid_cm"), params.get("label"),
+            started_at_ms, ended_at_ms, summary.get("result"), summary.get("samples"),
+        ),
+    )
+    db.executemany(
+        "INSERT OR REPLACE INTO calibration_point_anchor_stats(run_id, anchor_mac, median_d_m, mean_d_m, mad_d_m, "
+        "std_d_m, min_d_m, max_d_m, count) VALUES (?,?,?,?,?,?,?,?,?)",
+        [(run_id, mac, *[st.get(c) for c in _STAT_COLUMNS]) for mac, st in (summary.get("per_anchor") or {}).items()],
+    )
+
+
+def _load_points(db, tag_mac: str, session_id: Optional[str] = None, latest_only: bool = True):
+    """Finished venue points of a tag with their per-anchor stats, newest first.
+
+    With ``latest_only`` a point measured several times contributes its newest run.
+    """
+    sql = (
+        "SELECT p.* FROM calibration_points p JOIN calibration_runs r ON r.id = p.run_id "
+        "WHERE p.tag_mac=? AND r.status='finished'"
+    )
+    args = [tag_mac]
+    if session_id is not None:
+        sql += " AND p.session_id=?"
+        args.append(session_id)
+    rows = db.execute(sql + " ORDER BY p.started_at_ms DESC, p.run_id DESC", args).fetchall()
+    points = []
+    seen = set()
+    for r in rows:
+        if latest_only and r["point_id"] in seen:
+            continue
+        seen.add(r["point_id"])
+        points.append(dict(r))
+    if not points:
+        return points
+    by_run = {p["run_id"]: p for p in points}
+    for p in points:
+        p["per_anchor"] = {}
+    placeholders = ",".join(["?"] * len(by_run))
+    for st in db.execute(
+        f"SELECT * FROM calibration_point_anchor_stats WHERE run_id IN ({placeholders})", list(by_run)
+    ).fetchall():
+        by_run[st["run_id"]]["per_anchor"][st["anchor_mac"]] = {c: st[c] for c in _STAT_COLUMNS}
+    return points
+
+
 class CalStart(BaseModel):
     tag_mac: str
     duration_ms: int = Field(6000, ge=100, le=60000)
@@ -58,6 +145,9 @@ class CalSolve(BaseModel):
     tag_mac: str
     apply: bool = True
     min_points: int = Field(4, ge=4, le=10)
+    # free point heights with this prior sigma (cm); None keeps the surveyed heights fixed
+    height_sigma_cm: Optional[float] = Field(None, gt=0, le=200)
+    huber_cm: float = Field(10.0, gt=0, le=200)
 
 
 @router.get('/calibration/status')
@@ -122,19 +212,14 @@ async def _cal_tick_loop(cm: CalibrationManager):
     sm.set_state("SETUP")
 
 
-async def _collect_range_samples(range_cache, tag_mac: str, duration_ms: int, sample_interval_ms: int = 50):
-    end_ts = time.time() + (duration_ms / 1000.0)
-    samples = []
-    last_ts_by_anchor: Dict[str, int] = {}
-    while time.time() < end_ts:
-        snap = range_cache.snapshot(tag_mac)
-        for s in snap:
-            prev_ts = last_ts_by_anchor.get(s.anchor_mac)
-            if prev_ts is None or s.ts_ms > prev_ts:
-                samples.append(s)
-                last_ts_by_anchor[s.anchor_mac] = s.ts_ms
-        await asyncio.sleep(sample_interval_ms / 1000.0)
-    return samples
+async def _capture_range_stats(range_cache, tag_mac: str, duration_ms: int):
+    # every sample arriving during the window is recorded at ingest, not polled
+    cap = range_cache.open_capture(tag_mac)
+    try:
+        await asyncio.sleep(duration_ms / 1000.0)
+    finally:
+        range_cache.close_capture(cap)
+    return cap
 
 
 def _normalize_mac(mac: str) -> str:
@@ -144,42 +229,6 @@ def _normalize_mac(mac: str) -> str:
     return re.sub(r"[^0-9A-Fa-f]", "", mac).upper()
 
 
-def _dist_cm(a, b) -> float:
-    dx = a[0] - b[0]
-    dy = a[1] - b[1]
-    dz = a[2] - b[2]
-    return math.sqrt(dx * dx + dy * dy + dz * dz)
-
-
-def _fit_linear(pairs):
-    n = len(pairs)
-    if n <= 0:
-        return 1.0, 0.0, 0.0
-    xs = [p[0] for p in pairs]
-    ys = [p[1] for p in pairs]
-    if n == 1:
-        scale = 1.0
-        offset = ys[0] - xs[0]
-    else:
-        sx = sum(xs)
-        sy = sum(ys)
-        sxx = sum(x * x for x in xs)
-        sxy = sum(x * y for x, y in pairs)
-        denom = (n * sxx - sx * sx)
-        if abs(denom) < 1e-9:
-            scale = 1.0
-            offset = sum((y - x) for x, y in pairs) / n
-        else:
-            scale = (n * sxy - sx * sy) / denom
-            offset = (sy - scale * sx) / n
-    rms = 0.0
-    for x, y in pairs:
-        err = (scale * x + offset) - y
-        rms += err * err
-    rms = math.sqrt(rms / n) if n else 0.0
-    return scale, offset, rms
-
-
 @router.post('/calibration/point')
 async def calibration_point(payload: CalPoint, request: Request):
     sm = StateManager()
@@ -195,25 +244,21 @@ async def calibration_point(payload: CalPoint, request: Request):
     sm.set_state("CALIBRATION")
     start_ts = int(time.time() * 1000)
     try:
-        samples = await _collect_range_samples(te.range_cache, payload.tag_mac, payload.duration_ms)
+        capture = await _capture_range_stats(te.range_cache, payload.tag_mac, payload.duration_ms)
     finally:
         sm.set_state("SETUP")
     end_ts = int(time.time() * 1000)
 
-    per_anchor = {}
-    for s in samples:
-        per_anchor.setdefault(s.anchor_mac, []).append(s.d_m)
     per_anchor_stats = {}
-    for anchor, vals in per_anchor.items():
-        vals_sorted = sorted(vals)
-        median = vals_sorted[len(vals_sorted) // 2]
-        avg = sum(vals) / len(vals)
+    for anchor, st in capture.stats().items():
         per_anchor_stats[anchor] = {
-            "median_d_m": median,
-            "mean_d_m": avg,
-            "min_d_m": vals_sorted[0],
-            "max_d_m": vals_sorted[-1],
-            "count": len(vals),
+            "median_d_m": st["median_d_m"],
+            "mean_d_m": st["mean_d_m"],
+            "mad_d_m": st["mad_d_m"],
+            "std_d_m": st["std_d_m"],
+            "min_d_m": st["min_d_m"],
+            "max_d_m": st["max_d_m"],
+            "count": st["count"],
         }
 
     anchors_used = sorted(per_anchor_stats.keys())
@@ -230,7 +275,7 @@ async def calibration_point(payload: CalPoint, request: Request):
         "duration_ms": payload.duration_ms,
     }
     summary = {
-        "samples": len(samples),
+        "samples": capture.count,
         "anchors_used": anchors_used,
         "result": result,
         "per_anchor": per_anchor_stats,
@@ -252,8 +297,9 @@ async def calibration_point(payload: CalPoint, request: Request):
                 "finished",
             ),
         )
-        db.commit()
         run_id = cur.lastrowid
+        _store_point(db, run_id, payload.tag_mac, params, summary, start_ts, end_ts)
+        db.commit()
     finally:
         db.close()
 
@@ -288,41 +334,18 @@ def calibration_solve(payload: CalSolve, request: Request):
                   pos[2] + offsets.get(mac, (0.0, 0.0, 0.0))[2])
             for mac, pos in base_positions.items()
         }
-        rows = db.execute(
-            "SELECT id, started_at_ms, params_json, summary_json "
-            "FROM calibration_runs WHERE tag_mac=? AND status='finished' "
-            "ORDER BY started_at_ms DESC",
-            (tag_mac,),
-        ).fetchall()
+        rows = _load_points(db, tag_mac)
         if not rows:
             raise HTTPException(status_code=404, detail="no calibration runs for tag_mac")
-
-        points = {}
-        for r in rows:
-            try:
-                params = json.loads(r["params_json"] or "{}")
-            except Exception:
-                continue
-            if params.get("type") != "venue_point":
-                continue
-            point_id = params.get("point_id")
-            pos = params.get("position_cm")
-            if not point_id or not isinstance(pos, dict):
-                continue
-            if point_id in points:
-                continue
-            try:
-                summary = json.loads(r["summary_json"] or "{}")
-            except Exception:
-                summary = {}
-            points[point_id] = {
-                "run_id": r["id"],
+        points = {
+            r["point_id"]: {
+                "run_id": r["run_id"],
                 "started_at_ms": r["started_at_ms"],
-                "position_cm": {"x": float(pos.get("x", 0.0)), "y": float(pos.get("y", 0.0)), "z": float(pos.get("z", 0.0))},
-                "summary": summary,
+                "position_cm": {"x": float(r["x_cm"] or 0.0), "y": float(r["y_cm"] or 0.0), "z": float(r["z_cm"] or 0.0)},
+                "per_anchor": r["per_anchor"],
             }
-            if len(points) >= 5:
-                break
+            for r in rows
+        }
 
         if len(points) < payload.min_points:
             raise HTTPException(status_code=400, detail=f"need at least {payload.min_points} points, got {len(points)}")
@@ -331,10 +354,7 @@ def calibration_solve(payload: CalSolve, request: Request):
 
         anchor_samples = {}
         for point_id, info in points.items():
-            pos = info["position_cm"]
-            summary = info.get("summary") or {}
-            per_anchor = summary.get("per_anchor") or {}
-            for anchor_mac, stats in per_anchor.items():
+            for anchor_mac, stats in info["per_anchor"].items():
                 meas_m = stats.get("median_d_m")
                 if meas_m is None:
                     meas_m = stats.get("mean_d_m")
@@ -342,66 +362,50 @@ def calibration_solve(payload: CalSolve, request: Request):
                     continue
                 anchor_samples.setdefault(anchor_mac, []).append({
                     "point_id": point_id,
-                    "pos_cm": (pos["x"], pos["y"], pos["z"]),
                     "meas_cm": float(meas_m) * 100.0,
                 })
 
+        # one joint least-squares problem over all anchors (positions + range scale/offset)
+        observations = [
+            (anchor_mac, smp["point_id"], smp["meas_cm"])
+            for anchor_mac, samples in anchor_samples.items()
+            if anchor_mac in current_positions and anchor_mac in base_positions and len(samples) >= payload.min_points
+            for smp in samples
+        ]
+        ba = bundle_adjust(
+            point_positions,
+            observations,
+            current_positions,
+            height_sigma_cm=payload.height_sigma_cm,
+            huber_cm=payload.huber_cm,
+        )
+
         range_corrections = {}
-        for anchor_mac, samples in anchor_samples.items():
-            cur_pos = current_positions.get(anchor_mac)
-            if not cur_pos:
-                continue
-            pairs = []
-            points_used = []
-            for s in samples:
-                true_cm = _dist_cm(cur_pos, s["pos_cm"])
-                pairs.append((s["meas_cm"], true_cm))
-                points_used.append(s["point_id"])
-            if len(pairs) < 2:
+        anchor_offsets = {}
+        for anchor_mac, est in ba.anchors.items():
+            base_pos = base_positions[anchor_mac]
+            pos = est["position_cm"]
+            sigma = est["sigma"]
+            if est["range_scale"] <= 0.0:
                 continue
-            scale, offset_cm, rms_cm = _fit_linear(pairs)
-            if scale <= 0.0:
-                scale = 1.0
             range_corrections[anchor_mac] = {
-                "range_scale": scale,
-                "range_offset_cm": offset_cm,
-                "rms_cm": rms_cm,
-                "points_used": sorted(set(points_used)),
+                "range_scale": est["range_scale"],
+                "range_offset_cm": est["range_offset_cm"],
+                "rms_cm": est["rms_cm"],
+                "points_used": est["points_used"],
+                "sigma_scale": sigma["scale"],
+                "sigma_offset_cm": sigma["offset_cm"],
             }
-
-        anchor_offsets = {}
-        for anchor_mac, samples in anchor_samples.items():
-            base_pos = base_positions.get(anchor_mac)
-            if not base_pos:
-                continue
-            corr = range_corrections.get(anchor_mac)
-            if not corr:
-                continue
-            dists = {}
-            for s in samples:
-                if s["point_id"] not in point_positions:
-                    continue
-                d_corr_cm = corr["range_scale"] * s["meas_cm"] + corr["range_offset_cm"]
-                if d_corr_cm <= 0:
-                    continue
-                dists[s["point_id"]] = d_corr_cm
-            if len(dists) < payload.min_points:
-                continue
-            initial = current_positions.get(anchor_mac, base_pos)
-            res = solve_3d(point_positions, dists, initial_pos_cm=initial)
-            if res.pos_cm is None:
-                continue
-            dx = res.pos_cm[0] - base_pos[0]
-            dy = res.pos_cm[1] - base_pos[1]
-            dz = res.pos_cm[2] - base_pos[2]
             anchor_offsets[anchor_mac] = {
-                "offset_cm": {"x": dx, "y": dy, "z": dz},
-                "position_cm": {"x": res.pos_cm[0], "y": res.pos_cm[1], "z": res.pos_cm[2]},
-                "resid_m": res.resid_m,
-                "points_used": sorted(dists.keys()),
+                "offset_cm": {"x": pos["x"] - base_pos[0], "y": pos["y"] - base_pos[1], "z": pos["z"] - base_pos[2]},
+                "position_cm": pos,
+                "resid_m": est["rms_cm"] / 100.0,
+                "points_used": est["points_used"],
+                "sigma_cm": {"x": sigma["x_cm"], "y": sigma["y_cm"], "z": sigma["z_cm"], "position": sigma["position_cm"]},
+                "covariance": est["covariance"],
             }
 
-        applied = {"range_settings": 0, "anchor_offsets": 0, "mqtt_published": 0}
+        applied = {"range_settings": 0, "anchor_offsets": 0, "mqtt_published": 0, "cmd_ids": []}
         if payload.apply:
             ts = int(time.time() * 1000)
             p = get_persistence()
@@ -428,6 +432,7 @@ def calibration_solve(payload: CalSolve, request: Request):
                 except Exception:
                     pass
             db.commit()
+            bump_tables("anchor_position_offsets")
 
             mc = getattr(request.app.state, "mqtt_client", None)
             client = getattr(mc, "_client", None) if mc else None
@@ -436,17 +441,10 @@ def calibration_solve(payload: CalSolve, request: Request):
                     mac_norm = _normalize_mac(anchor_mac)
                     if not mac_norm:
                         continue
-                    payload_cmd = {
-                        "type": "cmd",
-                        "cmd": "apply_settings",
-                        "cmd_id": f"cal_{ts}_{mac_norm[-4:]}",
-                        "settings": {
-                            "range_scale": corr["range_scale"],
-                            "range_offset_cm": corr["range_offset_cm"],
-                        },
-                    }
-                    client.publish(f"dev/{mac_norm}/cmd", json.dumps(payload_cmd), qos=1)
+                    settings = {"range_scale": corr["range_scale"], "range_offset_cm": corr["range_offset_cm"]}
+                    cmd = mc.commands.submit(mac_norm, "apply_settings", {"settings": settings}, prefix="cal")
                     applied["mqtt_published"] += 1
+                    applied["cmd_ids"].append(cmd.cmd_id)
 
     finally:
         db.close()
@@ -457,6 +455,15 @@ def calibration_solve(payload: CalSolve, request: Request):
         "points_used": {k: v["position_cm"] for k, v in points.items()},
         "range_corrections": range_corrections,
         "anchor_offsets": anchor_offsets,
+        "solver": {
+            "rms_cm": ba.rms_cm,
+            "sigma0": ba.sigma0,
+            "iterations": ba.iterations,
+            "converged": ba.converged,
+            "observations": ba.observations,
+            "outliers": [list(o) for o in ba.outliers],
+            "point_heights_cm": ba.point_heights_cm,
+        },
         "applied": applied,
     }
 
@@ -494,17 +501,31 @@ def calibration_discard(run_id: int):
 
 
 @router.get('/calibration/runs')
-def list_runs():
+def list_runs(tag_mac: Optional[str] = None):
     db = connect_db()
     try:
         ensure_calibration_table(db)
-        rows = db.execute('SELECT * FROM calibration_runs ORDER BY id DESC LIMIT 200').fetchall()
+        if tag_mac:
+            rows = db.execute('SELECT * FROM calibration_runs WHERE tag_mac=? ORDER BY id DESC LIMIT 200', (tag_mac,)).fetchall()
+        else:
+            rows = db.execute('SELECT * FROM calibration_runs ORDER BY id DESC LIMIT 200').fetchall()
         runs = [dict(r) for r in rows]
     finally:
         db.close()
     return {'runs': runs}
 
 
+@router.get('/calibration/points')
+def list_points(tag_mac: str, session_id: Optional[str] = None, all_runs: bool = False):
+    db = connect_db()
+    try:
+        ensure_calibration_table(db)
+        points = _load_points(db, tag_mac, session_id=session_id, latest_only=not all_runs)
+    finally:
+        db.close()
+    return {'tag_mac': tag_mac, 'points': points}
+
+
 @router.get('/calibration/runs/{run_id}')
 def get_run(run_id: int):
     db = connect_db()
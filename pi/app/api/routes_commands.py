@@ -0,0 +1,72 @@
+from fastapi import APIRouter, HTTPException, Request
+from pydantic import BaseModel, Field
+from typing import Any, Dict, List, Optional
+import asyncio
+import re
+
+from app.command_dispatcher import DONE_STATES
+
+router = APIRouter()
+
+
+class CommandBulk(BaseModel):
+    macs: List[str] = Field(..., min_length=1, max_length=512)
+    cmd: str = Field("apply_settings", min_length=1, max_length=32)
+    # extra top-level fields of the cmd payload, e.g. {"settings": {...}}
+    fields: Dict[str, Any] = Field(default_factory=dict)
+    wait: bool = True
+    timeout_s: Optional[float] = Field(None, gt=0, le=60)
+
+
+def _normalize_mac(mac: str) -> str:
+    if not mac:
+        return ""
+    return re.sub(r"[^0-9A-Fa-f]", "", mac).upper()
+
+
+def _dispatcher(request: Request, need_client: bool = False):
+    mc = getattr(request.app.state, "mqtt_client", None)
+    if mc is None or getattr(mc, "commands", None) is None:
+        raise HTTPException(status_code=503, detail="command dispatcher not available")
+    if need_client and not getattr(mc, "_client", None):
+        raise HTTPException(status_code=503, detail="mqtt client not available")
+    return mc.commands
+
+
+@router.get("/commands")
+def list_commands(request: Request, state: Optional[str] = None, mac: Optional[str] = None, limit: int = 100):
+    d = _dispatcher(request)
+    return d.status(state=state, mac=_normalize_mac(mac) if mac else None, limit=max(1, min(limit, 1000)))
+
+
+@router.get("/commands/{cmd_id}")
+def get_command(cmd_id: str, request: Request):
+    c = _dispatcher(request).get(cmd_id)
+    if c is None:
+        raise HTTPException(status_code=404, detail="not found")
+    return c
+
+
+@router.post("/commands")
+async def send_commands(body: CommandBulk, request: Request):
+    """Send one command to many devices; with ``wait`` the answer lists every device's ack result."""
+    if "cmd_id" in body.fields or "type" in body.fields:
+        raise HTTPException(status_code=400, detail="cmd_id/type are set by the dispatcher")
+    macs = []
+    for m in body.macs:
+        norm = _normalize_mac(m)
+        if not norm:
+            raise HTTPException(status_code=400, detail=f"invalid mac: {m}")
+        if norm not in macs:
+            macs.append(norm)
+    d = _dispatcher(request, need_client=True)
+    cmds = d.submit_many(macs, body.cmd, body.fields, timeout_s=body.timeout_s)
+    if not body.wait:
+        return {"ok": True, "cmd_ids": [c.cmd_id for c in cmds]}
+    results = list(await asyncio.gather(*(asyncio.wrap_future(c.future) for c in cmds)))
+    return {
+        "ok": all(r["ok"] for r in results),
+        "acked": sum(1 for r in results if r["ok"]),
+        "failed": sum(1 for r in results if r["state"] in DONE_STATES and not r["ok"]),
+        "results": results,
+    }
@@ -1,12 +1,14 @@
 from fastapi import APIRouter, HTTPException, Request
-from pydantic import BaseModel
-from typing import Optional
+from pydantic import BaseModel, Field
+from typing import List, Optional
 import re
 
+from app.db.async_persistence import get_async_persistence
 from app.db.persistence import get_persistence
-from app.db import connect_db
-import json, time
-from app.bridge_client import call_bridge, BridgeError
+import asyncio
+import time
+from app.bridge_client import get_bridge_session, BridgeError
+from .cache import cached_json_async
 
 
 router = APIRouter()
@@ -48,8 +50,20 @@ class DeviceProvision(BaseModel):
     timeout_ms: Optional[int] = 8000
 
 
+class DeviceProvisionTarget(BaseModel):
+    mac: str
+    alias: Optional[str] = None
+
+
+class DeviceProvisionBatch(DeviceProvision):
+    # wifi/mqtt/apply/reboot/timeout apply to every device, alias per target
+    devices: List[DeviceProvisionTarget] = Field(..., min_length=1, max_length=256)
+
+
 class TagMapRequest(BaseModel):
     tag_id: Optional[str] = None
+    # wait for every anchor's cmd_ack (or its final timeout) before answering
+    wait: bool = False
 
 
 def _normalize_mac(mac: str) -> str:
@@ -80,38 +94,11 @@ def _normalize_tag_id(tag_id: Optional[str]) -> str:
 
 
 def _collect_anchor_macs() -> set:
-    anchors = set()
-    p = get_persistence()
     try:
-        for dev in p.list_devices():
-            role = (dev.get("role") or "").upper()
-            if role == "ANCHOR":
-                mac = _normalize_mac(dev.get("mac"))
-                if mac:
-                    anchors.add(mac)
+        return get_persistence().list_anchor_macs()
     except Exception:
-        pass
-    db = connect_db()
-    try:
-        try:
-            rows = db.execute("SELECT mac FROM anchor_positions").fetchall()
-            for r in rows:
-                mac = _normalize_mac(r["mac"])
-                if mac:
-                    anchors.add(mac)
-        except Exception:
-            pass
-        try:
-            rows = db.execute("SELECT mac FROM anchors").fetchall()
-            for r in rows:
-                mac = _normalize_mac(r["mac"])
-                if mac:
-                    anchors.add(mac)
-        except Exception:
-            pass
-    finally:
-        db.close()
-    return anchors
+        return set()
+
 
 def _ensure_anchor_index(mac_norm: str, p) -> Optional[int]:
     try:
@@ -145,9 +132,8 @@ def _ensure_anchor_index(mac_norm: str, p) -> Optional[int]:
 
 
 @router.get("/devices")
-def list_devices():
-    p = get_persistence()
-    return {"devices": p.list_devices()}
+async def list_devices(request: Request):
+    return await cached_json_async(request, ("devices",), lambda: {"devices": get_persistence().list_devices()})
 
 
 @router.put("/devices/{mac}")
@@ -164,14 +150,7 @@ def upsert_device(mac: str, body: DeviceIn, request: Request):
         mc = getattr(request.app.state, "mqtt_client", None)
         client = getattr(mc, "_client", None) if mc else None
         if client:
-            payload = {
-                "type": "cmd",
-                "cmd": "apply_settings",
-                "cmd_id": f"alias_{int(time.time()*1000)}",
-                "settings": {"alias": body.alias},
-            }
-            topic = f"dev/{mac_norm}/cmd"
-            client.publish(topic, json.dumps(payload), qos=1)
+            mc.commands.submit(mac_norm, "apply_settings", {"settings": {"alias": body.alias}}, prefix="alias")
             published = True
     return {"ok": True, "alias_published": published}
 
@@ -260,23 +239,19 @@ def apply_device_settings(mac: str, body: DeviceConfig, request: Request):
             pass
     if not settings:
         raise HTTPException(status_code=400, detail="no settings provided")
-    payload = {
-        "type": "cmd",
-        "cmd": "apply_settings",
-        "cmd_id": f"cfg_{int(time.time()*1000)}",
-        "settings": settings,
-    }
-    topic = f"dev/{mac_norm}/cmd"
-    client.publish(topic, json.dumps(payload), qos=1)
-    return {"published": True, "topic": topic, "payload": payload}
+    cmd = mc.commands.submit(mac_norm, "apply_settings", {"settings": settings}, prefix="cfg")
+    return {"published": True, "topic": f"dev/{mac_norm}/cmd", "payload": cmd.payload, "cmd_id": cmd.cmd_id}
 
 
-@router.post("/devices/{mac}/provision")
-def provision_device(mac: str, body: DeviceProvision, request: Request):
-    mac_norm = _normalize_mac(mac)
-    if not mac_norm:
-        raise HTTPException(status_code=400, detail="invalid mac")
-    p = get_persistence()
+def _bridge_session(p):
+    bridge_port = p.get_setting("provision.bridge_port", "/dev/ttyUSB0") or "/dev/ttyUSB0"
+    bridge_baud = int(p.get_setting("provision.bridge_baud", 115200) or 115200)
+    max_in_flight = int(p.get_setting("provision.bridge_max_in_flight", 2) or 2)
+    return get_bridge_session(bridge_port, bridge_baud, max_in_flight=max_in_flight)
+
+
+def _provision_request(p, mac_norm: str, body: DeviceProvision, alias: str):
+    """Bridge payload and timeout for one provision_write; stores the alias."""
     ssid = body.wifi_ssid if body.wifi_ssid is not None else (p.get_setting("wifi.ssid", "") or "")
     wpass = body.wifi_pass if body.wifi_pass is not None else (p.get_setting("wifi.pass", "") or "")
     host = body.mqtt_host if body.mqtt_host is not None else (p.get_setting("mqtt.host", "") or "")
@@ -284,16 +259,12 @@ def provision_device(mac: str, body: DeviceProvision, request: Request):
     if not ssid or not host or not port:
         raise HTTPException(status_code=400, detail="wifi/mqtt defaults missing")
 
-    alias = (body.alias or "").strip()
     if alias:
-        alias = alias[:10]
         try:
             p.upsert_device({"mac": mac_norm, "alias": alias})
         except Exception:
             pass
 
-    bridge_port = p.get_setting("provision.bridge_port", "/dev/ttyUSB0") or "/dev/ttyUSB0"
-    bridge_baud = int(p.get_setting("provision.bridge_baud", 115200) or 115200)
     token = p.get_setting("provision.token", "changeme") or "changeme"
     payload = {
         "op": "provision_write",
@@ -314,41 +285,95 @@ def provision_device(mac: str, body: DeviceProvision, request: Request):
     if payload["reboot"]:
         steps += 2
     timeout_s = max(5.0, (timeout_ms / 1000.0) * steps + 2.0)
+    return payload, timeout_s
+
+
+def _bridge_status(resp) -> int:
+    if not resp:
+        return 504
+    if resp.get("status") == "error":
+        code = (resp.get("err") or {}).get("code") or "BRIDGE_ERROR"
+        return 409 if code == "BUSY" else 502
+    return 200
+
+
+@router.post("/devices/{mac}/provision")
+def provision_device(mac: str, body: DeviceProvision, request: Request):
+    mac_norm = _normalize_mac(mac)
+    if not mac_norm:
+        raise HTTPException(status_code=400, detail="invalid mac")
+    p = get_persistence()
+    alias = (body.alias or "").strip()[:10]
+    payload, timeout_s = _provision_request(p, mac_norm, body, alias)
     try:
-        resp = call_bridge(bridge_port, bridge_baud, payload, timeout_s=timeout_s)
+        resp = _bridge_session(p).call(payload, timeout_s=timeout_s)
     except BridgeError as e:
         raise HTTPException(status_code=503, detail=str(e))
-    if not resp:
+    status = _bridge_status(resp)
+    if status == 504:
         raise HTTPException(status_code=504, detail="bridge timeout")
-    if resp.get("status") == "error":
-        code = (resp.get("err") or {}).get("code") or "BRIDGE_ERROR"
-        status = 409 if code == "BUSY" else 502
+    if status != 200:
         raise HTTPException(status_code=status, detail=resp)
     return {"ok": True, "bridge": resp, "mac": mac_norm, "alias": alias or None}
 
 
+@router.post("/devices/provision/batch")
+def provision_devices(body: DeviceProvisionBatch, request: Request):
+    """Provision many devices through the bridge; requests are pipelined on one session."""
+    p = get_persistence()
+    targets = []
+    for t in body.devices:
+        mac_norm = _normalize_mac(t.mac)
+        if not mac_norm:
+            raise HTTPException(status_code=400, detail=f"invalid mac: {t.mac}")
+        alias = (t.alias or "").strip()[:10]
+        targets.append((mac_norm, alias, *_provision_request(p, mac_norm, body, alias)))
+    try:
+        session = _bridge_session(p)
+    except BridgeError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    timeout_s = max(t[3] for t in targets)
+    started = time.time()
+    outcomes = session.call_many([t[2] for t in targets], timeout_s=timeout_s)
+    results = []
+    for (mac_norm, alias, _, _), (resp, err) in zip(targets, outcomes):
+        status = 503 if err else _bridge_status(resp)
+        results.append({
+            "mac": mac_norm,
+            "alias": alias or None,
+            "ok": status == 200,
+            "status": status,
+            "bridge": resp,
+            "error": err or ("bridge timeout" if status == 504 else None),
+        })
+    return {
+        "ok": all(r["ok"] for r in results),
+        "results": results,
+        "elapsed_ms": int((time.time() - started) * 1000),
+    }
+
+
 @router.post("/devices/{mac}/tag-map")
-def apply_tag_map_to_anchors(mac: str, body: TagMapRequest, request: Request):
+async def apply_tag_map_to_anchors(mac: str, body: TagMapRequest, request: Request):
     mac_norm = _normalize_mac(mac)
     if not mac_norm:
         raise HTTPException(status_code=400, detail="invalid mac")
     tag_id = _normalize_tag_id(body.tag_id)
     tag_mac = _format_mac_colon(mac_norm)
-    anchors = _collect_anchor_macs()
+    anchors = await get_async_persistence().run(_collect_anchor_macs)
     if not anchors:
         raise HTTPException(status_code=404, detail="no anchors found")
     mc = getattr(request.app.state, "mqtt_client", None)
     client = getattr(mc, "_client", None) if mc else None
     if not client:
         raise HTTPException(status_code=503, detail="mqtt client not available")
-    ts = int(time.time() * 1000)
-    payload_base = {
-        "type": "cmd",
-        "cmd": "apply_settings",
-        "settings": {"tag_map": {tag_id: tag_mac}},
-    }
-    for anchor in anchors:
-        payload = payload_base.copy()
-        payload["cmd_id"] = f"tagmap_{tag_id}_{ts}_{anchor[-4:]}"
-        client.publish(f"dev/{anchor}/cmd", json.dumps(payload), qos=1)
-    return {"published": len(anchors), "tag_id": tag_id, "tag_mac": tag_mac, "anchors": sorted(anchors)}
+    anchors = sorted(anchors)
+    cmds = mc.commands.submit_many(anchors, "apply_settings", {"settings": {"tag_map": {tag_id: tag_mac}}},
+                                   prefix=f"tagmap_{tag_id}")
+    out = {"published": len(anchors), "tag_id": tag_id, "tag_mac": tag_mac, "anchors": anchors,
+           "cmd_ids": [c.cmd_id for c in cmds]}
+    if body.wait:
+        results = await asyncio.gather(*(asyncio.wrap_future(c.future) for c in cmds))
+        out["results"] = list(results)
+        out["acked"] = sum(1 for r in results if r["ok"])
+    return out
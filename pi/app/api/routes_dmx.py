@@ -1,3 +1,6 @@
+import os
+import time
+
 from fastapi import APIRouter, HTTPException, Request
 from pydantic import BaseModel, Field, validator
 
@@ -31,9 +34,73 @@ def dmx_stop(request: Request):
     return {"ok": True}
 
 
+@router.post("/dmx/test/release")
+def dmx_test_release(request: Request):
+    """Drop all test channel writes so tracking and live color own the output again."""
+    eng = getattr(request.app.state, "dmx_engine", None)
+    if not eng:
+        raise HTTPException(status_code=503, detail="dmx engine not available")
+    released = eng.release_test_writes()
+    return {"ok": True, "released": {str(uni): sorted(set(chs)) for uni, chs in released.items()}}
+
+
+@router.get("/dmx/stats")
+def dmx_stats(request: Request):
+    eng = getattr(request.app.state, "dmx_engine", None)
+    if not eng:
+        raise HTTPException(status_code=503, detail="dmx engine not available")
+    return {"driver": eng.driver_stats()}
+
+
+CAPTURE_DIR = os.path.normpath(os.path.join(os.path.dirname(__file__), "..", "data", "captures"))
+
+
+class CaptureStart(BaseModel):
+    name: str | None = Field(None, description="file name inside data/captures (default: timestamped)")
+    keyframe_interval_s: float = Field(5.0, ge=0, le=300)
+
+
+@router.get("/dmx/capture")
+def dmx_capture_status(request: Request):
+    eng = getattr(request.app.state, "dmx_engine", None)
+    if not eng:
+        raise HTTPException(status_code=503, detail="dmx engine not available")
+    files = sorted(f for f in os.listdir(CAPTURE_DIR) if f.endswith(".ltcap")) if os.path.isdir(CAPTURE_DIR) else []
+    return {"active": eng.capture_stats(), "files": files}
+
+
+@router.post("/dmx/capture/start")
+def dmx_capture_start(body: CaptureStart, request: Request):
+    eng = getattr(request.app.state, "dmx_engine", None)
+    if not eng:
+        raise HTTPException(status_code=503, detail="dmx engine not available")
+    name = os.path.basename(body.name or time.strftime("dmx-%Y%m%d-%H%M%S"))
+    if not name.endswith(".ltcap"):
+        name += ".ltcap"
+    os.makedirs(CAPTURE_DIR, exist_ok=True)
+    try:
+        stats = eng.start_capture(os.path.join(CAPTURE_DIR, name), keyframe_interval_s=body.keyframe_interval_s)
+    except OSError as e:
+        raise HTTPException(status_code=500, detail=f"could not open capture: {e}")
+    return {"ok": True, "capture": stats}
+
+
+@router.post("/dmx/capture/stop")
+def dmx_capture_stop(request: Request):
+    eng = getattr(request.app.state, "dmx_engine", None)
+    if not eng:
+        raise HTTPException(status_code=503, detail="dmx engine not available")
+    stats = eng.stop_capture()
+    if stats is None:
+        raise HTTPException(status_code=409, detail={"code": "NOT_CAPTURING", "message": "No capture running"})
+    return {"ok": True, "capture": stats}
+
+
 class DmxConfig(BaseModel):
     mode: str = Field("uart", description="uart | artnet | off")
     uart_device: str | None = Field(None, description="e.g. /dev/serial0")
+    uart_threaded: bool | None = Field(None, description="transmit from a dedicated writer thread")
+    uart_refresh_hz: float | None = Field(None, ge=1, le=44)
     artnet_target: str | None = Field(None, description="IPv4 target or broadcast")
     artnet_port: int | None = Field(None, ge=1, le=65535)
     artnet_universe: int | None = Field(None, ge=0, le=32767)
@@ -53,9 +120,16 @@ def _load_dmx_config():
             return int(val)
         except Exception:
             return default
+    def _as_float(val, default):
+        try:
+            return float(val)
+        except Exception:
+            return default
     return {
         "mode": mode,
         "uart_device": p.get_setting("dmx.uart_device", "/dev/serial0") or "/dev/serial0",
+        "uart_threaded": str(p.get_setting("dmx.uart_threaded", "true") or "true").lower() in ("1", "true", "yes", "on"),
+        "uart_refresh_hz": _as_float(p.get_setting("dmx.uart_refresh_hz", 30), 30.0),
         "artnet_target": p.get_setting("artnet.target_ip", "255.255.255.255") or "255.255.255.255",
         "artnet_port": _as_int(p.get_setting("artnet.port", 6454), 6454),
         "artnet_universe": _as_int(p.get_setting("artnet.universe", 0), 0),
@@ -83,6 +157,10 @@ def put_dmx_config(body: DmxConfig):
     if mode == "uart":
         if body.uart_device:
             p.upsert_setting("dmx.uart_device", body.uart_device)
+        if body.uart_threaded is not None:
+            p.upsert_setting("dmx.uart_threaded", "true" if body.uart_threaded else "false")
+        if body.uart_refresh_hz is not None:
+            p.upsert_setting("dmx.uart_refresh_hz", str(body.uart_refresh_hz))
     elif mode == "artnet":
         if body.artnet_target:
             p.upsert_setting("artnet.target_ip", body.artnet_target)
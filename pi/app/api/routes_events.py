@@ -1,4 +1,6 @@
 from fastapi import APIRouter
+from typing import Optional
+from app.db.event_sink import get_event_sink
 from app.db.persistence import get_persistence
 
 
@@ -6,6 +8,18 @@ router = APIRouter()
 
 
 @router.get("/events")
-def list_events(limit: int = 200):
+def list_events(limit: int = 200, level: Optional[str] = None, source: Optional[str] = None,
+                event_type: Optional[str] = None, ref: Optional[str] = None, since_ms: Optional[int] = None,
+                until_ms: Optional[int] = None, before: Optional[int] = None):
+    # make events queued for the next group commit visible
+    get_event_sink().flush()
     p = get_persistence()
-    return {"events": p.list_events(limit=limit)}
+    return p.list_events_page(limit=max(1, min(limit, 1000)), level=level, source=source, event_type=event_type,
+                              ref=ref, since_ms=since_ms, until_ms=until_ms, before=before)
+
+
+@router.get("/events/stats")
+def event_stats():
+    sink = get_event_sink()
+    return {"stats": dict(sink.stats), "flush_interval_s": sink.flush_interval_s,
+            "dedup_window_s": sink.dedup_window_ms / 1000, "rate_per_s": sink.rate_per_s}
@@ -1,11 +1,12 @@
 import json
-from fastapi import APIRouter, HTTPException, UploadFile, File, Form
+from fastapi import APIRouter, HTTPException, Request, UploadFile, File, Form
 from pydantic import BaseModel, Field
 from typing import Optional
 
 from app.dmx.ssl2_import import parse_ssl2_fixture
 
 from app.db.persistence import get_persistence
+from .cache import cached_json
 
 
 def _assert_not_live(p):
@@ -15,6 +16,12 @@ def _assert_not_live(p):
         raise HTTPException(status_code=409, detail={"code": "STATE_BLOCKED", "message": "Operation not allowed while system is LIVE"})
 
 
+def _invalidate_dmx_plan(request: Request):
+    eng = getattr(request.app.state, "dmx_engine", None)
+    if eng and hasattr(eng, "invalidate_plan"):
+        eng.invalidate_plan()
+
+
 router = APIRouter()
 
 
@@ -29,12 +36,12 @@ class FixtureIn(BaseModel):
 
 
 @router.get("/fixture-profiles")
-def list_profiles():
+def list_profiles(request: Request):
     p = get_persistence()
-    return {"profiles": p.list_fixture_profiles()}
+    return cached_json(request, ("fixtures",), lambda: {"profiles": p.list_fixture_profiles()}, key="profiles")
 
 @router.post("/fixture-profiles/import-ssl2")
-async def import_fixture_profile_ssl2(file: UploadFile = File(...), profile_key: Optional[str] = Form(None)):
+async def import_fixture_profile_ssl2(request: Request, file: UploadFile = File(...), profile_key: Optional[str] = Form(None)):
     p = get_persistence()
     _assert_not_live(p)
     data = await file.read()
@@ -50,17 +57,18 @@ async def import_fixture_profile_ssl2(file: UploadFile = File(...), profile_key:
         p.upsert_fixture_profile(key, json.dumps(profile))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"failed to store profile: {e}")
+    _invalidate_dmx_plan(request)
     return {"ok": True, "profile_key": key, "profile": profile}
 
 
 @router.get("/fixtures")
-def list_fixtures():
+def list_fixtures(request: Request):
     p = get_persistence()
-    return {"fixtures": p.list_fixtures()}
+    return cached_json(request, ("fixtures",), lambda: {"fixtures": p.list_fixtures()})
 
 
 @router.post("/fixtures")
-def create_fixture(body: FixtureIn):
+def create_fixture(body: FixtureIn, request: Request):
     p = get_persistence()
     _assert_not_live(p)
     # basic validation: ensure fits in 512 using profile channels if available
@@ -77,6 +85,7 @@ def create_fixture(body: FixtureIn):
     if body.dmx_base_addr + channel_count - 1 > 512:
         raise HTTPException(status_code=400, detail="DMX channels exceed universe size")
     fid = p.create_fixture(body.dict())
+    _invalidate_dmx_plan(request)
     return {"id": fid}
 
 
@@ -90,41 +99,45 @@ def get_fixture(fid: int):
 
 
 @router.put("/fixtures/{fid}")
-def put_fixture(fid: int, body: dict):
+def put_fixture(fid: int, body: dict, request: Request):
     p = get_persistence()
     _assert_not_live(p)
     ok = p.update_fixture(fid, body)
     if not ok:
         raise HTTPException(status_code=404)
+    _invalidate_dmx_plan(request)
     return {"ok": True}
 
 
 @router.delete("/fixtures/{fid}")
-def delete_fixture(fid: int):
+def delete_fixture(fid: int, request: Request):
     p = get_persistence()
     _assert_not_live(p)
     ok = p.delete_fixture(fid)
     if not ok:
         raise HTTPException(status_code=404)
+    _invalidate_dmx_plan(request)
     return {"deleted": True}
 
 
 @router.post("/fixtures/{fid}/enable")
-def enable_fixture(fid: int):
+def enable_fixture(fid: int, request: Request):
     p = get_persistence()
     _assert_not_live(p)
     ok = p.update_fixture(fid, {"enabled": 1})
     if not ok:
         raise HTTPException(status_code=404)
+    _invalidate_dmx_plan(request)
     return {"ok": True}
 
 
 @router.post("/fixtures/{fid}/disable")
-def disable_fixture(fid: int):
+def disable_fixture(fid: int, request: Request):
     p = get_persistence()
     _assert_not_live(p)
     ok = p.update_fixture(fid, {"enabled": 0})
     if not ok:
         raise HTTPException(status_code=404)
+    _invalidate_dmx_plan(request)
     return {"ok": True}
 # /fixtures routes
@@ -0,0 +1,107 @@
+from fastapi import APIRouter, HTTPException, Request
+from pydantic import BaseModel, Field
+from typing import List
+
+from app.db.persistence import get_persistence
+from .cache import cached_json
+from .routes_fixtures import _assert_not_live, _invalidate_dmx_plan
+
+
+router = APIRouter()
+
+
+class GroupTagIn(BaseModel):
+    tag_mac: str
+    priority: int = 0
+
+
+class GroupMemberIn(BaseModel):
+    kind: str = "fixture"  # fixture | patch
+    ref_id: int
+
+
+class FixtureGroupIn(BaseModel):
+    name: str
+    enabled: bool = True
+    predict_ms: int = Field(0, ge=0, le=1000)
+    tags: List[GroupTagIn] = []
+    members: List[GroupMemberIn] = []
+
+
+def _validate_members(p, body: FixtureGroupIn):
+    fixture_ids = {f["id"] for f in p.list_fixtures()}
+    patch_ids = {pf["id"] for pf in p.list_patched_fixtures()}
+    for m in body.members:
+        if m.kind not in ("fixture", "patch"):
+            raise HTTPException(status_code=400, detail=f"invalid member kind {m.kind}")
+        known = fixture_ids if m.kind == "fixture" else patch_ids
+        if m.ref_id not in known:
+            raise HTTPException(status_code=400, detail=f"unknown {m.kind} {m.ref_id}")
+
+
+def _group_data(body: FixtureGroupIn) -> dict:
+    data = body.dict()
+    data["enabled"] = 1 if body.enabled else 0
+    return data
+
+
+@router.get("/fixture-groups")
+def list_groups(request: Request):
+    p = get_persistence()
+    return cached_json(request, ("fixture_groups",), lambda: {"groups": p.list_fixture_groups()})
+
+
+@router.get("/fixture-groups/routing")
+def groups_routing(request: Request):
+    """Tag each group currently follows (null while all of its tags are lost)."""
+    eng = getattr(request.app.state, "dmx_engine", None)
+    routing = getattr(eng, "routing_status", {}) if eng else {}
+    return {"routing": list(routing.values())}
+
+
+@router.post("/fixture-groups")
+def create_group(body: FixtureGroupIn, request: Request):
+    p = get_persistence()
+    _assert_not_live(p)
+    _validate_members(p, body)
+    try:
+        gid = p.save_fixture_group(None, _group_data(body))
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"could not create group: {e}")
+    _invalidate_dmx_plan(request)
+    return {"id": gid}
+
+
+@router.get("/fixture-groups/{gid}")
+def get_group(gid: int):
+    p = get_persistence()
+    g = p.get_fixture_group(gid)
+    if not g:
+        raise HTTPException(status_code=404)
+    return g
+
+
+@router.put("/fixture-groups/{gid}")
+def put_group(gid: int, body: FixtureGroupIn, request: Request):
+    p = get_persistence()
+    _assert_not_live(p)
+    _validate_members(p, body)
+    try:
+        ok = p.save_fixture_group(gid, _group_data(body))
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"could not update group: {e}")
+    if not ok:
+        raise HTTPException(status_code=404)
+    _invalidate_dmx_plan(request)
+    return {"ok": True}
+
+
+@router.delete("/fixture-groups/{gid}")
+def delete_group(gid: int, request: Request):
+    p = get_persistence()
+    _assert_not_live(p)
+    ok = p.delete_fixture_group(gid)
+    if not ok:
+        raise HTTPException(status_code=404)
+    _invalidate_dmx_plan(request)
+    return {"deleted": True}
@@ -1,5 +1,6 @@
 from fastapi import APIRouter, Request
 from ..db import connect_db
+from ..db.ram_db import get_ram_database
 import time
 
 router = APIRouter()
@@ -25,10 +26,13 @@ def health(request: Request):
 
     # mqtt status may be stored on app.state.mqtt_ok by startup routines
     mqtt_ok = getattr(request.app.state, 'mqtt_ok', None)
+    ram = get_ram_database()
 
     return {
         'ts_ms': int(time.time() * 1000),
         'db_ok': db_ok,
         'migrations_table_present': migrations,
-        'mqtt_ok': mqtt_ok
+        'mqtt_ok': mqtt_ok,
+        # LT_DB_RAM: live copy on tmpfs and last snapshot to disk
+        'db_ram': ram.status() if ram else None,
     }
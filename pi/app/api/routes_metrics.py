@@ -0,0 +1,18 @@
+from fastapi import APIRouter, Request
+from fastapi.responses import JSONResponse, PlainTextResponse
+from typing import Optional
+
+from app.metrics import REGISTRY
+
+router = APIRouter()
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+@router.get("/metrics")
+def metrics(request: Request, format: Optional[str] = None):
+    """Prometheus text format; JSON with ``?format=json`` or ``Accept: application/json``."""
+    accept = request.headers.get("accept", "")
+    if format == "json" or (format is None and "application/json" in accept and "text/plain" not in accept):
+        return JSONResponse(REGISTRY.as_dict())
+    return PlainTextResponse(REGISTRY.render_text(), media_type=PROMETHEUS_CONTENT_TYPE)
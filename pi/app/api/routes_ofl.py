@@ -10,6 +10,9 @@ from pydantic import BaseModel, Field
 
 from app.db.persistence import get_persistence
 from app.db import connect_db
+from app.db.versions import bump_tables
+from app.dmx.ofl_channels import compile_and_store
+from .cache import cached_json
 
 router = APIRouter()
 
@@ -112,6 +115,17 @@ def _find_channel_indexes(fixture: dict, mode_name: str):
     return dimmer_idx, shutter_idx, color_idx, rgb_idxs, chan_list
 
 
+def _invalidate_dmx_maps(request: Request):
+    eng = getattr(request.app.state, "dmx_engine", None)
+    if eng and hasattr(eng, "invalidate_ofl_maps"):
+        eng.invalidate_ofl_maps()
+
+
+def _ensure_channel_map(p, fixture_id: int, mode_name: str, fixture_obj: dict):
+    if p.get_ofl_channel_map(fixture_id, mode_name) is None:
+        compile_and_store(p, fixture_id, fixture_obj)
+
+
 def _assert_not_live():
     p = get_persistence()
     state = p.get_setting("system.state", "SETUP")
@@ -120,7 +134,7 @@ def _assert_not_live():
 
 
 @router.post("/ofl/fixtures/import")
-async def import_ofl_fixture(file: UploadFile = File(...), manufacturer: Optional[str] = Form(None), model: Optional[str] = Form(None)):
+async def import_ofl_fixture(request: Request, file: UploadFile = File(...), manufacturer: Optional[str] = Form(None), model: Optional[str] = Form(None)):
     _assert_not_live()
     raw = await file.read()
     obj, inferred_mfr, inferred_model = _load_ofl_json(raw, filename=file.filename or "")
@@ -148,43 +162,37 @@ async def import_ofl_fixture(file: UploadFile = File(...), manufacturer: Optiona
         duplicate = True
     else:
         fid = p.upsert_ofl_fixture(mfr, mdl, ofl_schema, norm, content_hash)
+    if fid:
+        compile_and_store(p, fid, obj)
+        _invalidate_dmx_maps(request)
     return {"fixture_id": fid, "duplicate": duplicate, "manufacturer": mfr, "model": mdl}
 
 
 @router.get("/ofl/fixtures")
-def list_ofl_fixtures(q: Optional[str] = None):
-    p = get_persistence()
-    rows = p.search_ofl_fixtures(q)
-    fixtures = []
-    for r in rows:
-        try:
-            obj = json.loads(r["ofl_json"])
-        except Exception:
-            obj = {}
-        modes = _extract_modes(obj)
-        fixtures.append({
-            "id": r["id"],
-            "manufacturer": r["manufacturer"],
-            "model": r["model"],
-            "modes": [{"name": m["name"], "channels": m["channels"]} for m in modes],
-        })
-    return {"fixtures": fixtures}
+def list_ofl_fixtures(request: Request, q: Optional[str] = None, after: Optional[int] = None, limit: int = 100):
+    limit = max(1, min(int(limit), 500))
+    return cached_json(
+        request, ("ofl",),
+        lambda: get_persistence().search_ofl_fixture_page(q, after=after, limit=limit),
+        key=f"q={q or ''}&after={after}&limit={limit}",
+    )
 
 
 @router.get("/ofl/fixtures/{fid}")
-def get_ofl_fixture(fid: int):
+def get_ofl_fixture(fid: int, include_json: bool = True):
     p = get_persistence()
-    row = p.get_ofl_fixture(fid)
-    if not row:
+    summary = p.get_ofl_fixture_summaries([fid]).get(fid)
+    if not summary:
         raise HTTPException(status_code=404)
+    if not include_json:
+        return summary
+    row = p.get_ofl_fixture(fid)
     try:
         obj = json.loads(row["ofl_json"])
     except Exception:
         obj = {}
     return {
-        "id": row["id"],
-        "manufacturer": row["manufacturer"],
-        "model": row["model"],
+        **summary,
         "ofl_schema": row["ofl_schema"],
         "ofl_json": obj,
     }
@@ -207,7 +215,7 @@ class ColorPayload(BaseModel):
 
 
 @router.post("/ofl/patched-fixtures")
-def create_patched_fixture(body: PatchIn):
+def create_patched_fixture(body: PatchIn, request: Request):
     _assert_not_live()
     p = get_persistence()
     fx = p.get_ofl_fixture(body.fixture_id)
@@ -225,14 +233,20 @@ def create_patched_fixture(body: PatchIn):
         raise HTTPException(status_code=400, detail="DMX address out of range for selected mode")
     overrides_str = json.dumps(body.overrides_json) if body.overrides_json is not None else None
     pid = p.create_patched_fixture(body.fixture_id, body.name, body.mode_name, body.universe, body.dmx_address, overrides_str)
+    _ensure_channel_map(p, body.fixture_id, body.mode_name, obj)
+    _invalidate_dmx_maps(request)
     return {"id": pid}
 
 
 @router.get("/ofl/patched-fixtures")
-def list_patched_fixtures():
+def list_patched_fixtures(request: Request):
+    return cached_json(request, ("ofl",), _build_patched_fixture_list, key="patched")
+
+
+def _build_patched_fixture_list():
     p = get_persistence()
     rows = p.list_patched_fixtures()
-    fixtures = {fx["id"]: fx for fx in p.search_ofl_fixtures()}
+    fixtures = p.get_ofl_fixture_summaries(sorted({r["fixture_id"] for r in rows}))
     out = []
     for r in rows:
         fx = fixtures.get(r["fixture_id"])
@@ -285,7 +299,7 @@ def get_patched_fixture(pid: int):
 
 
 @router.put("/ofl/patched-fixtures/{pid}")
-def update_patched_fixture(pid: int, body: PatchIn):
+def update_patched_fixture(pid: int, body: PatchIn, request: Request):
     _assert_not_live()
     p = get_persistence()
     row = p.get_patched_fixture(pid)
@@ -313,10 +327,13 @@ def update_patched_fixture(pid: int, body: PatchIn):
             (body.fixture_id, body.name, body.mode_name, body.universe, body.dmx_address, overrides_str, ts, pid),
         )
         conn.commit()
+        bump_tables("patched_fixtures")
         if cur.rowcount == 0:
             raise HTTPException(status_code=404, detail="not updated")
     finally:
         conn.close()
+    _ensure_channel_map(p, body.fixture_id, body.mode_name, obj)
+    _invalidate_dmx_maps(request)
     return {"ok": True}
 
 
@@ -345,11 +362,11 @@ def _build_test_frame(fixture_obj: dict, mode_name: str, base_addr: int, on: boo
     return channel_values, warnings
 
 
-def _send_test_frame(request: Request, universe: int, channel_values: dict):
+def _test_engine(request: Request):
     eng = getattr(request.app.state, "dmx_engine", None)
     if not eng:
         raise HTTPException(status_code=503, detail="dmx engine not available")
-    eng.send_custom_frame(universe, channel_values)
+    return eng
 
 
 @router.post("/ofl/patched-fixtures/{pid}/test/light-on")
@@ -368,29 +385,24 @@ def patched_fixture_light_on(pid: int, request: Request):
     channel_values, warnings = _build_test_frame(obj, row["mode_name"], row["dmx_address"], True)
     if not channel_values:
         raise HTTPException(status_code=400, detail={"message": "no channels inferred", "warnings": warnings})
-    _send_test_frame(request, row["universe"], channel_values)
+    _test_engine(request).send_custom_frame(row["universe"], channel_values, owner=f"patch:{pid}")
     writes = [{"channel": ch, "value": val} for ch, val in sorted(channel_values.items())]
     return {"patched_fixture_id": pid, "writes": writes, "warnings": warnings}
 
 
 @router.post("/ofl/patched-fixtures/{pid}/test/light-off")
 def patched_fixture_light_off(pid: int, request: Request):
+    """End the light test: the channels go back to tracking / live color (0 if unowned)."""
     p = get_persistence()
     row = p.get_patched_fixture(pid)
     if not row:
         raise HTTPException(status_code=404, detail="patched fixture not found")
-    fx = p.get_ofl_fixture(row["fixture_id"])
-    if not fx:
-        raise HTTPException(status_code=404, detail="fixture missing")
-    try:
-        obj = json.loads(fx["ofl_json"])
-    except Exception:
-        obj = {}
-    channel_values, warnings = _build_test_frame(obj, row["mode_name"], row["dmx_address"], False)
-    if not channel_values:
-        raise HTTPException(status_code=400, detail={"message": "no channels inferred", "warnings": warnings})
-    _send_test_frame(request, row["universe"], channel_values)
-    writes = [{"channel": ch, "value": val} for ch, val in sorted(channel_values.items())]
+    eng = _test_engine(request)
+    released = eng.release_test_writes(f"patch:{pid}")
+    frame = eng.merger.merged(row["universe"])
+    channels = sorted(set(released.get(row["universe"], ())))
+    writes = [{"channel": ch, "value": frame[ch]} for ch in channels]
+    warnings = [] if channels else ["no test writes active"]
     return {"patched_fixture_id": pid, "writes": writes, "warnings": warnings}
 
 
@@ -3,8 +3,9 @@ from pydantic import BaseModel
 import sqlite3
 import json
 
-from app.db.database import get_db_path
+from app.db.database import get_live_db_path
 from app.db.persistence import get_persistence
+from .cache import cached_json
 
 
 class SettingItem(BaseModel):
@@ -27,12 +28,16 @@ def _ensure_settings_table(conn):
 
 
 @router.get("/settings")
-def list_settings():
+def list_settings(request: Request):
+    return cached_json(request, ("settings",), _build_settings_list)
+
+
+def _build_settings_list():
     try:
         p = get_persistence()
         # ensure table exists (persistence does this on init)
         items = []
-        db = sqlite3.connect(get_db_path())
+        db = sqlite3.connect(get_live_db_path())
         try:
             _ensure_settings_table(db)
             rows = db.execute("SELECT key,value FROM settings").fetchall()
@@ -42,7 +47,7 @@ def list_settings():
         return {"settings": items}
     except Exception:
         # fallback raw
-        db = sqlite3.connect(get_db_path())
+        db = sqlite3.connect(get_live_db_path())
         _ensure_settings_table(db)
         cur = db.execute("SELECT key,value FROM settings")
         items = [{"key": r[0], "value": r[1]} for r in cur.fetchall()]
@@ -60,6 +65,10 @@ def put_setting(item: SettingItem, request: Request):
 
     # use persistence so the same connection path is used everywhere
     p.upsert_setting(item.key, item.value)
+    if item.key.startswith("tracking."):
+        eng = getattr(request.app.state, "dmx_engine", None)
+        if eng and hasattr(eng, "invalidate_plan"):
+            eng.invalidate_plan()
     pushed = 0
     mqtt_restarted = False
     if item.key in {"mqtt.host", "mqtt.port"}:
@@ -1,7 +1,7 @@
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
 from ..db import connect_db
-from app.db.persistence import get_persistence
+from app.db.async_persistence import get_async_persistence
 from app.core.state_manager import StateManager
 import time
 
@@ -13,8 +13,12 @@ class StateUpdate(BaseModel):
 
 
 @router.get('/state')
-def get_state():
-    p = get_persistence()
+async def get_state():
+    # one hop to the DB thread for all state queries
+    return await get_async_persistence().run(_state_snapshot)
+
+
+def _state_snapshot():
     sm = StateManager()
     system_state = sm.get_state()
     db = connect_db()
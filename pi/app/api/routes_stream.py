@@ -0,0 +1,81 @@
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from typing import Optional
+import json
+
+from app.live_broadcaster import DEFAULT_TOPICS, TOPICS
+
+router = APIRouter()
+
+HEARTBEAT_S = 15.0
+MAX_POLL_S = 30.0
+
+
+def _broadcaster(request: Request):
+    b = getattr(request.app.state, 'live_broadcaster', None)
+    if b is None:
+        raise HTTPException(status_code=503, detail='live feed not available')
+    return b
+
+
+def _parse_topics(raw: Optional[str]):
+    if not raw:
+        return DEFAULT_TOPICS
+    topics = tuple(t.strip() for t in raw.split(',') if t.strip())
+    unknown = [t for t in topics if t not in TOPICS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"unknown topics: {', '.join(unknown)}")
+    return topics
+
+
+def _parse_ids(raw: Optional[str]):
+    if not raw:
+        return None
+    return [i.strip() for i in raw.split(',') if i.strip()] or None
+
+
+def _sse(seq: int, events, snapshot: bool) -> str:
+    data = json.dumps({'type': 'bulk', 'events': events, 'snapshot': snapshot})
+    return f"id: {seq}\nevent: bulk\ndata: {data}\n\n"
+
+
+@router.get('/stream')
+async def stream(request: Request, topics: Optional[str] = None, ids: Optional[str] = None,
+                 since: Optional[int] = None, timeout: float = 25.0):
+    """Live feed without WebSockets.
+
+    Without ``since`` this is a Server-Sent Events stream (``id`` = sequence
+    number, resumable via ``Last-Event-ID``). With ``?since=<seq>`` it is a
+    long-poll: the request waits up to ``timeout`` seconds for changes after
+    ``seq`` and returns ``{"seq", "events", "snapshot"}``.
+    """
+    b = _broadcaster(request)
+    topic_list = _parse_topics(topics)
+    id_list = _parse_ids(ids)
+    b.touch(topic_list)
+
+    if since is not None:
+        seq, events, snapshot = await b.wait_changes(since, max(0.0, min(timeout, MAX_POLL_S)), topic_list, id_list)
+        return {'seq': seq, 'events': events, 'snapshot': snapshot}
+
+    try:
+        last = int(request.headers.get('last-event-id') or 0)
+    except ValueError:
+        last = 0
+
+    async def gen():
+        cursor = last
+        yield "retry: 2000\n\n"
+        while True:
+            b.touch(topic_list, ttl_s=HEARTBEAT_S * 2)
+            seq, events, snapshot = await b.wait_changes(cursor, HEARTBEAT_S, topic_list, id_list)
+            if await request.is_disconnected():
+                return
+            if events or (snapshot and seq != cursor):
+                yield _sse(seq, events, snapshot)
+            else:
+                yield ": ping\n\n"
+            cursor = seq
+
+    return StreamingResponse(gen(), media_type='text/event-stream',
+                             headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
@@ -1,9 +1,16 @@
 from fastapi import APIRouter, Request, HTTPException
+from typing import Optional
+import time
+
+from app import metrics
+from app.core import latency
+from app.db.persistence import get_persistence
+
 router = APIRouter()
 
 
 @router.get('/tracking/tags')
-def list_tracking_tags(request: Request):
+async def list_tracking_tags(request: Request):
     te = getattr(request.app.state, 'tracking_engine', None)
     if not te:
         return {'tags': []}
@@ -23,7 +30,7 @@ def list_tracking_tags(request: Request):
 
 
 @router.get('/tracking/position/{tag_mac}')
-def get_tracking_position(tag_mac: str, request: Request):
+async def get_tracking_position(tag_mac: str, request: Request):
     te = getattr(request.app.state, 'tracking_engine', None)
     if not te:
         raise HTTPException(status_code=404, detail='tracking engine not available')
@@ -31,3 +38,49 @@ def get_tracking_position(tag_mac: str, request: Request):
     if not p:
         raise HTTPException(status_code=404, detail='not found')
     return p
+
+
+@router.get('/tracking/latency')
+def get_tracking_latency(request: Request, tag_mac: Optional[str] = None):
+    """Latency breakdown range batch -> DMX frame for one tag (default: the selected tracking tag)."""
+    te = getattr(request.app.state, 'tracking_engine', None)
+    if not te:
+        raise HTTPException(status_code=404, detail='tracking engine not available')
+    eng = getattr(request.app.state, 'dmx_engine', None)
+    dmx_traces = getattr(eng, 'latency_traces', {}) if eng else {}
+    latest = te.latest_position
+    if not tag_mac:
+        tag_mac = (get_persistence().get_setting('tracking.tag_mac', '') or '').strip()
+    if not tag_mac:
+        tag_mac = next(iter(dmx_traces), None) or next(iter(latest), None)
+    payload = latest.get(tag_mac) if tag_mac else None
+    if not payload:
+        raise HTTPException(status_code=404, detail='not found')
+    now_ms = time.time() * 1000
+    trace = payload.get('trace')
+    dmx = dmx_traces.get(tag_mac)
+    anchors = payload.get('anchors_used') or []
+    return {
+        'tag_mac': tag_mac,
+        'state': payload.get('state'),
+        'position': {
+            'trace': trace,
+            'breakdown_ms': latency.breakdown(trace),
+            'age_ms': round(now_ms - trace['batch_ts_ms'], 1) if trace else None,
+        },
+        'dmx': {
+            'trace': dmx,
+            'breakdown_ms': latency.breakdown(dmx),
+            'frame': dmx.get('dmx_frame') if dmx else None,
+            'universes': dmx.get('universes') if dmx else None,
+            'current': bool(dmx and trace and dmx.get('solved_ms') == trace.get('solved_ms')),
+        },
+        # all tags since start
+        'stages': {stage: latency.summary(metrics.LATENCY_SECONDS, stage=stage) for stage, _, _ in latency.STAGES},
+        'anchors': {
+            a: {s: latency.summary(metrics.ANCHOR_LATENCY_SECONDS, anchor=a, stage=s) for s in ('transport', 'age')}
+            for a in anchors
+        },
+        'tracking_hz': te.tracking_hz,
+        'ts_ms': int(now_ms),
+    }
@@ -0,0 +1,147 @@
+"""Build-free static asset pipeline.
+
+At startup every file under ``web/static`` is hashed and precompressed (gzip,
+plus brotli when the ``brotli`` module is installed) into a cache directory.
+Templates link assets through ``asset_url('app.js')``, which yields a
+content-hashed URL such as ``/static/app.3f2a9c01d4e5.js``; those URLs never
+change content and are served with ``Cache-Control: immutable``. Plain names
+(``/static/app.js``) keep working and are revalidated via ETag.
+"""
+import gzip
+import hashlib
+import mimetypes
+import os
+import threading
+from dataclasses import dataclass, field
+from typing import Dict, Optional
+
+from fastapi import Request
+from fastapi.responses import FileResponse, Response
+
+try:
+    import brotli
+except Exception:
+    brotli = None
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "no-cache"
+COMPRESSIBLE = ("text/", "application/javascript", "application/json", "image/svg+xml", "application/xml")
+MIN_COMPRESS_BYTES = 256
+
+
+@dataclass
+class Asset:
+    name: str
+    hashed_name: str
+    path: str
+    etag: str
+    media_type: str
+    # encoding -> precompressed file
+    variants: Dict[str, str] = field(default_factory=dict)
+
+
+def _hashed_name(name: str, digest: str) -> str:
+    stem, ext = os.path.splitext(name)
+    return f"{stem}.{digest}{ext}"
+
+
+def _write_once(path: str, data: bytes):
+    if os.path.exists(path):
+        return
+    tmp = f"{path}.tmp{os.getpid()}"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def _accepts(request: Request, encoding: str) -> bool:
+    for part in request.headers.get("accept-encoding", "").split(","):
+        token, _, params = part.strip().partition(";")
+        if token.strip().lower() == encoding:
+            return params.replace(" ", "") not in ("q=0", "q=0.0")
+    return False
+
+
+class AssetPipeline:
+    def __init__(self, static_dir: str, cache_dir: str, prefix: str = "/static"):
+        self.static_dir = static_dir
+        self.cache_dir = cache_dir
+        self.prefix = prefix.rstrip("/")
+        self._lock = threading.Lock()
+        self._by_name: Dict[str, Asset] = {}
+        self._by_hashed: Dict[str, Asset] = {}
+        self._built = False
+
+    def build(self) -> int:
+        """Hash and precompress all static files; returns the number of assets."""
+        by_name: Dict[str, Asset] = {}
+        os.makedirs(self.cache_dir, exist_ok=True)
+        for root, _, files in os.walk(self.static_dir):
+            for fn in sorted(files):
+                path = os.path.join(root, fn)
+                name = os.path.relpath(path, self.static_dir).replace(os.sep, "/")
+                with open(path, "rb") as f:
+                    data = f.read()
+                digest = hashlib.sha256(data).hexdigest()[:12]
+                media_type = mimetypes.guess_type(fn)[0] or "application/octet-stream"
+                asset = Asset(name, _hashed_name(name, digest), path, f'"{digest}"', media_type)
+                if len(data) >= MIN_COMPRESS_BYTES and media_type.startswith(COMPRESSIBLE):
+                    self._compress(asset, data, digest)
+                by_name[name] = asset
+        with self._lock:
+            self._by_name = by_name
+            self._by_hashed = {a.hashed_name: a for a in by_name.values()}
+            self._built = True
+        return len(by_name)
+
+    def _compress(self, asset: Asset, data: bytes, digest: str):
+        # cache files are keyed by content hash, so unchanged assets are not recompressed
+        base = os.path.join(self.cache_dir, digest)
+        candidates = {"gzip": (base + ".gz", lambda: gzip.compress(data, compresslevel=9, mtime=0))}
+        if brotli is not None:
+            candidates["br"] = (base + ".br", lambda: brotli.compress(data, quality=11))
+        for encoding, (path, compress) in candidates.items():
+            if not os.path.exists(path):
+                packed = compress()
+                if len(packed) >= len(data):
+                    continue
+                _write_once(path, packed)
+            asset.variants[encoding] = path
+
+    def _ensure_built(self):
+        if not self._built:
+            self.build()
+
+    def url(self, name: str) -> str:
+        """Content-hashed URL for ``name``; the plain URL for unknown files."""
+        self._ensure_built()
+        asset = self._by_name.get(name.lstrip("/"))
+        return f"{self.prefix}/{asset.hashed_name if asset else name.lstrip('/')}"
+
+    def response(self, request: Request, name: str) -> Response:
+        self._ensure_built()
+        asset = self._by_hashed.get(name)
+        cache_control = IMMUTABLE
+        if asset is None:
+            asset = self._by_name.get(name)
+            cache_control = REVALIDATE
+        if asset is None or not os.path.exists(asset.path):
+            return Response(status_code=404)
+        headers = {"Cache-Control": cache_control, "ETag": asset.etag, "Vary": "Accept-Encoding"}
+        inm = request.headers.get("if-none-match")
+        if inm and asset.etag in [t.strip().removeprefix("W/") for t in inm.split(",")]:
+            return Response(status_code=304, headers=headers)
+        for encoding in ("br", "gzip"):
+            path = asset.variants.get(encoding)
+            if path and _accepts(request, encoding) and os.path.exists(path):
+                headers["Content-Encoding"] = encoding
+                return FileResponse(path, media_type=asset.media_type, headers=headers)
+        return FileResponse(asset.path, media_type=asset.media_type, headers=headers)
+
+    def stats(self) -> Dict[str, Optional[int]]:
+        self._ensure_built()
+        return {
+            "assets": len(self._by_name),
+            "gzip": sum(1 for a in self._by_name.values() if "gzip" in a.variants),
+            "br": sum(1 for a in self._by_name.values() if "br" in a.variants) if brotli is not None else None,
+        }
@@ -1,7 +1,20 @@
+"""NDJSON client for the ESP-NOW provisioning bridge on a serial port.
+
+One long-lived :class:`BridgeSession` per port keeps the serial connection
+open (the DTR/RTS reset and settle delay are paid once, not per request). A
+reader thread demultiplexes response lines by ``id`` into futures, so up to
+``max_in_flight`` requests can be pipelined; log lines the bridge prints in
+between are ignored. When the port fails, pending requests fail with
+:class:`BridgeError` and the next request reopens the port. A ``BUSY`` reply
+(the bridge runs one ESP-NOW job at a time) is retried until the request's
+deadline.
+"""
 import json
 import threading
 import time
 import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
 
 try:
     import serial
@@ -9,14 +22,15 @@ except Exception:  # pragma: no cover - optional dependency
     serial = None
 
 
-_LOCK = threading.Lock()
+DEFAULT_MAX_IN_FLIGHT = 2
+BUSY_RETRY_S = 0.25
 
 
 class BridgeError(RuntimeError):
     pass
 
 
-def _open_serial(port: str, baud: int, timeout_s: float):
+def _open_serial(port: str, baud: int, timeout_s: float, settle_s: float = 0.6):
     if serial is None:
         raise BridgeError("pyserial not installed")
     try:
@@ -35,7 +49,8 @@ def _open_serial(port: str, baud: int, timeout_s: float):
         ser.rts = False
     except Exception:
         pass
-    time.sleep(0.6)
+    if settle_s:
+        time.sleep(settle_s)
     try:
         ser.reset_input_buffer()
     except Exception:
@@ -43,32 +58,188 @@ def _open_serial(port: str, baud: int, timeout_s: float):
     return ser
 
 
-def call_bridge(port: str, baud: int, payload: dict, timeout_s: float = 8.0):
-    if not port:
-        raise BridgeError("bridge port not configured")
-    req_id = payload.get("id") or f"prov_{uuid.uuid4().hex[:8]}"
-    payload["id"] = req_id
-    payload["v"] = payload.get("v", 1)
-    line = json.dumps(payload) + "\n"
-    deadline = time.time() + timeout_s
-    with _LOCK:
-        ser = _open_serial(port, baud, timeout_s=0.5)
+class BridgeSession:
+    def __init__(self, port: str, baud: int = 115200, max_in_flight: int = DEFAULT_MAX_IN_FLIGHT,
+                 settle_s: float = 0.6, opener: Optional[Callable[[], object]] = None):
+        self.port = port
+        self.baud = baud
+        self.max_in_flight = max(1, int(max_in_flight))
+        self._opener = opener or (lambda: _open_serial(port, baud, timeout_s=0.2, settle_s=settle_s))
+        self._ser = None
+        self._reader: Optional[threading.Thread] = None
+        self._pending: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._slots = threading.Condition(self._lock)
+        self._in_flight = 0
+        self._closed = False
+        self.opens = 0
+        self.requests = 0
+
+    # --- connection -----------------------------------------------------
+    def _ensure_open_locked(self):
+        if self._ser is not None:
+            return self._ser
+        if self._closed:
+            raise BridgeError("bridge session closed")
+        ser = self._opener()
+        self._ser = ser
+        self.opens += 1
+        t = threading.Thread(target=self._read_loop, args=(ser,), name="lt-bridge-rx", daemon=True)
+        self._reader = t
+        t.start()
+        return ser
+
+    def _drop(self, ser, reason: str):
+        with self._lock:
+            if self._ser is not ser:
+                return
+            self._ser = None
+            pending, self._pending = self._pending, {}
         try:
-            ser.write(line.encode("utf-8"))
-            ser.flush()
-            while time.time() < deadline:
+            ser.close()
+        except Exception:
+            pass
+        for fut in pending.values():
+            if not fut.done():
+                fut.set_exception(BridgeError(reason))
+
+    def _read_loop(self, ser):
+        buf = b""
+        while True:
+            with self._lock:
+                if self._ser is not ser:
+                    return
+            try:
                 raw = ser.readline()
-                if not raw:
-                    continue
-                try:
-                    msg = json.loads(raw.decode("utf-8", errors="ignore").strip())
-                except Exception:
-                    continue
-                if msg.get("id") == req_id:
-                    return msg
-        finally:
+            except Exception as e:
+                self._drop(ser, f"bridge disconnected: {e}")
+                return
+            if not raw:
+                continue
+            buf += raw
+            if not buf.endswith(b"\n"):
+                continue  # partial line, the rest follows with the next read
+            line, buf = buf, b""
+            try:
+                msg = json.loads(line.decode("utf-8", errors="ignore").strip())
+            except Exception:
+                continue
+            if not isinstance(msg, dict):
+                continue
+            with self._lock:
+                fut = self._pending.pop(msg.get("id"), None)
+            if fut is not None and not fut.done():
+                fut.set_result(msg)
+
+    # --- requests -------------------------------------------------------
+    def submit(self, payload: dict, timeout_s: float = 8.0) -> Future:
+        """Send one request; blocks while ``max_in_flight`` requests are pending."""
+        req_id = payload.get("id") or f"prov_{uuid.uuid4().hex[:8]}"
+        payload["id"] = req_id
+        payload["v"] = payload.get("v", 1)
+        line = (json.dumps(payload) + "\n").encode("utf-8")
+        deadline = time.time() + timeout_s
+        fut: Future = Future()
+        with self._slots:
+            while self._in_flight >= self.max_in_flight:
+                left = deadline - time.time()
+                if left <= 0:
+                    fut.set_result(None)
+                    return fut
+                self._slots.wait(left)
+            ser = self._ensure_open_locked()
+            self._pending[req_id] = fut
+            self._in_flight += 1
+            self.requests += 1
+        fut.add_done_callback(self._release_slot)
+        try:
+            with self._write_lock:
+                ser.write(line)
+                ser.flush()
+        except Exception as e:
+            self._drop(ser, f"write failed: {e}")
+        return fut
+
+    def _release_slot(self, _fut):
+        with self._slots:
+            self._in_flight -= 1
+            self._slots.notify()
+
+    def _forget(self, payload: dict, fut: Future):
+        with self._lock:
+            if self._pending.get(payload.get("id")) is fut:
+                del self._pending[payload["id"]]
+        if not fut.done():
+            fut.cancel()
+
+    def call(self, payload: dict, timeout_s: float = 8.0) -> Optional[dict]:
+        """Request/response with BUSY retry; None on timeout."""
+        deadline = time.time() + timeout_s
+        while True:
+            left = deadline - time.time()
+            if left <= 0:
+                return None
+            fut = self.submit(payload, timeout_s=left)
             try:
-                ser.close()
+                resp = fut.result(timeout=max(0.0, deadline - time.time()))
+            except BridgeError:
+                raise
             except Exception:
-                pass
-    return None
+                self._forget(payload, fut)
+                return None
+            if resp is None:
+                return None
+            busy = resp.get("status") == "error" and (resp.get("err") or {}).get("code") == "BUSY"
+            if not busy or deadline - time.time() <= BUSY_RETRY_S:
+                return resp
+            time.sleep(BUSY_RETRY_S)
+
+    def call_many(self, payloads: List[dict], timeout_s: float = 8.0) -> List[Tuple[Optional[dict], Optional[str]]]:
+        """Run ``payloads`` concurrently; returns ``(response, error)`` per payload, in order."""
+        def one(payload):
+            try:
+                return self.call(payload, timeout_s=timeout_s), None
+            except BridgeError as e:
+                return None, str(e)
+
+        if not payloads:
+            return []
+        with ThreadPoolExecutor(max_workers=min(self.max_in_flight, len(payloads)), thread_name_prefix="lt-bridge") as ex:
+            return list(ex.map(one, payloads))
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            ser = self._ser
+        if ser is not None:
+            self._drop(ser, "bridge session closed")
+
+
+_SESSIONS: Dict[Tuple[str, int], BridgeSession] = {}
+_SESSIONS_LOCK = threading.Lock()
+
+
+def get_bridge_session(port: str, baud: int, max_in_flight: Optional[int] = None) -> BridgeSession:
+    if not port:
+        raise BridgeError("bridge port not configured")
+    key = (port, int(baud))
+    with _SESSIONS_LOCK:
+        s = _SESSIONS.get(key)
+        if s is None or s._closed:
+            s = _SESSIONS[key] = BridgeSession(port, int(baud), max_in_flight or DEFAULT_MAX_IN_FLIGHT)
+        elif max_in_flight:
+            s.max_in_flight = max(1, int(max_in_flight))
+        return s
+
+
+def close_bridge_sessions():
+    with _SESSIONS_LOCK:
+        sessions = list(_SESSIONS.values())
+        _SESSIONS.clear()
+    for s in sessions:
+        s.close()
+
+
+def call_bridge(port: str, baud: int, payload: dict, timeout_s: float = 8.0):
+    return get_bridge_session(port, baud).call(payload, timeout_s=timeout_s)
@@ -0,0 +1,279 @@
+"""Fleet command dispatcher with cmd_ack correlation.
+
+Commands to devices (``dev/<mac>/cmd``) are tracked in memory by ``cmd_id``
+until the device answers on ``dev/<mac>/cmd_ack``:
+
+- at most ``per_device`` commands are in flight per device and ``fleet`` in
+  total; the rest wait in a FIFO queue,
+- a command without ack is re-published with the same ``cmd_id`` after
+  ``timeout_s``, ``timeout_s * backoff``, ... until ``retries`` is used up,
+- every command has a ``concurrent.futures.Future`` resolving to its final
+  status dict; :meth:`CommandDispatcher.send` / :meth:`send_many` await it
+  from asyncio code. Futures are resolved after the dispatcher lock is
+  released, so done-callbacks may block (DB writes) without stalling it.
+
+Finished commands stay in a bounded history for ``/api/v1/commands``.
+"""
+import asyncio
+import itertools
+import json
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+QUEUED = "queued"
+SENT = "sent"
+ACKED = "acked"
+FAILED = "failed"
+TIMEOUT = "timeout"
+DONE_STATES = (ACKED, FAILED, TIMEOUT)
+
+
+def _same_mac(a: str, b: str) -> bool:
+    return (a or "").replace(":", "").upper() == (b or "").replace(":", "").upper()
+
+
+class Command:
+    __slots__ = ("cmd_id", "mac", "cmd", "payload", "key", "state", "attempts", "created_ms", "sent_ms",
+                 "done_ms", "deadline", "timeout_s", "result", "details", "future")
+
+    def __init__(self, cmd_id: str, mac: str, cmd: str, payload: dict, key: Optional[str], timeout_s: float):
+        self.cmd_id = cmd_id
+        self.mac = mac
+        self.cmd = cmd
+        self.payload = payload
+        self.key = key
+        self.state = QUEUED
+        self.attempts = 0
+        self.created_ms = int(time.time() * 1000)
+        self.sent_ms: Optional[int] = None
+        self.done_ms: Optional[int] = None
+        self.deadline = 0.0
+        self.timeout_s = timeout_s
+        self.result: Optional[str] = None
+        self.details: Any = None
+        self.future: Future = Future()
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "cmd_id": self.cmd_id,
+            "mac": self.mac,
+            "cmd": self.cmd,
+            "state": self.state,
+            "ok": self.state == ACKED,
+            "attempts": self.attempts,
+            "created_ms": self.created_ms,
+            "sent_ms": self.sent_ms,
+            "done_ms": self.done_ms,
+            "latency_ms": (self.done_ms - self.created_ms) if self.done_ms else None,
+            "result": self.result,
+            "details": self.details,
+        }
+
+
+class CommandDispatcher:
+    def __init__(self, publish: Callable[[str, str], bool], timeout_s: float = 3.0, retries: int = 2,
+                 backoff: float = 2.0, per_device: int = 1, fleet: int = 16, history: int = 500):
+        """``publish(topic, payload_json)`` returns False when the message could not be sent."""
+        self._publish = publish
+        self.timeout_s = timeout_s
+        self.retries = retries
+        self.backoff = backoff
+        self.per_device = max(1, per_device)
+        self.fleet = max(1, fleet)
+        self._cond = threading.Condition()
+        self._queue: "deque[Command]" = deque()
+        self._active: Dict[str, Command] = {}
+        self._by_key: Dict[str, Command] = {}
+        self._per_mac: Dict[str, int] = {}
+        self._history: "OrderedDict[str, Command]" = OrderedDict()
+        self._history_max = history
+        self._done: List[Command] = []  # finished under the lock, futures resolved after it
+        self._seq = itertools.count(1)
+        self._thread: Optional[threading.Thread] = None
+        self._stopped = False
+        self.stats = {"submitted": 0, "published": 0, "retried": 0, "acked": 0, "failed": 0, "timeout": 0}
+
+    # --- submission -----------------------------------------------------
+    def submit(self, mac: str, cmd: str, fields: Optional[dict] = None, prefix: Optional[str] = None,
+               key: Optional[str] = None, timeout_s: Optional[float] = None) -> Command:
+        """Queue ``cmd`` for ``mac``. With ``key``, a still pending command with the same key is returned instead."""
+        return self._submit(mac, cmd, fields, prefix, key, timeout_s)[0]
+
+    def submit_new(self, mac: str, cmd: str, fields: Optional[dict] = None, prefix: Optional[str] = None,
+                   key: Optional[str] = None, timeout_s: Optional[float] = None) -> Optional[Command]:
+        """Like :meth:`submit`, but None when a command with ``key`` is still pending."""
+        c, created = self._submit(mac, cmd, fields, prefix, key, timeout_s)
+        return c if created else None
+
+    def _submit(self, mac, cmd, fields, prefix, key, timeout_s):
+        with self._cond:
+            if key is not None:
+                pending = self._by_key.get(key)
+                if pending is not None and pending.state not in DONE_STATES:
+                    return pending, False
+            cmd_id = f"{prefix or cmd}_{int(time.time() * 1000)}_{next(self._seq)}"
+            payload = {"type": "cmd", "cmd": cmd, "cmd_id": cmd_id}
+            payload.update(fields or {})
+            c = Command(cmd_id, mac, cmd, payload, key, timeout_s or self.timeout_s)
+            self._queue.append(c)
+            if key is not None:
+                self._by_key[key] = c
+            self.stats["submitted"] += 1
+            self._ensure_thread()
+            self._pump_locked()
+            self._cond.notify()
+        self._resolve()
+        return c, True
+
+    def submit_many(self, macs: Iterable[str], cmd: str, fields: Optional[dict] = None,
+                    prefix: Optional[str] = None, timeout_s: Optional[float] = None) -> List[Command]:
+        return [self.submit(mac, cmd, fields, prefix=prefix, timeout_s=timeout_s) for mac in macs]
+
+    async def send(self, mac: str, cmd: str, fields: Optional[dict] = None, **kw) -> Dict[str, Any]:
+        return await asyncio.wrap_future(self.submit(mac, cmd, fields, **kw).future)
+
+    async def send_many(self, macs: Iterable[str], cmd: str, fields: Optional[dict] = None, **kw) -> List[Dict[str, Any]]:
+        cmds = self.submit_many(macs, cmd, fields, **kw)
+        return list(await asyncio.gather(*(asyncio.wrap_future(c.future) for c in cmds)))
+
+    # --- device side ----------------------------------------------------
+    def on_ack(self, mac: str, payload: dict) -> bool:
+        """Resolve the command named by an incoming cmd_ack; False for unknown cmd_ids or another device's ack."""
+        cmd_id = payload.get("cmd_id")
+        with self._cond:
+            c = self._active.get(cmd_id)
+            if c is None or not _same_mac(c.mac, mac):
+                return False
+            result = payload.get("result") or payload.get("status") or "ok"
+            c.result = result
+            c.details = payload.get("details")
+            self._finish_locked(c, ACKED if result == "ok" else FAILED)
+            self._pump_locked()
+            self._cond.notify()
+        self._resolve()
+        return True
+
+    # --- internals ------------------------------------------------------
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stopped = False
+            self._thread = threading.Thread(target=self._run, name="lt-cmd", daemon=True)
+            self._thread.start()
+
+    def _send_locked(self, c: Command):
+        c.attempts += 1
+        c.sent_ms = int(time.time() * 1000)
+        c.deadline = time.monotonic() + c.timeout_s * (self.backoff ** (c.attempts - 1))
+        c.state = SENT
+        try:
+            ok = self._publish(f"dev/{c.mac}/cmd", json.dumps(c.payload))
+        except Exception as e:
+            ok = False
+            c.details = str(e)
+        if ok is False:
+            c.result = "publish_failed"
+            self._finish_locked(c, FAILED)
+            return
+        self.stats["published"] += 1
+        if c.attempts > 1:
+            self.stats["retried"] += 1
+
+    def _pump_locked(self):
+        if not self._queue:
+            return
+        waiting = deque()
+        while self._queue and len(self._active) < self.fleet:
+            c = self._queue.popleft()
+            if self._per_mac.get(c.mac, 0) >= self.per_device:
+                waiting.append(c)
+                continue
+            self._active[c.cmd_id] = c
+            self._per_mac[c.mac] = self._per_mac.get(c.mac, 0) + 1
+            self._send_locked(c)
+        # keep FIFO order for commands blocked by their device's cap
+        waiting.extend(self._queue)
+        self._queue = waiting
+
+    def _finish_locked(self, c: Command, state: str):
+        c.state = state
+        c.done_ms = int(time.time() * 1000)
+        if self._active.pop(c.cmd_id, None) is not None:
+            n = self._per_mac.get(c.mac, 1) - 1
+            if n > 0:
+                self._per_mac[c.mac] = n
+            else:
+                self._per_mac.pop(c.mac, None)
+        if c.key is not None and self._by_key.get(c.key) is c:
+            del self._by_key[c.key]
+        self.stats[state] += 1
+        self._history[c.cmd_id] = c
+        while len(self._history) > self._history_max:
+            self._history.popitem(last=False)
+        self._done.append(c)
+
+    def _resolve(self):
+        """Resolve futures of finished commands; call without holding the lock."""
+        with self._cond:
+            done, self._done = self._done, []
+            results = [(c, c.as_dict()) for c in done]
+        for c, result in results:
+            if not c.future.done():
+                c.future.set_result(result)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if self._stopped:
+                    break
+                now = time.monotonic()
+                for c in list(self._active.values()):
+                    if c.state == SENT and c.deadline <= now:
+                        if c.attempts <= self.retries:
+                            self._send_locked(c)
+                        else:
+                            c.result = "timeout"
+                            self._finish_locked(c, TIMEOUT)
+                self._pump_locked()
+            self._resolve()
+            with self._cond:
+                if self._stopped:
+                    break
+                if not self._done:
+                    deadlines = [c.deadline for c in self._active.values() if c.state == SENT]
+                    wait = min(deadlines) - time.monotonic() if deadlines else 1.0
+                    self._cond.wait(max(0.005, wait))
+
+    def close(self):
+        """Stop the retry thread and fail every command that is still queued or in flight."""
+        with self._cond:
+            self._stopped = True
+            for c in list(self._queue) + list(self._active.values()):
+                c.result = "closed"
+                self._finish_locked(c, FAILED)
+            self._queue.clear()
+            self._cond.notify()
+        self._resolve()
+
+    # --- status view ----------------------------------------------------
+    def get(self, cmd_id: str) -> Optional[Dict[str, Any]]:
+        with self._cond:
+            c = self._active.get(cmd_id) or self._history.get(cmd_id)
+            if c is None:
+                c = next((q for q in self._queue if q.cmd_id == cmd_id), None)
+            return c.as_dict() if c else None
+
+    def status(self, state: Optional[str] = None, mac: Optional[str] = None, limit: int = 100) -> Dict[str, Any]:
+        with self._cond:
+            cmds = list(self._queue) + list(self._active.values()) + list(reversed(self._history.values()))
+            out = [c.as_dict() for c in cmds if (state is None or c.state == state) and (mac is None or c.mac == mac)]
+            return {
+                "queued": len(self._queue),
+                "in_flight": len(self._active),
+                "limits": {"per_device": self.per_device, "fleet": self.fleet,
+                           "timeout_s": self.timeout_s, "retries": self.retries, "backoff": self.backoff},
+                "stats": dict(self.stats),
+                "commands": out[:limit],
+            }
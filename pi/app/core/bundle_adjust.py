@@ -0,0 +1,259 @@
+"""Joint calibration of anchor positions and per-anchor range corrections.
+
+Every venue point ``i`` has a surveyed position ``q_i`` and a measured range
+``m_ai`` (cm) per anchor ``a``. One least-squares problem estimates, for all
+anchors at once, the position ``p_a`` and the linear range correction
+``s_a * m + o_a`` (the ``range_scale`` / ``range_offset_cm`` device settings)
+so that::
+
+    s_a * m_ai + o_a  ~=  |p_a - q_i|
+
+Optionally every point height ``z_i`` is a free parameter with a Gaussian
+prior around the surveyed value (tag held at slightly different heights).
+Weak priors on anchor positions (around the current ones), scale (1) and
+offset (0) keep anchors with few points well-posed.
+
+The normal equations have one dense 5x5 block per anchor and one scalar per
+point height, coupled only through the observations. Heights are eliminated
+with the Schur complement, so each Levenberg-Marquardt step solves a dense
+system of size 5 x anchors, independent of the number of points. Residuals
+are weighted with a Huber loss (IRLS). The inverse of the reduced system is
+the anchor parameter covariance, scaled by the a-posteriori variance factor.
+"""
+import math
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from .linalg import cho_inverse, cho_solve, cholesky, huber_cost, huber_weight
+
+Vec3 = Tuple[float, float, float]
+NP = 5  # parameters per anchor: x, y, z, scale, offset
+
+
+class BundleResult:
+    def __init__(self):
+        self.anchors: Dict[str, Dict] = {}
+        self.point_heights_cm: Dict[str, float] = {}
+        self.rms_cm = 0.0
+        self.sigma0 = 1.0
+        self.iterations = 0
+        self.converged = False
+        self.observations = 0
+        self.outliers: List[Tuple[str, str]] = []
+
+    def as_dict(self) -> Dict:
+        return {
+            "anchors": self.anchors,
+            "point_heights_cm": self.point_heights_cm,
+            "rms_cm": self.rms_cm,
+            "sigma0": self.sigma0,
+            "iterations": self.iterations,
+            "converged": self.converged,
+            "observations": self.observations,
+            "outliers": [list(o) for o in self.outliers],
+        }
+
+
+def bundle_adjust(
+    points_cm: Dict[str, Vec3],
+    observations: Sequence[Tuple[str, str, float]],
+    anchors_init_cm: Dict[str, Vec3],
+    height_sigma_cm: Optional[float] = None,
+    anchor_prior_sigma_cm: float = 300.0,
+    scale_prior_sigma: float = 0.1,
+    offset_prior_sigma_cm: float = 100.0,
+    huber_cm: float = 10.0,
+    max_iter: int = 50,
+    tol: float = 1e-6,
+) -> BundleResult:
+    """Solve for all anchors in ``anchors_init_cm`` observed in ``observations``.
+
+    ``observations`` are ``(anchor, point_id, measured_cm)``; observations of
+    unknown anchors or points are ignored.
+    """
+    anchors = sorted({a for a, pid, _ in observations if a in anchors_init_cm and pid in points_cm})
+    a_idx = {a: k for k, a in enumerate(anchors)}
+    pids = sorted({pid for a, pid, _ in observations if a in a_idx and pid in points_cm})
+    p_idx = {pid: k for k, pid in enumerate(pids)}
+    obs = [(a_idx[a], p_idx[pid], float(m)) for a, pid, m in observations if a in a_idx and pid in p_idx]
+
+    res = BundleResult()
+    res.observations = len(obs)
+    if not obs:
+        return res
+
+    n_a = len(anchors)
+    free_h = height_sigma_cm is not None and height_sigma_cm > 0
+    prior_a = [tuple(float(v) for v in anchors_init_cm[a]) for a in anchors]
+    z0 = [float(points_cm[pid][2]) for pid in pids]
+    xy = [(float(points_cm[pid][0]), float(points_cm[pid][1])) for pid in pids]
+
+    params = [[p[0], p[1], p[2], 1.0, 0.0] for p in prior_a]
+    heights = list(z0)
+    prior_w = [1.0 / anchor_prior_sigma_cm ** 2] * 3 + [1.0 / scale_prior_sigma ** 2, 1.0 / offset_prior_sigma_cm ** 2]
+    h_w = 1.0 / height_sigma_cm ** 2 if free_h else 0.0
+
+    def residual(k: int, i: int, m: float, prm, hts):
+        x, y, z, s, o = prm[k]
+        qx, qy = xy[i]
+        dx, dy, dz = x - qx, y - qy, z - hts[i]
+        d = math.sqrt(dx * dx + dy * dy + dz * dz) or 1e-9
+        return s * m + o - d, dx, dy, dz, d
+
+    def cost(prm, hts) -> float:
+        c = 0.0
+        for k, i, m in obs:
+            c += huber_cost(residual(k, i, m, prm, hts)[0], huber_cm)
+        for k in range(n_a):
+            pr = prior_a[k]
+            vals = (prm[k][0] - pr[0], prm[k][1] - pr[1], prm[k][2] - pr[2], prm[k][3] - 1.0, prm[k][4])
+            c += 0.5 * sum(w * v * v for w, v in zip(prior_w, vals))
+        if free_h:
+            c += 0.5 * h_w * sum((h - z) ** 2 for h, z in zip(hts, z0))
+        return c
+
+    def normal_equations(prm, hts):
+        haa = [[[0.0] * NP for _ in range(NP)] for _ in range(n_a)]
+        ga = [[0.0] * NP for _ in range(n_a)]
+        hpp = [h_w] * len(pids)
+        gp = [h_w * (h - z) for h, z in zip(hts, z0)] if free_h else [0.0] * len(pids)
+        hap: Dict[Tuple[int, int], List[float]] = {}
+        for k, i, m in obs:
+            r, dx, dy, dz, d = residual(k, i, m, prm, hts)
+            w = huber_weight(r, huber_cm)
+            j = (-dx / d, -dy / d, -dz / d, m, 1.0)
+            hk, gk = haa[k], ga[k]
+            for u in range(NP):
+                wju = w * j[u]
+                gk[u] += wju * r
+                row = hk[u]
+                for v in range(u + 1):
+                    row[v] += wju * j[v]
+            if free_h:
+                jz = dz / d
+                hpp[i] += w * jz * jz
+                gp[i] += w * jz * r
+                cross = hap.setdefault((k, i), [0.0] * NP)
+                for u in range(NP):
+                    cross[u] += w * j[u] * jz
+        for k in range(n_a):
+            pr = prior_a[k]
+            vals = (prm[k][0] - pr[0], prm[k][1] - pr[1], prm[k][2] - pr[2], prm[k][3] - 1.0, prm[k][4])
+            for u in range(NP):
+                haa[k][u][u] += prior_w[u]
+                ga[k][u] += prior_w[u] * vals[u]
+            for u in range(NP):
+                for v in range(u + 1, NP):
+                    haa[k][u][v] = haa[k][v][u]
+        return haa, ga, hpp, gp, hap
+
+    def reduced_system(haa, ga, hpp, gp, hap, lam):
+        n = NP * n_a
+        s_mat = [[0.0] * n for _ in range(n)]
+        rhs = [0.0] * n
+        for k in range(n_a):
+            for u in range(NP):
+                rhs[k * NP + u] = -ga[k][u]
+                for v in range(NP):
+                    s_mat[k * NP + u][k * NP + v] = haa[k][u][v]
+                s_mat[k * NP + u][k * NP + u] *= 1.0 + lam
+        hpp_d = [h * (1.0 + lam) for h in hpp]
+        if free_h:
+            by_point: Dict[int, List[Tuple[int, List[float]]]] = {}
+            for (k, i), cross in hap.items():
+                by_point.setdefault(i, []).append((k, cross))
+            for i, items in by_point.items():
+                inv = 1.0 / hpp_d[i]
+                for k, ck in items:
+                    for u in range(NP):
+                        rhs[k * NP + u] += ck[u] * inv * gp[i]
+                    for l, cl in items:
+                        for u in range(NP):
+                            f = ck[u] * inv
+                            row = s_mat[k * NP + u]
+                            for v in range(NP):
+                                row[l * NP + v] -= f * cl[v]
+        return s_mat, rhs, hpp_d
+
+    lam = 1e-3
+    cur = cost(params, heights)
+    for it in range(1, max_iter + 1):
+        res.iterations = it
+        haa, ga, hpp, gp, hap = normal_equations(params, heights)
+        step_ok = False
+        rel = 0.0
+        while lam < 1e8:
+            s_mat, rhs, hpp_d = reduced_system(haa, ga, hpp, gp, hap, lam)
+            low = cholesky(s_mat)
+            if low is None:
+                lam *= 10.0
+                continue
+            delta = cho_solve(low, rhs)
+            new_params = [[params[k][u] + delta[k * NP + u] for u in range(NP)] for k in range(n_a)]
+            new_heights = list(heights)
+            if free_h:
+                acc = [-g for g in gp]
+                for (k, i), cross in hap.items():
+                    acc[i] -= sum(cross[u] * delta[k * NP + u] for u in range(NP))
+                for i in range(len(pids)):
+                    new_heights[i] = heights[i] + acc[i] / hpp_d[i]
+            new_cost = cost(new_params, new_heights)
+            if new_cost <= cur:
+                step_ok = True
+                rel = (cur - new_cost) / max(cur, 1e-12)
+                params, heights, cur = new_params, new_heights, new_cost
+                lam = max(lam / 10.0, 1e-9)
+                break
+            lam *= 10.0
+        if not step_ok or rel < tol:
+            # no further descent possible within the damping range: at the optimum
+            res.converged = True
+            break
+
+    # covariance of the anchor parameters: inverse of the undamped reduced system
+    haa, ga, hpp, gp, hap = normal_equations(params, heights)
+    s_mat, _, _ = reduced_system(haa, ga, hpp, gp, hap, 0.0)
+    low = cholesky(s_mat)
+    cov = cho_inverse(low) if low is not None else None
+
+    sq = 0.0
+    wsq = 0.0
+    n_in = 0
+    per_anchor: Dict[int, List[float]] = {}
+    per_anchor_points: Dict[int, List[str]] = {}
+    for k, i, m in obs:
+        r = residual(k, i, m, params, heights)[0]
+        sq += r * r
+        per_anchor.setdefault(k, []).append(r)
+        per_anchor_points.setdefault(k, []).append(pids[i])
+        if abs(r) > 3.0 * huber_cm:
+            res.outliers.append((anchors[k], pids[i]))
+        else:
+            wsq += huber_weight(r, huber_cm) * r * r
+            n_in += 1
+    # heights carry their own prior, so only the anchor parameters use up redundancy
+    dof = n_in - NP * n_a
+    res.rms_cm = math.sqrt(sq / len(obs))
+    res.sigma0 = math.sqrt(wsq / dof) if dof > 0 else 1.0
+    var0 = res.sigma0 ** 2
+
+    for k, a in enumerate(anchors):
+        x, y, z, s, o = params[k]
+        block = [[cov[k * NP + u][k * NP + v] * var0 for v in range(NP)] for u in range(NP)] if cov else None
+        sig = [math.sqrt(max(block[u][u], 0.0)) for u in range(NP)] if block else [None] * NP
+        rs = per_anchor.get(k, [])
+        res.anchors[a] = {
+            "position_cm": {"x": x, "y": y, "z": z},
+            "range_scale": s,
+            "range_offset_cm": o,
+            "rms_cm": math.sqrt(sum(r * r for r in rs) / len(rs)) if rs else 0.0,
+            "points_used": sorted(set(per_anchor_points.get(k, []))),
+            "sigma": {
+                "x_cm": sig[0], "y_cm": sig[1], "z_cm": sig[2],
+                "position_cm": math.sqrt(sig[0] ** 2 + sig[1] ** 2 + sig[2] ** 2) if block else None,
+                "scale": sig[3], "offset_cm": sig[4],
+            },
+            "covariance": block,
+        }
+    if free_h:
+        res.point_heights_cm = {pid: heights[i] for i, pid in enumerate(pids)}
+    return res
@@ -0,0 +1,152 @@
+"""In-process publish/subscribe bus for tracking results.
+
+The tracking engine publishes one immutable :class:`PositionRecord` per tag
+update. Consumers either read the latest-value view (``latest`` /
+``latest_payloads``) or hold a :class:`BusSubscription` and ``await`` the next
+record instead of polling shared state on a timer. Every subscription has its
+own bounded queue; when a consumer falls behind, the oldest queued records are
+dropped so it always catches up to current data.
+"""
+import asyncio
+import threading
+from dataclasses import dataclass, replace
+from types import MappingProxyType
+from typing import Any, Dict, List, Mapping, Optional, Tuple
+
+
+@dataclass(frozen=True)
+class PositionRecord:
+    tag_mac: str
+    state: str
+    ts_ms: int
+    position_cm: Optional[Tuple[float, float, float]] = None
+    anchors_used: Tuple[str, ...] = ()
+    resid_m: Optional[float] = None
+    outliers: Optional[Tuple[str, ...]] = None
+    reason: Optional[str] = None
+    seq: int = 0
+    # latency provenance of a solved position, see TrackingEngine._trace
+    trace: Optional[Tuple[Tuple[str, float], ...]] = None
+
+    def to_payload(self) -> Dict[str, Any]:
+        """Dict in the format of the REST/WS/MQTT tracking payloads."""
+        out: Dict[str, Any] = {
+            "tag_mac": self.tag_mac,
+            "state": self.state,
+            "ts_ms": self.ts_ms,
+            "anchors_used": list(self.anchors_used),
+        }
+        if self.position_cm is not None:
+            x, y, z = self.position_cm
+            out["position_cm"] = {"x": x, "y": y, "z": z}
+        if self.resid_m is not None:
+            out["resid_m"] = self.resid_m
+        if self.outliers is not None:
+            out["outliers"] = list(self.outliers)
+        if self.reason:
+            out["reason"] = self.reason
+        if self.trace is not None:
+            out["trace"] = dict(self.trace)
+        return out
+
+
+class BusSubscription:
+    def __init__(self, bus: "TrackingBus", maxsize: int, loop: asyncio.AbstractEventLoop):
+        self._bus = bus
+        self._loop = loop
+        self.queue: "asyncio.Queue[PositionRecord]" = asyncio.Queue(maxsize=maxsize)
+        self.dropped = 0
+
+    def _offer(self, record: PositionRecord):
+        q = self.queue
+        while q.full():
+            q.get_nowait()
+            self.dropped += 1
+        q.put_nowait(record)
+
+    async def get(self) -> PositionRecord:
+        return await self.queue.get()
+
+    def drain(self) -> List[PositionRecord]:
+        """Everything queued right now, without waiting."""
+        out = []
+        while not self.queue.empty():
+            out.append(self.queue.get_nowait())
+        return out
+
+    def close(self):
+        self._bus.unsubscribe(self)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> PositionRecord:
+        return await self.queue.get()
+
+
+class TrackingBus:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._latest: Dict[str, PositionRecord] = {}
+        self._payloads: Dict[str, Dict[str, Any]] = {}
+        self._subs: List[BusSubscription] = []
+        self._seq = 0
+
+    def subscribe(self, maxsize: int = 256) -> BusSubscription:
+        """Must be called from the event loop the subscriber awaits on."""
+        sub = BusSubscription(self, maxsize, asyncio.get_event_loop())
+        with self._lock:
+            self._subs.append(sub)
+        return sub
+
+    def unsubscribe(self, sub: BusSubscription):
+        with self._lock:
+            if sub in self._subs:
+                self._subs.remove(sub)
+
+    def publish(self, record: PositionRecord) -> PositionRecord:
+        with self._lock:
+            self._seq += 1
+            record = replace(record, seq=self._seq)
+            self._latest[record.tag_mac] = record
+            self._payloads[record.tag_mac] = record.to_payload()
+            subs = list(self._subs)
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        for sub in subs:
+            if running is sub._loop:
+                sub._offer(record)
+            elif not sub._loop.is_closed():
+                sub._loop.call_soon_threadsafe(sub._offer, record)
+        return record
+
+    def stamp(self, tag_mac: str, seq: int, **times: float) -> Optional[PositionRecord]:
+        """Add timestamps to the trace of the latest record of ``tag_mac`` if it is still ``seq``.
+
+        For times that are only known after :meth:`publish` returned; the
+        latest-value view gets a new record and payload, nothing is mutated.
+        """
+        with self._lock:
+            rec = self._latest.get(tag_mac)
+            if rec is None or rec.seq != seq or rec.trace is None:
+                return None
+            rec = replace(rec, trace=rec.trace + tuple(times.items()))
+            self._latest[tag_mac] = rec
+            self._payloads[tag_mac] = rec.to_payload()
+            return rec
+
+    @property
+    def seq(self) -> int:
+        return self._seq
+
+    def latest(self) -> Mapping[str, PositionRecord]:
+        return MappingProxyType(self._latest)
+
+    def get(self, tag_mac: str) -> Optional[PositionRecord]:
+        return self._latest.get(tag_mac)
+
+    def latest_payloads(self) -> Mapping[str, Dict[str, Any]]:
+        """Read-only tag -> payload dict view; payloads are replaced, never mutated."""
+        return MappingProxyType(self._payloads)
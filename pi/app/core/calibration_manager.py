@@ -43,7 +43,8 @@ class CalibrationManager:
             "tag_mac": tag_mac,
             "started_at_ms": ts,
             "duration_ms": duration_ms,
-            "samples": [],
+            # records every sample of the tag at ingest until the run ends
+            "capture": self.range_cache.open_capture(tag_mac),
         }
         return run_id
 
@@ -59,6 +60,7 @@ class CalibrationManager:
             cdb.commit()
         finally:
             cdb.close()
+        self.range_cache.close_capture(self.active["capture"])
         self.active = None
 
     def tick(self):
@@ -69,22 +71,22 @@ class CalibrationManager:
         start = self.active["started_at_ms"]
         dur = self.active["duration_ms"]
         if now - start < dur:
-            snaps = self.range_cache.snapshot(self.active["tag_mac"], max_age_ms=dur)
-            self.active["samples"].extend(snaps)
-            self.active["progress"] = {"samples": len(self.active["samples"]), "duration_ms": now - start}
+            self.active["progress"] = {"samples": self.active["capture"].count, "duration_ms": now - start}
             return
         # finish
         self._finish(now)
 
     def _finish(self, ts_end: int):
-        snaps = self.active.get("samples", [])
-        anchors_used = list({s.anchor_mac for s in snaps})
-        per_anchor = {}
-        for s in snaps:
-            per_anchor.setdefault(s.anchor_mac, []).append(s.d_m)
-        per_anchor_stats = {k: {"median_d_m": sorted(v)[len(v)//2], "count": len(v)} for k, v in per_anchor.items()}
+        capture = self.active["capture"]
+        self.range_cache.close_capture(capture)
+        stats = capture.stats()
+        anchors_used = list(stats)
+        per_anchor_stats = {
+            k: {"median_d_m": st["median_d_m"], "mad_d_m": st["mad_d_m"], "mean_d_m": st["mean_d_m"], "count": st["count"]}
+            for k, st in stats.items()
+        }
         summary = {
-            "samples": len(snaps),
+            "samples": capture.count,
             "anchors_used": anchors_used,
             "duration_ms": self.active["duration_ms"],
             "result": "OK" if len(anchors_used) >= 2 else "FAILED",
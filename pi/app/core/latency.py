@@ -0,0 +1,85 @@
+"""Latency provenance of tracking positions.
+
+A solved position carries a trace of epoch-ms timestamps for the oldest
+range sample it used:
+
+    batch_ts_ms     anchor batch time (anchor clock)
+    rx_ms           MQTT receive on the Pi
+    stored_ms       insert into the range cache
+    solve_start_ms  tracking tick picked the tag up
+    solved_ms       solve finished
+    published_ms    tracking bus publish returned (all subscribers notified)
+    dmx_ms          first DMX frame sent with this position (added by DmxEngine)
+
+``STAGES`` turns consecutive timestamps into stage durations. ``transport``
+and ``total`` compare the anchor's clock with the Pi's, so they include the
+clock offset between the two.
+"""
+from typing import Dict, Iterable, Mapping, Optional
+
+from .. import metrics
+
+STAGES = (
+    ("transport", "batch_ts_ms", "rx_ms"),
+    ("ingest", "rx_ms", "stored_ms"),
+    ("queue", "stored_ms", "solve_start_ms"),
+    ("solve", "solve_start_ms", "solved_ms"),
+    ("publish", "solved_ms", "published_ms"),
+    ("dmx", "published_ms", "dmx_ms"),
+    ("total", "batch_ts_ms", "dmx_ms"),
+)
+
+
+def breakdown(trace: Optional[Mapping[str, float]]) -> Dict[str, float]:
+    """Stage -> duration in ms for the stages whose timestamps are in ``trace``."""
+    out: Dict[str, float] = {}
+    if not trace:
+        return out
+    for stage, start, end in STAGES:
+        a, b = trace.get(start), trace.get(end)
+        if a is not None and b is not None:
+            out[stage] = round(b - a, 2)
+    return out
+
+
+def observe(trace: Mapping[str, float], stages: Iterable[str]):
+    """Add the given stages of ``trace`` to ``lt_latency_seconds``; skewed negative values count as 0."""
+    durations = breakdown(trace)
+    for stage in stages:
+        ms = durations.get(stage)
+        if ms is not None:
+            metrics.LATENCY_SECONDS.observe(max(0.0, ms) / 1000.0, stage=stage)
+
+
+def observe_anchor(anchor: str, sample_ts_ms: float, rx_ms: Optional[float], solved_ms: float):
+    if rx_ms is not None:
+        metrics.ANCHOR_LATENCY_SECONDS.observe(max(0.0, rx_ms - sample_ts_ms) / 1000.0, anchor=anchor, stage="transport")
+    metrics.ANCHOR_LATENCY_SECONDS.observe(max(0.0, solved_ms - sample_ts_ms) / 1000.0, anchor=anchor, stage="age")
+
+
+def summary(hist: "metrics.Histogram", **labels) -> Optional[Dict[str, float]]:
+    """count, mean and bucket-interpolated p50/p95/p99 in ms."""
+    snap = hist.snapshot(**labels)
+    if not snap or not snap["count"]:
+        return None
+    count = snap["count"]
+    bounds = list(hist.buckets)
+    cumulative = list(snap["buckets"].values())
+
+    def quantile(q: float) -> float:
+        rank = q * count
+        prev_bound, prev_cum = 0.0, 0
+        for bound, cum in zip(bounds, cumulative):
+            if cum >= rank:
+                frac = (rank - prev_cum) / (cum - prev_cum) if cum > prev_cum else 0.0
+                return (prev_bound + (bound - prev_bound) * frac) * 1000.0
+            prev_bound, prev_cum = bound, cum
+        return bounds[-1] * 1000.0
+
+    return {
+        "count": count,
+        "mean_ms": round(snap["sum"] / count * 1000.0, 2),
+        "p50_ms": round(quantile(0.5), 2),
+        "p95_ms": round(quantile(0.95), 2),
+        "p99_ms": round(quantile(0.99), 2),
+    }
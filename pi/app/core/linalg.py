@@ -0,0 +1,107 @@
+"""Small dense linear algebra helpers (pure Python, row-major lists) and the
+Huber loss shared by the robust least-squares solvers.
+
+The solvers in this package work on systems of a few dozen unknowns, where
+plain lists are fast enough and avoid a numpy dependency on the Pi.
+"""
+import math
+from typing import List, Optional, Sequence, Tuple
+
+Matrix = List[List[float]]
+
+
+def huber_weight(r: float, delta: float) -> float:
+    """IRLS weight of residual ``r`` under a Huber loss with threshold ``delta``."""
+    a = abs(r)
+    return 1.0 if a <= delta else delta / a
+
+
+def huber_cost(r: float, delta: float) -> float:
+    a = abs(r)
+    return 0.5 * r * r if a <= delta else delta * (a - 0.5 * delta)
+
+
+def cholesky(a: Matrix) -> Optional[Matrix]:
+    """Lower Cholesky factor of a symmetric matrix; None if not positive definite."""
+    n = len(a)
+    low = [[0.0] * n for _ in range(n)]
+    for i in range(n):
+        row_i = low[i]
+        for j in range(i + 1):
+            row_j = low[j]
+            s = a[i][j]
+            for k in range(j):
+                s -= row_i[k] * row_j[k]
+            if i == j:
+                if s <= 0.0:
+                    return None
+                row_i[i] = math.sqrt(s)
+            else:
+                row_i[j] = s / row_j[j]
+    return low
+
+
+def cho_solve(low: Matrix, b: Sequence[float]) -> List[float]:
+    n = len(low)
+    y = [0.0] * n
+    for i in range(n):
+        s = b[i]
+        row = low[i]
+        for k in range(i):
+            s -= row[k] * y[k]
+        y[i] = s / row[i]
+    x = [0.0] * n
+    for i in range(n - 1, -1, -1):
+        s = y[i]
+        for k in range(i + 1, n):
+            s -= low[k][i] * x[k]
+        x[i] = s / low[i][i]
+    return x
+
+
+def cho_inverse(low: Matrix) -> Matrix:
+    n = len(low)
+    cols = []
+    for j in range(n):
+        e = [0.0] * n
+        e[j] = 1.0
+        cols.append(cho_solve(low, e))
+    return [[cols[j][i] for j in range(n)] for i in range(n)]
+
+
+def eigh(a: Matrix, max_sweeps: int = 50, tol: float = 1e-12) -> Tuple[List[float], Matrix]:
+    """Eigen-decomposition of a symmetric matrix (cyclic Jacobi).
+
+    Returns ``(values, vectors)`` sorted by descending eigenvalue; ``vectors[k]``
+    is the eigenvector of ``values[k]``.
+    """
+    n = len(a)
+    m = [list(row) for row in a]
+    v = [[1.0 if i == j else 0.0 for j in range(n)] for i in range(n)]
+    for _ in range(max_sweeps):
+        off = sum(m[i][j] * m[i][j] for i in range(n) for j in range(i + 1, n))
+        if off < tol:
+            break
+        for p in range(n - 1):
+            for q in range(p + 1, n):
+                apq = m[p][q]
+                if abs(apq) < 1e-300:
+                    continue
+                theta = (m[q][q] - m[p][p]) / (2.0 * apq)
+                t = (1.0 if theta >= 0 else -1.0) / (abs(theta) + math.sqrt(theta * theta + 1.0))
+                c = 1.0 / math.sqrt(t * t + 1.0)
+                s = t * c
+                for k in range(n):
+                    mkp, mkq = m[k][p], m[k][q]
+                    m[k][p] = c * mkp - s * mkq
+                    m[k][q] = s * mkp + c * mkq
+                for k in range(n):
+                    mpk, mqk = m[p][k], m[q][k]
+                    m[p][k] = c * mpk - s * mqk
+                    m[q][k] = s * mpk + c * mqk
+                for k in range(n):
+                    vkp, vkq = v[k][p], v[k][q]
+                    v[k][p] = c * vkp - s * vkq
+                    v[k][q] = s * vkp + c * vkq
+    order = sorted(range(n), key=lambda i: m[i][i], reverse=True)
+    return [m[i][i] for i in order], [[v[k][i] for k in range(n)] for i in order]
@@ -2,14 +2,21 @@ import threading
 import time
 from typing import Dict, List, Optional, Tuple
 
+from .. import metrics
+from .range_capture import RangeCapture
+
 
 class RangeSample:
-    def __init__(self, anchor_mac: str, tag_mac: str, d_m: float, ts_ms: int, quality: Optional[float] = None):
+    def __init__(self, anchor_mac: str, tag_mac: str, d_m: float, ts_ms: int, quality: Optional[float] = None,
+                 rx_ms: Optional[float] = None, stored_ms: Optional[float] = None):
         self.anchor_mac = anchor_mac
         self.tag_mac = tag_mac
         self.d_m = d_m
-        self.ts_ms = ts_ms
+        self.ts_ms = ts_ms  # anchor batch time
         self.quality = quality
+        # provenance: MQTT receive and cache insert time (epoch ms)
+        self.rx_ms = rx_ms
+        self.stored_ms = stored_ms
 
 
 class RangeCache:
@@ -19,10 +26,13 @@ class RangeCache:
         self.window_ms = window_ms
         self._samples: Dict[Tuple[str, str], RangeSample] = {}
         self._lock = threading.Lock()
+        self._captures: Dict[str, List[RangeCapture]] = {}
 
-    def update_from_batch(self, anchor_mac: str, batch_ts_ms: int, ranges: List[dict]):
-        now_ms = int(time.time() * 1000)
+    def update_from_batch(self, anchor_mac: str, batch_ts_ms: int, ranges: List[dict], rx_ms: Optional[float] = None):
+        stored_ms = time.time() * 1000
+        now_ms = int(stored_ms)
         ts = batch_ts_ms or now_ms
+        stored = 0
         with self._lock:
             for r in ranges:
                 tag = r.get("tag_mac")
@@ -33,10 +43,34 @@ class RangeCache:
                         d_m = float(r.get("distance_mm")) / 1000.0
                 if not tag or d_m is None:
                     continue
-                rs = RangeSample(anchor_mac, tag, float(d_m), int(r.get("ts_ms", ts)), r.get("q"))
+                rs = RangeSample(anchor_mac, tag, float(d_m), int(r.get("ts_ms", ts)), r.get("q"),
+                                 rx_ms=rx_ms if rx_ms is not None else stored_ms, stored_ms=stored_ms)
                 key = (tag, anchor_mac)
                 self._samples[key] = rs
+                stored += 1
+                taps = self._captures.get(tag)
+                if taps:
+                    for cap in taps:
+                        cap.record(rs)
             self._prune_locked(now_ms)
+        metrics.RANGE_SAMPLES.inc(stored)
+        if stored < len(ranges):
+            metrics.RANGE_DROPPED.inc(len(ranges) - stored, reason="invalid")
+
+    def open_capture(self, tag_mac: str, max_samples: int = 2048) -> RangeCapture:
+        """Attach a capture that records every sample of ``tag_mac`` from now on."""
+        cap = RangeCapture(tag_mac, max_samples=max_samples)
+        with self._lock:
+            self._captures.setdefault(tag_mac, []).append(cap)
+        return cap
+
+    def close_capture(self, cap: RangeCapture):
+        with self._lock:
+            taps = self._captures.get(cap.tag_mac, [])
+            if cap in taps:
+                taps.remove(cap)
+            if not taps:
+                self._captures.pop(cap.tag_mac, None)
 
     def _prune_locked(self, now_ms: int):
         cutoff = now_ms - self.window_ms
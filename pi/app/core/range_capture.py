@@ -0,0 +1,150 @@
+"""Lossless capture of range samples for calibration.
+
+A :class:`RangeCapture` is attached to the ``RangeCache`` ingest path for one
+tag and sees every sample as it arrives, including the ones the cache
+overwrites before anybody reads them. Per anchor it keeps a bounded buffer of
+the most recent samples and streaming statistics: count, mean and standard
+deviation (Welford), min/max, and median and MAD (median absolute deviation)
+estimated with the P² algorithm. Reading the statistics is O(1) per anchor.
+"""
+import math
+import threading
+from collections import deque
+from typing import Any, Dict, List, Optional
+
+
+class P2Quantile:
+    """Streaming quantile estimate (Jain & Chlamtac P² algorithm), O(1) memory."""
+
+    def __init__(self, p: float = 0.5):
+        self.p = p
+        self.n = 0
+        self._init: List[float] = []
+        self._q: List[float] = []
+        self._pos: List[float] = []
+        self._want: List[float] = []
+        self._inc = [0.0, p / 2.0, p, (1.0 + p) / 2.0, 1.0]
+
+    def add(self, x: float):
+        self.n += 1
+        if self.n <= 5:
+            self._init.append(x)
+            if self.n == 5:
+                self._q = sorted(self._init)
+                self._pos = [1.0, 2.0, 3.0, 4.0, 5.0]
+                p = self.p
+                self._want = [1.0, 1.0 + 2.0 * p, 1.0 + 4.0 * p, 3.0 + 2.0 * p, 5.0]
+            return
+        q, pos = self._q, self._pos
+        if x < q[0]:
+            q[0] = x
+            k = 0
+        elif x >= q[4]:
+            q[4] = x
+            k = 3
+        else:
+            k = 0
+            while k < 3 and x >= q[k + 1]:
+                k += 1
+        for i in range(k + 1, 5):
+            pos[i] += 1.0
+        for i in range(5):
+            self._want[i] += self._inc[i]
+        for i in (1, 2, 3):
+            d = self._want[i] - pos[i]
+            if (d >= 1.0 and pos[i + 1] - pos[i] > 1.0) or (d <= -1.0 and pos[i - 1] - pos[i] < -1.0):
+                s = 1.0 if d > 0 else -1.0
+                cand = self._parabolic(i, s)
+                if not (q[i - 1] < cand < q[i + 1]):
+                    cand = q[i] + s * (q[i + int(s)] - q[i]) / (pos[i + int(s)] - pos[i])
+                q[i] = cand
+                pos[i] += s
+
+    def _parabolic(self, i: int, s: float) -> float:
+        q, n = self._q, self._pos
+        return q[i] + s / (n[i + 1] - n[i - 1]) * (
+            (n[i] - n[i - 1] + s) * (q[i + 1] - q[i]) / (n[i + 1] - n[i])
+            + (n[i + 1] - n[i] - s) * (q[i] - q[i - 1]) / (n[i] - n[i - 1])
+        )
+
+    def value(self) -> Optional[float]:
+        if self.n == 0:
+            return None
+        if self.n <= 5:
+            # exact for the first samples (lower median, like sorted(v)[len(v)//2] for p=0.5)
+            vals = sorted(self._init)
+            return vals[min(len(vals) - 1, int(len(vals) * self.p))]
+        return self._q[2]
+
+
+class AnchorStats:
+    def __init__(self, max_samples: int):
+        self.count = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+        self.min: Optional[float] = None
+        self.max: Optional[float] = None
+        self.median = P2Quantile(0.5)
+        self.abs_dev = P2Quantile(0.5)
+        self.recent: "deque[Any]" = deque(maxlen=max_samples)
+        self.last_ts_ms = 0
+
+    def add(self, sample):
+        x = float(sample.d_m)
+        self.count += 1
+        delta = x - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (x - self.mean)
+        self.min = x if self.min is None else min(self.min, x)
+        self.max = x if self.max is None else max(self.max, x)
+        self.median.add(x)
+        # MAD against the running median estimate
+        self.abs_dev.add(abs(x - self.median.value()))
+        self.recent.append(sample)
+        self.last_ts_ms = max(self.last_ts_ms, int(sample.ts_ms or 0))
+
+    def snapshot(self) -> Dict[str, Any]:
+        std = math.sqrt(self._m2 / (self.count - 1)) if self.count > 1 else 0.0
+        return {
+            "count": self.count,
+            "mean_d_m": self.mean,
+            "median_d_m": self.median.value(),
+            "mad_d_m": self.abs_dev.value(),
+            "std_d_m": std,
+            "min_d_m": self.min,
+            "max_d_m": self.max,
+            "last_ts_ms": self.last_ts_ms,
+        }
+
+
+class RangeCapture:
+    """Receives every range sample of ``tag_mac`` while attached to a RangeCache."""
+
+    def __init__(self, tag_mac: str, max_samples: int = 2048):
+        self.tag_mac = tag_mac
+        self.max_samples = max_samples
+        self._anchors: Dict[str, AnchorStats] = {}
+        self._lock = threading.Lock()
+        self.count = 0
+
+    def record(self, sample):
+        with self._lock:
+            st = self._anchors.get(sample.anchor_mac)
+            if st is None:
+                st = self._anchors[sample.anchor_mac] = AnchorStats(self.max_samples)
+            st.add(sample)
+            self.count += 1
+
+    def anchors(self) -> List[str]:
+        with self._lock:
+            return sorted(self._anchors)
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            return {mac: st.snapshot() for mac, st in self._anchors.items()}
+
+    def samples(self, anchor_mac: str) -> List[Any]:
+        """Most recent samples of one anchor (at most ``max_samples``)."""
+        with self._lock:
+            st = self._anchors.get(anchor_mac)
+            return list(st.recent) if st else []
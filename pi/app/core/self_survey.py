@@ -0,0 +1,322 @@
+"""Anchor self-survey from anchor-to-anchor ranging.
+
+During a survey every anchor ranges to its peers and reports the distances
+on ``dev/<mac>/survey``; :class:`SurveyCollector` pools them per anchor pair.
+:func:`self_survey` turns the pairwise distances into a layout:
+
+1. classical multidimensional scaling (MDS) of the distance matrix gives an
+   initial layout up to rotation, translation and reflection; pairs that were
+   not measured are filled with shortest-path distances first,
+2. the gauge is fixed by user constraints: the ``origin`` anchor sits at
+   x=y=0, the ``x_axis`` anchor on the positive x axis and the ``xy_plane``
+   anchor at positive y; known mounting heights pin z (without at least three
+   known heights the three gauge anchors are taken to share one height),
+3. a robust (Huber) Levenberg-Marquardt refinement of all coordinates against
+   the measured distances and the height constraints. The inverse normal
+   matrix, scaled by the residual variance, gives per-anchor uncertainties.
+"""
+import math
+import statistics
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from .linalg import cho_inverse, cho_solve, cholesky, eigh, huber_cost, huber_weight
+
+Pair = Tuple[str, str]
+GAUGE_SIGMA_CM = 0.01
+
+
+def _pair(a: str, b: str) -> Pair:
+    return (a, b) if a <= b else (b, a)
+
+
+class SurveyCollector:
+    """Pools anchor-to-anchor distances reported while a survey is running."""
+
+    def __init__(self, max_samples: int = 256):
+        self.max_samples = max_samples
+        self.started_at_ms = int(time.time() * 1000)
+        self._samples: Dict[Pair, List[float]] = {}
+        self._lock = threading.Lock()
+        self.count = 0
+
+    def record(self, anchor_mac: str, peer_mac: str, d_cm: float):
+        if not anchor_mac or not peer_mac or anchor_mac == peer_mac or not d_cm or d_cm <= 0:
+            return
+        with self._lock:
+            buf = self._samples.setdefault(_pair(anchor_mac, peer_mac), [])
+            if len(buf) >= self.max_samples:
+                buf.pop(0)
+            buf.append(float(d_cm))
+            self.count += 1
+
+    def ranges(self) -> Dict[Pair, float]:
+        """Median distance (cm) per anchor pair, both directions pooled."""
+        with self._lock:
+            return {k: statistics.median(v) for k, v in self._samples.items() if v}
+
+    def status(self) -> Dict:
+        with self._lock:
+            anchors = sorted({m for k in self._samples for m in k})
+            return {
+                "started_at_ms": self.started_at_ms,
+                "samples": self.count,
+                "pairs": len(self._samples),
+                "anchors": anchors,
+            }
+
+
+class SurveyResult:
+    def __init__(self):
+        self.positions_cm: Dict[str, Dict[str, float]] = {}
+        self.sigma_cm: Dict[str, Dict[str, Optional[float]]] = {}
+        self.residuals_cm: Dict[str, float] = {}
+        self.rms_cm = 0.0
+        self.sigma0 = 1.0
+        self.iterations = 0
+        self.converged = False
+        self.filled_pairs = 0
+
+    def as_dict(self) -> Dict:
+        return {
+            "positions_cm": self.positions_cm,
+            "sigma_cm": self.sigma_cm,
+            "residuals_cm": self.residuals_cm,
+            "rms_cm": self.rms_cm,
+            "sigma0": self.sigma0,
+            "iterations": self.iterations,
+            "converged": self.converged,
+            "filled_pairs": self.filled_pairs,
+        }
+
+
+def _complete_distances(n: int, known: Dict[Tuple[int, int], float]) -> Tuple[List[List[float]], int]:
+    """Full distance matrix; missing pairs get shortest-path estimates."""
+    inf = float("inf")
+    d = [[0.0 if i == j else inf for j in range(n)] for i in range(n)]
+    for (i, j), v in known.items():
+        d[i][j] = d[j][i] = v
+    sp = [list(row) for row in d]
+    for k in range(n):
+        for i in range(n):
+            dik = sp[i][k]
+            if dik == inf:
+                continue
+            row_i, row_k = sp[i], sp[k]
+            for j in range(n):
+                alt = dik + row_k[j]
+                if alt < row_i[j]:
+                    row_i[j] = alt
+    filled = 0
+    for i in range(n):
+        for j in range(i + 1, n):
+            if d[i][j] == inf:
+                if sp[i][j] == inf:
+                    raise ValueError("range graph is not connected")
+                d[i][j] = d[j][i] = sp[i][j]
+                filled += 1
+    return d, filled
+
+
+def classical_mds(d: List[List[float]], dims: int = 3) -> List[List[float]]:
+    """Coordinates (n x dims) whose distances best match ``d`` (Torgerson)."""
+    n = len(d)
+    sq = [[v * v for v in row] for row in d]
+    row_mean = [sum(row) / n for row in sq]
+    total = sum(row_mean) / n
+    b = [[-0.5 * (sq[i][j] - row_mean[i] - row_mean[j] + total) for j in range(n)] for i in range(n)]
+    vals, vecs = eigh(b)
+    coords = [[0.0] * dims for _ in range(n)]
+    for k in range(min(dims, n)):
+        s = math.sqrt(max(vals[k], 0.0))
+        for i in range(n):
+            coords[i][k] = vecs[k][i] * s
+    return coords
+
+
+def _sub(a, b):
+    return [a[0] - b[0], a[1] - b[1], a[2] - b[2]]
+
+
+def _dot(a, b):
+    return a[0] * b[0] + a[1] * b[1] + a[2] * b[2]
+
+
+def _cross(a, b):
+    return [a[1] * b[2] - a[2] * b[1], a[2] * b[0] - a[0] * b[2], a[0] * b[1] - a[1] * b[0]]
+
+
+def _unit(a):
+    n = math.sqrt(_dot(a, a))
+    if n < 1e-9:
+        raise ValueError("gauge anchors are (nearly) coincident or collinear")
+    return [a[0] / n, a[1] / n, a[2] / n]
+
+
+def self_survey(
+    ranges_cm: Dict[Pair, float],
+    origin: str,
+    x_axis: str,
+    xy_plane: Optional[str] = None,
+    heights_cm: Optional[Dict[str, float]] = None,
+    height_sigma_cm: float = 2.0,
+    huber_cm: float = 10.0,
+    max_iter: int = 50,
+    tol: float = 1e-9,
+) -> SurveyResult:
+    """Anchor layout from pairwise distances ``{(mac_a, mac_b): d_cm}``."""
+    heights = dict(heights_cm or {})
+    anchors = sorted({m for k in ranges_cm for m in k})
+    idx = {m: i for i, m in enumerate(anchors)}
+    n = len(anchors)
+    for role, mac in (("origin", origin), ("x_axis", x_axis), ("xy_plane", xy_plane)):
+        if mac is not None and mac not in idx:
+            raise ValueError(f"{role} anchor {mac} has no ranges")
+    if n < 3:
+        raise ValueError("need ranges between at least 3 anchors")
+    known = {}
+    for (a, b), v in ranges_cm.items():
+        if a == b or v <= 0:
+            continue
+        i, j = idx[a], idx[b]
+        known[(min(i, j), max(i, j))] = float(v)
+    obs = [(i, j, v) for (i, j), v in sorted(known.items())]
+    d, filled = _complete_distances(n, known)
+
+    # 1. initial layout
+    x0 = classical_mds(d)
+    o, xa = idx[origin], idx[x_axis]
+    rel = [_sub(p, x0[o]) for p in x0]
+    e1 = _unit(rel[xa])
+    if xy_plane is not None:
+        cand = idx[xy_plane]
+    else:
+        # the anchor farthest from the origin-x axis line spans the plane
+        cand = max(range(n), key=lambda i: _dot(_cross(e1, rel[i]), _cross(e1, rel[i])))
+    v2 = rel[cand]
+    e2 = _unit([v2[k] - _dot(v2, e1) * e1[k] for k in range(3)])
+    e3 = _cross(e1, e2)
+
+    # 2. gauge: vertical from known heights, else the gauge anchors share one height
+    if len(heights) < 3:
+        z0 = heights.get(origin, 0.0)
+        for mac in (origin, x_axis, anchors[cand]):
+            heights.setdefault(mac, z0)
+    z_ref = heights.get(origin, 0.0)
+    xs = [[_dot(p, e1), _dot(p, e2), _dot(p, e3) + z_ref] for p in rel]
+    mirrored = [[p[0], p[1], 2.0 * z_ref - p[2]] for p in xs]
+    known_h = [(idx[m], h) for m, h in heights.items() if m in idx]
+
+    def height_err(cand_xs):
+        return sum((cand_xs[i][2] - h) ** 2 for i, h in known_h)
+
+    free = [i for i in range(n) if all(i != k for k, _ in known_h)]
+    err, err_m = height_err(xs), height_err(mirrored)
+    if abs(err - err_m) < 1e-6 and free:
+        # mirror ambiguity not resolved by heights: anchors hang above the gauge plane
+        if sum(xs[i][2] - z_ref for i in free) < 0:
+            xs = mirrored
+    elif err_m < err:
+        xs = mirrored
+    for i, h in known_h:
+        xs[i][2] = h
+
+    # 3. refinement; gauge and heights enter as (stiff) priors
+    priors = [(3 * o, 0.0, GAUGE_SIGMA_CM), (3 * o + 1, 0.0, GAUGE_SIGMA_CM), (3 * xa + 1, 0.0, GAUGE_SIGMA_CM)]
+    gauge_h = {o, xa, cand} if len(heights_cm or {}) < 3 else set()
+    for i, h in known_h:
+        priors.append((3 * i + 2, h, GAUGE_SIGMA_CM if i in gauge_h else height_sigma_cm))
+    params = [v for p in xs for v in p]
+    n_p = 3 * n
+
+    def residual(prm, i, j, v):
+        dx = prm[3 * i] - prm[3 * j]
+        dy = prm[3 * i + 1] - prm[3 * j + 1]
+        dz = prm[3 * i + 2] - prm[3 * j + 2]
+        dist = math.sqrt(dx * dx + dy * dy + dz * dz) or 1e-9
+        return dist - v, dx / dist, dy / dist, dz / dist
+
+    def cost(prm):
+        c = sum(huber_cost(residual(prm, i, j, v)[0], huber_cm) for i, j, v in obs)
+        return c + sum(0.5 * ((prm[k] - t) / s) ** 2 for k, t, s in priors)
+
+    def normal_equations(prm):
+        h = [[0.0] * n_p for _ in range(n_p)]
+        g = [0.0] * n_p
+        for i, j, v in obs:
+            r, ux, uy, uz = residual(prm, i, j, v)
+            w = huber_weight(r, huber_cm)
+            u = (ux, uy, uz)
+            for a in range(3):
+                g[3 * i + a] += w * u[a] * r
+                g[3 * j + a] -= w * u[a] * r
+                for b in range(3):
+                    wab = w * u[a] * u[b]
+                    h[3 * i + a][3 * i + b] += wab
+                    h[3 * j + a][3 * j + b] += wab
+                    h[3 * i + a][3 * j + b] -= wab
+                    h[3 * j + a][3 * i + b] -= wab
+        for k, t, s in priors:
+            h[k][k] += 1.0 / (s * s)
+            g[k] += (prm[k] - t) / (s * s)
+        return h, g
+
+    res = SurveyResult()
+    res.filled_pairs = filled
+    lam = 1e-3
+    cur = cost(params)
+    for it in range(1, max_iter + 1):
+        res.iterations = it
+        h, g = normal_equations(params)
+        step_ok = False
+        rel_gain = 0.0
+        while lam < 1e8:
+            damped = [list(row) for row in h]
+            for k in range(n_p):
+                # Marquardt scaling plus a small floor for directions no range constrains yet
+                damped[k][k] += lam * (h[k][k] + 1e-6)
+            low = cholesky(damped)
+            if low is None:
+                lam *= 10.0
+                continue
+            delta = cho_solve(low, [-v for v in g])
+            cand_p = [p + dlt for p, dlt in zip(params, delta)]
+            new_cost = cost(cand_p)
+            if new_cost <= cur:
+                step_ok = True
+                rel_gain = (cur - new_cost) / max(cur, 1e-12)
+                params, cur = cand_p, new_cost
+                lam = max(lam / 10.0, 1e-9)
+                break
+            lam *= 10.0
+        if not step_ok or rel_gain < tol:
+            res.converged = True
+            break
+
+    h, _ = normal_equations(params)
+    low = cholesky(h)
+    cov = cho_inverse(low) if low is not None else None
+    sq = 0.0
+    wsq = 0.0
+    n_in = 0
+    for i, j, v in obs:
+        r = residual(params, i, j, v)[0]
+        sq += r * r
+        a, b = anchors[i], anchors[j]
+        res.residuals_cm[f"{a}-{b}"] = r
+        if abs(r) <= 3.0 * huber_cm:
+            wsq += r * r
+            n_in += 1
+    # 3n coordinates minus the 6 gauge freedoms fixed by priors
+    dof = n_in - (3 * n - 6)
+    res.rms_cm = math.sqrt(sq / len(obs)) if obs else 0.0
+    res.sigma0 = math.sqrt(wsq / dof) if dof > 0 else 1.0
+    for i, mac in enumerate(anchors):
+        res.positions_cm[mac] = {"x": params[3 * i], "y": params[3 * i + 1], "z": params[3 * i + 2]}
+        if cov is None:
+            res.sigma_cm[mac] = {"x": None, "y": None, "z": None}
+            continue
+        sig = [math.sqrt(max(cov[3 * i + a][3 * i + a], 0.0)) * res.sigma0 for a in range(3)]
+        res.sigma_cm[mac] = {"x": sig[0], "y": sig[1], "z": sig[2]}
+    return res
@@ -1,6 +1,7 @@
 import time
 from typing import Dict, Any
 
+from app.db import ram_db
 from app.db.persistence import get_persistence
 
 
@@ -12,7 +13,12 @@ class StateManager:
         return self.p.get_setting("system.state", "SETUP")
 
     def set_state(self, state: str):
+        previous = self.get_state()
         self.p.upsert_setting("system.state", state)
+        if state == "LIVE" and previous != "LIVE":
+            # RAM database mode: make the show configuration durable before the show;
+            # the snapshot thread does the SD-card I/O, not the caller
+            ram_db.request_checkpoint(f"state:{previous}->{state}")
 
     def readiness(self) -> Dict[str, Any]:
         # minimal readiness: mqtt_ok flag + anchors_online>=min + fixtures enabled
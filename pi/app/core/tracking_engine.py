@@ -1,7 +1,10 @@
 import asyncio
 import time
-from typing import Any, Callable, Dict, List, Optional
+from typing import Any, Callable, Dict, List, Mapping, Optional
 
+from .. import metrics
+from . import latency
+from .bus import PositionRecord, TrackingBus
 from .range_cache import RangeCache
 from .anchor_positions import load_anchor_positions
 from .trilateration import solve_3d
@@ -17,11 +20,17 @@ class TrackingEngine:
         self.tracking_hz = s.get("rates.global.tracking_hz", s.get("tracking_hz", 10))
         self.anchor_positions_provider = anchor_positions_provider
         self.mqtt_publish = mqtt_publish
-        self.latest_position: Dict[str, dict] = {}
+        self.bus = TrackingBus()
+        self._last_tracking_ms: Dict[str, int] = {}
         self._running = False
 
-    def enqueue_range_batch(self, anchor_mac: str, ts_ms: int, ranges: List[dict]):
-        self.range_cache.update_from_batch(anchor_mac, ts_ms, ranges)
+    @property
+    def latest_position(self) -> Mapping[str, dict]:
+        """Latest payload per tag (read-only view of the bus)."""
+        return self.bus.latest_payloads()
+
+    def enqueue_range_batch(self, anchor_mac: str, ts_ms: int, ranges: List[dict], rx_ms: Optional[float] = None):
+        self.range_cache.update_from_batch(anchor_mac, ts_ms, ranges, rx_ms=rx_ms)
 
     def _get_anchor_positions(self) -> Dict[str, Any]:
         if self.anchor_positions_provider:
@@ -37,6 +46,13 @@ class TrackingEngine:
     async def run(self):
         self._running = True
         interval = 1.0 / float(self.tracking_hz or 10)
+        mqtt_task = asyncio.ensure_future(self._mqtt_forwarder(self.bus.subscribe()))
+        try:
+            await self._run_loop(interval)
+        finally:
+            mqtt_task.cancel()
+
+    async def _run_loop(self, interval: float):
         while self._running:
             try:
                 await self._tick()
@@ -45,6 +61,10 @@ class TrackingEngine:
             await asyncio.sleep(interval)
 
     async def _tick(self):
+        with metrics.TRACKING_TICK_SECONDS.time():
+            self._solve_tags()
+
+    def _solve_tags(self):
         anchors = self._get_anchor_positions()
         now_ms = int(time.time() * 1000)
         tags = self._tags_seen()
@@ -52,55 +72,105 @@ class TrackingEngine:
             samples = self.range_cache.snapshot(tag_mac, max_age_ms=self.stale_timeout_ms)
             # build dict anchor->dist_cm
             dist_map = {}
+            used = {}
             for s in samples:
                 if s.anchor_mac in anchors:
                     dist_map[s.anchor_mac] = s.d_m * 100.0  # m -> cm
+                    used[s.anchor_mac] = s
             if len(dist_map) < 4:
+                metrics.SOLVER_RESULTS.inc(reason="insufficient_anchors")
                 self._set_state(tag_mac, "STALE" if self._is_recent(tag_mac, now_ms) else "LOST", now_ms, None, anchors_used=[])
                 continue
+            solve_start_ms = time.time() * 1000
+            t0 = time.perf_counter()
             res = solve_3d(anchors, dist_map, resid_max_m=self.settings.get("tracking.resid_max_m", 5.0))
+            metrics.TRACKING_SOLVE_SECONDS.observe(time.perf_counter() - t0, tag=tag_mac)
+            solved_ms = solve_start_ms + (time.perf_counter() - t0) * 1000
+            metrics.SOLVER_ITERATIONS.observe(res.iterations)
+            metrics.SOLVER_RESULTS.inc(reason=res.reason or "ok")
             if res.pos_cm is None:
                 self._set_state(tag_mac, "STALE" if self._is_recent(tag_mac, now_ms) else "LOST", now_ms, None, anchors_used=res.anchors_used, reason=res.reason)
                 continue
-            payload = {
-                "tag_mac": tag_mac,
-                "state": "TRACKING",
-                "position_cm": {"x": res.pos_cm[0], "y": res.pos_cm[1], "z": res.pos_cm[2]},
-                "anchors_used": res.anchors_used,
-                "resid_m": res.resid_m,
-                "outliers": res.outliers,
-                "ts_ms": now_ms,
-            }
-            self.latest_position[tag_mac] = payload
-            if self.mqtt_publish:
+            trace = self._trace([used[a] for a in res.anchors_used if a in used], solve_start_ms, solved_ms)
+            self._last_tracking_ms[tag_mac] = now_ms
+            rec = self.bus.publish(PositionRecord(
+                tag_mac=tag_mac,
+                state="TRACKING",
+                ts_ms=now_ms,
+                position_cm=(res.pos_cm[0], res.pos_cm[1], res.pos_cm[2]),
+                anchors_used=tuple(res.anchors_used or ()),
+                resid_m=res.resid_m,
+                outliers=tuple(res.outliers or ()),
+                trace=trace,
+            ))
+            if trace is not None:
+                # only known once the bus has handed the record to every subscriber
+                published_ms = time.time() * 1000
+                self.bus.stamp(tag_mac, rec.seq, published_ms=round(published_ms, 1))
+                latency.observe({"solved_ms": solved_ms, "published_ms": published_ms}, ("publish",))
+
+    def _trace(self, samples: List[Any], solve_start_ms: float, solved_ms: float):
+        """Provenance of the oldest sample behind a position (see ``app.core.latency``).
+
+        ``published_ms`` is stamped onto the bus record after ``publish`` returns.
+        """
+        if not samples:
+            return None
+        for smp in samples:
+            latency.observe_anchor(smp.anchor_mac, smp.ts_ms, smp.rx_ms, solved_ms)
+        oldest = min(samples, key=lambda smp: smp.ts_ms)
+        trace = {
+            "anchor": oldest.anchor_mac,
+            "batch_ts_ms": float(oldest.ts_ms),
+            "rx_ms": oldest.rx_ms,
+            "stored_ms": oldest.stored_ms,
+            "solve_start_ms": solve_start_ms,
+            "solved_ms": solved_ms,
+        }
+        latency.observe(trace, ("transport", "ingest", "queue", "solve"))
+        return tuple((k, round(v, 1) if isinstance(v, float) else v) for k, v in trace.items() if v is not None)
+
+    async def _mqtt_forwarder(self, sub):
+        # MQTT consumes the bus like any other subscriber instead of running inside _tick
+        try:
+            async for rec in sub:
+                if rec.state != "TRACKING" or not self.mqtt_publish:
+                    continue
                 try:
-                    self.mqtt_publish(f"tracking/{tag_mac}/position", payload)
+                    self.mqtt_publish(f"tracking/{rec.tag_mac}/position", rec.to_payload())
                 except Exception:
                     pass
+        finally:
+            sub.close()
 
     def _tags_seen(self) -> List[str]:
         with self.range_cache._lock:
             return list({tag for (tag, _), _ in self.range_cache._samples.items()})
 
     def _is_recent(self, tag_mac: str, now_ms: int) -> bool:
-        last = self.latest_position.get(tag_mac, {}).get("ts_ms")
+        last = self._last_tracking_ms.get(tag_mac)
         if last is None:
             return False
         return (now_ms - last) <= self.lost_timeout_ms
 
     def _set_state(self, tag_mac: str, state: str, now_ms: int, pos: Optional[dict], anchors_used: List[str], reason: Optional[str] = None):
-        payload = self.latest_position.get(tag_mac, {}).copy()
-        payload.update({
-            "tag_mac": tag_mac,
-            "state": state,
-            "ts_ms": now_ms,
-            "anchors_used": anchors_used,
-        })
+        prev = self.bus.get(tag_mac)
+        if prev is not None and prev.state == state and not pos:
+            # unchanged STALE/LOST: subscribers already have it
+            return
+        position = prev.position_cm if prev else None
         if pos:
-            payload["position_cm"] = pos
-        if reason:
-            payload["reason"] = reason
-        self.latest_position[tag_mac] = payload
+            position = (pos["x"], pos["y"], pos["z"])
+        self.bus.publish(PositionRecord(
+            tag_mac=tag_mac,
+            state=state,
+            ts_ms=now_ms,
+            position_cm=position,
+            anchors_used=tuple(anchors_used or ()),
+            resid_m=prev.resid_m if prev else None,
+            outliers=prev.outliers if prev else None,
+            reason=reason or (prev.reason if prev else None),
+        ))
 
     def stop(self):
         self._running = False
@@ -1,21 +1,81 @@
 import os
 import sqlite3
+import threading
+
+# tmpfs copy used instead of LT_DB_PATH while RAM mode is on (see app.db.ram_db)
+_live_path = None
+
 
 def get_db_path():
     default = os.path.normpath(os.path.join(os.path.dirname(__file__), '..', 'data', 'lighttracker.db'))
     return os.environ.get('LT_DB_PATH', default)
 
-def connect_db():
-    """Create SQLite connection with required pragmas."""
-    path = get_db_path()
+
+def get_live_db_path():
+    """Path connections should open: the RAM copy if active, else ``LT_DB_PATH``."""
+    return _live_path or get_db_path()
+
+
+def set_live_db_path(path):
+    global _live_path
+    _live_path = path
+
+
+class PinnedConnection(sqlite3.Connection):
+    """Connection kept open by its thread; ``close()`` only ends an open transaction."""
+
+    def close(self):
+        if self.in_transaction:
+            self.rollback()
+
+    def release(self):
+        super().close()
+
+
+_thread = threading.local()
+
+
+def _open(path, factory=sqlite3.Connection):
     os.makedirs(os.path.dirname(path), exist_ok=True)
-    conn = sqlite3.connect(path)
+    conn = sqlite3.connect(path, factory=factory)
     conn.row_factory = sqlite3.Row
     # enforce brief guardrails
     conn.execute("PRAGMA foreign_keys=ON;")
     conn.execute("PRAGMA journal_mode=WAL;")
     return conn
 
+
+def connect_db():
+    """Create SQLite connection with required pragmas.
+
+    On a thread that called ``pin_thread_connection`` (the async persistence
+    worker) the same connection is returned every time, reopened only when
+    the configured DB path changes.
+    """
+    path = get_live_db_path()
+    if not getattr(_thread, "pinned", False):
+        return _open(path)
+    conn = getattr(_thread, "conn", None)
+    if conn is None or _thread.path != path:
+        if conn is not None:
+            conn.release()
+        conn = _thread.conn = _open(path, PinnedConnection)
+        _thread.path = path
+    return conn
+
+
+def pin_thread_connection():
+    _thread.pinned = True
+
+
+def release_thread_connection():
+    conn = getattr(_thread, "conn", None)
+    if conn is not None:
+        conn.release()
+    _thread.conn = None
+    _thread.pinned = False
+
+
 def execute_sql(sql, params=None):
     conn = connect_db()
     try:
@@ -0,0 +1,132 @@
+"""Async access to :class:`Persistence` through one dedicated DB thread.
+
+``async def`` routes await ``get_async_persistence().<method>(...)`` (or
+``run(fn)`` for a sync function doing several queries) instead of blocking a
+Starlette threadpool worker on sqlite I/O. All calls are executed on a single
+worker thread that keeps its own connection open (see ``connect_db``). Calls
+queued while the worker is busy are drained and executed back to back as one
+batch, and their results are handed back with one loop callback per batch.
+"""
+import asyncio
+import queue
+import threading
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from . import pin_thread_connection, release_thread_connection
+from .persistence import Persistence, get_persistence
+
+_Call = Tuple[Callable[..., Any], tuple, dict, asyncio.AbstractEventLoop, asyncio.Future]
+
+
+def _resolve(done: List[Tuple[asyncio.Future, bool, Any]]):
+    for fut, ok, value in done:
+        if fut.done():
+            continue
+        if ok:
+            fut.set_result(value)
+        else:
+            fut.set_exception(value)
+
+
+class AsyncPersistence:
+    def __init__(self, max_batch: int = 64):
+        self.max_batch = max_batch
+        self._queue: "queue.SimpleQueue[Optional[List[_Call]]]" = queue.SimpleQueue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.batches = 0
+
+    def _ensure_thread(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._worker, name="lt-db", daemon=True)
+                self._thread.start()
+
+    def _worker(self):
+        pin_thread_connection()
+        try:
+            while True:
+                item = self._queue.get()
+                if item is None:
+                    return
+                batch = list(item)
+                stop = False
+                while len(batch) < self.max_batch:
+                    try:
+                        more = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if more is None:
+                        stop = True
+                        break
+                    batch.extend(more)
+                self._execute(batch)
+                if stop:
+                    return
+        finally:
+            release_thread_connection()
+
+    def _execute(self, batch: List[_Call]):
+        by_loop: Dict[asyncio.AbstractEventLoop, list] = {}
+        for fn, args, kwargs, loop, fut in batch:
+            try:
+                by_loop.setdefault(loop, []).append((fut, True, fn(*args, **kwargs)))
+            except Exception as e:
+                by_loop.setdefault(loop, []).append((fut, False, e))
+        self.calls += len(batch)
+        self.batches += 1
+        for loop, done in by_loop.items():
+            if not loop.is_closed():
+                loop.call_soon_threadsafe(_resolve, done)
+
+    def _submit(self, calls: Sequence[Tuple[Callable[..., Any], tuple, dict]]) -> List[asyncio.Future]:
+        loop = asyncio.get_running_loop()
+        futures = [loop.create_future() for _ in calls]
+        self._ensure_thread()
+        self._queue.put([(fn, args, kwargs, loop, fut) for (fn, args, kwargs), fut in zip(calls, futures)])
+        return futures
+
+    async def run(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """Run a sync function on the DB thread; use it to group dependent queries."""
+        (fut,) = self._submit([(fn, args, kwargs)])
+        return await fut
+
+    async def run_many(self, calls: Sequence[Tuple[Callable[..., Any], tuple]]) -> List[Any]:
+        """Execute ``(fn, args)`` pairs as one batch; results in order, first error raised."""
+        futures = self._submit([(fn, tuple(args), {}) for fn, args in calls])
+        return list(await asyncio.gather(*futures))
+
+    def __getattr__(self, name: str):
+        # async variants of the public Persistence methods: await ap.get_setting(...)
+        if name.startswith("_") or not callable(getattr(Persistence, name, None)):
+            raise AttributeError(name)
+
+        async def call(*args, **kwargs):
+            return await self.run(lambda: getattr(get_persistence(), name)(*args, **kwargs))
+
+        call.__name__ = name
+        return call
+
+    def close(self, timeout: float = 2.0):
+        thread = self._thread
+        if thread is None:
+            return
+        self._queue.put(None)
+        thread.join(timeout)
+        self._thread = None
+
+
+_singleton = None
+_singleton_lock = threading.Lock()
+
+
+def get_async_persistence() -> AsyncPersistence:
+    global _singleton
+    if _singleton is None:
+        with _singleton_lock:
+            if _singleton is None:
+                _singleton = AsyncPersistence()
+    return _singleton
@@ -1,3 +1,3 @@
-from . import get_db_path, connect_db, execute_sql
+from . import get_db_path, get_live_db_path, connect_db, execute_sql
 
-__all__ = ["get_db_path", "connect_db", "execute_sql"]
+__all__ = ["get_db_path", "get_live_db_path", "connect_db", "execute_sql"]
@@ -0,0 +1,255 @@
+"""Buffered writer for ``event_log``.
+
+``Persistence.append_event`` only queues here; a background thread writes the
+queue as one transaction every ``flush_interval_s`` (or as soon as
+``max_batch`` new rows are waiting), so a burst of events costs one commit
+instead of one per event:
+
+- identical events (level, source, type, ref, details) within
+  ``dedup_window_s`` of the first one collapse into one row whose
+  ``repeat_count``/``last_ts_ms`` are updated,
+- at most ``rate_per_s`` new rows per (source, event_type) and second are
+  kept; the rest is counted and written as one ``events/rate_limited`` row,
+- rows older than ``events.max_age_days`` or beyond ``events.max_rows``
+  (settings) are pruned every ``prune_interval_s``.
+"""
+import json
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from ..metrics import DB_QUERY_SECONDS
+from . import connect_db, get_live_db_path
+
+_Key = Tuple[str, str, str, Optional[str], Optional[str]]
+
+DEFAULT_MAX_AGE_DAYS = 30
+DEFAULT_MAX_ROWS = 50000
+
+
+class _Group:
+    __slots__ = ("key", "first_ts", "last_ts", "count", "flushed", "row_id")
+
+    def __init__(self, key: _Key, ts_ms: int):
+        self.key = key
+        self.first_ts = ts_ms
+        self.last_ts = ts_ms
+        self.count = 1
+        self.flushed = 0
+        self.row_id: Optional[int] = None
+
+
+def ensure_event_columns(db):
+    """Add the dedup columns to an ``event_log`` created before migration 0011."""
+    cols = {r[1] for r in db.execute("PRAGMA table_info(event_log)").fetchall()}
+    if "repeat_count" not in cols:
+        db.execute("ALTER TABLE event_log ADD COLUMN repeat_count INTEGER NOT NULL DEFAULT 1")
+    if "last_ts_ms" not in cols:
+        db.execute("ALTER TABLE event_log ADD COLUMN last_ts_ms INTEGER")
+
+
+class EventSink:
+    def __init__(self, flush_interval_s: float = 1.0, max_batch: int = 256, dedup_window_s: float = 10.0,
+                 rate_per_s: int = 20, max_pending: int = 2000, prune_interval_s: float = 300.0):
+        self.flush_interval_s = flush_interval_s
+        self.max_batch = max_batch
+        self.dedup_window_ms = int(dedup_window_s * 1000)
+        self.rate_per_s = rate_per_s
+        self.max_pending = max_pending
+        self.prune_interval_s = prune_interval_s
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._groups: Dict[_Key, _Group] = {}
+        self._new = 0
+        self._rate: Dict[Tuple[str, str], List[int]] = {}
+        self._suppressed: Dict[Tuple[str, str], int] = {}
+        self._path: Optional[str] = None
+        self._columns_ok: Optional[str] = None
+        self._last_prune = 0.0
+        self._thread: Optional[threading.Thread] = None
+        self._stopped = False
+        self.stats = {"emitted": 0, "deduped": 0, "suppressed": 0, "flushes": 0, "rows": 0, "errors": 0, "pruned": 0}
+
+    def emit(self, level: str, source: str, event_type: str, ref: Optional[str] = None,
+             details_json: Optional[str] = None, ts_ms: Optional[int] = None):
+        ts = int(ts_ms if ts_ms is not None else time.time() * 1000)
+        key = (level, source, event_type, ref, details_json)
+        with self._cond:
+            self.stats["emitted"] += 1
+            g = self._groups.get(key)
+            # unwritten repeats are folded in even past the window so they are never lost
+            if g is not None and (ts - g.first_ts <= self.dedup_window_ms or g.count != g.flushed):
+                g.count += 1
+                g.last_ts = max(g.last_ts, ts)
+                self.stats["deduped"] += 1
+                return
+            rk = (source, event_type)
+            window = self._rate.get(rk)
+            sec = ts // 1000
+            if window is None or window[0] != sec:
+                window = self._rate[rk] = [sec, 0]
+            if window[1] >= self.rate_per_s or self._new >= self.max_pending:
+                self._suppressed[rk] = self._suppressed.get(rk, 0) + 1
+                self.stats["suppressed"] += 1
+                return
+            window[1] += 1
+            # a fresh group replaces an expired one; the old row keeps its final count
+            self._groups.pop(key, None)
+            self._groups[key] = _Group(key, ts)
+            self._new += 1
+            self._ensure_thread()
+            if self._new >= self.max_batch:
+                self._cond.notify()
+
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stopped = False
+            self._thread = threading.Thread(target=self._run, name="lt-events", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if self._stopped:
+                    return
+                if self._new < self.max_batch:
+                    self._cond.wait(self.flush_interval_s)
+                if self._stopped:
+                    return
+            self.flush()
+            if time.monotonic() - self._last_prune >= self.prune_interval_s:
+                self.prune()
+
+    def flush(self) -> int:
+        """Write pending events in one transaction; returns the number of rows inserted or updated."""
+        with self._flush_lock:
+            path = get_live_db_path()
+            with self._cond:
+                if path != self._path:
+                    # rows of another database can't be updated; keep only what is unwritten
+                    for k in [k for k, g in self._groups.items() if g.count == g.flushed]:
+                        del self._groups[k]
+                    for g in self._groups.values():
+                        g.row_id, g.flushed = None, 0
+                    self._path = path
+                    self._new = len(self._groups)
+                work = [(g, g.count, g.last_ts) for g in self._groups.values() if g.count != g.flushed]
+                suppressed, self._suppressed = self._suppressed, {}
+            if not work and not suppressed:
+                self._expire()
+                return 0
+            now = int(time.time() * 1000)
+            t0 = time.perf_counter()
+            db = connect_db()
+            try:
+                if self._columns_ok != path:
+                    ensure_event_columns(db)
+                    self._columns_ok = path
+                ids = []
+                for g, count, last_ts in work:
+                    if g.row_id is None:
+                        level, source, event_type, ref, details = g.key
+                        cur = db.execute(
+                            "INSERT INTO event_log(ts_ms, level, source, event_type, ref, details_json, repeat_count, last_ts_ms) "
+                            "VALUES(?,?,?,?,?,?,?,?)",
+                            (g.first_ts, level, source, event_type, ref, details, count, last_ts),
+                        )
+                        ids.append(cur.lastrowid)
+                    else:
+                        db.execute("UPDATE event_log SET repeat_count=?, last_ts_ms=? WHERE id=?", (count, last_ts, g.row_id))
+                        ids.append(g.row_id)
+                for (source, event_type), n in suppressed.items():
+                    db.execute(
+                        "INSERT INTO event_log(ts_ms, level, source, event_type, ref, details_json, repeat_count, last_ts_ms) "
+                        "VALUES(?,?,?,?,?,?,1,?)",
+                        (now, "WARN", "events", "rate_limited", f"{source}/{event_type}", json.dumps({"dropped": n}), now),
+                    )
+                db.commit()
+            except Exception:
+                if db.in_transaction:
+                    db.rollback()
+                with self._cond:
+                    self.stats["errors"] += 1
+                    for rk, n in suppressed.items():
+                        self._suppressed[rk] = self._suppressed.get(rk, 0) + n
+                return 0
+            finally:
+                db.close()
+            DB_QUERY_SECONDS.observe(time.perf_counter() - t0, method="event_sink.flush")
+            with self._cond:
+                for (g, count, _), row_id in zip(work, ids):
+                    if g.row_id is None:
+                        self._new -= 1
+                    g.row_id = row_id
+                    g.flushed = count
+                self.stats["flushes"] += 1
+                self.stats["rows"] += len(work) + len(suppressed)
+            self._expire()
+            return len(work) + len(suppressed)
+
+    def _expire(self):
+        now = int(time.time() * 1000)
+        with self._cond:
+            for k in [k for k, g in self._groups.items() if g.count == g.flushed and now - g.first_ts > self.dedup_window_ms]:
+                del self._groups[k]
+            for rk in [rk for rk, w in self._rate.items() if w[0] < now // 1000]:
+                del self._rate[rk]
+
+    def prune(self, max_age_days: Optional[float] = None, max_rows: Optional[int] = None) -> int:
+        """Apply retention; limits default to the ``events.max_age_days`` / ``events.max_rows`` settings."""
+        self._last_prune = time.monotonic()
+        db = connect_db()
+        try:
+            if max_age_days is None:
+                max_age_days = _setting_number(db, "events.max_age_days", DEFAULT_MAX_AGE_DAYS)
+            if max_rows is None:
+                max_rows = int(_setting_number(db, "events.max_rows", DEFAULT_MAX_ROWS))
+            removed = 0
+            if max_age_days and max_age_days > 0:
+                cutoff = int(time.time() * 1000 - max_age_days * 86400000)
+                removed += db.execute("DELETE FROM event_log WHERE ts_ms < ?", (cutoff,)).rowcount
+            if max_rows and max_rows > 0:
+                removed += db.execute(
+                    "DELETE FROM event_log WHERE id <= (SELECT MAX(id) FROM event_log) - ?", (max_rows,)
+                ).rowcount
+            db.commit()
+        except Exception:
+            if db.in_transaction:
+                db.rollback()
+            return 0
+        finally:
+            db.close()
+        with self._cond:
+            self.stats["pruned"] += removed
+        return removed
+
+    def close(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+        thread = self._thread
+        if thread is not None:
+            thread.join(2.0)
+        self._thread = None
+        self.flush()
+
+
+def _setting_number(db, key: str, default: float) -> float:
+    try:
+        row = db.execute("SELECT value FROM settings WHERE key=?", (key,)).fetchone()
+        return float(row[0]) if row and row[0] not in (None, "") else default
+    except Exception:
+        return default
+
+
+_singleton: Optional[EventSink] = None
+_singleton_lock = threading.Lock()
+
+
+def get_event_sink() -> EventSink:
+    global _singleton
+    if _singleton is None:
+        with _singleton_lock:
+            if _singleton is None:
+                _singleton = EventSink()
+    return _singleton
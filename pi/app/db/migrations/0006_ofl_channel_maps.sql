@@ -0,0 +1,31 @@
+-- Migration: 0006_ofl_channel_maps.sql
+-- Adds precompiled per-(fixture, mode) OFL channel-role tables
+PRAGMA foreign_keys=OFF;
+BEGIN TRANSACTION;
+
+CREATE TABLE IF NOT EXISTS ofl_channel_maps (
+  fixture_id INTEGER NOT NULL REFERENCES ofl_fixtures(id) ON DELETE CASCADE,
+  mode_name TEXT NOT NULL,
+  channel_count INTEGER NOT NULL,
+  map_json TEXT NOT NULL,
+  compiled_at_ms INTEGER NOT NULL,
+  PRIMARY KEY(fixture_id, mode_name)
+);
+
+-- a changed fixture definition makes its compiled maps stale
+CREATE TRIGGER IF NOT EXISTS trg_ofl_fixtures_maps_stale
+AFTER UPDATE OF ofl_json ON ofl_fixtures
+BEGIN
+  DELETE FROM ofl_channel_maps WHERE fixture_id = NEW.id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_ofl_fixtures_maps_delete
+AFTER DELETE ON ofl_fixtures
+BEGIN
+  DELETE FROM ofl_channel_maps WHERE fixture_id = OLD.id;
+END;
+
+INSERT OR IGNORE INTO schema_migrations (id, applied_at_ms) VALUES ('0006_ofl_channel_maps.sql', strftime('%s','now')*1000);
+
+COMMIT;
+PRAGMA foreign_keys=ON;
@@ -0,0 +1,48 @@
+-- Migration: 0007_fixture_groups.sql
+-- Adds fixture groups that follow an ordered list of tags (multi-tag routing)
+PRAGMA foreign_keys=OFF;
+BEGIN TRANSACTION;
+
+CREATE TABLE IF NOT EXISTS fixture_groups (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  name TEXT NOT NULL,
+  enabled INTEGER NOT NULL DEFAULT 1,
+  predict_ms INTEGER NOT NULL DEFAULT 0,
+  created_at_ms INTEGER NOT NULL,
+  updated_at_ms INTEGER NOT NULL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_fixture_groups_name ON fixture_groups(name);
+
+-- tags in fallback order: lowest priority value is followed first
+CREATE TABLE IF NOT EXISTS fixture_group_tags (
+  group_id INTEGER NOT NULL REFERENCES fixture_groups(id) ON DELETE CASCADE,
+  tag_mac TEXT NOT NULL,
+  priority INTEGER NOT NULL DEFAULT 0,
+  PRIMARY KEY(group_id, tag_mac)
+);
+
+-- kind: 'fixture' (fixtures.id) or 'patch' (patched_fixtures.id); a fixture is in at most one group
+CREATE TABLE IF NOT EXISTS fixture_group_members (
+  group_id INTEGER NOT NULL REFERENCES fixture_groups(id) ON DELETE CASCADE,
+  kind TEXT NOT NULL,
+  ref_id INTEGER NOT NULL,
+  PRIMARY KEY(kind, ref_id)
+);
+CREATE INDEX IF NOT EXISTS idx_fixture_group_members_group ON fixture_group_members(group_id);
+
+CREATE TRIGGER IF NOT EXISTS trg_fixture_group_members_fixture_delete
+AFTER DELETE ON fixtures
+BEGIN
+  DELETE FROM fixture_group_members WHERE kind = 'fixture' AND ref_id = OLD.id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_fixture_group_members_patch_delete
+AFTER DELETE ON patched_fixtures
+BEGIN
+  DELETE FROM fixture_group_members WHERE kind = 'patch' AND ref_id = OLD.id;
+END;
+
+INSERT OR IGNORE INTO schema_migrations (id, applied_at_ms) VALUES ('0007_fixture_groups.sql', strftime('%s','now')*1000);
+
+COMMIT;
+PRAGMA foreign_keys=ON;
@@ -0,0 +1,22 @@
+-- Migration: 0008_device_view_index.sql
+-- Covering index for per-key device setting lookups (anchor_index, cfg_hash, ...)
+-- and the offsets table that was only created lazily so far, so the bulk
+-- anchor/device view queries can join it unconditionally
+PRAGMA foreign_keys=OFF;
+BEGIN TRANSACTION;
+
+CREATE INDEX IF NOT EXISTS idx_device_settings_key_mac ON device_settings(key, mac, value);
+
+CREATE TABLE IF NOT EXISTS anchor_position_offsets (
+  mac TEXT PRIMARY KEY,
+  dx_cm REAL,
+  dy_cm REAL,
+  dz_cm REAL,
+  updated_at_ms INTEGER,
+  tag_mac TEXT
+);
+
+INSERT OR IGNORE INTO schema_migrations (id, applied_at_ms) VALUES ('0008_device_view_index.sql', strftime('%s','now')*1000);
+
+COMMIT;
+PRAGMA foreign_keys=ON;
@@ -0,0 +1,54 @@
+-- Migration: 0009_ofl_search.sql
+-- Search projection for the OFL library: categories, mode names and a mode
+-- summary are precomputed at import, and an FTS5 index over manufacturer,
+-- model, categories and mode names is kept in sync by triggers
+PRAGMA foreign_keys=OFF;
+BEGIN TRANSACTION;
+
+ALTER TABLE ofl_fixtures ADD COLUMN categories TEXT NOT NULL DEFAULT '';
+ALTER TABLE ofl_fixtures ADD COLUMN mode_names TEXT NOT NULL DEFAULT '';
+-- [{"name": ..., "channels": <count>}, ...]
+ALTER TABLE ofl_fixtures ADD COLUMN modes_json TEXT NOT NULL DEFAULT '[]';
+
+UPDATE ofl_fixtures SET
+  categories = COALESCE((SELECT group_concat(c.value, ', ') FROM json_each(ofl_fixtures.ofl_json, '$.categories') c), ''),
+  mode_names = COALESCE((SELECT group_concat(COALESCE(json_extract(m.value, '$.name'), json_extract(m.value, '$.modeName'), 'unnamed'), ', ')
+                         FROM json_each(ofl_fixtures.ofl_json, '$.modes') m WHERE m.type = 'object'), ''),
+  modes_json = COALESCE((SELECT json_group_array(json_object(
+                           'name', COALESCE(json_extract(m.value, '$.name'), json_extract(m.value, '$.modeName'), 'unnamed'),
+                           'channels', COALESCE(json_array_length(m.value, '$.channels'), 0)))
+                         FROM json_each(ofl_fixtures.ofl_json, '$.modes') m WHERE m.type = 'object'), '[]')
+WHERE json_valid(ofl_json) AND json_type(ofl_json) = 'object';
+
+CREATE VIRTUAL TABLE IF NOT EXISTS ofl_fixtures_fts USING fts5(
+  manufacturer, model, categories, mode_names,
+  content='ofl_fixtures', content_rowid='id',
+  tokenize='unicode61 remove_diacritics 2'
+);
+
+CREATE TRIGGER IF NOT EXISTS trg_ofl_fixtures_fts_insert AFTER INSERT ON ofl_fixtures
+BEGIN
+  INSERT INTO ofl_fixtures_fts(rowid, manufacturer, model, categories, mode_names)
+  VALUES (NEW.id, NEW.manufacturer, NEW.model, NEW.categories, NEW.mode_names);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_ofl_fixtures_fts_delete AFTER DELETE ON ofl_fixtures
+BEGIN
+  INSERT INTO ofl_fixtures_fts(ofl_fixtures_fts, rowid, manufacturer, model, categories, mode_names)
+  VALUES ('delete', OLD.id, OLD.manufacturer, OLD.model, OLD.categories, OLD.mode_names);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_ofl_fixtures_fts_update AFTER UPDATE OF manufacturer, model, categories, mode_names ON ofl_fixtures
+BEGIN
+  INSERT INTO ofl_fixtures_fts(ofl_fixtures_fts, rowid, manufacturer, model, categories, mode_names)
+  VALUES ('delete', OLD.id, OLD.manufacturer, OLD.model, OLD.categories, OLD.mode_names);
+  INSERT INTO ofl_fixtures_fts(rowid, manufacturer, model, categories, mode_names)
+  VALUES (NEW.id, NEW.manufacturer, NEW.model, NEW.categories, NEW.mode_names);
+END;
+
+INSERT INTO ofl_fixtures_fts(ofl_fixtures_fts) VALUES ('rebuild');
+
+INSERT OR IGNORE INTO schema_migrations (id, applied_at_ms) VALUES ('0009_ofl_search.sql', strftime('%s','now')*1000);
+
+COMMIT;
+PRAGMA foreign_keys=ON;
@@ -0,0 +1,86 @@
+-- Migration: 0010_calibration_points.sql
+-- Venue calibration points as rows instead of JSON inside calibration_runs:
+-- one calibration_points row per venue_point run plus its per-anchor range
+-- statistics, backfilled from params_json/summary_json. The run JSON stays
+-- as the archived record.
+PRAGMA foreign_keys=OFF;
+BEGIN TRANSACTION;
+
+CREATE TABLE IF NOT EXISTS calibration_points (
+  run_id INTEGER PRIMARY KEY,
+  tag_mac TEXT NOT NULL,
+  session_id TEXT,
+  point_id TEXT NOT NULL,
+  x_cm REAL,
+  y_cm REAL,
+  z_cm REAL,
+  grid_cm INTEGER,
+  label TEXT,
+  started_at_ms INTEGER,
+  ended_at_ms INTEGER,
+  result TEXT,
+  samples INTEGER
+);
+
+CREATE INDEX IF NOT EXISTS idx_calibration_points_tag_session_point ON calibration_points(tag_mac, session_id, point_id);
+CREATE INDEX IF NOT EXISTS idx_calibration_points_tag_started ON calibration_points(tag_mac, started_at_ms);
+
+CREATE TABLE IF NOT EXISTS calibration_point_anchor_stats (
+  run_id INTEGER NOT NULL,
+  anchor_mac TEXT NOT NULL,
+  median_d_m REAL,
+  mean_d_m REAL,
+  mad_d_m REAL,
+  std_d_m REAL,
+  min_d_m REAL,
+  max_d_m REAL,
+  count INTEGER,
+  PRIMARY KEY (run_id, anchor_mac)
+) WITHOUT ROWID;
+
+CREATE INDEX IF NOT EXISTS idx_calibration_runs_status_id ON calibration_runs(status, id);
+CREATE INDEX IF NOT EXISTS idx_calibration_runs_tag_id ON calibration_runs(tag_mac, id);
+
+INSERT OR IGNORE INTO calibration_points
+  (run_id, tag_mac, session_id, point_id, x_cm, y_cm, z_cm, grid_cm, label, started_at_ms, ended_at_ms, result, samples)
+SELECT
+  id, tag_mac,
+  json_extract(params_json, '$.session_id'),
+  json_extract(params_json, '$.point_id'),
+  json_extract(params_json, '$.position_cm.x'),
+  json_extract(params_json, '$.position_cm.y'),
+  json_extract(params_json, '$.position_cm.z'),
+  json_extract(params_json, '$.grid_cm'),
+  json_extract(params_json, '$.label'),
+  started_at_ms, ended_at_ms, result,
+  CASE WHEN json_valid(summary_json) THEN json_extract(summary_json, '$.samples') END
+FROM calibration_runs
+WHERE tag_mac IS NOT NULL
+  AND json_valid(params_json)
+  AND json_extract(params_json, '$.type') = 'venue_point'
+  AND json_extract(params_json, '$.point_id') IS NOT NULL
+  AND json_type(params_json, '$.position_cm') = 'object';
+
+INSERT OR IGNORE INTO calibration_point_anchor_stats
+  (run_id, anchor_mac, median_d_m, mean_d_m, mad_d_m, std_d_m, min_d_m, max_d_m, count)
+SELECT
+  r.id, a.key,
+  json_extract(a.value, '$.median_d_m'),
+  json_extract(a.value, '$.mean_d_m'),
+  json_extract(a.value, '$.mad_d_m'),
+  json_extract(a.value, '$.std_d_m'),
+  json_extract(a.value, '$.min_d_m'),
+  json_extract(a.value, '$.max_d_m'),
+  json_extract(a.value, '$.count')
+FROM calibration_runs r
+JOIN calibration_points p ON p.run_id = r.id
+JOIN json_each(
+  CASE WHEN json_valid(r.summary_json) THEN
+    CASE WHEN json_type(r.summary_json, '$.per_anchor') = 'object' THEN r.summary_json END
+  END, '$.per_anchor') a
+WHERE a.type = 'object';
+
+INSERT OR IGNORE INTO schema_migrations (id, applied_at_ms) VALUES ('0010_calibration_points.sql', strftime('%s','now')*1000);
+
+COMMIT;
+PRAGMA foreign_keys=ON;
@@ -0,0 +1,34 @@
+-- Migration: 0011_event_log_retention.sql
+-- event_log gets a repeat counter for deduplicated events (see
+-- app.db.event_sink) and indexes for time-range, retention and
+-- source/type queries. The table is rebuilt so the migration also works
+-- when the event sink already added the columns on an older schema.
+PRAGMA foreign_keys=OFF;
+BEGIN TRANSACTION;
+
+CREATE TABLE event_log_new (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  ts_ms INTEGER,
+  level TEXT,
+  source TEXT,
+  event_type TEXT,
+  ref TEXT,
+  details_json TEXT,
+  repeat_count INTEGER NOT NULL DEFAULT 1,
+  last_ts_ms INTEGER
+);
+
+INSERT INTO event_log_new (id, ts_ms, level, source, event_type, ref, details_json, last_ts_ms)
+  SELECT id, ts_ms, level, source, event_type, ref, details_json, ts_ms FROM event_log;
+
+DROP TABLE event_log;
+ALTER TABLE event_log_new RENAME TO event_log;
+
+CREATE INDEX IF NOT EXISTS idx_event_log_ts ON event_log(ts_ms);
+CREATE INDEX IF NOT EXISTS idx_event_log_source_type ON event_log(source, event_type, id);
+CREATE INDEX IF NOT EXISTS idx_event_log_level ON event_log(level, id);
+
+INSERT OR IGNORE INTO schema_migrations (id, applied_at_ms) VALUES ('0011_event_log_retention.sql', strftime('%s','now')*1000);
+
+COMMIT;
+PRAGMA foreign_keys=ON;
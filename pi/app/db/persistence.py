@@ -3,10 +3,54 @@ import threading
 from typing import Any, Dict, List, Optional
 
 from . import connect_db
+from ..metrics import DB_QUERY_SECONDS, instrument_methods
+from .event_sink import get_event_sink
+from .versions import bump, bump_tables
 
 _lock = threading.Lock()
 _singleton = None
 
+# SQL expression matching the Python-side MAC normalization for stored formats
+_NORM_MAC = "UPPER(REPLACE(REPLACE(COALESCE({0}, ''), ':', ''), '-', ''))"
+
+
+def _ofl_summary(ofl_json: str):
+    """(categories, mode_names, modes_json) stored next to ``ofl_json`` for search/listing."""
+    try:
+        obj = json.loads(ofl_json)
+    except Exception:
+        obj = None
+    if not isinstance(obj, dict):
+        return "", "", "[]"
+    categories = [str(c) for c in (obj.get("categories") or []) if c is not None]
+    modes = []
+    for m in obj.get("modes") or []:
+        if isinstance(m, dict):
+            modes.append({"name": m.get("name") or m.get("modeName") or "unnamed", "channels": len(m.get("channels") or [])})
+    return ", ".join(categories), ", ".join(m["name"] for m in modes), json.dumps(modes, separators=(",", ":"))
+
+
+def _ofl_projection(row) -> Dict[str, Any]:
+    try:
+        modes = json.loads(row["modes_json"] or "[]")
+    except Exception:
+        modes = []
+    return {
+        "id": row["id"],
+        "manufacturer": row["manufacturer"],
+        "model": row["model"],
+        "categories": [c for c in (row["categories"] or "").split(", ") if c],
+        "modes": modes,
+    }
+
+
+def _fts_query(q: Optional[str]) -> Optional[str]:
+    # every word must match as a prefix; quoting keeps FTS syntax characters literal
+    terms = [t for t in (q or "").split() if t.strip('"')]
+    if not terms:
+        return None
+    return " ".join('"' + t.replace('"', '""') + '"*' for t in terms)
+
 
 class Persistence:
     def __init__(self):
@@ -142,6 +186,7 @@ class Persistence:
                 (profile_key, profile_json),
             )
             db.commit()
+            bump_tables("fixture_profiles")
         finally:
             db.close()
 
@@ -150,18 +195,24 @@ class Persistence:
         db = connect_db()
         try:
             ts = int(__import__("time").time() * 1000)
+            categories, mode_names, modes_json = _ofl_summary(ofl_json)
             cur = db.execute(
-                """INSERT INTO ofl_fixtures(manufacturer, model, ofl_schema, ofl_json, content_hash, created_at_ms, updated_at_ms)
-                   VALUES(?,?,?,?,?,?,?)
+                """INSERT INTO ofl_fixtures(manufacturer, model, ofl_schema, ofl_json, content_hash, created_at_ms, updated_at_ms,
+                                            categories, mode_names, modes_json)
+                   VALUES(?,?,?,?,?,?,?,?,?,?)
                    ON CONFLICT(content_hash) DO UPDATE SET
                      manufacturer=excluded.manufacturer,
                      model=excluded.model,
                      ofl_schema=excluded.ofl_schema,
                      ofl_json=excluded.ofl_json,
-                     updated_at_ms=excluded.updated_at_ms""",
-                (manufacturer, model, ofl_schema, ofl_json, content_hash, ts, ts),
+                     updated_at_ms=excluded.updated_at_ms,
+                     categories=excluded.categories,
+                     mode_names=excluded.mode_names,
+                     modes_json=excluded.modes_json""",
+                (manufacturer, model, ofl_schema, ofl_json, content_hash, ts, ts, categories, mode_names, modes_json),
             )
             db.commit()
+            bump_tables("ofl_fixtures")
             if cur.lastrowid:
                 return cur.lastrowid
             row = db.execute("SELECT id FROM ofl_fixtures WHERE content_hash=?", (content_hash,)).fetchone()
@@ -185,18 +236,89 @@ class Persistence:
         finally:
             db.close()
 
-    def search_ofl_fixtures(self, q: str = None):
+    def search_ofl_fixture_page(self, q: Optional[str] = None, after: Optional[int] = None, limit: int = 100) -> Dict[str, Any]:
+        """One page of library search results without ``ofl_json``.
+
+        Ordered by (manufacturer, model, id); ``after`` is the id of the last row
+        of the previous page (keyset pagination), ``next`` the cursor for the
+        following page or None. ``q`` matches word prefixes in manufacturer,
+        model, categories and mode names.
+        """
+        db = connect_db()
+        try:
+            where = []
+            params: List[Any] = []
+            if after is not None:
+                last = db.execute("SELECT manufacturer, model FROM ofl_fixtures WHERE id=?", (after,)).fetchone()
+                if last:
+                    where.append("(f.manufacturer, f.model, f.id) > (?, ?, ?)")
+                    params += [last["manufacturer"], last["model"], after]
+            match = _fts_query(q)
+            if match:
+                where.append("f.id IN (SELECT rowid FROM ofl_fixtures_fts WHERE ofl_fixtures_fts MATCH ?)")
+                params.append(match)
+            sql = ("SELECT f.id, f.manufacturer, f.model, f.categories, f.modes_json FROM ofl_fixtures f"
+                   + (" WHERE " + " AND ".join(where) if where else "")
+                   + " ORDER BY f.manufacturer, f.model, f.id LIMIT ?")
+            rows = db.execute(sql, params + [limit + 1]).fetchall()
+            items = [_ofl_projection(r) for r in rows[:limit]]
+            return {"fixtures": items, "next": items[-1]["id"] if len(rows) > limit else None}
+        finally:
+            db.close()
+
+    def get_ofl_fixture_summaries(self, ids: Optional[List[int]] = None) -> Dict[int, Dict[str, Any]]:
+        """id -> projection (names, categories, modes) for ``ids`` (all when None)."""
         db = connect_db()
         try:
-            if q:
-                ql = f"%{q.lower()}%"
-                rows = db.execute(
-                    "SELECT id, manufacturer, model, ofl_schema, ofl_json, content_hash, created_at_ms, updated_at_ms FROM ofl_fixtures WHERE lower(manufacturer) LIKE ? OR lower(model) LIKE ? ORDER BY manufacturer, model",
-                    (ql, ql),
-                ).fetchall()
+            if ids is None:
+                rows = db.execute("SELECT id, manufacturer, model, categories, modes_json FROM ofl_fixtures").fetchall()
             else:
-                rows = db.execute("SELECT id, manufacturer, model, ofl_schema, ofl_json, content_hash, created_at_ms, updated_at_ms FROM ofl_fixtures ORDER BY manufacturer, model").fetchall()
-            return [dict(r) for r in rows]
+                ids = list(ids)
+                if not ids:
+                    return {}
+                marks = ",".join("?" for _ in ids)
+                rows = db.execute(f"SELECT id, manufacturer, model, categories, modes_json FROM ofl_fixtures WHERE id IN ({marks})", ids).fetchall()
+            return {r["id"]: _ofl_projection(r) for r in rows}
+        finally:
+            db.close()
+
+    # OFL compiled channel maps
+    def replace_ofl_channel_maps(self, fixture_id: int, maps: Dict[str, Dict[str, Any]]) -> None:
+        db = connect_db()
+        try:
+            ts = int(__import__("time").time() * 1000)
+            db.execute("DELETE FROM ofl_channel_maps WHERE fixture_id=?", (fixture_id,))
+            db.executemany(
+                "INSERT INTO ofl_channel_maps(fixture_id, mode_name, channel_count, map_json, compiled_at_ms) VALUES(?,?,?,?,?)",
+                [
+                    (fixture_id, mode_name, int(m.get("channel_count") or 0), json.dumps(m, separators=(",", ":")), ts)
+                    for mode_name, m in maps.items()
+                ],
+            )
+            db.commit()
+        finally:
+            db.close()
+
+    def get_ofl_channel_map(self, fixture_id: int, mode_name: str) -> Optional[Dict[str, Any]]:
+        db = connect_db()
+        try:
+            row = db.execute(
+                "SELECT map_json FROM ofl_channel_maps WHERE fixture_id=? AND mode_name=?",
+                (fixture_id, mode_name),
+            ).fetchone()
+            return json.loads(row["map_json"]) if row else None
+        finally:
+            db.close()
+
+    def list_ofl_channel_maps(self) -> Dict[tuple, Dict[str, Any]]:
+        """Compiled maps for every patched (fixture, mode); keyed by (fixture_id, mode_name)."""
+        db = connect_db()
+        try:
+            rows = db.execute(
+                "SELECT m.fixture_id, m.mode_name, m.map_json FROM ofl_channel_maps m "
+                "WHERE EXISTS (SELECT 1 FROM patched_fixtures p WHERE p.fixture_id=m.fixture_id AND p.mode_name=m.mode_name)"
+            ).fetchall()
+            return {(r["fixture_id"], r["mode_name"]): json.loads(r["map_json"]) for r in rows}
         finally:
             db.close()
 
@@ -211,6 +333,7 @@ class Persistence:
                 (fixture_id, name, mode_name, universe, dmx_address, overrides_json, ts, ts),
             )
             db.commit()
+            bump_tables("patched_fixtures")
             return cur.lastrowid
         finally:
             db.close()
@@ -231,6 +354,80 @@ class Persistence:
         finally:
             db.close()
 
+    # Fixture groups (multi-tag routing)
+    def list_fixture_groups(self) -> List[Dict[str, Any]]:
+        db = connect_db()
+        try:
+            groups = [dict(r) for r in db.execute(
+                "SELECT id, name, enabled, predict_ms, created_at_ms, updated_at_ms FROM fixture_groups ORDER BY id"
+            ).fetchall()]
+            by_id = {g["id"]: g for g in groups}
+            for g in groups:
+                g["tags"] = []
+                g["members"] = []
+            for r in db.execute("SELECT group_id, tag_mac, priority FROM fixture_group_tags ORDER BY group_id, priority, tag_mac").fetchall():
+                g = by_id.get(r["group_id"])
+                if g is not None:
+                    g["tags"].append({"tag_mac": r["tag_mac"], "priority": r["priority"]})
+            for r in db.execute("SELECT group_id, kind, ref_id FROM fixture_group_members ORDER BY group_id, kind, ref_id").fetchall():
+                g = by_id.get(r["group_id"])
+                if g is not None:
+                    g["members"].append({"kind": r["kind"], "ref_id": r["ref_id"]})
+            return groups
+        finally:
+            db.close()
+
+    def get_fixture_group(self, gid: int) -> Optional[Dict[str, Any]]:
+        return next((g for g in self.list_fixture_groups() if g["id"] == gid), None)
+
+    def save_fixture_group(self, gid: Optional[int], data: Dict[str, Any]) -> Optional[int]:
+        """Create (gid=None) or replace a group including its tag list and members."""
+        db = connect_db()
+        try:
+            ts = int(__import__("time").time() * 1000)
+            if gid is None:
+                cur = db.execute(
+                    "INSERT INTO fixture_groups(name, enabled, predict_ms, created_at_ms, updated_at_ms) VALUES(?,?,?,?,?)",
+                    (data.get("name"), int(data.get("enabled", 1)), int(data.get("predict_ms", 0)), ts, ts),
+                )
+                gid = cur.lastrowid
+            else:
+                cur = db.execute(
+                    "UPDATE fixture_groups SET name=?, enabled=?, predict_ms=?, updated_at_ms=? WHERE id=?",
+                    (data.get("name"), int(data.get("enabled", 1)), int(data.get("predict_ms", 0)), ts, gid),
+                )
+                if cur.rowcount == 0:
+                    db.rollback()
+                    return None
+                db.execute("DELETE FROM fixture_group_tags WHERE group_id=?", (gid,))
+                db.execute("DELETE FROM fixture_group_members WHERE group_id=?", (gid,))
+            db.executemany(
+                "INSERT OR REPLACE INTO fixture_group_tags(group_id, tag_mac, priority) VALUES(?,?,?)",
+                [(gid, t["tag_mac"], int(t.get("priority", i))) for i, t in enumerate(data.get("tags") or [])],
+            )
+            # moving a fixture into this group removes it from any other group
+            db.executemany(
+                "INSERT OR REPLACE INTO fixture_group_members(group_id, kind, ref_id) VALUES(?,?,?)",
+                [(gid, m["kind"], int(m["ref_id"])) for m in data.get("members") or []],
+            )
+            db.commit()
+            bump_tables("fixture_groups")
+            return gid
+        finally:
+            db.close()
+
+    def delete_fixture_group(self, gid: int) -> bool:
+        db = connect_db()
+        try:
+            db.execute("DELETE FROM fixture_group_tags WHERE group_id=?", (gid,))
+            db.execute("DELETE FROM fixture_group_members WHERE group_id=?", (gid,))
+            cur = db.execute("DELETE FROM fixture_groups WHERE id=?", (gid,))
+            db.commit()
+            bump_tables("fixture_groups")
+            return cur.rowcount > 0
+        finally:
+            db.close()
+
     # Fixtures
     def list_fixtures(self) -> List[Dict[str, Any]]:
         db = connect_db()
@@ -278,6 +475,7 @@ class Persistence:
                 ),
             )
             db.commit()
+            bump_tables("fixtures")
             return cur.lastrowid
         finally:
             db.close()
@@ -313,6 +511,7 @@ class Persistence:
             sql = f"UPDATE fixtures SET {', '.join(set_parts)}, updated_at_ms=? WHERE id=?"
             cur = db.execute(sql, values)
             db.commit()
+            bump_tables("fixtures")
             return cur.rowcount > 0
         finally:
             db.close()
@@ -322,6 +521,7 @@ class Persistence:
         try:
             cur = db.execute("DELETE FROM fixtures WHERE id=?", (fid,))
             db.commit()
+            bump_tables("fixtures")
             return cur.rowcount > 0
         finally:
             db.close()
@@ -343,6 +543,7 @@ class Persistence:
                 "status": data.get("status"),
                 "notes": data.get("notes"),
             }
+            prev = db.execute("SELECT alias, role FROM devices WHERE mac=?", (fields["mac"],)).fetchone()
             db.execute(
                 """INSERT INTO devices(mac, role, alias, name, ip_last, fw, first_seen_at_ms, last_seen_at_ms, status, notes)
                    VALUES(:mac, :role, :alias, :name, :ip_last, :fw, :first_seen_at_ms, :last_seen_at_ms, :status, :notes)
@@ -358,6 +559,12 @@ class Persistence:
                 , fields
             )
             db.commit()
+            bump_tables("devices")
+            # heartbeats only move last_seen/ip/status; the anchor view reads alias and role
+            before = (prev["alias"], prev["role"]) if prev else (None, None)
+            after = tuple(fields[k] if fields[k] is not None else before[i] for i, k in enumerate(("alias", "role")))
+            if after != before:
+                bump("anchors")
         finally:
             db.close()
 
@@ -413,6 +620,7 @@ class Persistence:
                 (mac, key, value, ts),
             )
             db.commit()
+            bump_tables("device_settings")
         finally:
             db.close()
 
@@ -427,27 +635,103 @@ class Persistence:
         finally:
             db.close()
 
+    def list_device_view(self, keys: tuple = ("anchor_index",)) -> List[Dict[str, Any]]:
+        """All devices with the requested device settings in ``settings`` (one query)."""
+        db = connect_db()
+        try:
+            marks = ",".join("?" for _ in keys) or "NULL"
+            rows = db.execute(
+                "SELECT d.mac, d.role, d.alias, d.name, d.ip_last, d.fw, d.first_seen_at_ms, d.last_seen_at_ms, "
+                "d.status, d.notes, s.key AS s_key, s.value AS s_value "
+                f"FROM devices d LEFT JOIN device_settings s ON s.key IN ({marks}) AND s.mac = d.mac "
+                "ORDER BY d.rowid",
+                tuple(keys),
+            ).fetchall()
+            out: Dict[str, Dict[str, Any]] = {}
+            for r in rows:
+                dev = out.get(r["mac"])
+                if dev is None:
+                    dev = {k: r[k] for k in r.keys() if k not in ("s_key", "s_value")}
+                    dev["settings"] = {}
+                    out[r["mac"]] = dev
+                if r["s_key"] is not None:
+                    dev["settings"][r["s_key"]] = r["s_value"]
+            return list(out.values())
+        finally:
+            db.close()
+
+    def list_anchor_view(self) -> List[Dict[str, Any]]:
+        """Anchor positions joined with alias, anchor_index and offset (one query).
+
+        Legacy ``anchors`` rows with a position but no ``anchor_positions`` row
+        are included after the others.
+
+        MACs are matched in normalized form (upper case, no ``:``/``-``) because
+        devices, anchors and anchor_positions do not always store the same format.
+        """
+        db = connect_db()
+        try:
+            rows = db.execute(
+                f"""WITH dev AS (
+                      SELECT {_NORM_MAC.format('d.mac')} AS nmac,
+                             MAX(NULLIF(d.alias, '')) AS alias,
+                             MAX(s.value) AS anchor_index
+                      FROM devices d
+                      LEFT JOIN device_settings s ON s.key = 'anchor_index' AND s.mac = {_NORM_MAC.format('d.mac')}
+                      GROUP BY nmac
+                    ), legacy AS (
+                      SELECT {_NORM_MAC.format('mac')} AS nmac, MAX(NULLIF(alias, '')) AS alias
+                      FROM anchors GROUP BY nmac
+                    ), pos AS (
+                      SELECT mac, x_cm, y_cm, z_cm, updated_at_ms, 0 AS src, rowid AS ord FROM anchor_positions
+                      UNION ALL
+                      SELECT a.mac, a.pos_x_cm, a.pos_y_cm, a.pos_z_cm, a.last_seen_at_ms, 1, a.rowid
+                      FROM anchors a
+                      WHERE a.pos_x_cm IS NOT NULL AND a.pos_y_cm IS NOT NULL AND a.pos_z_cm IS NOT NULL
+                        AND NOT EXISTS (SELECT 1 FROM anchor_positions ap
+                                        WHERE {_NORM_MAC.format('ap.mac')} = {_NORM_MAC.format('a.mac')})
+                    )
+                    SELECT pos.mac, pos.x_cm, pos.y_cm, pos.z_cm, pos.updated_at_ms,
+                           COALESCE(dev.alias, legacy.alias) AS alias, dev.anchor_index,
+                           o.dx_cm, o.dy_cm, o.dz_cm
+                    FROM pos
+                    LEFT JOIN dev ON dev.nmac = {_NORM_MAC.format('pos.mac')}
+                    LEFT JOIN legacy ON legacy.nmac = {_NORM_MAC.format('pos.mac')}
+                    LEFT JOIN anchor_position_offsets o ON o.mac = pos.mac
+                    ORDER BY pos.src, pos.ord"""
+            ).fetchall()
+            return [dict(r) for r in rows]
+        finally:
+            db.close()
+
+    def list_anchor_macs(self) -> set:
+        """Normalized MACs of everything that is an anchor: ANCHOR devices, positions, legacy anchors."""
+        db = connect_db()
+        try:
+            rows = db.execute(
+                f"""SELECT {_NORM_MAC.format('mac')} AS nmac FROM devices WHERE UPPER(COALESCE(role, '')) = 'ANCHOR'
+                    UNION SELECT {_NORM_MAC.format('mac')} FROM anchor_positions
+                    UNION SELECT {_NORM_MAC.format('mac')} FROM anchors"""
+            ).fetchall()
+            return {r["nmac"] for r in rows if r["nmac"]}
+        finally:
+            db.close()
+
     def delete_device(self, mac: str) -> bool:
         db = connect_db()
         try:
             cur = db.execute("DELETE FROM devices WHERE mac=?", (mac,))
             db.commit()
+            bump_tables("devices")
+            bump("anchors")
             return cur.rowcount > 0
         finally:
             db.close()
 
     # Event log
     def append_event(self, level: str, source: str, event_type: str, ref: str = None, details_json: str = None):
-        db = connect_db()
-        try:
-            ts = int(__import__("time").time() * 1000)
-            db.execute(
-                "INSERT INTO event_log(ts_ms, level, source, event_type, ref, details_json) VALUES(?,?,?,?,?,?)",
-                (ts, level, source, event_type, ref, details_json),
-            )
-            db.commit()
-        finally:
-            db.close()
+        """Queue an event; it is written with the next group commit of the event sink."""
+        get_event_sink().emit(level, source, event_type, ref=ref, details_json=details_json)
 
     def upsert_setting(self, key: str, value: str):
         db = connect_db()
@@ -458,6 +742,7 @@ class Persistence:
                 (key, value, ts),
             )
             db.commit()
+            bump_tables("settings")
         finally:
             db.close()
 
@@ -469,14 +754,42 @@ class Persistence:
         finally:
             db.close()
 
-    def list_events(self, limit: int = 200) -> List[Dict[str, Any]]:
+    def list_events(self, limit: int = 200, **filters) -> List[Dict[str, Any]]:
+        return self.list_events_page(limit=limit, **filters)["events"]
+
+    def list_events_page(self, limit: int = 200, level: Optional[str] = None, source: Optional[str] = None,
+                         event_type: Optional[str] = None, ref: Optional[str] = None, since_ms: Optional[int] = None,
+                         until_ms: Optional[int] = None, before: Optional[int] = None) -> Dict[str, Any]:
+        """Newest events first, filtered; ``before`` is the id of the last row of
+        the previous page (keyset pagination), ``next`` the cursor for the
+        following page or None. ``level`` accepts a comma separated list."""
         db = connect_db()
         try:
-            rows = db.execute(
-                "SELECT id, ts_ms, level, source, event_type, ref, details_json FROM event_log ORDER BY id DESC LIMIT ?",
-                (limit,),
-            ).fetchall()
-            return [dict(r) for r in rows]
+            where = []
+            params: List[Any] = []
+            if level:
+                levels = [lv.strip().upper() for lv in level.split(",") if lv.strip()]
+                where.append("level IN (%s)" % ",".join("?" * len(levels)))
+                params += levels
+            for col, val in (("source", source), ("event_type", event_type), ("ref", ref)):
+                if val is not None:
+                    where.append(f"{col}=?")
+                    params.append(val)
+            if since_ms is not None:
+                where.append("COALESCE(last_ts_ms, ts_ms) >= ?")
+                params.append(since_ms)
+            if until_ms is not None:
+                where.append("ts_ms <= ?")
+                params.append(until_ms)
+            if before is not None:
+                where.append("id < ?")
+                params.append(before)
+            sql = ("SELECT id, ts_ms, level, source, event_type, ref, details_json, repeat_count, last_ts_ms FROM event_log"
+                   + (" WHERE " + " AND ".join(where) if where else "")
+                   + " ORDER BY id DESC LIMIT ?")
+            rows = db.execute(sql, params + [limit + 1]).fetchall()
+            items = [dict(r) for r in rows[:limit]]
+            return {"events": items, "next": items[-1]["id"] if len(rows) > limit else None}
         finally:
             db.close()
 
@@ -489,6 +802,10 @@ class Persistence:
             db.close()
 
 
+# per-method SQLite timing for /metrics
+instrument_methods(Persistence, DB_QUERY_SECONDS)
+
+
 def get_persistence() -> Persistence:
     global _singleton
     if _singleton:
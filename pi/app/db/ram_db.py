@@ -0,0 +1,257 @@
+"""RAM-resident database with durable snapshots (``LT_DB_RAM=1``).
+
+The live database is a copy of ``LT_DB_PATH`` on tmpfs (``LT_DB_RAM_DIR``,
+default ``/dev/shm``); every connection from ``connect_db`` and the
+migrations at startup use that copy, so shows never wait on the SD card.
+The copy is written back with the SQLite online backup API:
+
+- every ``LT_DB_CHECKPOINT_S`` seconds (default 60) if the live files changed,
+- when ``system.state`` changes to LIVE (``StateManager.set_state`` only
+  signals the snapshot thread, so the transition never waits on the SD card),
+- on shutdown.
+
+Crash safety: a checkpoint writes a complete snapshot to ``<db>.snapshot``,
+fsyncs it, renames it over ``LT_DB_PATH`` and fsyncs the directory. The
+file on disk is therefore always either the previous or the new snapshot,
+never a mix, and it is self-contained (rollback journal, no ``-wal``).
+
+- Process crash / kill: the tmpfs copy survives; at the next start a copy
+  that passes ``PRAGMA quick_check`` and is newer than the disk file is used
+  and checkpointed immediately, so nothing is lost.
+- Power loss / reboot: tmpfs is gone; the last snapshot is loaded, so changes
+  since the last checkpoint (at most one interval, or since going LIVE) are
+  lost.
+"""
+import hashlib
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from typing import Any, Dict, Optional
+
+SNAPSHOT_SUFFIX = ".snapshot"
+
+
+def _sidecars(path: str):
+    return (path + "-wal", path + "-shm", path + "-journal")
+
+
+def _remove(*paths: str):
+    for p in paths:
+        try:
+            os.remove(p)
+        except FileNotFoundError:
+            pass
+
+
+def _fsync_dir(path: str):
+    try:
+        fd = os.open(os.path.dirname(path) or ".", os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def _mtime_ns(path: str) -> int:
+    try:
+        return os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return 0
+
+
+def _copy(src_path: str, dst_path: str):
+    """Online backup of ``src_path`` into a fresh rollback-journal file at ``dst_path``."""
+    _remove(dst_path, *_sidecars(dst_path))
+    src = sqlite3.connect(src_path)
+    try:
+        dst = sqlite3.connect(dst_path)
+        try:
+            src.backup(dst)
+            dst.execute("PRAGMA journal_mode=DELETE")
+        finally:
+            dst.close()
+    finally:
+        src.close()
+
+
+def _quick_check(path: str) -> bool:
+    try:
+        conn = sqlite3.connect(path)
+        try:
+            row = conn.execute("PRAGMA quick_check").fetchone()
+            return bool(row) and row[0] == "ok"
+        finally:
+            conn.close()
+    except sqlite3.Error:
+        return False
+
+
+class RamDatabase:
+    def __init__(self, disk_path: str, live_dir: Optional[str] = None, interval_s: float = 60.0):
+        self.disk_path = os.path.abspath(disk_path)
+        if live_dir is None:
+            live_dir = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+        tag = hashlib.sha1(self.disk_path.encode()).hexdigest()[:10]
+        self.live_path = os.path.join(live_dir, f"lighttracker-{tag}.db")
+        self.interval_s = interval_s
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._requested: Optional[str] = None
+        self._thread: Optional[threading.Thread] = None
+        self._last_sig = None
+        self.recovered = False
+        self.stats: Dict[str, Any] = {"checkpoints": 0, "skipped": 0, "errors": 0, "last_ms": None,
+                                      "last_reason": None, "last_duration_ms": None, "last_error": None}
+
+    def _signature(self):
+        return tuple(_mtime_ns(p) for p in (self.live_path, self.live_path + "-wal"))
+
+    def open(self) -> str:
+        """Prepare the live copy and return its path."""
+        os.makedirs(os.path.dirname(self.disk_path), exist_ok=True)
+        os.makedirs(os.path.dirname(self.live_path), exist_ok=True)
+        _remove(self.disk_path + SNAPSHOT_SUFFIX)
+        live_newest = max(self._signature())
+        if live_newest and live_newest > _mtime_ns(self.disk_path) and _quick_check(self.live_path):
+            # left behind by a crashed process: newer than the last snapshot
+            self.recovered = True
+            self.checkpoint("recovered", force=True)
+            return self.live_path
+        _remove(self.live_path, *_sidecars(self.live_path))
+        if os.path.exists(self.disk_path):
+            # fold a WAL left by a run without RAM mode into the file first
+            conn = sqlite3.connect(self.disk_path)
+            try:
+                conn.execute("PRAGMA journal_mode=DELETE")
+            finally:
+                conn.close()
+            _copy(self.disk_path, self.live_path)
+        self._last_sig = self._signature()
+        return self.live_path
+
+    def checkpoint(self, reason: str = "manual", force: bool = False) -> bool:
+        """Write the live database to disk; False when skipped (unchanged) or failed."""
+        with self._lock:
+            sig = self._signature()
+            if not force and sig == self._last_sig:
+                self.stats["skipped"] += 1
+                return False
+            t0 = time.monotonic()
+            tmp = self.disk_path + SNAPSHOT_SUFFIX
+            try:
+                _copy(self.live_path, tmp)
+                fd = os.open(tmp, os.O_RDONLY)
+                try:
+                    os.fsync(fd)
+                finally:
+                    os.close(fd)
+                _remove(*_sidecars(self.disk_path))
+                os.replace(tmp, self.disk_path)
+                _fsync_dir(self.disk_path)
+            except Exception as e:
+                _remove(tmp, *_sidecars(tmp))
+                self.stats["errors"] += 1
+                self.stats["last_error"] = f"{reason}: {e}"
+                return False
+            self._last_sig = sig
+            self.stats["checkpoints"] += 1
+            self.stats["last_ms"] = int(time.time() * 1000)
+            self.stats["last_reason"] = reason
+            self.stats["last_duration_ms"] = round((time.monotonic() - t0) * 1000, 1)
+            return True
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="lt-dbsnap", daemon=True)
+        self._thread.start()
+
+    def request_checkpoint(self, reason: str):
+        """Ask the snapshot thread for a checkpoint now; returns immediately."""
+        self._requested = reason
+        self._wake.set()
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.interval_s)
+            if self._stop.is_set():
+                return
+            self._wake.clear()
+            reason, self._requested = self._requested, None
+            self.checkpoint(reason or "interval")
+
+    def close(self):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(5.0)
+            self._thread = None
+        saved = self.checkpoint("shutdown") or self._signature() == self._last_sig
+        if saved:
+            # a clean shutdown leaves nothing to recover; the next start loads the snapshot
+            _remove(self.live_path, *_sidecars(self.live_path))
+        return saved
+
+    def status(self) -> Dict[str, Any]:
+        return {"disk_path": self.disk_path, "live_path": self.live_path, "interval_s": self.interval_s,
+                "recovered": self.recovered, **self.stats}
+
+
+_active: Optional[RamDatabase] = None
+
+
+def get_ram_database() -> Optional[RamDatabase]:
+    return _active
+
+
+def enable_from_env() -> Optional[RamDatabase]:
+    """Switch ``connect_db`` to a RAM copy when ``LT_DB_RAM`` is set; idempotent."""
+    global _active
+    if _active is not None:
+        return _active
+    if os.environ.get("LT_DB_RAM", "").strip().lower() not in ("1", "true", "yes", "on"):
+        return None
+    from . import get_db_path, set_live_db_path
+    rd = RamDatabase(get_db_path(), live_dir=os.environ.get("LT_DB_RAM_DIR") or None,
+                     interval_s=float(os.environ.get("LT_DB_CHECKPOINT_S", "60") or 60))
+    set_live_db_path(rd.open())
+    rd.start()
+    _active = rd
+    return rd
+
+
+def disable(checkpoint: bool = True):
+    """Stop snapshots (final checkpoint unless ``checkpoint`` is False) and use ``LT_DB_PATH`` again."""
+    global _active
+    rd, _active = _active, None
+    if rd is None:
+        return
+    if checkpoint:
+        rd.close()
+    else:
+        rd._stop.set()
+        rd._wake.set()
+    from . import set_live_db_path
+    set_live_db_path(None)
+
+
+def checkpoint(reason: str) -> bool:
+    rd = _active
+    return rd.checkpoint(reason) if rd is not None else False
+
+
+def request_checkpoint(reason: str) -> bool:
+    """Non-blocking variant of ``checkpoint`` for request handlers and the event loop."""
+    rd = _active
+    if rd is None:
+        return False
+    rd.request_checkpoint(reason)
+    return True
@@ -0,0 +1,51 @@
+"""In-process version counters per resource family.
+
+Write paths bump the families of the tables they touch; read routes use the
+versions as cache keys and ETags (see ``app.api.cache``). Versions only grow
+and restart with the process, so ETags also carry ``BOOT_ID``.
+"""
+import threading
+import time
+from typing import Dict, Tuple
+
+BOOT_ID = format(int(time.time() * 1000), "x")
+
+# table -> resource families whose responses read it
+TABLE_FAMILIES: Dict[str, Tuple[str, ...]] = {
+    "anchors": ("anchors",),
+    "anchor_positions": ("anchors",),
+    "anchor_position_offsets": ("anchors",),
+    # alias/role changes also bump "anchors" (see Persistence.upsert_device)
+    "devices": ("devices",),
+    "device_settings": ("devices", "anchors"),
+    "fixtures": ("fixtures",),
+    "fixture_profiles": ("fixtures",),
+    "fixture_groups": ("fixture_groups",),
+    "ofl_fixtures": ("ofl",),
+    "patched_fixtures": ("ofl",),
+    "settings": ("settings",),
+}
+
+_lock = threading.Lock()
+_versions: Dict[str, int] = {}
+
+
+def bump(*families: str) -> None:
+    with _lock:
+        for fam in families:
+            _versions[fam] = _versions.get(fam, 0) + 1
+
+
+def bump_tables(*tables: str) -> None:
+    families = set()
+    for table in tables:
+        families.update(TABLE_FAMILIES.get(table, ()))
+    bump(*families)
+
+
+def version(family: str) -> int:
+    return _versions.get(family, 0)
+
+
+def versions(*families: str) -> Tuple[int, ...]:
+    return tuple(_versions.get(f, 0) for f in families)
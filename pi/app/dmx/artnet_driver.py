@@ -47,3 +47,11 @@ class ArtnetDriver:
             self.sock.sendto(packet, (self.target_ip, self.port))
         except Exception:
             pass
+
+    def close(self):
+        try:
+            if self.sock:
+                self.sock.close()
+        except Exception:
+            pass
+        self.sock = None
@@ -0,0 +1,376 @@
+"""Record DMX output to compact capture files, replay and diff them.
+
+A capture starts with a fixed header followed by one record per sent frame::
+
+    header:  b"LTDMXCAP" | version u8 | keyframe interval ms u32 | start epoch ms u64
+    record:  kind u8 | t_us u64 (since start) | universe u16 | payload length u16 | payload
+
+``kind`` is ``K`` (keyframe: the full frame) or ``D`` (delta against the
+previous frame of the same universe: runs of ``offset u16 | count u8 | bytes``).
+An unchanged frame is an empty delta, so the timing of every send is kept and
+captures can be replayed as DMX-path benchmarks.
+
+Recording hooks the driver layer (:class:`RecordingDriver`); encoding and file
+I/O happen on a background thread so the DMX tick only enqueues a bytes copy.
+
+CLI::
+
+    python -m app.dmx.capture info show.ltcap
+    python -m app.dmx.capture replay show.ltcap --artnet 10.0.0.50 --speed 2
+    python -m app.dmx.capture diff a.ltcap b.ltcap
+"""
+import argparse
+import json
+import queue
+import struct
+import threading
+import time
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+MAGIC = b"LTDMXCAP"
+VERSION = 1
+_HEADER = struct.Struct("<8sBIQ")
+_RECORD = struct.Struct("<BQHH")
+_RUN = struct.Struct("<HB")
+KEYFRAME = ord("K")
+DELTA = ord("D")
+
+
+def encode_delta(prev: bytes, frame: bytes) -> bytes:
+    """Encode changed slots of ``frame`` relative to ``prev`` (same length) as runs."""
+    if frame == prev:
+        return b""
+    out = bytearray()
+    n = len(frame)
+    i = 0
+    while i < n:
+        if frame[i] == prev[i]:
+            i += 1
+            continue
+        start = i
+        # keep short unchanged gaps inside a run; a new run header costs 3 bytes
+        while i < n and i - start < 255:
+            if frame[i] != prev[i]:
+                i += 1
+            elif i + 3 < n and frame[i:i + 3] != prev[i:i + 3] and i - start + 3 <= 255:
+                i += 1
+            else:
+                break
+        out += _RUN.pack(start, i - start)
+        out += frame[start:i]
+    return bytes(out)
+
+
+def apply_delta(prev: bytes, payload: bytes) -> bytes:
+    frame = bytearray(prev)
+    pos = 0
+    while pos < len(payload):
+        offset, count = _RUN.unpack_from(payload, pos)
+        pos += _RUN.size
+        frame[offset:offset + count] = payload[pos:pos + count]
+        pos += count
+    return bytes(frame)
+
+
+class CaptureRecorder:
+    """Append frames to a capture file from a background writer thread."""
+
+    def __init__(self, path: str, keyframe_interval_s: float = 5.0, max_queue: int = 4096):
+        self.path = path
+        self.keyframe_interval_us = int(max(0.0, keyframe_interval_s) * 1_000_000)
+        self.started_at_ms = int(time.time() * 1000)
+        self._t0 = time.perf_counter()
+        self._queue: "queue.Queue[Optional[Tuple[int, int, bytes]]]" = queue.Queue(maxsize=max_queue)
+        self._fh = open(path, "wb")
+        self._fh.write(_HEADER.pack(MAGIC, VERSION, self.keyframe_interval_us // 1000, self.started_at_ms))
+        self._prev: Dict[int, bytes] = {}
+        self._last_key_us: Dict[int, int] = {}
+        self.frames = 0
+        self.keyframes = 0
+        self.dropped = 0
+        self.bytes_written = _HEADER.size
+        self.error: Optional[str] = None
+        self._closed = False
+        self._thread = threading.Thread(target=self._writer_loop, name="dmx-capture", daemon=True)
+        self._thread.start()
+
+    def record(self, universe: int, frame: bytes):
+        """Called from the DMX path: timestamp and enqueue, never blocks."""
+        if self._closed:
+            return
+        t_us = int((time.perf_counter() - self._t0) * 1_000_000)
+        try:
+            self._queue.put_nowait((t_us, universe or 0, bytes(frame)))
+        except queue.Full:
+            self.dropped += 1
+
+    def _encode(self, t_us: int, universe: int, frame: bytes) -> bytes:
+        prev = self._prev.get(universe)
+        last_key = self._last_key_us.get(universe)
+        if prev is None or len(prev) != len(frame) or last_key is None or t_us - last_key >= self.keyframe_interval_us:
+            kind, payload = KEYFRAME, frame
+            self._last_key_us[universe] = t_us
+            self.keyframes += 1
+        else:
+            kind, payload = DELTA, encode_delta(prev, frame)
+        self._prev[universe] = frame
+        return _RECORD.pack(kind, t_us, universe, len(payload)) + payload
+
+    def _writer_loop(self):
+        try:
+            while True:
+                item = self._queue.get()
+                if item is None:
+                    break
+                chunk = self._encode(*item)
+                self._fh.write(chunk)
+                self.bytes_written += len(chunk)
+                self.frames += 1
+            self._fh.flush()
+        except OSError as e:
+            # e.g. SD card full: stop recording, the DMX output itself is unaffected
+            self.error = str(e)
+            self._closed = True
+            self._drain()
+
+    def _drain(self):
+        while True:
+            try:
+                if self._queue.get_nowait() is not None:
+                    self.dropped += 1
+            except queue.Empty:
+                return
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "path": self.path,
+            "started_at_ms": self.started_at_ms,
+            "frames": self.frames,
+            "keyframes": self.keyframes,
+            "dropped": self.dropped,
+            "bytes": self.bytes_written,
+            "pending": self._queue.qsize(),
+            "error": self.error,
+        }
+
+    def close(self):
+        thread, self._thread = self._thread, None
+        if thread is None:
+            return
+        self._closed = True
+        if thread.is_alive():
+            try:
+                self._queue.put(None, timeout=2.0)
+            except queue.Full:
+                # writer stuck or gone: give up the backlog instead of blocking shutdown
+                self._drain()
+                self._queue.put_nowait(None)
+            thread.join(timeout=5.0)
+        try:
+            self._fh.close()
+        except Exception:
+            pass
+
+
+class RecordingDriver:
+    """Driver proxy that forwards every frame and tees it into a recorder."""
+
+    def __init__(self, inner, recorder: CaptureRecorder):
+        self.inner = inner
+        self.recorder = recorder
+
+    def send_frame(self, frame: bytes, universe: Optional[int] = None):
+        self.inner.send_frame(frame, universe=universe)
+        uni = universe if universe is not None else getattr(self.inner, "default_universe", 0)
+        self.recorder.record(uni, frame)
+
+    def stats(self) -> Dict[str, Any]:
+        inner_stats = getattr(self.inner, "stats", None)
+        out = dict(inner_stats()) if inner_stats else {"driver": type(self.inner).__name__}
+        out["capture"] = self.recorder.stats()
+        return out
+
+    def close(self):
+        close = getattr(self.inner, "close", None)
+        if close:
+            close()
+
+    def __getattr__(self, name):
+        return getattr(self.inner, name)
+
+
+def read_header(fh) -> Dict[str, Any]:
+    raw = fh.read(_HEADER.size)
+    if len(raw) < _HEADER.size:
+        raise ValueError("not a DMX capture (truncated header)")
+    magic, version, key_ms, started_ms = _HEADER.unpack(raw)
+    if magic != MAGIC:
+        raise ValueError("not a DMX capture (bad magic)")
+    if version != VERSION:
+        raise ValueError(f"unsupported capture version {version}")
+    return {"version": version, "keyframe_interval_ms": key_ms, "started_at_ms": started_ms}
+
+
+def read_capture(path: str) -> Iterator[Tuple[int, int, bytes]]:
+    """Yield ``(t_us, universe, frame)`` with deltas already applied."""
+    prev: Dict[int, bytes] = {}
+    with open(path, "rb") as fh:
+        read_header(fh)
+        while True:
+            raw = fh.read(_RECORD.size)
+            if len(raw) < _RECORD.size:
+                return  # clean end or a record cut off by a crash
+            kind, t_us, universe, length = _RECORD.unpack(raw)
+            payload = fh.read(length)
+            if len(payload) < length:
+                return
+            if kind == KEYFRAME:
+                frame = payload
+            elif kind == DELTA:
+                base = prev.get(universe)
+                if base is None:
+                    continue  # delta without keyframe (corrupt head): skip until next keyframe
+                frame = apply_delta(base, payload)
+            else:
+                raise ValueError(f"unknown record kind {kind}")
+            prev[universe] = frame
+            yield t_us, universe, frame
+
+
+def capture_info(path: str) -> Dict[str, Any]:
+    with open(path, "rb") as fh:
+        header = read_header(fh)
+    per_uni: Dict[int, int] = {}
+    last_t = 0
+    for t_us, universe, _ in read_capture(path):
+        per_uni[universe] = per_uni.get(universe, 0) + 1
+        last_t = t_us
+    header.update({
+        "frames": sum(per_uni.values()),
+        "universes": {str(u): n for u, n in sorted(per_uni.items())},
+        "duration_s": round(last_t / 1_000_000, 3),
+    })
+    return header
+
+
+def replay(path: str, driver, speed: float = 1.0, stop_event: Optional[threading.Event] = None) -> Dict[str, Any]:
+    """Stream a capture through ``driver``. ``speed`` <= 0 sends as fast as possible.
+
+    Returns send timings, so a replay through a real driver doubles as a benchmark.
+    """
+    frames = 0
+    send_total = 0.0
+    send_max = 0.0
+    late_max = 0.0
+    t_start = time.perf_counter()
+    for t_us, universe, frame in read_capture(path):
+        if stop_event is not None and stop_event.is_set():
+            break
+        if speed > 0:
+            due = t_start + (t_us / 1_000_000) / speed
+            delay = due - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                late_max = max(late_max, -delay)
+        t0 = time.perf_counter()
+        driver.send_frame(frame, universe=universe)
+        dt = time.perf_counter() - t0
+        send_total += dt
+        send_max = max(send_max, dt)
+        frames += 1
+    elapsed = time.perf_counter() - t_start
+    return {
+        "frames": frames,
+        "elapsed_s": round(elapsed, 3),
+        "fps": round(frames / elapsed, 1) if elapsed > 0 else 0.0,
+        "send_avg_us": round(send_total / frames * 1_000_000, 1) if frames else 0.0,
+        "send_max_us": round(send_max * 1_000_000, 1),
+        "late_max_ms": round(late_max * 1000, 2),
+    }
+
+
+def diff_captures(path_a: str, path_b: str, max_examples: int = 10) -> Dict[str, Any]:
+    """Compare two captures frame by frame (n-th frame of a universe vs n-th frame)."""
+    def by_universe(path):
+        out: Dict[int, list] = {}
+        for t_us, universe, frame in read_capture(path):
+            out.setdefault(universe, []).append((t_us, frame))
+        return out
+
+    a, b = by_universe(path_a), by_universe(path_b)
+    result: Dict[str, Any] = {"identical": True, "universes": {}}
+    for universe in sorted(set(a) | set(b)):
+        fa, fb = a.get(universe, []), b.get(universe, [])
+        channels = set()
+        differing = 0
+        examples = []
+        for idx, ((ta, xa), (tb, xb)) in enumerate(zip(fa, fb)):
+            if xa == xb:
+                continue
+            differing += 1
+            changed = [ch for ch in range(min(len(xa), len(xb))) if xa[ch] != xb[ch]]
+            channels.update(changed)
+            if len(examples) < max_examples:
+                examples.append({"index": idx, "t_us_a": ta, "t_us_b": tb, "channels": changed[:32]})
+        if differing or len(fa) != len(fb):
+            result["identical"] = False
+        result["universes"][str(universe)] = {
+            "frames_a": len(fa),
+            "frames_b": len(fb),
+            "differing_frames": differing,
+            "channels": sorted(channels),
+            "examples": examples,
+        }
+    return result
+
+
+class _NullDriver:
+    def send_frame(self, frame: bytes, universe: Optional[int] = None):
+        pass
+
+
+def _cli_driver(args):
+    if args.artnet:
+        from .artnet_driver import ArtnetDriver
+        return ArtnetDriver(target_ip=args.artnet, port=args.port)
+    if args.uart:
+        from .uart_rs485_driver import UartRs485Driver
+        return UartRs485Driver(device=args.uart)
+    return _NullDriver()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m app.dmx.capture", description="DMX capture tools")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p_info = sub.add_parser("info", help="summarize a capture")
+    p_info.add_argument("path")
+    p_replay = sub.add_parser("replay", help="stream a capture through a driver")
+    p_replay.add_argument("path")
+    p_replay.add_argument("--speed", type=float, default=1.0, help="1 = real time, 0 = as fast as possible")
+    p_replay.add_argument("--artnet", help="Art-Net target IP")
+    p_replay.add_argument("--port", type=int, default=6454)
+    p_replay.add_argument("--uart", help="RS-485 UART device, e.g. /dev/serial0")
+    p_diff = sub.add_parser("diff", help="compare two captures")
+    p_diff.add_argument("a")
+    p_diff.add_argument("b")
+    args = parser.parse_args(argv)
+
+    if args.cmd == "info":
+        out = capture_info(args.path)
+    elif args.cmd == "replay":
+        driver = _cli_driver(args)
+        try:
+            out = replay(args.path, driver, speed=args.speed)
+        finally:
+            close = getattr(driver, "close", None)
+            if close:
+                close()
+    else:
+        out = diff_captures(args.a, args.b)
+    print(json.dumps(out, indent=2))
+    return 0 if args.cmd != "diff" or out["identical"] else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
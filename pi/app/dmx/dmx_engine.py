@@ -1,12 +1,18 @@
+import asyncio
 import time
 import json
 from typing import Dict, Any, Callable, Optional
 
+from app import metrics
+from app.core import latency
 from app.db.persistence import get_persistence
 from .mapping import compute_pan_tilt, limit
-from .frame_builder import build_frame, deg_to_u16, u16_to_coarse_fine
+from .frame_builder import command_channel_values, deg_to_u16, u16_to_coarse_fine
+from .merge import UniverseMerger
 from .uart_rs485_driver import UartRs485Driver
 from .artnet_driver import ArtnetDriver
+from .ofl_channels import ensure_patched_maps
+from .capture import CaptureRecorder, RecordingDriver
 
 
 class DmxEngine:
@@ -19,110 +25,312 @@ class DmxEngine:
         self.last_sent: Dict[Any, Dict[str, float]] = {}  # fixture_id or ofl:patch_id -> {"pan_deg":..., "tilt_deg":...}
         self.test_target_cm = None
         self.test_until_ms = None
-        self._ofl_fixture_cache: Dict[int, Dict[str, Any]] = {}
-        self._ofl_channel_cache: Dict[tuple, Dict[str, Optional[int]]] = {}
-        self._ofl_color_cache: Dict[tuple, Dict[str, Optional[int]]] = {}
-        self._color_overrides: Dict[int, Dict[str, int]] = {}
+        self._ofl_maps: Optional[Dict[tuple, Dict[str, Any]]] = None  # (fixture_id, mode_name) -> compiled channel map
+        self._ofl_misses: set = set()
+        # output sources merge into layers instead of overwriting each other's frames
+        self.merger = UniverseMerger()
+        self.tracking_layer = self.merger.layer("tracking", priority=10)
+        self.color_layer = self.merger.layer("live_color", priority=20)
+        self.test_layer = self.merger.layer("test", priority=30)
+        self._tracking_owned: Dict[Any, tuple] = {}  # fixture key -> (universe, channels)
+        self._plan: Optional[Dict[str, Any]] = None
+        self.plan_ttl_ms = 5000  # safety net for DB edits that bypass invalidate_plan()
+        self.routing_status: Dict[int, Dict[str, Any]] = {}
+        self._capture: Optional[CaptureRecorder] = None
+        self._tag_motion: Dict[str, tuple] = {}  # tag -> (ts_ms, position_cm, velocity_cm_s)
+        self._color_owned: Dict[int, tuple] = {}  # patch_id -> (universe, channels)
+        self._test_owned: Dict[Any, tuple] = {}  # owner -> (universe, channels, until_ms)
+        self.test_hold_ms = 30000  # test writes fall back to tracking/live color after this
+        self.frame_seq = 0  # ticks that sent at least one frame
+        self.latency_traces: Dict[str, Dict[str, Any]] = {}  # tag -> trace of the last position put on the wire
+        self._traced: Dict[str, float] = {}  # tag -> solved_ms already stamped
+        self._sub = None  # tracking bus subscription while run() is active
+        self._positions: Dict[str, dict] = {}  # tag -> latest payload received from the bus
+
+    async def run(self, hz: float = 30.0):
+        """Tick at ``hz``, taking tag positions from the tracking bus instead of polling the engine."""
+        bus = getattr(self.tracking_engine, "bus", None)
+        if bus is not None:
+            self._sub = bus.subscribe()
+            self._positions = dict(bus.latest_payloads())
+        try:
+            while True:
+                try:
+                    self.tick()
+                except Exception:
+                    pass
+                await asyncio.sleep(1.0 / hz)
+        finally:
+            sub, self._sub = self._sub, None
+            if sub is not None:
+                sub.close()
+
+    def _latest_positions(self) -> Dict[str, dict]:
+        sub = self._sub
+        if sub is None:
+            # not subscribed (tests, engines without a bus): read the latest-value view
+            return getattr(self.tracking_engine, "latest_position", {}) or {}
+        bus = self.tracking_engine.bus
+        for rec in sub.drain():
+            cur = bus.get(rec.tag_mac)
+            # the latest-value view of the same record also has stamps added after publish
+            if cur is not None and cur.seq == rec.seq:
+                self._positions[rec.tag_mac] = bus.latest_payloads()[rec.tag_mac]
+            else:
+                self._positions[rec.tag_mac] = rec.to_payload()
+        return self._positions
 
     def tick(self):
+        with metrics.DMX_TICK_SECONDS.time():
+            self._tick()
+
+    def _tick(self):
         p = get_persistence()
-        fixtures = p.list_fixtures()
-        patched = p.list_patched_fixtures()
-        profiles = {pr["profile_key"]: json.loads(pr["profile_json"]) if pr.get("profile_json") else {} for pr in p.list_fixture_profiles()}
         state = self.state_provider()
         now = int(time.time() * 1000)
         use_test = self.test_target_cm and self.test_until_ms and now < self.test_until_ms
 
         if self._driver_managed:
             self._ensure_driver(p)
-
-        target_pos = None
-        if state == "LIVE" and not use_test:
-            pos = self._select_tracking_payload(p)
-            if pos:
-                target_pos = pos.get("position_cm")
+        self._expire_test_writes(now)
+
+        plan = self._get_plan(p, now)
+        latest = self._latest_positions()
+
+        # resolve one target per group, then one per fixture: O(groups + fixtures)
+        default_target = None
+        group_targets: Dict[int, Optional[dict]] = {}
+        # tag -> universes its position is written to this tick (latency tracing)
+        default_tag = None
+        group_tags: Dict[int, Optional[str]] = {}
+        sources: Dict[str, set] = {}
         if use_test:
-            target_pos = self.test_target_cm
+            default_target = self.test_target_cm
+            group_targets = {gid: self.test_target_cm for gid in plan["groups"]}
+        elif state == "LIVE":
+            pos = self._select_tracking_payload(latest, plan["preferred_tag"])
+            if pos:
+                default_target = pos.get("position_cm")
+                default_tag = pos.get("tag_mac")
+            group_targets = self._resolve_group_targets(plan["groups"], latest, now)
+            group_tags = {gid: r["tag_mac"] for gid, r in self.routing_status.items()}
 
         commands = []
-        for fx in fixtures:
-            if not fx.get("enabled", 1):
-                continue
+        for entry in plan["entries"]:
+            gid = entry["group_id"]
+            target_pos = group_targets.get(gid) if gid is not None else default_target
             if not target_pos:
                 continue
-
-            fixture_pos = {"x": fx.get("pos_x_cm", 0), "y": fx.get("pos_y_cm", 0), "z": fx.get("pos_z_cm", 0)}
-            pan, tilt = compute_pan_tilt(fixture_pos, target_pos, fx)
-            prev = self.last_sent.get(fx["id"], {"pan_deg": pan, "tilt_deg": tilt})
+            src_tag = group_tags.get(gid) if gid is not None else default_tag
+            if src_tag:
+                sources.setdefault(src_tag, set()).add(entry["universe"])
+            pan, tilt = compute_pan_tilt(entry["pos"], target_pos, entry["cfg"])
+            key = entry["key"]
+            prev = self.last_sent.get(key, {"pan_deg": pan, "tilt_deg": tilt})
             dt_s = 0.033  # approx 30 Hz
-            pan = limit(prev["pan_deg"], pan, fx.get("slew_pan_deg_s", 180), dt_s)
-            tilt = limit(prev["tilt_deg"], tilt, fx.get("slew_tilt_deg_s", 180), dt_s)
-            self.last_sent[fx["id"]] = {"pan_deg": pan, "tilt_deg": tilt}
+            pan = limit(prev["pan_deg"], pan, entry["slew_pan_deg_s"], dt_s)
+            tilt = limit(prev["tilt_deg"], tilt, entry["slew_tilt_deg_s"], dt_s)
+            self.last_sent[key] = {"pan_deg": pan, "tilt_deg": tilt}
 
-            pan_u16 = deg_to_u16(pan, fx.get("pan_min_deg", 0), fx.get("pan_max_deg", 360))
-            tilt_u16 = deg_to_u16(tilt, fx.get("tilt_min_deg", 0), fx.get("tilt_max_deg", 180))
+            pan_u16 = deg_to_u16(pan, entry["pan_min_deg"], entry["pan_max_deg"])
+            tilt_u16 = deg_to_u16(tilt, entry["tilt_min_deg"], entry["tilt_max_deg"])
+            if entry["kind"] == "fixture":
+                commands.append({
+                    "id": key,
+                    "profile_key": entry["profile_key"],
+                    "dmx_base_addr": entry["dmx_base_addr"],
+                    "universe": entry["universe"],
+                    "pan_u16": pan_u16,
+                    "tilt_u16": tilt_u16,
+                })
+            else:
+                channel_values = self._ofl_build_channel_values(entry["dmx_base_addr"], pan_u16, tilt_u16, entry["chan_map"])
+                if not channel_values:
+                    continue
+                commands.append({
+                    "id": key,
+                    "universe": entry["universe"],
+                    "channel_values": channel_values,
+                })
+
+        # fixtures without a target keep their last values in the tracking layer (freeze)
+        if commands:
+            self._write_tracking_layer(commands, plan["profiles"])
+
+        if self.driver:
+            sent = set()
+            for uni, frame in self.merger.frames().items():
+                try:
+                    self.driver.send_frame(frame, universe=uni)
+                    metrics.DMX_FRAMES.inc(universe=uni)
+                    sent.add(uni)
+                except Exception as e:
+                    metrics.DMX_SEND_ERRORS.inc(universe=uni)
+                    p.append_event("ERROR", "dmx", "send_failed", ref=str(uni), details_json=str(e))
+            if sent:
+                self.frame_seq += 1
+                self._trace_latency(latest, sources, sent)
+
+    def _trace_latency(self, latest: Dict[str, dict], sources: Dict[str, set], sent: set):
+        """Stamp the first DMX frame that carried each tag's position onto its trace."""
+        dmx_ms = time.time() * 1000
+        for tag, universes in sources.items():
+            trace = (latest.get(tag) or {}).get("trace")
+            universes = sorted(universes & sent)
+            if not trace or not universes or self._traced.get(tag) == trace.get("solved_ms"):
+                continue
+            self._traced[tag] = trace.get("solved_ms")
+            full = dict(trace, dmx_ms=round(dmx_ms, 1), dmx_frame=self.frame_seq, universes=universes)
+            latency.observe(full, ("dmx", "total"))
+            self.latency_traces[tag] = full
 
-            commands.append({
-                "id": fx["id"],
+    def _write_tracking_layer(self, commands, profiles):
+        by_uni: Dict[int, Dict[int, int]] = {}
+        for cmd in commands:
+            uni = cmd.get("universe", 0) or 0
+            values = command_channel_values(cmd, profiles)
+            by_uni.setdefault(uni, {}).update(values)
+            self._tracking_owned[cmd["id"]] = (uni, tuple(values))
+        for uni, values in by_uni.items():
+            self.tracking_layer.set(uni, values)
+
+    # Output plan
+    def invalidate_plan(self):
+        """Force the compiled fixture/group plan to be rebuilt on the next tick."""
+        self._plan = None
+
+    def _get_plan(self, persistence, now_ms: int):
+        plan = self._plan
+        if plan is None or now_ms - plan["built_at_ms"] > self.plan_ttl_ms:
+            plan = self._plan = self._build_plan(persistence, now_ms)
+            self.merger.set_htp_channels(plan["htp"])
+            # release channels of fixtures that are no longer part of the plan (disabled/removed)
+            keys = {e["key"] for e in plan["entries"]}
+            for key in [k for k in self._tracking_owned if k not in keys]:
+                uni, channels = self._tracking_owned.pop(key)
+                self.tracking_layer.release(uni, channels)
+                self.last_sent.pop(key, None)
+        return plan
+
+    def _build_plan(self, persistence, now_ms: int) -> Dict[str, Any]:
+        """Compile fixtures, patches, channel maps and group routing into one per-tick plan."""
+        profiles = {pr["profile_key"]: json.loads(pr["profile_json"]) if pr.get("profile_json") else {} for pr in persistence.list_fixture_profiles()}
+        groups: Dict[int, Dict[str, Any]] = {}
+        member_group: Dict[tuple, int] = {}
+        try:
+            group_rows = persistence.list_fixture_groups()
+        except Exception:
+            group_rows = []  # migrations not applied yet
+        for g in group_rows:
+            if not g.get("enabled", 1):
+                continue
+            groups[g["id"]] = {
+                "id": g["id"],
+                "name": g["name"],
+                "tags": [t["tag_mac"] for t in g.get("tags") or []],
+                "predict_ms": int(g.get("predict_ms") or 0),
+            }
+            for m in g.get("members") or []:
+                member_group[(m["kind"], m["ref_id"])] = g["id"]
+
+        entries = []
+        for fx in persistence.list_fixtures():
+            if not fx.get("enabled", 1):
+                continue
+            entries.append({
+                "key": fx["id"],
+                "kind": "fixture",
+                "group_id": member_group.get(("fixture", fx["id"])),
+                "universe": fx.get("universe", 0),
                 "profile_key": fx["profile_key"],
                 "dmx_base_addr": fx["dmx_base_addr"],
-                "universe": fx.get("universe", 0),
-                "pan_u16": pan_u16,
-                "tilt_u16": tilt_u16,
+                "pos": {"x": fx.get("pos_x_cm", 0), "y": fx.get("pos_y_cm", 0), "z": fx.get("pos_z_cm", 0)},
+                "cfg": fx,
+                "slew_pan_deg_s": fx.get("slew_pan_deg_s", 180),
+                "slew_tilt_deg_s": fx.get("slew_tilt_deg_s", 180),
+                "pan_min_deg": fx.get("pan_min_deg", 0),
+                "pan_max_deg": fx.get("pan_max_deg", 360),
+                "tilt_min_deg": fx.get("tilt_min_deg", 0),
+                "tilt_max_deg": fx.get("tilt_max_deg", 180),
             })
 
-        for patch in patched:
-            if not target_pos:
-                continue
-            fixture_obj = self._load_ofl_fixture(p, patch.get("fixture_id"))
-            if not fixture_obj:
-                continue
-            chan_map = self._ofl_get_pan_tilt_channels(patch.get("fixture_id"), patch.get("mode_name"), fixture_obj)
+        # intensity channels merge HTP so tracking, live color and tests never fight over them
+        htp: Dict[int, set] = {}
+        for patch in persistence.list_patched_fixtures():
+            chan_map = self._get_ofl_map(persistence, patch.get("fixture_id"), patch.get("mode_name"))
+            if chan_map and chan_map.get("dimmer") is not None:
+                ch = int(patch.get("dmx_address", 1) or 1) + chan_map["dimmer"]
+                if 1 <= ch <= 512:
+                    htp.setdefault(patch.get("universe", 0) or 0, set()).add(ch)
             if not chan_map or (chan_map.get("pan") is None and chan_map.get("tilt") is None):
                 continue
             overrides = self._parse_overrides(patch.get("overrides_json"))
-            fixture_pos = {
-                "x": overrides.get("pos_x_cm", 0),
-                "y": overrides.get("pos_y_cm", 0),
-                "z": overrides.get("pos_z_cm", 0),
-            }
-            cfg = {
-                "invert_pan": bool(overrides.get("invert_pan", 0)),
-                "invert_tilt": bool(overrides.get("invert_tilt", 0)),
-            }
-            pan, tilt = compute_pan_tilt(fixture_pos, target_pos, cfg)
-            key = f"ofl:{patch.get('id')}"
-            prev = self.last_sent.get(key, {"pan_deg": pan, "tilt_deg": tilt})
-            dt_s = 0.033
-            pan = limit(prev["pan_deg"], pan, overrides.get("slew_pan_deg_s", 180), dt_s)
-            tilt = limit(prev["tilt_deg"], tilt, overrides.get("slew_tilt_deg_s", 180), dt_s)
-            self.last_sent[key] = {"pan_deg": pan, "tilt_deg": tilt}
-
-            pan_u16 = deg_to_u16(pan, overrides.get("pan_min_deg", -360), overrides.get("pan_max_deg", 360))
-            tilt_u16 = deg_to_u16(tilt, overrides.get("tilt_min_deg", -180), overrides.get("tilt_max_deg", 180))
-            base_addr = patch.get("dmx_address", 1)
-            channel_values = self._ofl_build_channel_values(base_addr, pan_u16, tilt_u16, chan_map)
-            if not channel_values:
-                continue
-            color = self._color_overrides.get(patch.get("id"))
-            if color:
-                color_map = self._ofl_get_color_channels(patch.get("fixture_id"), patch.get("mode_name"), fixture_obj)
-                color_values = self._ofl_build_color_values(base_addr, color, color_map)
-                if color_values:
-                    channel_values.update(color_values)
-            commands.append({
-                "id": key,
+            entries.append({
+                "key": f"ofl:{patch.get('id')}",
+                "kind": "patch",
+                "group_id": member_group.get(("patch", patch.get("id"))),
                 "universe": patch.get("universe", 0),
-                "channel_values": channel_values,
+                "dmx_base_addr": patch.get("dmx_address", 1),
+                "chan_map": chan_map,
+                "pos": {
+                    "x": overrides.get("pos_x_cm", 0),
+                    "y": overrides.get("pos_y_cm", 0),
+                    "z": overrides.get("pos_z_cm", 0),
+                },
+                "cfg": {
+                    "invert_pan": bool(overrides.get("invert_pan", 0)),
+                    "invert_tilt": bool(overrides.get("invert_tilt", 0)),
+                },
+                "slew_pan_deg_s": overrides.get("slew_pan_deg_s", 180),
+                "slew_tilt_deg_s": overrides.get("slew_tilt_deg_s", 180),
+                "pan_min_deg": overrides.get("pan_min_deg", -360),
+                "pan_max_deg": overrides.get("pan_max_deg", 360),
+                "tilt_min_deg": overrides.get("tilt_min_deg", -180),
+                "tilt_max_deg": overrides.get("tilt_max_deg", 180),
             })
 
-        if commands and self.driver:
-            frames = self._build_frames_by_universe(commands, profiles)
-            for uni, frame in frames.items():
-                try:
-                    self.driver.send_frame(frame, universe=uni)
-                except Exception as e:
-                    p.append_event("ERROR", "dmx", "send_failed", ref=str(uni), details_json=str(e))
+        return {
+            "built_at_ms": now_ms,
+            "profiles": profiles,
+            "groups": groups,
+            "entries": entries,
+            "htp": htp,
+            "preferred_tag": (persistence.get_setting("tracking.tag_mac", "") or "").strip(),
+        }
+
+    def _resolve_group_targets(self, groups: Dict[int, Dict[str, Any]], latest: Dict[str, dict], now_ms: int) -> Dict[int, Optional[dict]]:
+        targets: Dict[int, Optional[dict]] = {}
+        routing: Dict[int, Dict[str, Any]] = {}
+        for gid, g in groups.items():
+            target = None
+            following = None
+            for tag in g["tags"]:
+                payload = latest.get(tag)
+                if payload and payload.get("state") == "TRACKING" and payload.get("position_cm"):
+                    target = self._predict(tag, payload, g["predict_ms"], now_ms)
+                    following = tag
+                    break
+            targets[gid] = target
+            routing[gid] = {"group_id": gid, "name": g["name"], "tag_mac": following, "position_cm": target}
+        self.routing_status = routing
+        return targets
+
+    def _predict(self, tag: str, payload: dict, predict_ms: int, now_ms: int) -> dict:
+        """Linear extrapolation of a tag position by up to ``predict_ms`` (0 = latest position)."""
+        pos = payload["position_cm"]
+        ts = payload.get("ts_ms") or now_ms
+        prev = self._tag_motion.get(tag)
+        if prev is None or prev[0] != ts:
+            vel = None
+            if prev is not None and ts > prev[0]:
+                dt = (ts - prev[0]) / 1000.0
+                vel = {k: (pos[k] - prev[1][k]) / dt for k in ("x", "y", "z")}
+            self._tag_motion[tag] = prev = (ts, pos, vel)
+        vel = prev[2]
+        if predict_ms <= 0 or not vel:
+            return pos
+        ahead = min(predict_ms, max(0, now_ms - ts) + predict_ms) / 1000.0
+        return {k: pos[k] + vel[k] * ahead for k in ("x", "y", "z")}
 
     def aim(self, target_cm: Dict[str, Any], duration_ms: int):
         self.test_target_cm = target_cm
@@ -133,32 +341,81 @@ class DmxEngine:
         self.test_until_ms = None
 
     def set_live_color(self, patch_id: int, r: int, g: int, b: int, dim: int):
-        self._color_overrides[int(patch_id)] = {
+        pid = int(patch_id)
+        color = {
             "r": int(max(0, min(255, r))),
             "g": int(max(0, min(255, g))),
             "b": int(max(0, min(255, b))),
             "dim": int(max(0, min(255, dim))),
         }
+        p = get_persistence()
+        patch = p.get_patched_fixture(pid)
+        if not patch:
+            return
+        chan_map = self._get_ofl_map(p, patch.get("fixture_id"), patch.get("mode_name"))
+        values = self._ofl_build_color_values(patch.get("dmx_address", 1), color, chan_map)
+        uni = patch.get("universe", 0) or 0
+        self._release_color(pid)
+        if values:
+            self.color_layer.set(uni, values)
+            self._color_owned[pid] = (uni, tuple(values))
+            # a live color supersedes earlier test writes on the same channels
+            self.test_layer.release(uni, values.keys())
 
     def clear_live_color(self, patch_id: int):
-        self._color_overrides.pop(int(patch_id), None)
-
-    def send_custom_frame(self, universe: int, channel_values: Dict[int, int]):
+        self._release_color(int(patch_id))
+
+    def _release_color(self, patch_id: int):
+        owned = self._color_owned.pop(patch_id, None)
+        if owned:
+            self.color_layer.release(owned[0], owned[1])
+
+    def send_custom_frame(self, universe: int, channel_values: Dict[int, int], owner: Any = None, hold_ms: Optional[int] = None):
+        """Write test values into the test layer and push the merged universe immediately.
+
+        The values override tracking and live color until ``release_test_writes(owner)``
+        or until ``hold_ms`` (default ``test_hold_ms``) has passed.
+        """
+        owner = owner if owner is not None else ("universe", universe)
+        self.release_test_writes(owner, push=False)
+        self.test_layer.set(universe, channel_values)
+        until_ms = int(time.time() * 1000) + int(self.test_hold_ms if hold_ms is None else hold_ms)
+        self._test_owned[owner] = (universe, tuple(channel_values), until_ms)
+        self._push_universes({universe})
+
+    def release_test_writes(self, owner: Any = None, push: bool = True) -> Dict[int, tuple]:
+        """Drop test writes of ``owner`` (all owners if None); returns universe -> released channels."""
+        owners = list(self._test_owned) if owner is None else [owner]
+        released: Dict[int, tuple] = {}
+        for key in owners:
+            entry = self._test_owned.pop(key, None)
+            if entry is None:
+                continue
+            uni, channels, _ = entry
+            self.test_layer.release(uni, channels)
+            released[uni] = released.get(uni, ()) + channels
+        if push and released:
+            self._push_universes(set(released))
+        return released
+
+    def _expire_test_writes(self, now_ms: int):
+        for key in [k for k, e in self._test_owned.items() if e[2] <= now_ms]:
+            self.release_test_writes(key, push=False)
+
+    def _push_universes(self, universes):
+        """Send the merged frames of ``universes`` now instead of waiting for the next tick."""
         p = get_persistence()
         if self._driver_managed:
             self._ensure_driver(p)
         if not self.driver:
             return
-        frame = bytearray(513)
-        frame[0] = 0x00
-        for ch, val in channel_values.items():
-            if ch < 1 or ch > 512:
-                continue
-            frame[ch] = max(0, min(255, int(val)))
-        try:
-            self.driver.send_frame(bytes(frame), universe=universe)
-        except Exception as e:
-            p.append_event("ERROR", "dmx", "send_custom_failed", ref=str(universe), details_json=str(e))
+        for universe in sorted(universes):
+            try:
+                self.driver.send_frame(self.merger.merged(universe), universe=universe)
+                metrics.DMX_FRAMES.inc(universe=universe)
+            except Exception as e:
+                metrics.DMX_SEND_ERRORS.inc(universe=universe)
+                p.append_event("ERROR", "dmx", "send_custom_failed", ref=str(universe), details_json=str(e))
 
     def _ensure_driver(self, persistence):
         def _as_int(val, default):
@@ -167,10 +424,15 @@ class DmxEngine:
             except Exception:
                 return default
 
+        def _as_float(val, default):
+            try:
+                return float(val)
+            except Exception:
+                return default
+
         mode = (persistence.get_setting("dmx.output_mode", "uart") or "uart").lower()
         if mode == "off":
-            self.driver = None
-            self._driver_sig = ("off",)
+            self._replace_driver(None, ("off",))
             return
 
         if mode == "artnet":
@@ -179,28 +441,60 @@ class DmxEngine:
             universe = _as_int(persistence.get_setting("artnet.universe", 0), 0)
             sig = ("artnet", target, port, universe)
             if sig != self._driver_sig:
-                self.driver = ArtnetDriver(target_ip=target, port=port, default_universe=universe)
-                self._driver_sig = sig
+                self._replace_driver(ArtnetDriver(target_ip=target, port=port, default_universe=universe), sig)
             return
 
         # default to UART RS485
         device = persistence.get_setting("dmx.uart_device", "/dev/serial0") or "/dev/serial0"
-        sig = ("uart", device)
+        threaded = str(persistence.get_setting("dmx.uart_threaded", "true") or "true").lower() in ("1", "true", "yes", "on")
+        refresh_hz = _as_float(persistence.get_setting("dmx.uart_refresh_hz", 30), 30.0)
+        sig = ("uart", device, threaded, refresh_hz)
         if sig != self._driver_sig:
-            self.driver = UartRs485Driver(device=device)
-            self._driver_sig = sig
+            self._replace_driver(UartRs485Driver(device=device, threaded=threaded, refresh_hz=refresh_hz), sig)
 
-    def _build_frames_by_universe(self, commands, profiles):
-        universes = {}
-        grouped = {}
-        for cmd in commands:
-            uni = cmd.get("universe", 0) or 0
-            grouped.setdefault(uni, []).append(cmd)
-        for uni, cmds in grouped.items():
-            frame = build_frame(cmds, profiles)
-            if frame:
-                universes[uni] = frame
-        return universes
+    def _replace_driver(self, driver, sig):
+        old = self.driver
+        if old is not None and old is not driver:
+            try:
+                close = getattr(old, "close", None)
+                if close:
+                    close()
+            except Exception:
+                pass
+        if driver is not None and self._capture is not None:
+            driver = RecordingDriver(driver, self._capture)
+        self.driver = driver
+        self._driver_sig = sig
+
+    # Capture
+    def start_capture(self, path: str, keyframe_interval_s: float = 5.0) -> Dict[str, Any]:
+        """Tee every frame handed to the driver into a capture file."""
+        self.stop_capture()
+        self._capture = CaptureRecorder(path, keyframe_interval_s=keyframe_interval_s)
+        if self.driver is not None:
+            self.driver = RecordingDriver(self.driver, self._capture)
+        return self._capture.stats()
+
+    def stop_capture(self) -> Optional[Dict[str, Any]]:
+        rec = self._capture
+        if rec is None:
+            return None
+        self._capture = None
+        if isinstance(self.driver, RecordingDriver):
+            self.driver = self.driver.inner
+        rec.close()
+        return rec.stats()
+
+    def capture_stats(self) -> Optional[Dict[str, Any]]:
+        return self._capture.stats() if self._capture else None
+
+    def driver_stats(self) -> Dict[str, Any]:
+        if not self.driver:
+            return {"driver": None}
+        stats = getattr(self.driver, "stats", None)
+        if stats:
+            return stats()
+        return {"driver": type(self.driver).__name__}
 
     def _parse_overrides(self, raw):
         if not raw:
@@ -212,12 +506,10 @@ class DmxEngine:
         except Exception:
             return {}
 
-    def _select_tracking_payload(self, persistence):
-        latest = getattr(self.tracking_engine, "latest_position", {}) or {}
+    def _select_tracking_payload(self, latest: Dict[str, dict], preferred: str = ""):
         if not latest:
             return None
 
-        preferred = (persistence.get_setting("tracking.tag_mac", "") or "").strip()
         if preferred:
             payload = latest.get(preferred)
             if payload and payload.get("state") == "TRACKING":
@@ -231,181 +523,29 @@ class DmxEngine:
                 best = payload
         return best
 
-    def _load_ofl_fixture(self, persistence, fixture_id: Optional[int]):
-        if not fixture_id:
-            return None
-        if fixture_id in self._ofl_fixture_cache:
-            return self._ofl_fixture_cache[fixture_id]
-        row = persistence.get_ofl_fixture(fixture_id)
-        if not row:
-            return None
-        try:
-            obj = json.loads(row.get("ofl_json") or "{}")
-        except Exception:
-            obj = {}
-        self._ofl_fixture_cache[fixture_id] = obj
-        return obj
+    def invalidate_ofl_maps(self):
+        """Drop the cached channel tables; the next tick reloads them from the DB."""
+        self._ofl_maps = None
+        self._ofl_misses = set()
+        self._plan = None
 
-    def _ofl_get_pan_tilt_channels(self, fixture_id: int, mode_name: str, fixture_obj: dict):
-        key = (fixture_id, mode_name)
-        if key in self._ofl_channel_cache:
-            return self._ofl_channel_cache[key]
-        modes = fixture_obj.get("modes") or []
-        target_mode = None
-        for m in modes:
-            if isinstance(m, dict) and (m.get("name") or m.get("modeName")) == mode_name:
-                target_mode = m
-                break
-        if not target_mode:
-            return None
-        chan_list = target_mode.get("channels") or []
-        available = fixture_obj.get("availableChannels") or {}
-
-        def classify(label: str):
-            lower = (label or "").lower()
-            if not lower:
-                return None
-            if "speed" in lower or "time" in lower or "macro" in lower or "accel" in lower:
-                return None
-            is_pan = "pan" in lower
-            is_tilt = "tilt" in lower
-            if not (is_pan or is_tilt):
-                return None
-            is_fine = "fine" in lower or "lsb" in lower or "16" in lower
-            return is_pan, is_tilt, is_fine
-
-        pan_idx = None
-        pan_fine_idx = None
-        tilt_idx = None
-        tilt_fine_idx = None
-        for idx, ch in enumerate(chan_list, start=0):
-            key_name = ch if isinstance(ch, str) else ch.get("name") if isinstance(ch, dict) else None
-            details = available.get(key_name) if isinstance(available, dict) else {}
-            label = ""
-            if isinstance(details, dict):
-                label = details.get("name") or ""
-            label = label or (key_name or "")
-
-            res = classify(label) or classify(key_name or "")
-            if not res and isinstance(details, dict):
-                caps = details.get("capabilities") or []
-                for cap in caps:
-                    typ = (cap.get("type") or "")
-                    res = classify(typ)
-                    if res:
-                        break
-            if not res:
-                continue
-            is_pan, is_tilt, is_fine = res
-            if is_pan:
-                if is_fine:
-                    pan_fine_idx = idx
-                elif pan_idx is None:
-                    pan_idx = idx
-            if is_tilt:
-                if is_fine:
-                    tilt_fine_idx = idx
-                elif tilt_idx is None:
-                    tilt_idx = idx
-
-        if pan_idx is None and pan_fine_idx is not None:
-            pan_idx = pan_fine_idx
-            pan_fine_idx = None
-        if tilt_idx is None and tilt_fine_idx is not None:
-            tilt_idx = tilt_fine_idx
-            tilt_fine_idx = None
-
-        out = {"pan": pan_idx, "pan_fine": pan_fine_idx, "tilt": tilt_idx, "tilt_fine": tilt_fine_idx}
-        self._ofl_channel_cache[key] = out
-        return out
-
-    def _ofl_get_color_channels(self, fixture_id: int, mode_name: str, fixture_obj: dict):
-        key = (fixture_id, mode_name, "color")
-        if key in self._ofl_color_cache:
-            return self._ofl_color_cache[key]
-        modes = fixture_obj.get("modes") or []
-        target_mode = None
-        for m in modes:
-            if isinstance(m, dict) and (m.get("name") or m.get("modeName")) == mode_name:
-                target_mode = m
-                break
-        if not target_mode:
+    def _get_ofl_map(self, persistence, fixture_id: Optional[int], mode_name: Optional[str]):
+        if not fixture_id or not mode_name:
             return None
-        chan_list = target_mode.get("channels") or []
-        available = fixture_obj.get("availableChannels") or {}
-
-        def label_for(ch):
-            key_name = ch if isinstance(ch, str) else ch.get("name") if isinstance(ch, dict) else None
-            details = available.get(key_name) if isinstance(available, dict) else {}
-            label = ""
-            if isinstance(details, dict):
-                label = details.get("name") or ""
-            return (label or key_name or "").strip(), details
-
-        def classify(label: str):
-            lower = (label or "").lower()
-            if not lower:
-                return None, False
-            is_fine = "fine" in lower or "lsb" in lower or "16" in lower
-            if "red" in lower:
-                return "red", is_fine
-            if "green" in lower:
-                return "green", is_fine
-            if "blue" in lower:
-                return "blue", is_fine
-            if "white" in lower:
-                return "white", is_fine
-            if "dim" in lower or "intensity" in lower:
-                return "dimmer", is_fine
-            if "shutter" in lower or "strobe" in lower:
-                return "shutter", is_fine
-            return None, is_fine
-
-        def pick(existing, idx, is_fine, allow_fine=False):
-            if existing is not None:
-                return existing
-            if is_fine and not allow_fine:
-                return existing
-            return idx
-
-        r = {"coarse": None, "fine": None}
-        g = {"coarse": None, "fine": None}
-        b = {"coarse": None, "fine": None}
-        w = {"coarse": None, "fine": None}
-        dim = {"coarse": None, "fine": None}
-        sh = {"coarse": None, "fine": None}
-
-        for idx, ch in enumerate(chan_list, start=0):
-            label, details = label_for(ch)
-            kind, is_fine = classify(label)
-            if not kind and isinstance(details, dict):
-                for cap in (details.get("capabilities") or []):
-                    typ = (cap.get("type") or "")
-                    kind, is_fine = classify(typ)
-                    if kind:
-                        break
-            if not kind:
-                continue
-            bucket = {"red": r, "green": g, "blue": b, "white": w, "dimmer": dim, "shutter": sh}.get(kind)
-            if bucket is None:
-                continue
-            if is_fine:
-                if bucket["fine"] is None:
-                    bucket["fine"] = idx
-            else:
-                if bucket["coarse"] is None:
-                    bucket["coarse"] = idx
-
-        out = {
-            "red": r["coarse"] if r["coarse"] is not None else r["fine"],
-            "green": g["coarse"] if g["coarse"] is not None else g["fine"],
-            "blue": b["coarse"] if b["coarse"] is not None else b["fine"],
-            "white": w["coarse"] if w["coarse"] is not None else w["fine"],
-            "dimmer": dim["coarse"] if dim["coarse"] is not None else dim["fine"],
-            "shutter": sh["coarse"] if sh["coarse"] is not None else sh["fine"],
-        }
-        self._ofl_color_cache[key] = out
-        return out
+        if self._ofl_maps is None:
+            try:
+                ensure_patched_maps(persistence)
+            except Exception as e:
+                persistence.append_event("WARN", "dmx", "ofl_map_compile_failed", details_json=str(e))
+            self._ofl_maps = persistence.list_ofl_channel_maps()
+        key = (fixture_id, mode_name)
+        chan_map = self._ofl_maps.get(key)
+        if chan_map is None and key not in self._ofl_misses:
+            # patched behind our back: reload once, then remember the miss
+            self._ofl_misses.add(key)
+            self._ofl_maps = None
+            return self._get_ofl_map(persistence, fixture_id, mode_name)
+        return chan_map
 
     def _ofl_build_channel_values(self, base_addr: int, pan_u16: int, tilt_u16: int, chan_map: dict):
         if not chan_map:
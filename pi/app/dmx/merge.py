@@ -0,0 +1,213 @@
+"""Layered DMX universe merge.
+
+Every output source (tracking, live color, test frames, future cues) writes
+into its own sparse :class:`Layer`. Layers are stacked by priority and merged
+per universe: LTP channels take the value of the highest-priority layer that
+owns them, HTP channels take the maximum over all owning layers.
+
+The merge works on whole-universe big integers / byte strings instead of
+per-channel Python loops, and keeps the merged prefix below each layer so a
+change only re-merges the layers from the lowest changed one upwards.
+"""
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+HTP = "HTP"
+LTP = "LTP"
+
+FRAME_LEN = 513  # start code + 512 slots
+_FULL = (1 << (FRAME_LEN * 8)) - 1
+
+
+def _to_int(buf) -> int:
+    return int.from_bytes(buf, "big")
+
+
+def _to_bytes(val: int) -> bytes:
+    return val.to_bytes(FRAME_LEN, "big")
+
+
+class _LayerUniverse:
+    __slots__ = ("values", "mask", "rev", "_cache_rev", "_vals_int", "_mask_int")
+
+    def __init__(self):
+        self.values = bytearray(FRAME_LEN)
+        self.mask = bytearray(FRAME_LEN)
+        self.rev = 0
+        self._cache_rev = -1
+        self._vals_int = 0
+        self._mask_int = 0
+
+    def ints(self) -> Tuple[int, int]:
+        if self._cache_rev != self.rev:
+            self._vals_int = _to_int(self.values)
+            self._mask_int = _to_int(self.mask)
+            self._cache_rev = self.rev
+        return self._vals_int, self._mask_int
+
+
+class Layer:
+    """Sparse per-universe channel values owned by one output source."""
+
+    def __init__(self, name: str, priority: int, lock=None):
+        self.name = name
+        self.priority = priority
+        # shared with the merger, so a merge never sees a half-written update
+        self._lock = lock if lock is not None else threading.RLock()
+        self._universes: Dict[int, _LayerUniverse] = {}
+
+    def _uni(self, universe: int) -> _LayerUniverse:
+        lu = self._universes.get(universe)
+        if lu is None:
+            lu = self._universes[universe] = _LayerUniverse()
+        return lu
+
+    def universes(self) -> List[int]:
+        return [u for u, lu in self._universes.items() if any(lu.mask)]
+
+    def set(self, universe: int, channel_values: Dict[int, int]) -> bool:
+        """Set (and take ownership of) channels. Returns True if anything changed."""
+        with self._lock:
+            return self._set(universe, channel_values)
+
+    def _set(self, universe: int, channel_values: Dict[int, int]) -> bool:
+        lu = self._uni(universe)
+        changed = False
+        values, mask = lu.values, lu.mask
+        for ch, val in channel_values.items():
+            if ch < 1 or ch > 512:
+                continue
+            v = max(0, min(255, int(val)))
+            if values[ch] != v or not mask[ch]:
+                values[ch] = v
+                mask[ch] = 0xFF
+                changed = True
+        if changed:
+            lu.rev += 1
+        return changed
+
+    def release(self, universe: int, channels: Optional[Iterable[int]] = None) -> bool:
+        """Give up channels (all channels of the universe if ``channels`` is None)."""
+        with self._lock:
+            return self._release(universe, channels)
+
+    def _release(self, universe: int, channels: Optional[Iterable[int]]) -> bool:
+        lu = self._universes.get(universe)
+        if lu is None:
+            return False
+        if channels is None:
+            if not any(lu.mask):
+                return False
+            lu.values[:] = bytes(FRAME_LEN)
+            lu.mask[:] = bytes(FRAME_LEN)
+            lu.rev += 1
+            return True
+        changed = False
+        for ch in channels:
+            if 1 <= ch <= 512 and lu.mask[ch]:
+                lu.mask[ch] = 0
+                lu.values[ch] = 0
+                changed = True
+        if changed:
+            lu.rev += 1
+        return changed
+
+    def get(self, universe: int) -> Dict[int, int]:
+        lu = self._universes.get(universe)
+        if lu is None:
+            return {}
+        return {ch: lu.values[ch] for ch in range(1, FRAME_LEN) if lu.mask[ch]}
+
+    def revision(self, universe: int) -> int:
+        lu = self._universes.get(universe)
+        return lu.rev if lu else 0
+
+
+class UniverseMerger:
+    """Stack of layers merged into one 513-byte frame per universe."""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._layers: Dict[str, Layer] = {}
+        self._order: List[Layer] = []
+        self._htp: Dict[int, bytearray] = {}
+        self._htp_rev: Dict[int, int] = {}
+        # universe -> (layer order, per-layer revisions, htp rev, prefix results)
+        self._cache: Dict[int, Tuple[List[str], List[int], int, List[int]]] = {}
+
+    def layer(self, name: str, priority: int = 0) -> Layer:
+        with self._lock:
+            lay = self._layers.get(name)
+            if lay is None:
+                lay = self._layers[name] = Layer(name, priority, lock=self._lock)
+                # stable: equal priorities keep creation order
+                self._order = sorted(self._layers.values(), key=lambda l: l.priority)
+            return lay
+
+    def set_rule(self, universe: int, channels: Iterable[int], rule: str):
+        rule = (rule or LTP).upper()
+        with self._lock:
+            mask = self._htp.setdefault(universe, bytearray(FRAME_LEN))
+            for ch in channels:
+                if 1 <= ch <= 512:
+                    mask[ch] = 0xFF if rule == HTP else 0
+            self._htp_rev[universe] = self._htp_rev.get(universe, 0) + 1
+
+    def set_htp_channels(self, htp: Dict[int, Iterable[int]]):
+        """Make exactly the given channels HTP (per universe); every other channel is LTP."""
+        with self._lock:
+            wanted = {uni: set(chs) for uni, chs in htp.items()}
+            for uni in set(self._htp) | set(wanted):
+                mask = self._htp.get(uni)
+                current = {ch for ch in range(1, FRAME_LEN) if mask[ch]} if mask else set()
+                new = wanted.get(uni, set())
+                if current - new:
+                    self.set_rule(uni, current - new, LTP)
+                if new - current:
+                    self.set_rule(uni, new - current, HTP)
+
+    def rule(self, universe: int, channel: int) -> str:
+        mask = self._htp.get(universe)
+        return HTP if mask and mask[channel] else LTP
+
+    def universes(self) -> List[int]:
+        with self._lock:
+            seen = set()
+            for lay in self._order:
+                seen.update(lay.universes())
+            return sorted(seen)
+
+    def merged(self, universe: int) -> bytes:
+        with self._lock:
+            names = [l.name for l in self._order]
+            revs = [l.revision(universe) for l in self._order]
+            htp_rev = self._htp_rev.get(universe, 0)
+            cached = self._cache.get(universe)
+            start = 0
+            prefix: List[int] = []
+            if cached and cached[0] == names and cached[2] == htp_rev:
+                _, old_revs, _, old_prefix = cached
+                while start < len(revs) and revs[start] == old_revs[start]:
+                    start += 1
+                prefix = old_prefix[:start]
+            acc = prefix[-1] if prefix else 0
+            htp_mask = _to_int(self._htp[universe]) if universe in self._htp else 0
+            for lay in self._order[start:]:
+                lu = lay._universes.get(universe)
+                if lu is not None:
+                    vals, mask = lu.ints()
+                    if mask:
+                        ltp = mask & ~htp_mask & _FULL
+                        acc = (acc & (_FULL ^ ltp)) | (vals & ltp)
+                        htp_vals = vals & mask & htp_mask
+                        if htp_vals:
+                            acc = _to_int(bytes(map(max, _to_bytes(acc), _to_bytes(htp_vals))))
+                prefix.append(acc)
+            self._cache[universe] = (names, revs, htp_rev, prefix)
+            frame = _to_bytes(prefix[-1] if prefix else 0)
+            # slot 0 is the DMX start code
+            return b"\x00" + frame[1:]
+
+    def frames(self) -> Dict[int, bytes]:
+        with self._lock:
+            return {uni: self.merged(uni) for uni in self.universes()}
@@ -0,0 +1,174 @@
+"""Compile OFL fixture modes into compact channel-role tables.
+
+Channel roles (pan/tilt, color, dimmer, ...) are resolved once when a fixture
+is imported or patched and stored in ``ofl_channel_maps``, so the DMX output
+path never has to parse the (potentially large) ``ofl_json`` blob.
+"""
+import json
+from typing import Any, Dict, Optional
+
+MAP_VERSION = 1
+
+ROLE_KEYS = (
+    "pan", "pan_fine", "tilt", "tilt_fine",
+    "red", "green", "blue", "white", "dimmer", "shutter",
+)
+
+
+def _find_mode(fixture_obj: dict, mode_name: str) -> Optional[dict]:
+    for m in fixture_obj.get("modes") or []:
+        if isinstance(m, dict) and (m.get("name") or m.get("modeName")) == mode_name:
+            return m
+    return None
+
+
+def _channel_label(ch, available):
+    key_name = ch if isinstance(ch, str) else ch.get("name") if isinstance(ch, dict) else None
+    details = available.get(key_name) if isinstance(available, dict) else {}
+    label = ""
+    if isinstance(details, dict):
+        label = details.get("name") or ""
+    return key_name, (label or key_name or "").strip(), details
+
+
+def _classify_pan_tilt(label: str):
+    lower = (label or "").lower()
+    if not lower:
+        return None
+    if "speed" in lower or "time" in lower or "macro" in lower or "accel" in lower:
+        return None
+    is_pan = "pan" in lower
+    is_tilt = "tilt" in lower
+    if not (is_pan or is_tilt):
+        return None
+    is_fine = "fine" in lower or "lsb" in lower or "16" in lower
+    return is_pan, is_tilt, is_fine
+
+
+def _classify_color(label: str):
+    lower = (label or "").lower()
+    if not lower:
+        return None, False
+    is_fine = "fine" in lower or "lsb" in lower or "16" in lower
+    if "red" in lower:
+        return "red", is_fine
+    if "green" in lower:
+        return "green", is_fine
+    if "blue" in lower:
+        return "blue", is_fine
+    if "white" in lower:
+        return "white", is_fine
+    if "dim" in lower or "intensity" in lower:
+        return "dimmer", is_fine
+    if "shutter" in lower or "strobe" in lower:
+        return "shutter", is_fine
+    return None, is_fine
+
+
+def _pan_tilt_roles(chan_list, available) -> Dict[str, Optional[int]]:
+    pan_idx = None
+    pan_fine_idx = None
+    tilt_idx = None
+    tilt_fine_idx = None
+    for idx, ch in enumerate(chan_list):
+        key_name, label, details = _channel_label(ch, available)
+        res = _classify_pan_tilt(label) or _classify_pan_tilt(key_name or "")
+        if not res and isinstance(details, dict):
+            for cap in details.get("capabilities") or []:
+                res = _classify_pan_tilt(cap.get("type") or "")
+                if res:
+                    break
+        if not res:
+            continue
+        is_pan, is_tilt, is_fine = res
+        if is_pan:
+            if is_fine:
+                pan_fine_idx = idx
+            elif pan_idx is None:
+                pan_idx = idx
+        if is_tilt:
+            if is_fine:
+                tilt_fine_idx = idx
+            elif tilt_idx is None:
+                tilt_idx = idx
+
+    if pan_idx is None and pan_fine_idx is not None:
+        pan_idx, pan_fine_idx = pan_fine_idx, None
+    if tilt_idx is None and tilt_fine_idx is not None:
+        tilt_idx, tilt_fine_idx = tilt_fine_idx, None
+    return {"pan": pan_idx, "pan_fine": pan_fine_idx, "tilt": tilt_idx, "tilt_fine": tilt_fine_idx}
+
+
+def _color_roles(chan_list, available) -> Dict[str, Optional[int]]:
+    buckets = {k: {"coarse": None, "fine": None} for k in ("red", "green", "blue", "white", "dimmer", "shutter")}
+    for idx, ch in enumerate(chan_list):
+        _, label, details = _channel_label(ch, available)
+        kind, is_fine = _classify_color(label)
+        if not kind and isinstance(details, dict):
+            for cap in details.get("capabilities") or []:
+                kind, is_fine = _classify_color(cap.get("type") or "")
+                if kind:
+                    break
+        bucket = buckets.get(kind) if kind else None
+        if bucket is None:
+            continue
+        slot = "fine" if is_fine else "coarse"
+        if bucket[slot] is None:
+            bucket[slot] = idx
+    return {k: (b["coarse"] if b["coarse"] is not None else b["fine"]) for k, b in buckets.items()}
+
+
+def compile_mode(fixture_obj: dict, mode_name: str) -> Optional[Dict[str, Any]]:
+    """Resolve channel roles for one mode. Offsets are 0-based from the patch address."""
+    mode = _find_mode(fixture_obj or {}, mode_name)
+    if not mode:
+        return None
+    chan_list = mode.get("channels") or []
+    available = fixture_obj.get("availableChannels") or {}
+    out: Dict[str, Any] = {"v": MAP_VERSION, "channel_count": len(chan_list)}
+    out.update(_pan_tilt_roles(chan_list, available))
+    out.update(_color_roles(chan_list, available))
+    return out
+
+
+def compile_fixture(fixture_obj: dict) -> Dict[str, Dict[str, Any]]:
+    """Compile every mode of an OFL fixture. Returns mode_name -> channel map."""
+    maps = {}
+    for m in (fixture_obj or {}).get("modes") or []:
+        if not isinstance(m, dict):
+            continue
+        name = m.get("name") or m.get("modeName")
+        if not name:
+            continue
+        compiled = compile_mode(fixture_obj, name)
+        if compiled is not None:
+            maps[name] = compiled
+    return maps
+
+
+def compile_and_store(persistence, fixture_id: int, fixture_obj: Optional[dict] = None) -> Dict[str, Dict[str, Any]]:
+    """(Re)compile all modes of a library fixture and persist the channel tables."""
+    if fixture_obj is None:
+        row = persistence.get_ofl_fixture(fixture_id)
+        if not row:
+            return {}
+        try:
+            fixture_obj = json.loads(row.get("ofl_json") or "{}")
+        except Exception:
+            fixture_obj = {}
+    maps = compile_fixture(fixture_obj)
+    persistence.replace_ofl_channel_maps(fixture_id, maps)
+    return maps
+
+
+def ensure_patched_maps(persistence) -> int:
+    """Backfill channel tables for patches created before maps were persisted."""
+    existing = persistence.list_ofl_channel_maps()
+    missing = set()
+    for patch in persistence.list_patched_fixtures():
+        key = (patch.get("fixture_id"), patch.get("mode_name"))
+        if key[0] and key not in existing:
+            missing.add(key[0])
+    for fixture_id in missing:
+        compile_and_store(persistence, fixture_id)
+    return len(missing)
@@ -1,5 +1,6 @@
+import threading
 import time
-import json
+from typing import Any, Callable, Dict, Optional
 
 try:
     import serial
@@ -8,9 +9,37 @@ except Exception:
 
 
 class UartRs485Driver:
-    def __init__(self, device: str = "/dev/serial0"):
+    """DMX512 over a UART wired to an RS485 transceiver.
+
+    In the default (synchronous) mode ``send_frame`` emits break/MAB and writes
+    the frame from the caller's thread, which blocks for the full wire time
+    (~23 ms for 513 slots at 250 kbaud). With ``threaded=True`` a dedicated
+    writer thread owns the port: ``send_frame`` only swaps the latest frame into
+    a back buffer and the writer retransmits the front buffer continuously at
+    ``refresh_hz`` (DMX receivers expect a steady refresh even when nothing
+    changed). ``clock`` (default ``time.monotonic``) paces the writer.
+    """
+
+    def __init__(self, device: str = "/dev/serial0", threaded: bool = False, refresh_hz: float = 30.0,
+                 clock: Callable[[], float] = time.monotonic):
         self.device = device
         self.ser = None
+        self.threaded = threaded
+        self.refresh_hz = max(1.0, min(44.0, float(refresh_hz or 30.0)))
+        self._buf_lock = threading.Lock()
+        self._back: Optional[bytes] = None
+        self._front: Optional[bytes] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._frames_sent = 0
+        self._frames_swapped = 0
+        self._errors = 0
+        self._last_error: Optional[str] = None
+        self._clock = clock
+        self._next_due: Optional[float] = None
+        self._fps = 0.0
+        self._fps_window_start = 0.0
+        self._fps_window_frames = 0
 
     def init(self):
         if serial is None:
@@ -18,8 +47,18 @@ class UartRs485Driver:
         self.ser = serial.Serial(self.device, baudrate=250000, bytesize=8, parity="N", stopbits=2)
 
     def send_frame(self, frame: bytes, universe=None):
+        if self.threaded:
+            with self._buf_lock:
+                self._back = bytes(frame)
+                self._frames_swapped += 1
+            self._ensure_writer()
+            return
         if not self.ser:
             self.init()
+        self._transmit(frame)
+        self._frames_sent += 1
+
+    def _transmit(self, frame: bytes):
         # DMX break + MAB best-effort
         try:
             self.ser.break_condition = True
@@ -31,3 +70,84 @@ class UartRs485Driver:
             time.sleep(120e-6)
         self.ser.write(frame)
         self.ser.flush()
+
+    # Threaded writer
+    def _ensure_writer(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._next_due = None
+        self._thread = threading.Thread(target=self._writer_loop, name=f"dmx-uart-{self.device}", daemon=True)
+        self._thread.start()
+
+    def _writer_loop(self):
+        while not self._stop.is_set():
+            delay = self._writer_step()
+            if delay > 0:
+                self._stop.wait(delay)
+
+    def _writer_step(self) -> float:
+        """One writer cycle: transmit the front buffer, return the seconds until the next one is due."""
+        if self._next_due is None:
+            self._next_due = self._fps_window_start = self._clock()
+            self._fps_window_frames = 0
+        backoff = 0.0
+        with self._buf_lock:
+            if self._back is not None:
+                self._front, self._back = self._back, None
+            frame = self._front
+        if frame is not None:
+            try:
+                if not self.ser:
+                    self.init()
+                self._transmit(frame)
+                self._frames_sent += 1
+                self._fps_window_frames += 1
+            except Exception as e:
+                self._errors += 1
+                self._last_error = str(e)
+                self._close_port()
+                # back off before reopening the port
+                backoff = 0.5
+        now = self._clock()
+        elapsed = now - self._fps_window_start
+        if elapsed >= 1.0:
+            self._fps = self._fps_window_frames / elapsed
+            self._fps_window_start = now
+            self._fps_window_frames = 0
+        self._next_due = now + backoff if backoff else self._next_due + 1.0 / self.refresh_hz
+        delay = self._next_due - self._clock()
+        if delay <= 0:
+            # running late (slow port): do not try to catch up with a burst
+            self._next_due = self._clock()
+            return 0.0
+        return delay
+
+    def _close_port(self):
+        try:
+            if self.ser:
+                self.ser.close()
+        except Exception:
+            pass
+        self.ser = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "driver": "uart",
+            "device": self.device,
+            "threaded": self.threaded,
+            "refresh_hz": self.refresh_hz,
+            "fps": round(self._fps, 2),
+            "frames_sent": self._frames_sent,
+            "frames_swapped": self._frames_swapped,
+            "errors": self._errors,
+            "last_error": self._last_error,
+        }
+
+    def close(self):
+        self._stop.set()
+        t = self._thread
+        if t and t.is_alive() and t is not threading.current_thread():
+            t.join(timeout=1.0)
+        self._thread = None
+        self._close_port()
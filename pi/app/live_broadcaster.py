@@ -0,0 +1,438 @@
+"""Fan-out of live updates to WebSocket clients.
+
+Every entity (an anchor, a tag, the system state, a DMX universe, a log
+event) is JSON-encoded once when it changes. Each client owns a sender task
+and, per topic, an ordered set of pending entity keys; a publish only marks
+the changed keys as pending and wakes the senders. A client that falls behind
+therefore coalesces to the newest state of each entity instead of queueing
+stale messages, and a client whose send does not complete within
+``send_timeout_s`` is dropped without holding up anyone else.
+
+Clients choose what they receive with a subscribe message::
+
+    {"type": "subscribe", "topics": [
+        {"topic": "tags", "ids": ["AA:BB:..."], "max_hz": 10},
+        {"topic": "state"},
+        {"topic": "dmx", "ids": ["0"], "max_hz": 5}]}
+    {"type": "unsubscribe", "topics": ["dmx"]}
+
+Topics: ``tags``, ``anchors``, ``state``, ``dmx`` and ``events``; ``ids``
+narrows a topic to some entities and ``max_hz`` caps how often that topic is
+sent to this client. Until a client subscribes it gets ``tags`` and
+``anchors`` (the original feed). Messages keep the
+``{"type": "bulk", "events": [...]}`` shape; subscribing sends the current
+state of the subscribed entities first.
+
+Clients connecting with ``?format=binary`` receive ``tags`` updates as binary
+frames instead: a ``POSITIONS_HEADER`` followed by one fixed-width
+``POSITION_RECORD`` per tag (little-endian)::
+
+    header:  kind u8 (1) | version u8 (1) | record count u16
+    record:  tag index u16 | state u8 | flags u8 (bit 0: has position) | ts_ms f64 | x, y, z f32 (cm)
+
+Tag indexes refer to a ``{"type": "tag_index", "tags": [...]}`` text message
+that is (re)sent before any frame using an index the client has not seen yet.
+
+Every publish that changes something gets a sequence number, and the changed
+keys of the last ``ring_size`` publishes are kept in a ring. ``changes_since``
+and ``wait_changes`` serve the same feed to SSE and long-poll clients
+(``/api/v1/stream``), which resume from a sequence number; a client that fell
+out of the ring gets a full snapshot instead.
+"""
+import asyncio
+import json
+import struct
+import time
+from collections import deque
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from . import metrics
+
+EntityKey = Tuple[str, str]  # (topic, entity id)
+
+TOPICS = ("tags", "anchors", "state", "dmx", "events")
+DEFAULT_TOPICS = ("tags", "anchors")
+MAX_HZ = 60.0
+
+POSITIONS_HEADER = struct.Struct("<BBH")
+POSITION_RECORD = struct.Struct("<HBBdfff")
+BINARY_KIND_POSITIONS = 1
+BINARY_VERSION = 1
+STATE_CODES = {"TRACKING": 1, "STALE": 2, "LOST": 3}
+
+# event "type" -> topic, and the field that identifies the entity
+_TYPE_TOPIC = {
+    "tracking": ("tags", "tag_mac"),
+    "anchor_pos": ("anchors", "mac"),
+    "state": ("state", "id"),
+    "dmx": ("dmx", "universe"),
+    "event": ("events", "id"),
+}
+
+
+def entity_key(event: Dict[str, Any]) -> Optional[EntityKey]:
+    spec = _TYPE_TOPIC.get(event.get("type"))
+    if spec is None:
+        return None
+    ident = event.get(spec[1])
+    if ident is None or ident == "":
+        return None
+    return spec[0], str(ident)
+
+
+class Subscription:
+    __slots__ = ("ids", "min_interval_s")
+
+    def __init__(self, ids: Optional[Iterable[str]] = None, max_hz: Optional[float] = None):
+        self.ids: Optional[Set[str]] = {str(i) for i in ids} if ids else None
+        hz = min(float(max_hz), MAX_HZ) if max_hz else 0.0
+        self.min_interval_s = 1.0 / hz if hz > 0 else 0.0
+
+    def wants(self, ident: str) -> bool:
+        return self.ids is None or ident in self.ids
+
+
+class LiveClient:
+    def __init__(self, broadcaster: "LiveBroadcaster", ws, max_pending: int, binary: bool = False):
+        self.broadcaster = broadcaster
+        self.ws = ws
+        self.binary = binary
+        self.tag_index_sent = 0
+        self.max_pending = max_pending
+        self.subs: Dict[str, Subscription] = {t: Subscription() for t in DEFAULT_TOPICS}
+        self.pending: Dict[str, Dict[str, None]] = {}  # topic -> ordered set of entity ids
+        self.next_due: Dict[str, float] = {}
+        self.wake = asyncio.Event()
+        self.task: Optional[asyncio.Task] = None
+        self.sent = 0
+        self.coalesced = 0
+
+    def wants(self, key: EntityKey) -> bool:
+        sub = self.subs.get(key[0])
+        return sub is not None and sub.wants(key[1])
+
+    def mark(self, keys: Iterable[EntityKey]):
+        marked = False
+        for key in keys:
+            if not self.wants(key):
+                continue
+            ids = self.pending.setdefault(key[0], {})
+            if key[1] in ids:
+                self.coalesced += 1
+            else:
+                ids[key[1]] = None
+            marked = True
+            if len(ids) > self.max_pending:
+                # far behind on this topic: send its full current state next time instead
+                ids.clear()
+                ids.update(dict.fromkeys(i for t, i in self.broadcaster.keys(key[0]) if self.wants((t, i))))
+        if marked:
+            self.wake.set()
+
+    def subscribe(self, topics: Iterable[Dict[str, Any]]) -> List[str]:
+        added = []
+        for spec in topics:
+            topic = spec.get("topic") if isinstance(spec, dict) else spec
+            if topic not in TOPICS:
+                continue
+            spec = spec if isinstance(spec, dict) else {}
+            self.subs[topic] = Subscription(spec.get("ids"), spec.get("max_hz"))
+            self.pending.pop(topic, None)
+            self.next_due.pop(topic, None)
+            added.append(topic)
+        # current state of what was just subscribed
+        self.mark(k for k in self.broadcaster.keys() if k[0] in added)
+        return added
+
+    def unsubscribe(self, topics: Iterable[str]) -> List[str]:
+        removed = []
+        for topic in topics:
+            if self.subs.pop(topic, None) is not None:
+                self.pending.pop(topic, None)
+                removed.append(topic)
+        return removed
+
+    def handle_message(self, raw: str) -> Optional[Dict[str, Any]]:
+        """Apply a client control message; returns the reply to send (if any)."""
+        try:
+            msg = json.loads(raw)
+        except Exception:
+            return {"type": "error", "message": "invalid json"}
+        if not isinstance(msg, dict):
+            return None
+        kind = msg.get("type")
+        if kind == "subscribe":
+            if msg.get("replace", True):
+                self.subs = {}
+                self.pending = {}
+            self.subscribe(msg.get("topics") or [])
+            return {"type": "subscribed", "topics": sorted(self.subs)}
+        if kind == "unsubscribe":
+            self.unsubscribe(msg.get("topics") or [])
+            return {"type": "subscribed", "topics": sorted(self.subs)}
+        return None
+
+    def _take_due(self, now: float) -> Tuple[List[EntityKey], Optional[float]]:
+        """Pending keys of topics whose rate allows a send now, and the next wake-up."""
+        keys: List[EntityKey] = []
+        wait = None
+        for topic in list(self.pending):
+            ids = self.pending[topic]
+            if not ids:
+                continue
+            due = self.next_due.get(topic, 0.0)
+            if due > now:
+                wait = due - now if wait is None else min(wait, due - now)
+                continue
+            keys.extend((topic, i) for i in ids)
+            self.pending[topic] = {}
+            sub = self.subs.get(topic)
+            if sub is not None and sub.min_interval_s:
+                self.next_due[topic] = now + sub.min_interval_s
+        return keys, wait
+
+    async def run(self):
+        b = self.broadcaster
+        wait = None
+        try:
+            while True:
+                if wait is None:
+                    await self.wake.wait()
+                else:
+                    try:
+                        await asyncio.wait_for(self.wake.wait(), timeout=wait)
+                    except asyncio.TimeoutError:
+                        pass
+                self.wake.clear()
+                keys, wait = self._take_due(time.monotonic())
+                if not keys:
+                    continue
+                if self.binary:
+                    tag_keys = tuple(k for k in keys if k[0] == "tags")
+                    keys = [k for k in keys if k[0] != "tags"]
+                    if tag_keys:
+                        await self._send_positions(tag_keys)
+                if not keys:
+                    continue
+                msg = b.encode(tuple(keys))
+                if msg is None:
+                    continue
+                t0 = time.perf_counter()
+                await asyncio.wait_for(self.ws.send_text(msg), timeout=b.send_timeout_s)
+                metrics.WS_SEND_SECONDS.observe(time.perf_counter() - t0)
+                self.sent += 1
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            # timeout or broken socket: drop only this client
+            b.dropped += 1
+            metrics.WS_DROPPED.inc()
+            b.discard(self)
+            try:
+                await asyncio.wait_for(self.ws.close(), timeout=1.0)
+            except Exception:
+                pass
+
+    async def _send_positions(self, keys: Tuple[EntityKey, ...]):
+        b = self.broadcaster
+        frame = b.encode_positions(keys)
+        if frame is None:
+            return
+        if len(b.tag_list) > self.tag_index_sent:
+            index_msg = json.dumps({"type": "tag_index", "tags": b.tag_list})
+            await asyncio.wait_for(self.ws.send_text(index_msg), timeout=b.send_timeout_s)
+            self.tag_index_sent = len(b.tag_list)
+        t0 = time.perf_counter()
+        await asyncio.wait_for(self.ws.send_bytes(frame), timeout=b.send_timeout_s)
+        metrics.WS_SEND_SECONDS.observe(time.perf_counter() - t0)
+        self.sent += 1
+
+
+class LiveBroadcaster:
+    def __init__(self, send_timeout_s: float = 2.0, max_pending: int = 1024, max_events: int = 100,
+                 ring_size: int = 512):
+        self.send_timeout_s = send_timeout_s
+        self.max_pending = max_pending
+        self.max_events = max_events
+        self._fragments: Dict[EntityKey, str] = {}
+        self._values: Dict[EntityKey, Dict[str, Any]] = {}
+        self._clients: Dict[Any, LiveClient] = {}
+        self._msg_cache: Dict[Tuple[EntityKey, ...], str] = {}
+        self._records: Dict[EntityKey, bytes] = {}  # packed POSITION_RECORD per tag
+        self._bin_cache: Dict[Tuple[EntityKey, ...], bytes] = {}
+        self.tag_list: List[str] = []  # append-only: index -> tag_mac
+        self._tag_index: Dict[str, int] = {}
+        self.dropped = 0
+        self.seq = 0
+        self._ring: "deque[Tuple[int, Tuple[EntityKey, ...]]]" = deque(maxlen=ring_size)
+        self._wake: Optional[asyncio.Event] = None
+        self._interest: Dict[str, float] = {}  # topic -> monotonic deadline, for stream clients
+
+    def keys(self, topic: Optional[str] = None) -> List[EntityKey]:
+        if topic is None:
+            return list(self._fragments)
+        return [k for k in self._fragments if k[0] == topic]
+
+    def add(self, ws, binary: bool = False) -> LiveClient:
+        client = LiveClient(self, ws, self.max_pending, binary=binary)
+        self._clients[ws] = client
+        client.mark(self._fragments)  # initial full snapshot
+        client.task = asyncio.ensure_future(client.run())
+        return client
+
+    def get(self, ws) -> Optional[LiveClient]:
+        return self._clients.get(ws)
+
+    def discard(self, client_or_ws):
+        client = client_or_ws if isinstance(client_or_ws, LiveClient) else self._clients.get(client_or_ws)
+        if client is None:
+            return
+        self._clients.pop(client.ws, None)
+        task = client.task
+        if task is not None and task is not asyncio.current_task() and not task.done():
+            task.cancel()
+
+    def clients(self) -> List[LiveClient]:
+        return list(self._clients.values())
+
+    def has_subscribers(self, topic: str) -> bool:
+        if self._interest.get(topic, 0.0) > time.monotonic():
+            return True
+        return any(topic in c.subs for c in self._clients.values())
+
+    def touch(self, topics: Iterable[str], ttl_s: float = 30.0):
+        """Mark topics as wanted by stream/long-poll clients for ``ttl_s`` seconds."""
+        deadline = time.monotonic() + ttl_s
+        for topic in topics:
+            self._interest[topic] = max(self._interest.get(topic, 0.0), deadline)
+
+    def publish(self, events: Iterable[Dict[str, Any]]) -> int:
+        """Store events, encode changed entities once and wake the clients. Returns #changed."""
+        with metrics.WS_PUBLISH_SECONDS.time():
+            return self._publish(events)
+
+    def _publish(self, events: Iterable[Dict[str, Any]]) -> int:
+        changed: List[EntityKey] = []
+        for ev in events:
+            key = entity_key(ev)
+            if key is None or self._values.get(key) == ev:
+                continue
+            self._values[key] = ev
+            self._fragments[key] = json.dumps(ev)
+            if key[0] == "tags":
+                self._records[key] = self._pack_position(key[1], ev)
+            changed.append(key)
+        if changed:
+            self._trim_events()
+            self._msg_cache = {}
+            self._bin_cache = {}
+            for client in self._clients.values():
+                client.mark(changed)
+            self.seq += 1
+            self._ring.append((self.seq, tuple(changed)))
+            if self._wake is not None:
+                self._wake.set()
+                self._wake = None
+        return len(changed)
+
+    def changes_since(self, since: int, topics: Iterable[str] = DEFAULT_TOPICS,
+                      ids: Optional[Iterable[str]] = None) -> Tuple[int, List[Dict[str, Any]], bool]:
+        """``(seq, events, snapshot)``: current values of what changed after ``since``.
+
+        ``snapshot`` is True when ``since`` is no longer covered by the ring (or
+        is 0); the events are then the full state of the requested topics.
+        """
+        topics = set(topics)
+        ids = set(ids) if ids else None
+        oldest = self._ring[0][0] if self._ring else self.seq + 1
+        if since <= 0 or since < oldest - 1 or since > self.seq:
+            keys = [k for k in self._values if k[0] in topics]
+            snapshot = True
+        else:
+            seen: Dict[EntityKey, None] = {}
+            for seq, changed in self._ring:
+                if seq > since:
+                    for k in changed:
+                        if k[0] in topics:
+                            seen[k] = None
+            keys = list(seen)
+            snapshot = False
+        events = [self._values[k] for k in keys if k in self._values and (ids is None or k[1] in ids)]
+        return self.seq, events, snapshot
+
+    async def wait_changes(self, since: int, timeout: float, topics: Iterable[str] = DEFAULT_TOPICS,
+                           ids: Optional[Iterable[str]] = None) -> Tuple[int, List[Dict[str, Any]], bool]:
+        """Like ``changes_since`` but waits up to ``timeout`` for a matching change."""
+        topics = tuple(topics)
+        deadline = time.monotonic() + timeout
+        while True:
+            seq, events, snapshot = self.changes_since(since, topics, ids)
+            if events or (snapshot and seq != since):
+                return seq, events, snapshot
+            # nothing for this client yet: skip unrelated publishes
+            since = seq
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return seq, [], False
+            if self._wake is None:
+                self._wake = asyncio.Event()
+            try:
+                await asyncio.wait_for(self._wake.wait(), remaining)
+            except asyncio.TimeoutError:
+                pass
+
+    def _trim_events(self):
+        # log events are a stream: keep only the most recent ones as "current state"
+        event_keys = self.keys("events")
+        if len(event_keys) > self.max_events:
+            self.remove(event_keys[: len(event_keys) - self.max_events])
+
+    def remove(self, keys: Iterable[EntityKey]):
+        for key in keys:
+            self._values.pop(key, None)
+            self._fragments.pop(key, None)
+            self._records.pop(key, None)
+
+    def _pack_position(self, tag_mac: str, ev: Dict[str, Any]) -> bytes:
+        idx = self._tag_index.get(tag_mac)
+        if idx is None:
+            idx = self._tag_index[tag_mac] = len(self.tag_list)
+            self.tag_list.append(tag_mac)
+        pos = ev.get("position_cm")
+        if pos:
+            return POSITION_RECORD.pack(idx, STATE_CODES.get(ev.get("state"), 0), 1, ev.get("ts_ms") or 0,
+                                        pos.get("x") or 0.0, pos.get("y") or 0.0, pos.get("z") or 0.0)
+        return POSITION_RECORD.pack(idx, STATE_CODES.get(ev.get("state"), 0), 0, ev.get("ts_ms") or 0, 0.0, 0.0, 0.0)
+
+    def encode_positions(self, keys: Tuple[EntityKey, ...]) -> Optional[bytes]:
+        """Binary positions frame for tag ``keys``, shared between clients like ``encode``."""
+        frame = self._bin_cache.get(keys)
+        if frame is None:
+            records = [self._records[k] for k in keys if k in self._records]
+            if not records:
+                return None
+            frame = POSITIONS_HEADER.pack(BINARY_KIND_POSITIONS, BINARY_VERSION, len(records)) + b"".join(records)
+            self._bin_cache[keys] = frame
+        return frame
+
+    def encode(self, keys: Tuple[EntityKey, ...]) -> Optional[str]:
+        """Bulk message for ``keys``; clients asking for the same set share one string."""
+        msg = self._msg_cache.get(keys)
+        if msg is None:
+            parts = [self._fragments[k] for k in keys if k in self._fragments]
+            if not parts:
+                return None
+            msg = '{"type": "bulk", "events": [' + ", ".join(parts) + "]}"
+            self._msg_cache[keys] = msg
+        return msg
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "clients": len(self._clients),
+            "entities": len(self._fragments),
+            "dropped": self.dropped,
+            "per_client": [
+                {"topics": sorted(c.subs), "binary": c.binary, "pending": sum(len(v) for v in c.pending.values()), "sent": c.sent, "coalesced": c.coalesced}
+                for c in self._clients.values()
+            ],
+        }
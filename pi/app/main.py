@@ -1,6 +1,5 @@
 from fastapi import FastAPI, Request, WebSocket
 from fastapi.responses import HTMLResponse
-from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 import os
 import threading
@@ -8,8 +7,14 @@ import asyncio
 import json
 import sys
 
+from .db import get_live_db_path
 from .db.migrations.runner import run_migrations
+from .db.ram_db import disable as disable_ram_db, enable_from_env as enable_ram_db
+from . import metrics
 from .api import router as api_router
+from .api import routes_metrics
+from .live_broadcaster import LiveBroadcaster
+from .assets import AssetPipeline
 
 try:
     from app.db.persistence import get_persistence
@@ -22,33 +27,41 @@ app = FastAPI()
 
 BASE_DIR = os.path.dirname(__file__)
 templates = Jinja2Templates(directory=os.path.join(BASE_DIR, 'web', 'templates'))
-app.mount('/static', StaticFiles(directory=os.path.join(BASE_DIR, 'web', 'static')), name='static')
-
-# cache-busting for static assets
-try:
-    APP_JS_VERSION = str(int(os.path.getmtime(os.path.join(BASE_DIR, 'web', 'static', 'app.js'))))
-    APP_CSS_VERSION = str(int(os.path.getmtime(os.path.join(BASE_DIR, 'web', 'static', 'style.css'))))
-except Exception:
-    APP_JS_VERSION = APP_CSS_VERSION = "1"
-templates.env.globals["app_js_version"] = APP_JS_VERSION
-templates.env.globals["app_css_version"] = APP_CSS_VERSION
+# hashed, precompressed static assets (see app.assets); templates use asset_url()
+assets = AssetPipeline(
+    os.path.join(BASE_DIR, 'web', 'static'),
+    os.environ.get('LT_ASSET_CACHE', os.path.join(BASE_DIR, 'data', 'asset_cache')),
+)
+templates.env.globals["asset_url"] = assets.url
 
 
 @app.on_event('startup')
 def startup():
     loop = asyncio.get_event_loop()
 
+    # LT_DB_RAM=1: load the DB into tmpfs before anything opens it
+    try:
+        enable_ram_db()
+    except Exception as e:
+        print(f"[startup] RAM database disabled: {e}", file=sys.stderr)
+
     # Run migrations in a separate thread to avoid blocking startup in dev
     def _run():
         try:
-            run_migrations()
+            run_migrations(get_live_db_path())
         except Exception as e:
             print(f"[startup] migrations failed: {e}", file=sys.stderr)
     t = threading.Thread(target=_run, daemon=True)
     t.start()
 
+    try:
+        assets.build()
+    except Exception as e:
+        print(f"[startup] asset build failed: {e}", file=sys.stderr)
+
     # initialize state for websocket clients and calibration
-    app.state.ws_clients = set()
+    app.state.live_broadcaster = LiveBroadcaster()
+    metrics.REGISTRY.add_collector(_collect_ws_metrics)
     app.state.active_calibration = None
     app.state.mqtt_ok = False
     # initialize tracking engine (lazy: may import paho later)
@@ -116,74 +129,174 @@ def startup():
         loop.create_task(_dmx_loop())
     except Exception:
         pass
-    # broadcaster loop (websocket updates)
+    # broadcaster loops (websocket updates)
     try:
+        loop.create_task(_tracking_forwarder())
         loop.create_task(_broadcaster())
     except Exception as e:
         print(f"[startup] broadcaster start failed: {e}", file=sys.stderr)
 
 
-async def _dmx_loop():
-    while True:
+def _collect_ws_metrics():
+    b = getattr(app.state, 'live_broadcaster', None)
+    if b is not None:
+        metrics.WS_CLIENTS.set(len(b.clients()))
+
+
+@app.on_event('shutdown')
+async def on_shutdown():
+    # flush a running DMX capture so the file ends on a complete record
+    eng = getattr(app.state, "dmx_engine", None)
+    if eng:
+        try:
+            eng.stop_capture()
+        except Exception:
+            pass
+    try:
+        from app.db.event_sink import get_event_sink
+        get_event_sink().close()
+    except Exception:
+        pass
+    try:
+        from app.db.async_persistence import get_async_persistence
+        get_async_persistence().close()
+    except Exception:
+        pass
+    try:
+        from app.bridge_client import close_bridge_sessions
+        close_bridge_sessions()
+    except Exception:
+        pass
+    mc = getattr(app.state, "mqtt_client", None)
+    if mc is not None and getattr(mc, "commands", None) is not None:
         try:
-            eng = getattr(app.state, "dmx_engine", None)
-            if eng:
-                eng.tick()
+            mc.commands.close()
         except Exception:
             pass
-        await asyncio.sleep(1.0 / 30.0)
+    # last: everything above may still write
+    try:
+        disable_ram_db()
+    except Exception:
+        pass
+
+
+async def _dmx_loop():
+    eng = getattr(app.state, "dmx_engine", None)
+    if eng:
+        await eng.run(hz=30.0)
+
+
+async def _tracking_forwarder():
+    # wake on new tracking records instead of copying latest_position on a timer
+    te = getattr(app.state, 'tracking_engine', None)
+    if not te:
+        return
+    sub = te.bus.subscribe()
+    try:
+        while True:
+            first = await sub.get()
+            latest = {}
+            for rec in [first] + sub.drain():
+                latest[rec.tag_mac] = rec
+            events = []
+            for rec in latest.values():
+                ev = rec.to_payload()
+                ev['type'] = 'tracking'
+                events.append(ev)
+            try:
+                app.state.live_broadcaster.publish(events)
+            except Exception:
+                pass
+    finally:
+        sub.close()
+
+
+def _read_anchor_rows():
+    from .db import connect_db
+    from .core.anchor_positions import load_anchor_offsets
+    db = connect_db()
+    try:
+        rows = [dict(r) for r in db.execute('SELECT mac,x_cm,y_cm,z_cm,updated_at_ms FROM anchor_positions').fetchall()]
+        return rows, load_anchor_offsets(db)
+    except Exception:
+        return [], {}
+    finally:
+        db.close()
+
+
+def _read_state_event():
+    p = get_persistence()
+    return {
+        'type': 'state',
+        'id': 'system',
+        'state': p.get_setting('system.state', 'SETUP'),
+        'tracking_tag_mac': p.get_setting('tracking.tag_mac', '') or '',
+    }
 
 
 async def _broadcaster():
-    # periodically read anchor_positions and tracking positions and broadcast to connected websockets
+    # feed anchor, state, DMX and event updates into the live broadcaster; it sends
+    # only what changed, and only to clients subscribed to it (tags: _tracking_forwarder)
+    from .db.async_persistence import get_async_persistence
+    from .db.versions import versions
+    anchor_keys = set()
+    anchors_ver = None
+    settings_ver = None
+    next_event_read = 0.0
+    last_event_id = 0
     while True:
         await asyncio.sleep(0.2)
         try:
-            from .db import connect_db
-            from .core.anchor_positions import load_anchor_offsets
-            db = connect_db()
-            try:
-                rows = db.execute('SELECT mac,x_cm,y_cm,z_cm,updated_at_ms FROM anchor_positions').fetchall()
-                offsets = load_anchor_offsets(db)
-            except Exception:
-                rows = []
-                offsets = {}
-            finally:
-                db.close()
-
+            b = app.state.live_broadcaster
+            ap = get_async_persistence()
             events = []
-            ts = int(asyncio.get_event_loop().time() * 1000)
-            for r in rows:
-                dx, dy, dz = offsets.get(r["mac"], (0.0, 0.0, 0.0))
-                events.append({
-                    'type': 'anchor_pos',
-                    'mac': r['mac'],
-                    'position_cm': {'x': r['x_cm'] + dx, 'y': r['y_cm'] + dy, 'z': r['z_cm'] + dz},
-                    'position_base_cm': {'x': r['x_cm'], 'y': r['y_cm'], 'z': r['z_cm']},
-                    'offset_cm': {'x': dx, 'y': dy, 'z': dz},
-                    'ts_ms': r['updated_at_ms'] or ts
-                })
-
-            te = getattr(app.state, 'tracking_engine', None)
-            if te:
-                for tag, payload in te.latest_position.items():
-                    ev = payload.copy()
-                    ev['type'] = 'tracking'
-                    ev['tag_mac'] = tag
-                    events.append(ev)
-
-            if not events:
-                continue
-
-            # broadcast
-            to_remove = []
-            for ws in list(app.state.ws_clients):
-                try:
-                    await ws.send_text(json.dumps({'type': 'bulk', 'events': events}))
-                except Exception:
-                    to_remove.append(ws)
-            for ws in to_remove:
-                app.state.ws_clients.discard(ws)
+            now = asyncio.get_event_loop().time()
+            ver = versions('anchors')
+            if ver != anchors_ver:
+                # anchors change rarely: re-read them only after a write bumped their version
+                anchors_ver = ver
+                rows, offsets = await ap.run(_read_anchor_rows)
+
+                ts = int(now * 1000)
+                seen = set()
+                for r in rows:
+                    dx, dy, dz = offsets.get(r["mac"], (0.0, 0.0, 0.0))
+                    seen.add(('anchor_pos', r['mac']))
+                    events.append({
+                        'type': 'anchor_pos',
+                        'mac': r['mac'],
+                        'position_cm': {'x': r['x_cm'] + dx, 'y': r['y_cm'] + dy, 'z': r['z_cm'] + dz},
+                        'position_base_cm': {'x': r['x_cm'], 'y': r['y_cm'], 'z': r['z_cm']},
+                        'offset_cm': {'x': dx, 'y': dy, 'z': dz},
+                        'ts_ms': r['updated_at_ms'] or ts
+                    })
+                b.remove(anchor_keys - seen)
+                anchor_keys = seen
+
+            if b.has_subscribers('state') and get_persistence:
+                ver = versions('settings')
+                if ver != settings_ver:
+                    settings_ver = ver
+                    events.append(await ap.run(_read_state_event))
+
+            eng = getattr(app.state, 'dmx_engine', None)
+            if eng and b.has_subscribers('dmx'):
+                for uni, frame in eng.merger.frames().items():
+                    events.append({'type': 'dmx', 'universe': uni, 'channels': list(frame[1:])})
+
+            if b.has_subscribers('events') and get_persistence and now >= next_event_read:
+                next_event_read = now + 1.0
+                rows = await ap.list_events(limit=b.max_events)
+                for r in reversed(rows):
+                    if r['id'] > last_event_id:
+                        ev = dict(r)
+                        ev['type'] = 'event'
+                        events.append(ev)
+                if rows:
+                    last_event_id = max(last_event_id, rows[0]['id'])
+
+            if events:
+                b.publish(events)
         except Exception:
             await asyncio.sleep(1)
 
@@ -191,12 +304,17 @@ async def _broadcaster():
 @app.websocket('/ws/live')
 async def ws_live(websocket: WebSocket):
     await websocket.accept()
-    app.state.ws_clients.add(websocket)
+    # opt-in binary position frames: /ws/live?format=binary
+    binary = websocket.query_params.get('format') == 'binary'
+    client = app.state.live_broadcaster.add(websocket, binary=binary)
     try:
-        # simple keep-alive loop
+        # subscription messages; ping when the client is quiet
         while True:
             try:
-                await asyncio.wait_for(websocket.receive_text(), timeout=30.0)
+                raw = await asyncio.wait_for(websocket.receive_text(), timeout=30.0)
+                reply = client.handle_message(raw)
+                if reply:
+                    await websocket.send_text(json.dumps(reply))
             except asyncio.TimeoutError:
                 # send ping
                 try:
@@ -204,10 +322,17 @@ async def ws_live(websocket: WebSocket):
                 except Exception:
                     break
     finally:
-        app.state.ws_clients.discard(websocket)
+        app.state.live_broadcaster.discard(websocket)
 
 
 app.include_router(api_router)
+# scrapers expect /metrics at the root; same handler as /api/v1/metrics
+app.add_api_route('/metrics', routes_metrics.metrics, methods=['GET'], include_in_schema=False)
+
+
+@app.api_route('/static/{name:path}', methods=['GET', 'HEAD'], name='static')
+def static_asset(name: str, request: Request):
+    return assets.response(request, name)
 
 
 @app.get('/', response_class=HTMLResponse)
@@ -0,0 +1,276 @@
+"""Dependency-free metrics registry (counters, gauges, fixed-bucket histograms).
+
+Hot paths update module-level metrics defined at the bottom of this file;
+``/metrics`` renders the registry in the Prometheus text format (0.0.4) or
+as JSON. Labelled metrics keep one child per label-value tuple, so label
+values must come from small sets (topic types, universes, tags, method
+names). Updates take a per-metric lock and cost a few hundred nanoseconds.
+"""
+import bisect
+import functools
+import math
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+TIME_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+ITERATION_BUCKETS = (1, 2, 3, 4, 6, 8, 12, 16, 24)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _fmt(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if value == -math.inf:
+        return "-Inf"
+    if isinstance(value, float) and value.is_integer() and abs(value) < 1e15:
+        return str(int(value))
+    return repr(value)
+
+
+def _label_str(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._children: Dict[Tuple[str, ...], Any] = {}
+
+    def _key(self, labels: Dict[str, Any]) -> Tuple[str, ...]:
+        if len(labels) != len(self.labelnames):
+            raise ValueError(f"{self.name}: expected labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[n]) for n in self.labelnames)
+
+    def clear(self):
+        with self._lock:
+            self._children.clear()
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._children[key] = self._children.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._children.get(self._key(labels), 0)
+
+    def _samples(self):
+        with self._lock:
+            return [(self.name, k, v) for k, v in self._children.items()]
+
+    def _json(self):
+        with self._lock:
+            return [{"labels": dict(zip(self.labelnames, k)), "value": v} for k, v in self._children.items()]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._children[key] = value
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+
+class _HistogramChild:
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self, n: int):
+        self.counts = [0] * n
+        self.sum = 0.0
+        self.count = 0
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = TIME_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(float(b) for b in buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        # first bucket >= value; index len(buckets) is +Inf
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            child = self._children.get(key)
+            if child is None:
+                child = self._children[key] = _HistogramChild(len(self.buckets) + 1)
+            child.counts[i] += 1
+            child.sum += value
+            child.count += 1
+
+    def time(self, **labels) -> "_Timer":
+        """Context manager observing the elapsed seconds."""
+        return _Timer(self, labels)
+
+    def snapshot(self, **labels) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            child = self._children.get(self._key(labels))
+            return self._child_dict(child) if child else None
+
+    def _child_dict(self, child: _HistogramChild) -> Dict[str, Any]:
+        cumulative, acc = {}, 0
+        for bound, n in zip(self.buckets + (math.inf,), child.counts):
+            acc += n
+            cumulative[_fmt(bound)] = acc
+        return {"count": child.count, "sum": child.sum, "buckets": cumulative}
+
+    def _samples(self):
+        out = []
+        with self._lock:
+            for key, child in self._children.items():
+                acc = 0
+                for bound, n in zip(self.buckets + (math.inf,), child.counts):
+                    acc += n
+                    out.append((self.name + "_bucket", key, acc, f'le="{_fmt(bound)}"'))
+                out.append((self.name + "_sum", key, child.sum))
+                out.append((self.name + "_count", key, child.count))
+        return out
+
+    def _json(self):
+        with self._lock:
+            return [dict(labels=dict(zip(self.labelnames, k)), **self._child_dict(c)) for k, c in self._children.items()]
+
+
+class _Timer:
+    __slots__ = ("hist", "labels", "t0")
+
+    def __init__(self, hist: Histogram, labels: Dict[str, Any]):
+        self.hist = hist
+        self.labels = labels
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.hist.observe(time.perf_counter() - self.t0, **self.labels)
+        return False
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: List[Callable[[], None]] = []
+        self._lock = threading.Lock()
+
+    def _register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                if type(existing) is not type(metric):
+                    raise ValueError(f"metric {metric.name} already registered as {existing.kind}")
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, help, labelnames))
+
+    def gauge(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(name, help, labelnames))
+
+    def histogram(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = TIME_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, help, labelnames, buckets))
+
+    def add_collector(self, fn: Callable[[], None]):
+        """``fn`` runs before every render, e.g. to set gauges from live objects."""
+        self._collectors.append(fn)
+
+    def collect(self):
+        for fn in list(self._collectors):
+            try:
+                fn()
+            except Exception:
+                pass
+
+    def render_text(self) -> str:
+        self.collect()
+        lines = []
+        for m in sorted(self._metrics.values(), key=lambda m: m.name):
+            lines.append(f"# HELP {m.name} {_escape(m.help)}")
+            lines.append(f"# TYPE {m.name} {m.kind}")
+            for sample in m._samples():
+                name, key, value = sample[0], sample[1], sample[2]
+                extra = sample[3] if len(sample) > 3 else ""
+                lines.append(f"{name}{_label_str(m.labelnames, key, extra)} {_fmt(value)}")
+        return "\n".join(lines) + "\n"
+
+    def as_dict(self) -> Dict[str, Any]:
+        self.collect()
+        return {m.name: {"type": m.kind, "help": m.help, "samples": m._json()}
+                for m in sorted(self._metrics.values(), key=lambda m: m.name)}
+
+
+REGISTRY = Registry()
+
+
+def instrument_methods(cls, hist: Histogram, prefix: str = ""):
+    """Time every public method of ``cls`` into ``hist`` labelled ``method``."""
+    for name, fn in list(vars(cls).items()):
+        if name.startswith("_") or not callable(fn):
+            continue
+
+        def wrap(fn=fn, label=prefix + name):
+            @functools.wraps(fn)
+            def timed(*args, **kwargs):
+                t0 = time.perf_counter()
+                try:
+                    return fn(*args, **kwargs)
+                finally:
+                    hist.observe(time.perf_counter() - t0, method=label)
+            return timed
+
+        setattr(cls, name, wrap())
+    return cls
+
+
+# --- metrics of the hot paths ------------------------------------------------
+MQTT_MESSAGES = REGISTRY.counter("lt_mqtt_messages_total", "MQTT messages received per topic type", ("type",))
+MQTT_DECODE_ERRORS = REGISTRY.counter("lt_mqtt_decode_errors_total", "MQTT payloads that were not valid JSON")
+MQTT_DECODE_SECONDS = REGISTRY.histogram("lt_mqtt_decode_seconds", "JSON decode time of MQTT payloads")
+MQTT_HANDLE_SECONDS = REGISTRY.histogram("lt_mqtt_handle_seconds", "Handling time of MQTT messages per topic type", ("type",))
+
+RANGE_SAMPLES = REGISTRY.counter("lt_range_samples_ingested_total", "Range samples stored in the range cache")
+RANGE_DROPPED = REGISTRY.counter("lt_range_samples_dropped_total", "Range samples discarded at ingest", ("reason",))
+
+TRACKING_TICK_SECONDS = REGISTRY.histogram("lt_tracking_tick_seconds", "Duration of one tracking engine tick")
+TRACKING_SOLVE_SECONDS = REGISTRY.histogram("lt_tracking_solve_seconds", "Position solve time per tag", ("tag",))
+SOLVER_ITERATIONS = REGISTRY.histogram("lt_solver_iterations", "Trilateration iterations per solve", buckets=ITERATION_BUCKETS)
+SOLVER_RESULTS = REGISTRY.counter("lt_solver_results_total", "Trilateration outcomes (ok or the failure reason)", ("reason",))
+
+DMX_TICK_SECONDS = REGISTRY.histogram("lt_dmx_tick_seconds", "Duration of one DMX engine tick")
+DMX_FRAMES = REGISTRY.counter("lt_dmx_frames_sent_total", "DMX frames handed to the output driver", ("universe",))
+DMX_SEND_ERRORS = REGISTRY.counter("lt_dmx_send_errors_total", "DMX frames the output driver failed to send", ("universe",))
+
+WS_CLIENTS = REGISTRY.gauge("lt_ws_clients", "Connected live WebSocket clients")
+WS_DROPPED = REGISTRY.counter("lt_ws_clients_dropped_total", "Live WebSocket clients dropped for slow or broken sends")
+WS_PUBLISH_SECONDS = REGISTRY.histogram("lt_ws_publish_seconds", "Time to store, encode and fan out one live publish")
+WS_SEND_SECONDS = REGISTRY.histogram("lt_ws_send_seconds", "Time of one WebSocket send to a client")
+
+DB_QUERY_SECONDS = REGISTRY.histogram("lt_db_query_seconds", "SQLite time per persistence method", ("method",))
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.15, 0.25, 0.5, 1.0, 2.5, 5.0)
+LATENCY_SECONDS = REGISTRY.histogram("lt_latency_seconds", "Range-to-DMX latency per pipeline stage", ("stage",),
+                                     buckets=LATENCY_BUCKETS)
+ANCHOR_LATENCY_SECONDS = REGISTRY.histogram("lt_anchor_latency_seconds", "Per-anchor sample transport time and age at solve",
+                                            ("anchor", "stage"), buckets=LATENCY_BUCKETS)
@@ -9,6 +9,8 @@ try:
 except Exception:
     mqtt = None
 
+from app import metrics
+from app.command_dispatcher import ACKED, CommandDispatcher
 from app.db.persistence import get_persistence
 
 class MQTTClientWrapper:
@@ -20,10 +22,22 @@ class MQTTClientWrapper:
         self.connected = False
         self._status_cb = status_cb
         self._loop_thread = None
+        # set by /anchors/survey/start; receives dev/<mac>/survey ranges
+        self.survey_collector = None
+        # dev/<mac>/cmd commands, resolved by dev/<mac>/cmd_ack
+        self.commands = CommandDispatcher(self._publish_cmd)
 
-    def _ensure_anchor_index(self, mac: str, p) -> Optional[int]:
+    def _publish_cmd(self, topic: str, payload: str) -> bool:
+        client = self._client
+        if not client:
+            return False
+        info = client.publish(topic, payload, qos=1)
+        return getattr(info, "rc", 0) == 0
+
+    def _ensure_anchor_index(self, mac: str, p, current=None, used: Optional[set] = None) -> Optional[int]:
         try:
-            current = p.get_device_setting(mac, "anchor_index", "")
+            if current is None:
+                current = p.get_device_setting(mac, "anchor_index", "")
             if current != "":
                 idx = int(current)
                 if 0 <= idx <= 7:
@@ -31,16 +45,17 @@ class MQTTClientWrapper:
         except Exception:
             pass
 
-        used = set()
-        try:
-            rows = p.list_device_settings_by_key("anchor_index")
-            for r in rows:
-                try:
-                    used.add(int(r.get("value")))
-                except Exception:
-                    pass
-        except Exception:
-            pass
+        if used is None:
+            used = set()
+            try:
+                rows = p.list_device_settings_by_key("anchor_index")
+                for r in rows:
+                    try:
+                        used.add(int(r.get("value")))
+                    except Exception:
+                        pass
+            except Exception:
+                pass
 
         for i in range(8):
             if i not in used:
@@ -48,10 +63,11 @@ class MQTTClientWrapper:
                     p.upsert_device_setting(mac, "anchor_index", str(i))
                 except Exception:
                     pass
+                used.add(i)
                 return i
         return None
 
-    def _build_default_cfg(self, mac: str, p):
+    def _base_cfg(self, p) -> dict:
         cfg = {}
         ssid = (p.get_setting('wifi.ssid', '') or '').strip()
         wpass = p.get_setting('wifi.pass', '') or ''
@@ -70,11 +86,19 @@ class MQTTClientWrapper:
             cfg['mqtt_host'] = host
         if port:
             cfg['mqtt_port'] = port
-        dev = p.get_device(mac)
+        return cfg
+
+    def _build_default_cfg(self, mac: str, p, base: Optional[dict] = None, dev: Optional[dict] = None,
+                           used: Optional[set] = None):
+        """Settings to push to ``mac``; ``base``/``dev``/``used`` come from bulk queries when given."""
+        cfg = dict(base) if base is not None else self._base_cfg(p)
+        if dev is None:
+            dev = p.get_device(mac)
         if dev and dev.get('alias'):
             cfg['alias'] = dev['alias']
         if dev and (dev.get('role') or '').upper() == 'ANCHOR':
-            idx = self._ensure_anchor_index(mac, p)
+            current = dev["settings"].get("anchor_index", "") if "settings" in dev else None
+            idx = self._ensure_anchor_index(mac, p, current=current, used=used)
             if idx is not None:
                 cfg['anchor_index'] = idx
         return cfg
@@ -83,25 +107,35 @@ class MQTTClientWrapper:
         payload = json.dumps(cfg, sort_keys=True, separators=(",", ":"))
         return hashlib.sha256(payload.encode("utf-8")).hexdigest()
 
-    def _maybe_apply_defaults(self, mac: str, p) -> bool:
+    def _maybe_apply_defaults(self, mac: str, p, base: Optional[dict] = None, dev: Optional[dict] = None,
+                              used: Optional[set] = None) -> bool:
         if not self._client:
             return False
-        cfg = self._build_default_cfg(mac, p)
+        cfg = self._build_default_cfg(mac, p, base=base, dev=dev, used=used)
         if not cfg:
             return False
         cfg_hash = self._cfg_hash(cfg)
-        last_hash = p.get_device_setting(mac, "cfg_hash", "")
+        if dev is not None and "settings" in dev:
+            last_hash = dev["settings"].get("cfg_hash", "")
+        else:
+            last_hash = p.get_device_setting(mac, "cfg_hash", "")
         if last_hash == cfg_hash:
             return False
-        payload = {
-            "type": "cmd",
-            "cmd": "apply_settings",
-            "cmd_id": f"auto_cfg_{int(time.time()*1000)}",
-            "settings": cfg,
-        }
-        topic = f"dev/{mac}/cmd"
-        self._client.publish(topic, json.dumps(payload), qos=1)
-        p.upsert_device_setting(mac, "cfg_hash", cfg_hash)
+        cmd = self.commands.submit_new(mac, "apply_settings", {"settings": cfg}, prefix="auto_cfg",
+                                       key=f"auto_cfg:{mac}:{cfg_hash}")
+        if cmd is None:
+            # the same settings are still waiting for their ack
+            return False
+
+        def _acked(fut, mac=mac, cfg_hash=cfg_hash):
+            # only a confirmed apply counts; otherwise the next pass pushes again
+            if fut.result().get("state") == ACKED:
+                try:
+                    get_persistence().upsert_device_setting(mac, "cfg_hash", cfg_hash)
+                except Exception:
+                    pass
+
+        cmd.future.add_done_callback(_acked)
         p.upsert_device_setting(mac, "cfg_last_sent_ms", str(int(time.time()*1000)))
         try:
             p.append_event('INFO', 'mqtt', 'auto_apply_settings', ref=mac, details_json=json.dumps(cfg))
@@ -113,13 +147,21 @@ class MQTTClientWrapper:
         if not self._client:
             return 0
         p = get_persistence()
+        base = self._base_cfg(p)
+        devices = p.list_device_view(("anchor_index", "cfg_hash"))
+        used = set()
+        for r in p.list_device_settings_by_key("anchor_index"):
+            try:
+                used.add(int(r.get("value")))
+            except Exception:
+                pass
         count = 0
-        for dev in p.list_devices():
+        for dev in devices:
             mac = dev.get("mac")
             if not mac:
                 continue
             try:
-                if self._maybe_apply_defaults(mac, p):
+                if self._maybe_apply_defaults(mac, p, base=base, dev=dev, used=used):
                     count += 1
             except Exception:
                 pass
@@ -130,6 +172,7 @@ class MQTTClientWrapper:
             client.subscribe('dev/+/status')
             client.subscribe('dev/+/ranges')
             client.subscribe('dev/+/cmd_ack')
+            client.subscribe('dev/+/survey')
             # mark mqtt ok
             try:
                 p = get_persistence()
@@ -160,12 +203,25 @@ class MQTTClientWrapper:
 
     def _on_message(self, client, userdata, msg):
         topic_parts = msg.topic.split('/')
+        ttype = topic_parts[2] if len(topic_parts) >= 3 and topic_parts[0] == 'dev' else 'other'
+        metrics.MQTT_MESSAGES.inc(type=ttype)
+        rx_ms = time.time() * 1000
+        t0 = time.perf_counter()
         try:
             payload = json.loads(msg.payload.decode('utf-8'))
         except Exception:
+            metrics.MQTT_DECODE_ERRORS.inc()
             return
+        t1 = time.perf_counter()
+        metrics.MQTT_DECODE_SECONDS.observe(t1 - t0)
+        try:
+            self._handle_message(topic_parts, payload, rx_ms)
+        finally:
+            metrics.MQTT_HANDLE_SECONDS.observe(time.perf_counter() - t1, type=ttype)
+
+    def _handle_message(self, topic_parts, payload, rx_ms: float):
         p = get_persistence()
-        now_ms = int(time.time()*1000)
+        now_ms = int(rx_ms)
         def _coerce_ts_ms(ts_ms: Optional[object]) -> int:
             try:
                 t = int(ts_ms)
@@ -194,11 +250,28 @@ class MQTTClientWrapper:
                 ranges = payload.get('ranges', [])
                 if anchor_mac and ranges and self.tracking_engine:
                     try:
-                        self.tracking_engine.enqueue_range_batch(anchor_mac, ts_ms, ranges)
+                        self.tracking_engine.enqueue_range_batch(anchor_mac, ts_ms, ranges, rx_ms=rx_ms)
+                    except Exception:
+                        metrics.RANGE_DROPPED.inc(len(ranges), reason='error')
+                elif ranges:
+                    metrics.RANGE_DROPPED.inc(len(ranges), reason='no_engine')
+            elif ttype == 'survey':
+                col = self.survey_collector
+                if col is None:
+                    return
+                anchor_mac = payload.get('anchor_mac') or mac
+                for r in payload.get('ranges', []):
+                    d_m = r.get('d_m')
+                    if d_m is None and r.get('distance_mm') is not None:
+                        d_m = float(r.get('distance_mm')) / 1000.0
+                    if d_m is None:
+                        continue
+                    try:
+                        col.record(anchor_mac, r.get('peer_mac'), float(d_m) * 100.0)
                     except Exception:
                         pass
             elif ttype == 'cmd_ack':
-                # basic logging
+                self.commands.on_ack(mac, payload)
                 p.append_event('INFO', 'mqtt', 'cmd_ack', ref=mac, details_json=json.dumps(payload))
 
     def start(self):
@@ -0,0 +1,27 @@
+import copy
+
+import pytest
+
+# OFL moving head: 16-bit pan/tilt, speed, dimmer, RGB (9ch) plus a swapped 2ch mode
+OFL_MOVER = {
+    "availableChannels": {
+        "Pan": {"capabilities": [{"type": "Pan"}]},
+        "Pan fine": {},
+        "Tilt": {"capabilities": [{"type": "Tilt"}]},
+        "Tilt fine": {},
+        "Pan/Tilt Speed": {"capabilities": [{"type": "PanTiltSpeed"}]},
+        "Dimmer": {"capabilities": [{"type": "Intensity"}]},
+        "Red": {},
+        "Green": {},
+        "Blue": {},
+    },
+    "modes": [
+        {"name": "9ch", "channels": ["Pan", "Pan fine", "Tilt", "Tilt fine", "Pan/Tilt Speed", "Dimmer", "Red", "Green", "Blue"]},
+        {"name": "2ch", "channels": ["Tilt", "Pan"]},
+    ],
+}
+
+
+@pytest.fixture
+def ofl_mover():
+    return copy.deepcopy(OFL_MOVER)
@@ -0,0 +1,53 @@
+import os
+import tempfile
+
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.db.migrations.runner import run_migrations
+
+
+def setup_module(_):
+    tmp = tempfile.NamedTemporaryFile(delete=False)
+    tmp.close()
+    os.environ["LT_DB_PATH"] = tmp.name
+    run_migrations(tmp.name)
+
+
+client = TestClient(app)
+
+
+def test_etag_revalidation_and_invalidation():
+    r1 = client.get("/api/v1/settings")
+    etag = r1.headers["etag"]
+    assert r1.status_code == 200 and etag.startswith('W/"settings-')
+
+    r2 = client.get("/api/v1/settings", headers={"If-None-Match": etag})
+    assert r2.status_code == 304 and r2.content == b""
+
+    # other families are unaffected by a settings write
+    fx_etag = client.get("/api/v1/fixtures").headers["etag"]
+    assert client.put("/api/v1/settings", json={"key": "cache.test", "value": "1"}).status_code == 200
+    r3 = client.get("/api/v1/settings", headers={"If-None-Match": etag})
+    assert r3.status_code == 200 and r3.headers["etag"] != etag
+    assert any(i["key"] == "cache.test" for i in r3.json()["settings"])
+    assert client.get("/api/v1/fixtures", headers={"If-None-Match": fx_etag}).status_code == 304
+
+
+def test_query_variants_have_distinct_etags():
+    a = client.get("/api/v1/ofl/fixtures", params={"q": "spot"}).headers["etag"]
+    b = client.get("/api/v1/ofl/fixtures", params={"q": "wash"}).headers["etag"]
+    assert a != b
+
+
+def test_device_heartbeat_keeps_anchor_etag():
+    from app.db.persistence import get_persistence
+    p = get_persistence()
+    p.upsert_device({"mac": "AA:BB:CC:00:00:01", "role": "ANCHOR", "alias": "A1"})
+    etag = client.get("/api/v1/anchors").headers["etag"]
+    dev_etag = client.get("/api/v1/devices").headers["etag"]
+    p.upsert_device({"mac": "AA:BB:CC:00:00:01", "ip_last": "10.0.0.5", "status": "online"})
+    assert client.get("/api/v1/anchors", headers={"If-None-Match": etag}).status_code == 304
+    assert client.get("/api/v1/devices", headers={"If-None-Match": dev_etag}).status_code == 200
+    p.upsert_device({"mac": "AA:BB:CC:00:00:01", "alias": "A2"})
+    assert client.get("/api/v1/anchors", headers={"If-None-Match": etag}).status_code == 200
@@ -0,0 +1,56 @@
+import gzip
+
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+from app.assets import IMMUTABLE, AssetPipeline
+
+
+def _client(tmp_path):
+    static = tmp_path / "static"
+    static.mkdir()
+    (static / "app.js").write_text("console.log('light');\n" * 50)
+    (static / "tiny.css").write_text("a{}")
+    assets = AssetPipeline(str(static), str(tmp_path / "cache"))
+    app = FastAPI()
+
+    @app.get("/static/{name:path}")
+    def serve(name: str, request: Request):
+        return assets.response(request, name)
+
+    return assets, TestClient(app), static
+
+
+def test_hashed_urls_and_encodings(tmp_path):
+    assets, client, static = _client(tmp_path)
+    assert assets.build() == 2
+    url = assets.url("app.js")
+    assert url.startswith("/static/app.") and url.endswith(".js") and url != "/static/app.js"
+
+    r = client.get(url, headers={"Accept-Encoding": "gzip"})
+    assert r.status_code == 200
+    assert r.headers["content-encoding"] == "gzip" and r.headers["cache-control"] == IMMUTABLE
+    assert r.text == (static / "app.js").read_text()
+
+    raw = client.get(url, headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in raw.headers and raw.text == r.text
+
+    # too small to be worth compressing
+    assert "content-encoding" not in client.get(assets.url("tiny.css"), headers={"Accept-Encoding": "gzip"}).headers
+
+    plain = client.get("/static/app.js")
+    assert plain.headers["cache-control"] == "no-cache"
+    assert client.get("/static/app.js", headers={"If-None-Match": plain.headers["etag"]}).status_code == 304
+    assert client.get("/static/missing.js").status_code == 404
+
+
+def test_content_change_gives_new_url(tmp_path):
+    assets, client, static = _client(tmp_path)
+    old = assets.url("app.js")
+    (static / "app.js").write_text("console.log('moved');\n" * 50)
+    assets.build()
+    new = assets.url("app.js")
+    assert new != old
+    gz = [p for p in (tmp_path / "cache").iterdir() if p.suffix == ".gz"]
+    assert len(gz) == 2
+    assert any(gzip.decompress(p.read_bytes()).startswith(b"console.log('moved')") for p in gz)
@@ -0,0 +1,44 @@
+import asyncio
+
+import pytest
+
+from app.db import connect_db
+from app.db.async_persistence import AsyncPersistence
+from app.db.migrations.runner import run_migrations
+
+
+def test_calls_run_on_one_thread_with_pinned_connection(tmp_path, monkeypatch):
+    path = str(tmp_path / "async.db")
+    monkeypatch.setenv("LT_DB_PATH", path)
+    run_migrations(path)
+    ap = AsyncPersistence()
+
+    def conn_id():
+        db = connect_db()
+        try:
+            return id(db)
+        finally:
+            db.close()
+
+    def boom():
+        raise ValueError("nope")
+
+    async def run():
+        await ap.upsert_setting("async.key", "42")
+        assert await ap.get_setting("async.key") == "42"
+        # one queued batch, same connection for every call
+        ids = await ap.run_many([(conn_id, ()), (conn_id, ()), (conn_id, ())])
+        assert len(set(ids)) == 1
+        with pytest.raises(ValueError):
+            await ap.run(boom)
+        # the worker survives errors
+        return await asyncio.gather(*(ap.get_setting("async.key") for _ in range(20)))
+
+    before = ap.batches
+    try:
+        assert asyncio.run(run()) == ["42"] * 20
+        assert ap.calls == 26 and ap.batches - before < ap.calls
+    finally:
+        ap.close()
+    with pytest.raises(AttributeError):
+        ap.not_a_method
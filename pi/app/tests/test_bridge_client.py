@@ -0,0 +1,149 @@
+import json
+import os
+import threading
+import time
+import tty
+
+import pytest
+
+from app.bridge_client import BridgeError, BridgeSession, _open_serial
+
+serial = pytest.importorskip("serial")
+
+
+class FakeBridge:
+    """Speaks the bridge NDJSON protocol on a pty; runs one job at a time like the firmware."""
+
+    def __init__(self, job_s=0.05, busy_once=()):
+        self.master, slave = os.openpty()
+        tty.setraw(slave)
+        self.path = os.ttyname(slave)
+        self._slave = slave
+        self.job_s = job_s
+        self.busy_once = set(busy_once)
+        self.received = []
+        self.max_backlog = 0
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        buf = b""
+        while True:
+            try:
+                chunk = os.read(self.master, 4096)
+            except OSError:
+                return
+            if not chunk:
+                return
+            buf += chunk
+            lines = buf.split(b"\n")
+            buf = lines.pop()
+            self.max_backlog = max(self.max_backlog, len(lines))
+            for raw in lines:
+                req = json.loads(raw)
+                self.received.append(req)
+                self._send(b"bridge: serial rx op=%s\n" % req["op"].encode())
+                dev = req.get("device_id")
+                if dev in self.busy_once:
+                    self.busy_once.discard(dev)
+                    resp = {"v": 1, "id": req["id"], "status": "error", "err": {"code": "BUSY"}}
+                else:
+                    time.sleep(self.job_s)
+                    resp = {"v": 1, "id": req["id"], "op": req["op"] + "_ack", "status": "ok", "device_id": dev}
+                self._send(json.dumps(resp).encode() + b"\n")
+
+    def _send(self, data):
+        try:
+            os.write(self.master, data)
+        except OSError:
+            pass
+
+    def kill(self):
+        os.close(self.master)
+        os.close(self._slave)
+
+
+def _session(bridge, **kw):
+    return BridgeSession(bridge.path, max_in_flight=kw.pop("max_in_flight", 4), settle_s=0, **kw)
+
+
+def _req(dev):
+    return {"op": "provision_write", "device_id": dev}
+
+
+def test_pipelined_batch_on_one_connection():
+    bridge = FakeBridge(busy_once={"D03"})
+    s = _session(bridge)
+    try:
+        results = s.call_many([_req(f"D{i:02d}") for i in range(12)], timeout_s=5.0)
+        assert [r["device_id"] for r, err in results] == [f"D{i:02d}" for i in range(12)]
+        assert all(err is None and r["status"] == "ok" for r, err in results)
+        assert s.opens == 1
+        # requests were queued on the line while the bridge was busy with earlier ones
+        assert bridge.max_backlog > 1
+        # the BUSY reply was retried
+        assert sum(1 for r in bridge.received if r["device_id"] == "D03") == 2
+    finally:
+        s.close()
+        bridge.kill()
+
+
+def test_timeout_returns_none_and_frees_slot():
+    bridge = FakeBridge(job_s=0.5)
+    s = _session(bridge, max_in_flight=1)
+    try:
+        assert s.call(_req("SLOW"), timeout_s=0.1) is None
+        assert s.call(_req("NEXT"), timeout_s=3.0)["device_id"] == "NEXT"
+    finally:
+        s.close()
+        bridge.kill()
+
+
+def test_reconnect_after_port_loss():
+    bridges = [FakeBridge(job_s=1.0), FakeBridge()]
+    opened = []
+
+    def opener():
+        b = bridges[len(opened)]
+        opened.append(b)
+        return _open_serial(b.path, 115200, timeout_s=0.1, settle_s=0)
+
+    s = BridgeSession("fake", opener=opener)
+    try:
+        fut = s.submit(_req("LOST"), timeout_s=5.0)
+        time.sleep(0.2)
+        bridges[0].kill()
+        with pytest.raises(BridgeError):
+            fut.result(timeout=3.0)
+        assert s.call(_req("BACK"), timeout_s=3.0)["device_id"] == "BACK"
+        assert s.opens == 2
+    finally:
+        s.close()
+        bridges[1].kill()
+
+
+def test_batch_provision_api(tmp_path, monkeypatch):
+    from fastapi.testclient import TestClient
+    from app.bridge_client import close_bridge_sessions
+    from app.db.migrations.runner import run_migrations
+    from app.db.persistence import get_persistence
+    from app.main import app
+
+    db_path = str(tmp_path / "lt.db")
+    monkeypatch.setenv("LT_DB_PATH", db_path)
+    run_migrations(db_path)
+    bridge = FakeBridge(job_s=0.01)
+    p = get_persistence()
+    for k, v in {"provision.bridge_port": bridge.path, "wifi.ssid": "venue", "mqtt.host": "10.0.0.2"}.items():
+        p.upsert_setting(k, v)
+    try:
+        body = {"devices": [{"mac": f"AABBCCDDEE{i:02X}", "alias": f"A{i}"} for i in range(5)], "reboot": False}
+        r = TestClient(app).post("/api/v1/devices/provision/batch", json=body)
+        assert r.status_code == 200, r.text
+        out = r.json()
+        assert out["ok"] and [x["mac"] for x in out["results"]] == [f"AABBCCDDEE{i:02X}" for i in range(5)]
+        assert out["results"][0]["bridge"]["device_id"] == "AA:BB:CC:DD:EE:00"
+        assert p.get_device("AABBCCDDEE04")["alias"] == "A4"
+    finally:
+        close_bridge_sessions()
+        bridge.kill()
@@ -0,0 +1,62 @@
+from app.core.bundle_adjust import bundle_adjust
+import math
+import random
+import time
+
+
+def _survey(seed=7, n_points=50, noise_cm=2.0, outliers=()):
+    rng = random.Random(seed)
+    anchors = {
+        "A1": (0.0, 0.0, 250.0),
+        "A2": (1000.0, 0.0, 260.0),
+        "A3": (1000.0, 800.0, 240.0),
+        "A4": (0.0, 800.0, 255.0),
+        "A5": (500.0, -50.0, 300.0),
+        "A6": (500.0, 850.0, 280.0),
+    }
+    corr = {a: (1.0 + rng.uniform(-0.03, 0.03), rng.uniform(-20.0, 20.0)) for a in anchors}
+    points = {f"P{i}": (rng.uniform(50, 950), rng.uniform(50, 750), rng.uniform(80, 150)) for i in range(n_points)}
+    obs = []
+    for pid, q in points.items():
+        for a, p in anchors.items():
+            scale, offset = corr[a]
+            meas = (math.dist(p, q) - offset) / scale + rng.gauss(0.0, noise_cm)
+            if (a, pid) in outliers:
+                meas += 150.0
+            obs.append((a, pid, meas))
+    init = {a: (p[0] + rng.uniform(-40, 40), p[1] + rng.uniform(-40, 40), p[2] + rng.uniform(-30, 30)) for a, p in anchors.items()}
+    return anchors, corr, points, obs, init
+
+
+def test_bundle_adjust_recovers_anchors_and_range_bias():
+    bad = {("A1", "P3"), ("A3", "P10"), ("A5", "P20"), ("A6", "P33")}
+    anchors, corr, points, obs, init = _survey(outliers=bad)
+    t0 = time.perf_counter()
+    res = bundle_adjust(points, obs, init)
+    assert time.perf_counter() - t0 < 1.0
+    assert res.converged
+    assert set(res.outliers) == bad
+    for a, est in res.anchors.items():
+        pos = est["position_cm"]
+        err = math.dist((pos["x"], pos["y"], pos["z"]), anchors[a])
+        sigma = est["sigma"]
+        assert err < 25.0
+        # the reported uncertainty is of the same order as the actual error
+        assert err < 4.0 * sigma["position_cm"]
+        assert abs(est["range_scale"] - corr[a][0]) < 0.02
+        assert abs(est["range_offset_cm"] - corr[a][1]) < 15.0
+        assert len(est["points_used"]) == 50
+        assert len(est["covariance"]) == 5
+
+
+def test_bundle_adjust_height_prior():
+    anchors, corr, points, obs, init = _survey(seed=3)
+    fixed = bundle_adjust(points, obs, init)
+    # a very tight height prior must reproduce the fixed-height solution
+    tight = bundle_adjust(points, obs, init, height_sigma_cm=0.001)
+    for a in anchors:
+        pf, pt = fixed.anchors[a]["position_cm"], tight.anchors[a]["position_cm"]
+        assert abs(pf["z"] - pt["z"]) < 0.1
+    assert max(abs(tight.point_heights_cm[p] - q[2]) for p, q in points.items()) < 0.01
+    loose = bundle_adjust(points, obs, init, height_sigma_cm=5.0)
+    assert loose.converged and len(loose.point_heights_cm) == 50
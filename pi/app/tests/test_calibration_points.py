@@ -0,0 +1,97 @@
+import json
+import math
+import os
+import random
+import sqlite3
+import tempfile
+
+from fastapi.testclient import TestClient
+
+from app.db.migrations.runner import run_migrations
+from app.main import app
+
+ANCHORS = {
+    "AA0000000001": (0.0, 0.0, 250.0),
+    "AA0000000002": (1000.0, 0.0, 260.0),
+    "AA0000000003": (1000.0, 800.0, 240.0),
+    "AA0000000004": (0.0, 800.0, 255.0),
+}
+
+
+def setup_module(_):
+    tmp = tempfile.NamedTemporaryFile(delete=False)
+    tmp.close()
+    os.environ["LT_DB_PATH"] = tmp.name
+    run_migrations(tmp.name)
+    db = sqlite3.connect(tmp.name)
+    # pretend 0010 has not run yet and the points only exist as run JSON
+    db.executescript(
+        "DROP TABLE calibration_points; DROP TABLE calibration_point_anchor_stats;"
+        "DELETE FROM schema_migrations WHERE id='0010_calibration_points.sql';"
+    )
+    for mac, (x, y, z) in ANCHORS.items():
+        db.execute("INSERT INTO anchor_positions(mac,x_cm,y_cm,z_cm,updated_at_ms) VALUES(?,?,?,?,0)", (mac, x, y, z))
+    rng = random.Random(1)
+    for i in range(12):
+        q = (rng.uniform(50, 950), rng.uniform(50, 750), 100.0)
+        per = {m: {"median_d_m": math.dist(p, q) / 100.0 * 1.01 + 0.05, "count": 40} for m, p in ANCHORS.items()}
+        params = {"type": "venue_point", "session_id": "s1", "point_id": f"P{i}", "position_cm": dict(zip("xyz", q))}
+        db.execute(
+            "INSERT INTO calibration_runs(tag_mac,started_at_ms,status,params_json,summary_json) VALUES(?,?,?,?,?)",
+            ("TAG1", 1000 + i, "finished", json.dumps(params), json.dumps({"samples": 160, "per_anchor": per})),
+        )
+    # older repeat of P0, a plain run and a broken record are skipped / ignored
+    db.execute(
+        "INSERT INTO calibration_runs(tag_mac,started_at_ms,status,params_json,summary_json) VALUES(?,?,?,?,?)",
+        ("TAG1", 10, "finished", json.dumps({"type": "venue_point", "session_id": "s0", "point_id": "P0",
+                                             "position_cm": {"x": 1, "y": 2, "z": 3}}), "{}"),
+    )
+    db.execute("INSERT INTO calibration_runs(tag_mac,started_at_ms,status,params_json) VALUES('TAG1',5,'finished','{}')")
+    db.execute("INSERT INTO calibration_runs(tag_mac,started_at_ms,status,params_json,summary_json) "
+               "VALUES('TAG1',6,'finished','not json','{')")
+    db.commit()
+    db.close()
+    run_migrations(tmp.name)
+
+
+client = TestClient(app)
+
+
+def test_backfill_and_point_listing():
+    r = client.get("/api/v1/calibration/points", params={"tag_mac": "TAG1"})
+    pts = {p["point_id"]: p for p in r.json()["points"]}
+    assert len(pts) == 12
+    assert pts["P0"]["session_id"] == "s1" and pts["P0"]["samples"] == 160
+    assert set(pts["P3"]["per_anchor"]) == set(ANCHORS)
+    allr = client.get("/api/v1/calibration/points", params={"tag_mac": "TAG1", "all_runs": True}).json()["points"]
+    assert len(allr) == 13
+    s0 = client.get("/api/v1/calibration/points", params={"tag_mac": "TAG1", "session_id": "s0"}).json()["points"]
+    assert [p["point_id"] for p in s0] == ["P0"] and s0[0]["per_anchor"] == {}
+
+
+def test_solve_reads_normalized_points():
+    r = client.post("/api/v1/calibration/solve", json={"tag_mac": "TAG1", "apply": False})
+    assert r.status_code == 200, r.text
+    corr = r.json()["range_corrections"]["AA0000000001"]
+    assert abs(corr["range_scale"] - 1 / 1.01) < 1e-3
+    assert len(corr["points_used"]) == 12
+
+
+def test_indexed_lookups():
+    db = sqlite3.connect(os.environ["LT_DB_PATH"])
+    try:
+        plan = " ".join(r[3] for r in db.execute(
+            "EXPLAIN QUERY PLAN SELECT id FROM calibration_runs WHERE status='finished' ORDER BY id DESC LIMIT 1"))
+        assert "idx_calibration_runs_status_id" in plan
+        plan = " ".join(r[3] for r in db.execute(
+            "EXPLAIN QUERY PLAN SELECT * FROM calibration_points WHERE tag_mac=? AND session_id=?", ("T", "s")))
+        assert "idx_calibration_points_tag_session_point" in plan
+    finally:
+        db.close()
+
+
+def test_new_point_is_stored_normalized():
+    payload = {"tag_mac": "TAG2", "duration_ms": 100, "point_id": "N1", "position_cm": {"x": 1, "y": 2, "z": 3}}
+    assert client.post("/api/v1/calibration/point", json=payload).status_code == 200
+    pts = client.get("/api/v1/calibration/points", params={"tag_mac": "TAG2"}).json()["points"]
+    assert [(p["point_id"], p["x_cm"], p["z_cm"]) for p in pts] == [("N1", 1.0, 3.0)]
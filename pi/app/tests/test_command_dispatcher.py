@@ -0,0 +1,194 @@
+import asyncio
+import json
+import threading
+import time
+from types import SimpleNamespace
+
+from fastapi.testclient import TestClient
+
+from app.command_dispatcher import ACKED, FAILED, TIMEOUT, CommandDispatcher
+from app.main import app
+
+
+class FakeFleet:
+    """Devices that ack every command after ``delay_s``; ``drop`` swallows the first N publishes per mac."""
+
+    def __init__(self, delay_s=0.05, drop=None):
+        self.delay_s = delay_s
+        self.drop = dict(drop or {})
+        self.published = []
+        self.dispatcher = None
+        self._lock = threading.Lock()
+        self.in_flight = {}
+        self.max_total = 0
+        self.max_per_mac = 0
+
+    def publish(self, topic, payload):
+        mac = topic.split("/")[1]
+        msg = json.loads(payload)
+        with self._lock:
+            self.published.append((mac, msg["cmd_id"]))
+            if self.drop.get(mac, 0) > 0:
+                self.drop[mac] -= 1
+                return True
+            self.in_flight[mac] = self.in_flight.get(mac, 0) + 1
+            self.max_per_mac = max(self.max_per_mac, self.in_flight[mac])
+            self.max_total = max(self.max_total, sum(self.in_flight.values()))
+        threading.Timer(self.delay_s, self._ack, args=(mac, msg["cmd_id"])).start()
+        return True
+
+    def _ack(self, mac, cmd_id):
+        with self._lock:
+            self.in_flight[mac] -= 1
+        self.dispatcher.on_ack(mac, {"v": 1, "type": "cmd_ack", "cmd_id": cmd_id, "result": "ok"})
+
+
+def _dispatcher(devices, **kw):
+    d = CommandDispatcher(devices.publish, **kw)
+    devices.dispatcher = d
+    return d
+
+
+def test_bulk_push_runs_in_parallel_within_caps():
+    fleet = FakeFleet(delay_s=0.05)
+    d = _dispatcher(fleet, per_device=1, fleet=16)
+    macs = [f"AA00000000{i:02X}" for i in range(50)]
+    t0 = time.monotonic()
+    results = asyncio.run(d.send_many(macs, "apply_settings", {"settings": {"alias": "x"}}))
+    elapsed = time.monotonic() - t0
+    assert [r["mac"] for r in results] == macs
+    assert all(r["state"] == ACKED and r["attempts"] == 1 for r in results)
+    assert fleet.max_total <= 16 and fleet.max_total > 1
+    # 50 commands in waves of 16 instead of 50 sequential round trips
+    assert elapsed < 50 * 0.05 / 2
+    assert d.status()["stats"]["acked"] == 50
+    d.close()
+
+
+def test_per_device_commands_are_serialized():
+    fleet = FakeFleet(delay_s=0.02)
+    d = _dispatcher(fleet, per_device=1)
+    cmds = [d.submit("AA0000000001", "apply_settings", {"settings": {"n": i}}) for i in range(3)]
+    results = [c.future.result(timeout=2) for c in cmds]
+    assert fleet.max_per_mac == 1
+    assert [r["cmd_id"] for r in results] == [mac_cmd for _, mac_cmd in fleet.published]
+    d.close()
+
+
+def test_retry_with_backoff_then_timeout():
+    fleet = FakeFleet(delay_s=0.01, drop={"AA0000000001": 1, "AA0000000002": 10})
+    d = _dispatcher(fleet, timeout_s=0.05, retries=2, backoff=2.0)
+    ok = d.submit("AA0000000001", "apply_settings")
+    lost = d.submit("AA0000000002", "apply_settings")
+    r_ok = ok.future.result(timeout=2)
+    assert r_ok["state"] == ACKED and r_ok["attempts"] == 2
+    t0 = time.monotonic()
+    r_lost = lost.future.result(timeout=3)
+    assert r_lost["state"] == TIMEOUT and r_lost["attempts"] == 3
+    # 0.05 + 0.1 + 0.2 s of waiting in total
+    assert time.monotonic() - t0 > 0.2
+    # retries reuse the cmd_id so a late ack still matches
+    assert len({cid for mac, cid in fleet.published if mac == "AA0000000002"}) == 1
+    d.close()
+
+
+def test_keyed_submit_reuses_pending_command():
+    fleet = FakeFleet(delay_s=0.1)
+    d = _dispatcher(fleet)
+    a = d.submit("AA0000000001", "apply_settings", key="cfg:1")
+    b = d.submit("AA0000000001", "apply_settings", key="cfg:1")
+    assert a is b
+    a.future.result(timeout=2)
+    c = d.submit("AA0000000001", "apply_settings", key="cfg:1")
+    assert c is not a
+    c.future.result(timeout=2)
+    d.close()
+
+
+def test_commands_api():
+    fleet = FakeFleet(delay_s=0.01)
+    d = _dispatcher(fleet)
+    old = getattr(app.state, "mqtt_client", None)
+    app.state.mqtt_client = SimpleNamespace(_client=object(), commands=d)
+    try:
+        client = TestClient(app)
+        body = {"macs": ["aa:00:00:00:00:01", "AA0000000002"], "fields": {"settings": {"alias": "A"}}}
+        r = client.post("/api/v1/commands", json=body)
+        assert r.status_code == 200, r.text
+        out = r.json()
+        assert out["ok"] and out["acked"] == 2
+        cmd_id = out["results"][0]["cmd_id"]
+        assert client.get(f"/api/v1/commands/{cmd_id}").json()["state"] == ACKED
+        view = client.get("/api/v1/commands", params={"mac": "AA0000000002"}).json()
+        assert [c["mac"] for c in view["commands"]] == ["AA0000000002"]
+        assert client.post("/api/v1/commands", json=dict(body, fields={"cmd_id": "x"})).status_code == 400
+    finally:
+        app.state.mqtt_client = old
+        d.close()
+
+
+def test_ack_from_another_device_is_ignored():
+    fleet = FakeFleet(delay_s=10)
+    d = _dispatcher(fleet)
+    c = d.submit("AA0000000001", "apply_settings")
+    assert not d.on_ack("AA0000000002", {"cmd_id": c.cmd_id, "result": "ok"})
+    assert c.state != ACKED
+    assert d.on_ack("aa:00:00:00:00:01", {"cmd_id": c.cmd_id, "result": "ok"})
+    assert c.future.result(timeout=1)["state"] == ACKED
+    d.close()
+
+
+def test_done_callbacks_run_outside_the_lock():
+    fleet = FakeFleet(delay_s=10)
+    d = _dispatcher(fleet)
+    c = d.submit("AA0000000001", "apply_settings")
+    free = []
+
+    def probe(_fut):
+        # another thread (e.g. the retry loop) must be able to take the lock meanwhile
+        t = threading.Thread(target=lambda: free.append(d._cond.acquire(timeout=0.5) and d._cond.release() is None))
+        t.start()
+        t.join()
+
+    c.future.add_done_callback(probe)
+    d.on_ack("AA0000000001", {"cmd_id": c.cmd_id, "result": "ok"})
+    assert free == [True]
+    d.close()
+
+
+def test_close_fails_pending_commands():
+    fleet = FakeFleet(delay_s=10)
+    d = _dispatcher(fleet, per_device=1)
+    sent = d.submit("AA0000000001", "apply_settings")
+    queued = d.submit("AA0000000001", "apply_settings")
+    d.close()
+    for c in (sent, queued):
+        r = c.future.result(timeout=1)
+        assert r["state"] == FAILED and r["result"] == "closed"
+    assert d.status()["in_flight"] == 0 and d.status()["queued"] == 0
+
+
+def test_auto_apply_skips_settings_still_pending(tmp_path, monkeypatch):
+    from app.db.event_sink import get_event_sink
+    from app.db.migrations.runner import run_migrations
+    from app.db.persistence import get_persistence
+    from app.mqtt_client import MQTTClientWrapper
+
+    db_path = str(tmp_path / "lt.db")
+    monkeypatch.setenv("LT_DB_PATH", db_path)
+    run_migrations(db_path)
+    p = get_persistence()
+    mc = MQTTClientWrapper()
+    mc._client = SimpleNamespace(publish=lambda topic, payload, qos=0: SimpleNamespace(rc=0))
+    try:
+        assert mc._maybe_apply_defaults("AA0000000001", p)
+        sent_ms = p.get_device_setting("AA0000000001", "cfg_last_sent_ms", "")
+        time.sleep(0.01)
+        # same cfg while the first push waits for its ack: no new command, event or timestamp
+        assert not mc._maybe_apply_defaults("AA0000000001", p)
+        assert p.get_device_setting("AA0000000001", "cfg_last_sent_ms", "") == sent_ms
+        assert mc.commands.status()["stats"]["submitted"] == 1
+    finally:
+        mc.commands.close()
+        # write the queued events into this test's database, not the next one's
+        get_event_sink().flush()
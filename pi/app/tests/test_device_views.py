@@ -0,0 +1,53 @@
+from app.db import connect_db
+from app.db.migrations.runner import run_migrations
+from app.db.persistence import get_persistence
+
+
+def _setup(tmp_path, monkeypatch):
+    path = str(tmp_path / "views.db")
+    monkeypatch.setenv("LT_DB_PATH", path)
+    run_migrations(path)
+    return get_persistence()
+
+
+def test_anchor_view_joins_alias_index_and_offset(tmp_path, monkeypatch):
+    p = _setup(tmp_path, monkeypatch)
+    p.upsert_device({"mac": "AABBCCDDEE01", "role": "ANCHOR", "alias": "Nord"})
+    p.upsert_device({"mac": "AABBCCDDEE02", "role": "ANCHOR"})
+    p.upsert_device({"mac": "AABBCCDDEE09", "role": "TAG"})
+    p.upsert_device_setting("AABBCCDDEE01", "anchor_index", "3")
+    db = connect_db()
+    try:
+        db.execute("INSERT INTO anchor_positions(mac,x_cm,y_cm,z_cm,updated_at_ms) VALUES('AA:BB:CC:DD:EE:01',100,200,300,5)")
+        db.execute("INSERT INTO anchor_positions(mac,x_cm,y_cm,z_cm,updated_at_ms) VALUES('AABBCCDDEE02',0,0,250,6)")
+        db.execute("INSERT INTO anchors(mac, alias, pos_x_cm, pos_y_cm, pos_z_cm) VALUES('aa-bb-cc-dd-ee-02', 'Legacy', 9, 9, 9)")
+        db.execute("INSERT INTO anchors(mac, alias, pos_x_cm, pos_y_cm, pos_z_cm, last_seen_at_ms) VALUES('AABBCCDDEE03', 'Alt', 400, 0, 200, 7)")
+        db.execute("INSERT INTO anchors(mac, alias) VALUES('AABBCCDDEE04', 'NoPos')")
+        db.execute("INSERT INTO anchor_position_offsets(mac,dx_cm,dy_cm,dz_cm) VALUES('AA:BB:CC:DD:EE:01',1.5,0,-2)")
+        db.commit()
+    finally:
+        db.close()
+
+    rows = {r["mac"]: r for r in p.list_anchor_view()}
+    a = rows["AA:BB:CC:DD:EE:01"]
+    assert (a["alias"], a["anchor_index"], a["dx_cm"], a["dz_cm"]) == ("Nord", "3", 1.5, -2)
+    b = rows["AABBCCDDEE02"]
+    assert (b["alias"], b["anchor_index"], b["dx_cm"]) == ("Legacy", None, None)
+    # legacy anchors without an anchor_positions row are still listed
+    assert list(rows) == ["AA:BB:CC:DD:EE:01", "AABBCCDDEE02", "AABBCCDDEE03"]
+    assert (b["x_cm"], b["z_cm"]) == (0, 250)
+    c = rows["AABBCCDDEE03"]
+    assert (c["alias"], c["x_cm"], c["z_cm"], c["updated_at_ms"]) == ("Alt", 400, 200, 7)
+    assert p.list_anchor_macs() == {"AABBCCDDEE01", "AABBCCDDEE02", "AABBCCDDEE03", "AABBCCDDEE04"}
+
+
+def test_device_view_carries_requested_settings(tmp_path, monkeypatch):
+    p = _setup(tmp_path, monkeypatch)
+    p.upsert_device({"mac": "D1", "role": "ANCHOR"})
+    p.upsert_device({"mac": "D2", "role": "TAG"})
+    p.upsert_device_setting("D1", "anchor_index", "0")
+    p.upsert_device_setting("D1", "cfg_hash", "abc")
+    p.upsert_device_setting("D1", "other", "x")
+    view = {d["mac"]: d for d in p.list_device_view(("anchor_index", "cfg_hash"))}
+    assert view["D1"]["settings"] == {"anchor_index": "0", "cfg_hash": "abc"}
+    assert view["D2"]["settings"] == {} and view["D2"]["role"] == "TAG"
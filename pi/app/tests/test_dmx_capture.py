@@ -0,0 +1,101 @@
+import random
+import time
+
+from app.dmx.capture import (
+    CaptureRecorder, RecordingDriver, apply_delta, capture_info, diff_captures, encode_delta, read_capture, replay,
+)
+
+
+class ListDriver:
+    default_universe = 0
+
+    def __init__(self):
+        self.sent = []
+
+    def send_frame(self, frame: bytes, universe=None):
+        self.sent.append((universe, bytes(frame)))
+
+
+def test_delta_roundtrip():
+    rnd = random.Random(3)
+    prev = bytes(rnd.randint(0, 255) for _ in range(513))
+    for _ in range(50):
+        frame = bytearray(prev)
+        for _ in range(rnd.randint(0, 40)):
+            frame[rnd.randint(0, 512)] = rnd.randint(0, 255)
+        payload = encode_delta(prev, bytes(frame))
+        assert apply_delta(prev, payload) == bytes(frame)
+        prev = bytes(frame)
+    assert encode_delta(prev, prev) == b""
+
+
+def test_record_replay_and_diff(tmp_path):
+    frames = []
+    for i in range(40):
+        f = bytearray(513)
+        f[1] = i
+        f[100] = 255 - i
+        frames.append(bytes(f))
+
+    path_a = str(tmp_path / "a.ltcap")
+    rec = CaptureRecorder(path_a, keyframe_interval_s=0.0005)
+    drv = RecordingDriver(ListDriver(), rec)
+    for i, f in enumerate(frames):
+        drv.send_frame(f, universe=i % 2)
+    rec.close()
+    assert rec.stats()["frames"] == 40 and rec.stats()["dropped"] == 0
+    assert len(drv.inner.sent) == 40
+
+    decoded = list(read_capture(path_a))
+    assert [(u, f) for _, u, f in decoded] == [(i % 2, f) for i, f in enumerate(frames)]
+    assert capture_info(path_a)["universes"] == {"0": 20, "1": 20}
+
+    out = ListDriver()
+    stats = replay(path_a, out, speed=0)
+    assert stats["frames"] == 40
+    assert out.sent == [(i % 2, f) for i, f in enumerate(frames)]
+
+    path_b = str(tmp_path / "b.ltcap")
+    rec = CaptureRecorder(path_b)
+    for i, f in enumerate(frames):
+        if i == 7:
+            f = f[:5] + b"\x80" + f[6:]
+        rec.record(i % 2, f)
+    rec.close()
+    assert diff_captures(path_a, path_a)["identical"]
+    diff = diff_captures(path_a, path_b)
+    assert not diff["identical"]
+    assert diff["universes"]["1"]["differing_frames"] == 1
+    assert diff["universes"]["1"]["channels"] == [5]
+    assert diff["universes"]["0"]["differing_frames"] == 0
+
+
+class FailingFile:
+    def __init__(self, inner):
+        self.inner = inner
+
+    def write(self, data):
+        raise OSError(28, "No space left on device")
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.inner.close()
+
+
+def test_write_error_stops_capture_without_blocking_close(tmp_path):
+    rec = CaptureRecorder(str(tmp_path / "full.ltcap"), max_queue=8)
+    rec._fh = FailingFile(rec._fh)
+    for i in range(8):
+        rec.record(0, bytes(513))
+    deadline = time.monotonic() + 2
+    while rec.stats()["error"] is None and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert "No space left" in rec.stats()["error"]
+    rec.record(0, bytes(513))  # ignored after the error
+    assert rec.stats()["pending"] == 0 and rec.stats()["frames"] == 0
+    t0 = time.monotonic()
+    rec.close()
+    assert time.monotonic() - t0 < 1.0
+    rec.close()
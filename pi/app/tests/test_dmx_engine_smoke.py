@@ -27,3 +27,54 @@ def test_dmx_engine_smoke(monkeypatch):
     fid = p.create_fixture({"name": "fx", "profile_key": "generic_mh_16bit_v1", "universe": 1, "dmx_base_addr": 1, "pos_x_cm": 0, "pos_y_cm": 0, "pos_z_cm": 0})
     eng.tick()
     assert drv.sent, "DMX frame should be sent"
+
+
+def test_test_writes_are_released_and_expire():
+    drv = DummyDriver()
+    class TE:
+        latest_position = {}
+    eng = DmxEngine(tracking_engine=TE(), driver=drv, state_provider=lambda: "SETUP")
+    eng.tracking_layer.set(2, {1: 40})
+    eng.send_custom_frame(2, {1: 0, 5: 255}, owner="patch:7")
+    assert drv.sent[-1] == (2, eng.merger.merged(2)) and drv.sent[-1][1][1] == 0
+    # light-off: tracking owns the channel again, the unowned one drops to 0
+    assert eng.release_test_writes("patch:7") == {2: (1, 5)}
+    frame = drv.sent[-1][1]
+    assert frame[1] == 40 and frame[5] == 0
+    assert eng.release_test_writes("patch:7") == {}
+
+    eng.send_custom_frame(2, {1: 0}, owner="patch:7", hold_ms=0)
+    assert eng.merger.merged(2)[1] == 0
+    eng.tick()
+    assert eng.merger.merged(2)[1] == 40 and not eng._test_owned
+
+
+def test_patched_dimmer_channels_merge_htp(tmp_path, monkeypatch, ofl_mover):
+    import json
+    from app.dmx.merge import HTP, LTP
+    from app.dmx.ofl_channels import compile_and_store
+
+    db_path = str(tmp_path / "lt.db")
+    monkeypatch.setenv("LT_DB_PATH", db_path)
+    run_migrations(db_path)
+    p = get_persistence()
+    fid = p.upsert_ofl_fixture("Acme", "Mover", None, json.dumps(ofl_mover, sort_keys=True), "hash1")
+    compile_and_store(p, fid, ofl_mover)
+    pid = p.create_patched_fixture(fid, "m1", "9ch", 1, 10)
+    class TE:
+        latest_position = {}
+    eng = DmxEngine(tracking_engine=TE(), driver=DummyDriver(), state_provider=lambda: "SETUP")
+    eng.tick()
+    assert eng.merger.rule(1, 15) == HTP and eng.merger.rule(1, 16) == LTP
+    eng.set_live_color(pid, 255, 0, 0, 100)
+    eng.send_custom_frame(1, {15: 30, 16: 7})
+    frame = eng.merger.merged(1)
+    assert frame[15] == 100 and frame[16] == 7
+    from app.db import connect_db
+    db = connect_db()
+    db.execute("DELETE FROM patched_fixtures WHERE id=?", (pid,))
+    db.commit()
+    db.close()
+    eng.invalidate_plan()
+    eng.tick()
+    assert eng.merger.rule(1, 15) == LTP
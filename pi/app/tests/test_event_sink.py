@@ -0,0 +1,101 @@
+import time
+
+from fastapi.testclient import TestClient
+
+from app.db import connect_db
+from app.db.event_sink import EventSink
+from app.db.migrations.runner import run_migrations
+from app.main import app
+
+
+def _rows(sql="SELECT * FROM event_log ORDER BY id", params=()):
+    db = connect_db()
+    try:
+        return [dict(r) for r in db.execute(sql, params).fetchall()]
+    finally:
+        db.close()
+
+
+def _migrated(tmp_path, monkeypatch):
+    db_path = str(tmp_path / "lt.db")
+    monkeypatch.setenv("LT_DB_PATH", db_path)
+    run_migrations(db_path)
+
+
+def test_repeats_collapse_into_one_row_per_group_commit(tmp_path, monkeypatch):
+    _migrated(tmp_path, monkeypatch)
+    sink = EventSink(flush_interval_s=60)
+    t0 = int(time.time() * 1000)
+    # a flapping Art-Net target at 30 Hz for one second
+    for i in range(30):
+        sink.emit("ERROR", "dmx", "send_failed", ref="1", details_json="timed out", ts_ms=t0 + i * 33)
+    sink.emit("INFO", "mqtt", "cmd_ack", ref="AA01")
+    assert _rows() == []
+    assert sink.flush() == 2
+    rows = _rows()
+    assert [(r["event_type"], r["repeat_count"]) for r in rows] == [("send_failed", 30), ("cmd_ack", 1)]
+    assert rows[0]["last_ts_ms"] == t0 + 29 * 33
+    # further repeats inside the window update the same row
+    sink.emit("ERROR", "dmx", "send_failed", ref="1", details_json="timed out", ts_ms=t0 + 2000)
+    sink.flush()
+    rows = _rows()
+    assert len(rows) == 2 and rows[0]["repeat_count"] == 31
+    # past the window a new row starts
+    sink.emit("ERROR", "dmx", "send_failed", ref="1", details_json="timed out", ts_ms=t0 + 20000)
+    sink.flush()
+    assert [r["repeat_count"] for r in _rows()] == [31, 1, 1]
+    assert sink.stats["flushes"] == 3
+    sink.close()
+
+
+def test_rate_limit_writes_summary(tmp_path, monkeypatch):
+    _migrated(tmp_path, monkeypatch)
+    sink = EventSink(flush_interval_s=60, rate_per_s=5)
+    t0 = (int(time.time()) * 1000)
+    for i in range(12):
+        sink.emit("WARN", "dmx", "ofl_map_compile_failed", details_json=f"fixture {i}", ts_ms=t0 + i)
+    sink.flush()
+    rows = _rows()
+    assert len(rows) == 6
+    assert rows[-1]["source"] == "events" and rows[-1]["ref"] == "dmx/ofl_map_compile_failed"
+    assert rows[-1]["details_json"] == '{"dropped": 7}'
+    sink.close()
+
+
+def test_background_flush_and_retention(tmp_path, monkeypatch):
+    _migrated(tmp_path, monkeypatch)
+    sink = EventSink(flush_interval_s=0.05)
+    now = int(time.time() * 1000)
+    sink.emit("INFO", "test", "old", ts_ms=now - 40 * 86400000)
+    for i in range(5):
+        sink.emit("INFO", "test", "new", details_json=str(i))
+    deadline = time.monotonic() + 2
+    while sink.stats["pruned"] < 1 and time.monotonic() < deadline:
+        time.sleep(0.02)
+    # the first background pass also applies retention: the 40 day old event is gone
+    assert [r["event_type"] for r in _rows()] == ["new"] * 5
+    assert sink.prune(max_age_days=0, max_rows=3) == 2
+    assert [r["details_json"] for r in _rows()] == ["2", "3", "4"]
+    sink.close()
+
+
+def test_events_api_filters_and_cursor(tmp_path, monkeypatch):
+    from app.db.persistence import get_persistence
+    _migrated(tmp_path, monkeypatch)
+    p = get_persistence()
+    for i in range(5):
+        p.append_event("INFO", "mqtt", "cmd_ack", ref=f"AA0{i}")
+    p.append_event("ERROR", "dmx", "send_failed", ref="1")
+    client = TestClient(app)
+    r = client.get("/api/v1/events", params={"source": "mqtt", "limit": 2})
+    assert r.status_code == 200, r.text
+    page = r.json()
+    assert [e["ref"] for e in page["events"]] == ["AA04", "AA03"]
+    page = client.get("/api/v1/events", params={"source": "mqtt", "limit": 2, "before": page["next"]}).json()
+    assert [e["ref"] for e in page["events"]] == ["AA02", "AA01"]
+    last = client.get("/api/v1/events", params={"source": "mqtt", "limit": 2, "before": page["next"]}).json()
+    assert [e["ref"] for e in last["events"]] == ["AA00"] and last["next"] is None
+    errors = client.get("/api/v1/events", params={"level": "error,warn"}).json()["events"]
+    assert [(e["source"], e["repeat_count"]) for e in errors] == [("dmx", 1)]
+    plan = _rows("EXPLAIN QUERY PLAN SELECT id FROM event_log WHERE source=? AND event_type=? ORDER BY id DESC", ("a", "b"))
+    assert any("idx_event_log_source_type" in r["detail"] for r in plan)
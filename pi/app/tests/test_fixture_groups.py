@@ -0,0 +1,76 @@
+import json
+
+from app.dmx.dmx_engine import DmxEngine
+from app.dmx.ofl_channels import compile_and_store
+from app.db.migrations.runner import run_migrations
+from app.db.persistence import get_persistence
+
+
+FIXTURE = {
+    "availableChannels": {"Pan": {}, "Pan fine": {}, "Tilt": {}, "Tilt fine": {}},
+    "modes": [{"name": "4ch", "channels": ["Pan", "Pan fine", "Tilt", "Tilt fine"]}],
+}
+
+
+class DummyDriver:
+    def __init__(self):
+        self.sent = []
+
+    def send_frame(self, frame: bytes, universe=None):
+        self.sent.append((universe, frame))
+
+
+class TE:
+    latest_position = {}
+
+
+def _tracking(x, ts):
+    return {"state": "TRACKING", "ts_ms": ts, "position_cm": {"x": x, "y": 300, "z": 0}}
+
+
+def test_group_follows_tags_by_priority(tmp_path, monkeypatch):
+    db_path = tmp_path / "groups.db"
+    monkeypatch.setenv("LT_DB_PATH", str(db_path))
+    run_migrations(str(db_path))
+    p = get_persistence()
+    fid = p.upsert_ofl_fixture("Acme", "Mover", None, json.dumps(FIXTURE), "h")
+    compile_and_store(p, fid, FIXTURE)
+    grouped = p.create_patched_fixture(fid, "g1", "4ch", 0, 1, json.dumps({"pos_z_cm": 400}))
+    p.create_patched_fixture(fid, "solo", "4ch", 0, 20, json.dumps({"pos_z_cm": 400}))
+    gid = p.save_fixture_group(None, {
+        "name": "left",
+        "tags": [{"tag_mac": "A", "priority": 0}, {"tag_mac": "B", "priority": 1}],
+        "members": [{"kind": "patch", "ref_id": grouped}],
+    })
+    assert p.get_fixture_group(gid)["members"] == [{"kind": "patch", "ref_id": grouped}]
+
+    te = TE()
+    te.latest_position = {"A": _tracking(-200, 1), "B": _tracking(200, 2)}
+    eng = DmxEngine(tracking_engine=te, driver=DummyDriver(), state_provider=lambda: "LIVE")
+
+    calls = []
+    orig = p.list_fixture_groups
+    monkeypatch.setattr(p, "list_fixture_groups", lambda: calls.append(1) or orig())
+    for _ in range(3):
+        eng.tick()
+    # the plan is compiled once, not re-read per tick
+    assert len(calls) == 1
+    assert eng.routing_status[gid]["tag_mac"] == "A"
+    frame = eng.merger.merged(0)
+    # grouped fixture aims at A (left), ungrouped follows the most recent tag B (right)
+    assert frame[1] != frame[20]
+
+    te.latest_position = {"A": {"state": "LOST"}, "B": _tracking(200, 3)}
+    eng.tick()
+    assert eng.routing_status[gid]["tag_mac"] == "B"
+
+    te.latest_position = {}
+    before = eng.merger.merged(0)
+    eng.tick()
+    # no target: fixtures hold their last position
+    assert eng.routing_status[gid]["tag_mac"] is None
+    assert eng.merger.merged(0) == before
+
+    # deleting the group also removes its tag list and memberships
+    assert p.delete_fixture_group(gid)
+    assert p.get_fixture_group(gid) is None
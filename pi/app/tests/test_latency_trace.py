@@ -0,0 +1,95 @@
+import asyncio
+import math
+import time
+
+from fastapi.testclient import TestClient
+
+from app.core import latency
+from app.core.tracking_engine import TrackingEngine
+from app.db.migrations.runner import run_migrations
+from app.db.persistence import get_persistence
+from app.dmx.dmx_engine import DmxEngine
+from app.dmx.uart_rs485_driver import UartRs485Driver
+from app.main import app
+
+ANCHORS = {"A": (0.0, 0.0, 0.0), "B": (400.0, 0.0, 0.0), "C": (0.0, 400.0, 0.0), "D": (0.0, 0.0, 250.0)}
+
+
+class DummyDriver(UartRs485Driver):
+    def __init__(self):
+        self.sent = []
+
+    def send_frame(self, frame: bytes, universe=None):
+        self.sent.append(universe)
+
+
+def _feed(te, batch_ts_ms, rx_ms, target=(150.0, 120.0, 100.0)):
+    for mac, pos in ANCHORS.items():
+        d_m = math.dist(pos, target) / 100.0
+        # anchor D reports 20 ms later than the others
+        ts = batch_ts_ms + (20 if mac == "D" else 0)
+        te.enqueue_range_batch(mac, ts, [{"tag_mac": "T1", "d_m": d_m}], rx_ms=rx_ms)
+
+
+def test_trace_from_range_batch_to_dmx_frame(tmp_path, monkeypatch):
+    db_path = str(tmp_path / "lt.db")
+    monkeypatch.setenv("LT_DB_PATH", db_path)
+    run_migrations(db_path)
+    get_persistence().create_fixture({"name": "fx", "profile_key": "generic_mh_16bit_v1", "universe": 1,
+                                      "dmx_base_addr": 1, "pos_x_cm": 0, "pos_y_cm": 0, "pos_z_cm": 300})
+    te = TrackingEngine(anchor_positions_provider=lambda: ANCHORS)
+    now = time.time() * 1000
+    _feed(te, int(now - 60), now - 45)
+    asyncio.run(te._tick())
+
+    payload = te.latest_position["T1"]
+    trace = payload["trace"]
+    assert trace["anchor"] != "D" and trace["batch_ts_ms"] == int(now - 60)
+    steps = latency.breakdown(trace)
+    assert abs(steps["transport"] - 15) < 1
+    assert all(steps[s] >= 0 for s in ("ingest", "queue", "solve", "publish"))
+    assert "dmx" not in steps
+    # the publish stage ends when the bus has handed the record out
+    publish = te.bus.publish
+
+    def slow_publish(rec):
+        time.sleep(0.02)
+        return publish(rec)
+
+    monkeypatch.setattr(te.bus, "publish", slow_publish)
+    _feed(te, int(time.time() * 1000), None)
+    asyncio.run(te._tick())
+    monkeypatch.setattr(te.bus, "publish", publish)
+    assert latency.breakdown(te.latest_position["T1"]["trace"])["publish"] >= 19
+    trace = te.latest_position["T1"]["trace"]
+
+    drv = DummyDriver()
+    eng = DmxEngine(tracking_engine=te, driver=drv, state_provider=lambda: "LIVE")
+    eng.tick()
+    dmx = eng.latency_traces["T1"]
+    assert dmx["dmx_frame"] == 1 and dmx["universes"] == [1]
+    assert dmx["solved_ms"] == trace["solved_ms"]
+    total = latency.breakdown(dmx)["total"]
+    assert total >= latency.breakdown(trace)["publish"] >= 19
+    # the same position in later frames keeps its first frame
+    eng.tick()
+    assert eng.latency_traces["T1"]["dmx_frame"] == 1
+    _feed(te, int(time.time() * 1000), None)
+    asyncio.run(te._tick())
+    eng.tick()
+    assert eng.latency_traces["T1"]["dmx_frame"] == 3
+
+    old = {k: getattr(app.state, k, None) for k in ("tracking_engine", "dmx_engine")}
+    app.state.tracking_engine, app.state.dmx_engine = te, eng
+    try:
+        r = TestClient(app).get("/api/v1/tracking/latency", params={"tag_mac": "T1"})
+        assert r.status_code == 200, r.text
+        out = r.json()
+        assert out["dmx"]["current"] and out["dmx"]["frame"] == 3
+        assert set(out["position"]["breakdown_ms"]) == {"transport", "ingest", "queue", "solve", "publish"}
+        assert out["stages"]["total"]["count"] >= 2
+        assert out["anchors"]["D"]["age"]["count"] >= 2
+        assert TestClient(app).get("/api/v1/tracking/latency", params={"tag_mac": "NOPE"}).status_code == 404
+    finally:
+        for k, v in old.items():
+            setattr(app.state, k, v)
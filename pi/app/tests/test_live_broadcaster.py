@@ -0,0 +1,151 @@
+import asyncio
+import json
+
+from app import metrics
+from app.live_broadcaster import LiveBroadcaster, POSITIONS_HEADER, POSITION_RECORD
+
+
+class FakeWS:
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.messages = []
+        self.closed = False
+
+    async def send_text(self, msg):
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        self.messages.append(json.loads(msg))
+
+    async def send_bytes(self, data):
+        self.messages.append(bytes(data))
+
+    async def close(self):
+        self.closed = True
+
+
+def _tag(mac, x):
+    return {"type": "tracking", "tag_mac": mac, "state": "TRACKING", "position_cm": {"x": x, "y": 0, "z": 0}}
+
+
+def test_snapshot_then_only_changes():
+    async def run():
+        b = LiveBroadcaster()
+        b.publish([_tag("A", 1), _tag("B", 2)])
+        ws = FakeWS()
+        b.add(ws)
+        await asyncio.sleep(0.01)
+        assert {e["tag_mac"] for e in ws.messages[0]["events"]} == {"A", "B"}
+        # unchanged entities are not re-sent
+        assert b.publish([_tag("A", 1), _tag("B", 3)]) == 1
+        await asyncio.sleep(0.01)
+        assert [e["tag_mac"] for e in ws.messages[-1]["events"]] == ["B"]
+        assert len(ws.messages) == 2
+    asyncio.run(run())
+
+
+def test_slow_client_coalesces_and_times_out():
+    async def run():
+        b = LiveBroadcaster(send_timeout_s=0.05)
+        fast, slow, stuck = FakeWS(), FakeWS(delay=0.02), FakeWS(delay=1.0)
+        for ws in (fast, slow, stuck):
+            b.add(ws)
+        for x in range(10):
+            b.publish([_tag("A", x)])
+            await asyncio.sleep(0.005)
+        await asyncio.sleep(0.1)
+        # the fast client is not held up by the others and ends on the newest state
+        assert fast.messages[-1]["events"][0]["position_cm"]["x"] == 9
+        # the slow one skipped intermediate states but converged
+        assert len(slow.messages) < 10
+        assert slow.messages[-1]["events"][0]["position_cm"]["x"] == 9
+        # the stuck one was dropped
+        assert stuck.closed and len(b.clients()) == 2 and b.dropped == 1
+        assert metrics.WS_DROPPED.value() == dropped_before + 1
+    dropped_before = metrics.WS_DROPPED.value()
+    asyncio.run(run())
+
+
+def test_subscriptions_filter_topics_and_rate():
+    async def run():
+        b = LiveBroadcaster()
+        b.publish([_tag("A", 0), _tag("B", 0), {"type": "state", "id": "system", "state": "SETUP"}])
+        ws = FakeWS()
+        client = b.add(ws)
+        reply = client.handle_message(json.dumps({"type": "subscribe", "topics": [
+            {"topic": "tags", "ids": ["A"], "max_hz": 10},
+            {"topic": "state"},
+        ]}))
+        assert reply == {"type": "subscribed", "topics": ["state", "tags"]}
+        await asyncio.sleep(0.01)
+        ws.messages.clear()
+        for x in range(1, 20):
+            b.publish([_tag("A", x), _tag("B", x)])
+            await asyncio.sleep(0.01)
+        await asyncio.sleep(0.12)
+        events = [e for m in ws.messages for e in m["events"]]
+        # only tag A, at most ~10 Hz over ~0.3 s, ending on the newest value
+        assert {e["tag_mac"] for e in events} == {"A"}
+        assert 2 <= len(events) <= 5
+        assert events[-1]["position_cm"]["x"] == 19
+        b.publish([{"type": "state", "id": "system", "state": "LIVE"}])
+        await asyncio.sleep(0.01)
+        assert ws.messages[-1]["events"] == [{"type": "state", "id": "system", "state": "LIVE"}]
+        client.handle_message(json.dumps({"type": "unsubscribe", "topics": ["state"]}))
+        assert not b.has_subscribers("state")
+    asyncio.run(run())
+
+
+def test_binary_position_frames():
+    async def run():
+        b = LiveBroadcaster()
+        ws = FakeWS()
+        b.add(ws, binary=True)
+        b.publish([_tag("A", 10), {"type": "tracking", "tag_mac": "B", "state": "LOST", "ts_ms": 5}])
+        await asyncio.sleep(0.01)
+        index, frame = ws.messages[0], ws.messages[1]
+        assert index == {"type": "tag_index", "tags": ["A", "B"]}
+        kind, version, count = POSITIONS_HEADER.unpack_from(frame)
+        assert (kind, version, count) == (1, 1, 2)
+        assert len(frame) == POSITIONS_HEADER.size + 2 * POSITION_RECORD.size
+        rec_a = POSITION_RECORD.unpack_from(frame, POSITIONS_HEADER.size)
+        rec_b = POSITION_RECORD.unpack_from(frame, POSITIONS_HEADER.size + POSITION_RECORD.size)
+        assert rec_a[:3] == (0, 1, 1) and rec_a[4:] == (10.0, 0.0, 0.0)
+        assert rec_b[:4] == (1, 3, 0, 5.0)
+        # known tags: later frames come without a new index message
+        b.publish([_tag("A", 11)])
+        await asyncio.sleep(0.01)
+        assert len(ws.messages) == 3 and isinstance(ws.messages[2], bytes)
+    asyncio.run(run())
+
+
+def test_resume_from_ring_and_long_poll():
+    async def run():
+        b = LiveBroadcaster(ring_size=3)
+        b.publish([_tag("A", 1), _tag("B", 1)])
+        seq, events, snapshot = b.changes_since(0)
+        assert snapshot and {e["tag_mac"] for e in events} == {"A", "B"}
+        b.publish([_tag("A", 2)])
+        b.publish([{"type": "state", "id": "system", "state": "LIVE"}])
+        # resume: only what changed after seq, filtered by topic, newest value
+        seq2, events, snapshot = b.changes_since(seq)
+        assert not snapshot and events == [_tag("A", 2)]
+        for x in range(3, 7):
+            b.publish([_tag("B", x)])
+        # seq fell out of the ring: full snapshot instead
+        _, events, snapshot = b.changes_since(seq, topics=("tags", "state"))
+        assert snapshot and len(events) == 3
+
+        # long-poll waits for a matching change and ignores other topics
+        cur = b.seq
+        waiter = asyncio.ensure_future(b.wait_changes(cur, 1.0, topics=("tags",), ids=["A"]))
+        await asyncio.sleep(0.01)
+        b.publish([_tag("B", 99)])
+        await asyncio.sleep(0.01)
+        assert not waiter.done()
+        b.publish([_tag("A", 42)])
+        seq3, events, snapshot = await asyncio.wait_for(waiter, 1.0)
+        assert seq3 == cur + 2 and events == [_tag("A", 42)] and not snapshot
+        assert await b.wait_changes(b.seq, 0.02) == (b.seq, [], False)
+        b.touch(["events"], ttl_s=5)
+        assert b.has_subscribers("events")
+    asyncio.run(run())
@@ -0,0 +1,54 @@
+import random
+
+from app.dmx.merge import UniverseMerger, HTP
+
+
+def test_ltp_priority_and_release():
+    m = UniverseMerger()
+    tracking = m.layer("tracking", priority=10)
+    test = m.layer("test", priority=30)
+    tracking.set(1, {1: 100, 2: 50})
+    test.set(1, {2: 200})
+    frame = m.merged(1)
+    assert len(frame) == 513 and frame[0] == 0
+    assert frame[1] == 100 and frame[2] == 200
+    # an explicit 0 from the higher layer still wins under LTP
+    test.set(1, {1: 0})
+    assert m.merged(1)[1] == 0
+    test.release(1)
+    frame = m.merged(1)
+    assert frame[1] == 100 and frame[2] == 50
+    assert m.universes() == [1]
+
+
+def test_htp_takes_maximum():
+    m = UniverseMerger()
+    low = m.layer("low", priority=1)
+    high = m.layer("high", priority=2)
+    m.set_rule(0, [5], HTP)
+    low.set(0, {5: 180, 6: 180})
+    high.set(0, {5: 20, 6: 20})
+    frame = m.merged(0)
+    assert frame[5] == 180  # HTP
+    assert frame[6] == 20   # LTP
+
+
+def test_incremental_merge_matches_reference():
+    rnd = random.Random(7)
+    m = UniverseMerger()
+    layers = [m.layer(f"l{i}", priority=i) for i in range(4)]
+    m.set_rule(0, range(1, 50), HTP)
+    for _ in range(100):
+        lay = rnd.choice(layers)
+        if rnd.random() < 0.2:
+            lay.release(0, [rnd.randint(1, 512) for _ in range(5)])
+        else:
+            lay.set(0, {rnd.randint(1, 512): rnd.randint(0, 255) for _ in range(5)})
+        expected = bytearray(513)
+        snapshots = [l.get(0) for l in layers]
+        for ch in range(1, 513):
+            owners = [snap[ch] for snap in snapshots if ch in snap]
+            if not owners:
+                continue
+            expected[ch] = max(owners) if ch < 50 else owners[-1]
+        assert m.merged(0) == bytes(expected)
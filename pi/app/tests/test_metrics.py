@@ -0,0 +1,84 @@
+import asyncio
+import json
+import os
+import tempfile
+from types import SimpleNamespace
+
+from fastapi.testclient import TestClient
+
+from app import metrics
+from app.core.tracking_engine import TrackingEngine
+from app.db.migrations.runner import run_migrations
+from app.main import app
+from app.metrics import Registry
+
+client = TestClient(app)
+
+
+def setup_module(module):
+    fd, path = tempfile.mkstemp(suffix=".db")
+    os.close(fd)
+    os.environ["LT_DB_PATH"] = path
+    run_migrations(path)
+
+
+def test_registry_text_and_json():
+    r = Registry()
+    c = r.counter("t_msgs_total", "messages", ("type",))
+    g = r.gauge("t_clients", "clients")
+    h = r.histogram("t_seconds", "latency", buckets=(0.01, 0.1))
+    c.inc(type="ranges")
+    c.inc(2, type='a"b')
+    g.set(3)
+    for v in (0.005, 0.05, 0.05, 5.0):
+        h.observe(v)
+    text = r.render_text()
+    assert "# TYPE t_msgs_total counter" in text
+    assert 't_msgs_total{type="ranges"} 1' in text
+    assert 't_msgs_total{type="a\\"b"} 2' in text
+    assert "t_clients 3" in text
+    assert 't_seconds_bucket{le="0.01"} 1' in text
+    assert 't_seconds_bucket{le="0.1"} 3' in text
+    assert 't_seconds_bucket{le="+Inf"} 4' in text
+    assert "t_seconds_count 4" in text
+    d = r.as_dict()
+    assert d["t_seconds"]["samples"][0]["buckets"] == {"0.01": 1, "0.1": 3, "+Inf": 4}
+    assert r.counter("t_msgs_total", "again", ("type",)) is c
+
+
+def test_hot_paths_update_metrics():
+    from app.mqtt_client import MQTTClientWrapper
+
+    before = metrics.MQTT_MESSAGES.value(type="ranges")
+    ingested = metrics.RANGE_SAMPLES.value()
+    te = TrackingEngine(anchor_positions_provider=lambda: {
+        "A1": (0, 0, 0), "A2": (500, 0, 0), "A3": (0, 500, 0), "A4": (0, 0, 300),
+    })
+    mc = MQTTClientWrapper(tracking_engine=te)
+    ranges = [{"tag_mac": "T1", "d_m": 2.0}, {"tag_mac": "T1"}]
+    for anchor in ("A1", "A2", "A3", "A4"):
+        msg = SimpleNamespace(topic=f"dev/{anchor}/ranges", payload=json.dumps({"ranges": ranges}).encode())
+        mc._on_message(None, None, msg)
+    mc._on_message(None, None, SimpleNamespace(topic="dev/A1/status", payload=b"{not json"))
+    mc.commands.close()
+    assert metrics.MQTT_MESSAGES.value(type="ranges") == before + 4
+    assert metrics.RANGE_SAMPLES.value() == ingested + 4
+    assert metrics.RANGE_DROPPED.value(reason="invalid") >= 4
+    assert metrics.MQTT_DECODE_ERRORS.value() >= 1
+
+    ticks = (metrics.TRACKING_TICK_SECONDS.snapshot() or {"count": 0})["count"]
+    asyncio.run(te._tick())
+    assert metrics.TRACKING_TICK_SECONDS.snapshot()["count"] == ticks + 1
+    assert metrics.TRACKING_SOLVE_SECONDS.snapshot(tag="T1")["count"] >= 1
+
+
+def test_metrics_endpoints():
+    from app.db.persistence import get_persistence
+    assert get_persistence().get_setting("system.state") == "SETUP"
+    r = client.get("/metrics")
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith("text/plain; version=0.0.4")
+    assert 'lt_db_query_seconds_count{method="get_setting"}' in r.text
+    j = client.get("/api/v1/metrics", params={"format": "json"}).json()
+    assert j["lt_dmx_tick_seconds"]["type"] == "histogram"
+    assert any(s["labels"]["method"] == "get_setting" for s in j["lt_db_query_seconds"]["samples"])
@@ -0,0 +1,37 @@
+import json
+import os
+
+from app.dmx.ofl_channels import compile_fixture, compile_mode, compile_and_store
+from app.db.migrations.runner import run_migrations
+
+
+def test_compile_mode_roles(ofl_mover):
+    m = compile_mode(ofl_mover, "9ch")
+    assert m["channel_count"] == 9
+    assert (m["pan"], m["pan_fine"], m["tilt"], m["tilt_fine"]) == (0, 1, 2, 3)
+    assert m["dimmer"] == 5
+    assert (m["red"], m["green"], m["blue"]) == (6, 7, 8)
+    assert m["white"] is None
+    assert compile_mode(ofl_mover, "missing") is None
+    assert set(compile_fixture(ofl_mover)) == {"9ch", "2ch"}
+    assert compile_fixture(ofl_mover)["2ch"]["pan"] == 1
+
+
+def test_channel_maps_persisted_and_invalidated(tmp_path, ofl_mover):
+    db_path = tmp_path / "ofl.db"
+    os.environ["LT_DB_PATH"] = str(db_path)
+    run_migrations(str(db_path))
+    from app.db.persistence import Persistence
+    p = Persistence()
+    norm = json.dumps(ofl_mover, sort_keys=True)
+    fid = p.upsert_ofl_fixture("Acme", "Mover", None, norm, "hash1")
+    compile_and_store(p, fid, ofl_mover)
+    p.create_patched_fixture(fid, "m1", "9ch", 0, 1)
+    maps = p.list_ofl_channel_maps()
+    # only patched (fixture, mode) pairs are loaded for the output path
+    assert list(maps) == [(fid, "9ch")]
+    assert maps[(fid, "9ch")]["tilt"] == 2
+
+    # editing the fixture definition drops its compiled maps
+    p.upsert_ofl_fixture("Acme", "Mover", None, json.dumps({"modes": []}), "hash1")
+    assert p.get_ofl_channel_map(fid, "9ch") is None
@@ -0,0 +1,36 @@
+import json
+
+from app.db.migrations.runner import run_migrations
+from app.db.persistence import get_persistence
+
+
+def _fixture(categories, modes):
+    return json.dumps({"categories": categories, "modes": [{"name": n, "channels": ["c"] * k} for n, k in modes]})
+
+
+def test_search_projection_and_keyset_pages(tmp_path, monkeypatch):
+    path = str(tmp_path / "ofl.db")
+    monkeypatch.setenv("LT_DB_PATH", path)
+    run_migrations(path)
+    p = get_persistence()
+    ids = {}
+    for i in range(5):
+        ids[i] = p.upsert_ofl_fixture("Robe", f"Spot {i}", None, _fixture(["Moving Head"], [("Basic", 8), ("Extended", 16)]), f"h{i}")
+    p.upsert_ofl_fixture("Cameo", "Flat Par", None, _fixture(["Color Changer"], [("RGBW", 4)]), "par")
+
+    page = p.search_ofl_fixture_page(limit=4)
+    assert [f["model"] for f in page["fixtures"]] == ["Flat Par", "Spot 0", "Spot 1", "Spot 2"]
+    assert "ofl_json" not in page["fixtures"][0]
+    assert page["fixtures"][1]["modes"] == [{"name": "Basic", "channels": 8}, {"name": "Extended", "channels": 16}]
+    rest = p.search_ofl_fixture_page(after=page["next"], limit=4)
+    assert [f["model"] for f in rest["fixtures"]] == ["Spot 3", "Spot 4"] and rest["next"] is None
+
+    # word prefixes over manufacturer, model, categories and mode names
+    assert [f["model"] for f in p.search_ofl_fixture_page("color")["fixtures"]] == ["Flat Par"]
+    assert len(p.search_ofl_fixture_page("exten rob")["fixtures"]) == 5
+    assert p.search_ofl_fixture_page('rgbw "OR')["fixtures"] == []
+
+    # index follows updates of the projection columns
+    p.upsert_ofl_fixture("Cameo", "Flat Par", None, _fixture(["Blinder"], [("Dim", 1)]), "par")
+    assert p.search_ofl_fixture_page("color")["fixtures"] == []
+    assert p.get_ofl_fixture_summaries([ids[0]])[ids[0]]["categories"] == ["Moving Head"]
@@ -0,0 +1,133 @@
+import os
+import sqlite3
+import time
+
+from app.db import connect_db, ram_db
+from app.db.migrations.runner import run_migrations
+from app.db.ram_db import RamDatabase
+
+
+def _setting(path, key):
+    conn = sqlite3.connect(path)
+    try:
+        row = conn.execute("SELECT value FROM settings WHERE key=?", (key,)).fetchone()
+        return row[0] if row else None
+    finally:
+        conn.close()
+
+
+def _put(path, key, value):
+    conn = sqlite3.connect(path)
+    try:
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("INSERT OR REPLACE INTO settings(key, value, updated_at_ms) VALUES(?,?,0)", (key, value))
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def _disk(tmp_path):
+    disk = str(tmp_path / "data" / "lt.db")
+    run_migrations(disk)
+    _put(disk, "show.name", "v1")
+    return disk
+
+
+def test_checkpoint_writes_snapshot_only_when_changed(tmp_path):
+    disk = _disk(tmp_path)
+    rd = RamDatabase(disk, live_dir=str(tmp_path / "shm"))
+    live = rd.open()
+    assert live.startswith(str(tmp_path / "shm")) and _setting(live, "show.name") == "v1"
+    # the disk file was folded into a self-contained file
+    assert not os.path.exists(disk + "-wal")
+    _put(live, "show.name", "v2")
+    assert _setting(disk, "show.name") == "v1"
+    assert rd.checkpoint("test")
+    assert _setting(disk, "show.name") == "v2"
+    assert not os.path.exists(disk + "-wal") and not os.path.exists(disk + ram_db.SNAPSHOT_SUFFIX)
+    assert not rd.checkpoint("test")
+    assert rd.stats["checkpoints"] == 1 and rd.stats["skipped"] == 1
+    assert rd.close() and not os.path.exists(live)
+
+
+def test_failed_checkpoint_keeps_previous_snapshot(tmp_path, monkeypatch):
+    disk = _disk(tmp_path)
+    rd = RamDatabase(disk, live_dir=str(tmp_path / "shm"))
+    live = rd.open()
+    _put(live, "show.name", "v2")
+
+    def crash(src, dst):
+        raise OSError("power lost during rename")
+
+    monkeypatch.setattr(ram_db.os, "replace", crash)
+    assert not rd.checkpoint("test")
+    assert "power lost" in rd.stats["last_error"]
+    assert _setting(disk, "show.name") == "v1"
+    assert ram_db._quick_check(disk)
+    assert not os.path.exists(disk + ram_db.SNAPSHOT_SUFFIX)
+    monkeypatch.undo()
+    assert rd.checkpoint("retry") and _setting(disk, "show.name") == "v2"
+
+
+def test_process_crash_recovers_from_tmpfs_power_loss_from_snapshot(tmp_path):
+    disk = _disk(tmp_path)
+    shm = str(tmp_path / "shm")
+    crashed = RamDatabase(disk, live_dir=shm)
+    live = crashed.open()
+    _put(live, "show.name", "v2")
+    time.sleep(0.01)
+    # process died without a checkpoint: the tmpfs copy is newer and gets used
+    rd = RamDatabase(disk, live_dir=shm)
+    assert rd.open() == live and rd.recovered
+    assert _setting(disk, "show.name") == "v2"
+    _put(live, "show.name", "v3")
+    # reboot: tmpfs is empty, the last snapshot is loaded
+    for p in (live, live + "-wal", live + "-shm"):
+        if os.path.exists(p):
+            os.remove(p)
+    rd = RamDatabase(disk, live_dir=shm)
+    rd.open()
+    assert not rd.recovered and _setting(live, "show.name") == "v2"
+
+
+def test_env_mode_checkpoints_on_interval_and_state_transition(tmp_path, monkeypatch):
+    from app.core.state_manager import StateManager
+
+    disk = _disk(tmp_path)
+    monkeypatch.setenv("LT_DB_PATH", disk)
+    monkeypatch.setenv("LT_DB_RAM", "1")
+    monkeypatch.setenv("LT_DB_RAM_DIR", str(tmp_path / "shm"))
+    monkeypatch.setenv("LT_DB_CHECKPOINT_S", "0.05")
+    rd = ram_db.enable_from_env()
+    try:
+        db = connect_db()
+        try:
+            assert db.execute("PRAGMA database_list").fetchone()["file"] == rd.live_path
+            db.execute("UPDATE settings SET value='v2' WHERE key='show.name'")
+            db.commit()
+        finally:
+            db.close()
+        deadline = time.monotonic() + 2
+        while _setting(disk, "show.name") != "v2" and time.monotonic() < deadline:
+            time.sleep(0.02)
+        assert rd.stats["last_reason"] == "interval"
+        rd.interval_s = 60
+        time.sleep(0.1)
+        # only going LIVE asks for a snapshot, and set_state never copies inline
+        StateManager().set_state("SAFE")
+        assert rd._requested is None
+        with rd._lock:  # a checkpoint in progress must not block the transition
+            StateManager().set_state("LIVE")
+            assert _setting(disk, "system.state") == "SETUP"
+        deadline = time.monotonic() + 2
+        while _setting(disk, "system.state") != "LIVE" and time.monotonic() < deadline:
+            time.sleep(0.02)
+        assert rd.stats["last_reason"] == "state:SAFE->LIVE"
+    finally:
+        ram_db.disable()
+    assert ram_db.get_ram_database() is None
+    db = connect_db()
+    try:
+        assert db.execute("PRAGMA database_list").fetchone()["file"] == disk
+    finally:
+        db.close()
@@ -18,3 +18,34 @@ def test_range_cache_stale_filtered():
     rc.update_from_batch("A1", now - 200, [{"tag_mac": "T1", "d_m": 3.0, "ts_ms": now - 200}])
     snap = rc.snapshot("T1", max_age_ms=100)
     assert snap == []
+
+
+def test_capture_sees_every_sample_with_streaming_stats():
+    import random
+    import statistics
+    rc = RangeCache(window_ms=500)
+    cap = rc.open_capture("T1", max_samples=100)
+    rnd = random.Random(7)
+    vals = {"A1": [], "A2": []}
+    now = int(time.time() * 1000)
+    for i in range(1000):
+        for anchor, base in (("A1", 3.0), ("A2", 5.0)):
+            d = base + rnd.gauss(0, 0.05)
+            vals[anchor].append(d)
+            # the cache only keeps the latest value; the capture must keep them all
+            rc.update_from_batch(anchor, now + i, [{"tag_mac": "T1", "d_m": d}, {"tag_mac": "T9", "d_m": 1.0}])
+    rc.close_capture(cap)
+    rc.update_from_batch("A1", now, [{"tag_mac": "T1", "d_m": 99.0}])
+    stats = cap.stats()
+    assert cap.count == 2000 and set(stats) == {"A1", "A2"}
+    for anchor, v in vals.items():
+        st = stats[anchor]
+        assert st["count"] == 1000
+        assert abs(st["mean_d_m"] - statistics.fmean(v)) < 1e-9
+        assert abs(st["median_d_m"] - statistics.median(v)) < 0.01
+        mad = statistics.median(abs(x - statistics.median(v)) for x in v)
+        assert abs(st["mad_d_m"] - mad) < 0.01
+        assert st["min_d_m"] == min(v) and st["max_d_m"] == max(v)
+    # bounded buffer keeps the newest samples
+    recent = cap.samples("A1")
+    assert len(recent) == 100 and recent[-1].d_m == vals["A1"][-1]
@@ -0,0 +1,94 @@
+import math
+import os
+import random
+import tempfile
+import time
+
+from fastapi.testclient import TestClient
+
+from app.core.self_survey import SurveyCollector, self_survey
+from app.db.migrations.runner import run_migrations
+from app.main import app
+
+
+def setup_module(_):
+    tmp = tempfile.NamedTemporaryFile(delete=False)
+    tmp.close()
+    os.environ["LT_DB_PATH"] = tmp.name
+    run_migrations(tmp.name)
+
+
+client = TestClient(app)
+
+
+def _layout(n=16, seed=2, max_range_cm=2800.0):
+    rng = random.Random(seed)
+    truth = {"AA0000000000": (0.0, 0.0, 300.0), "AA0000000001": (2500.0, 0.0, 300.0), "AA0000000002": (400.0, 1800.0, 300.0)}
+    for i in range(3, n):
+        truth[f"AA00000000{i:02d}"] = (rng.uniform(0, 3000), rng.uniform(0, 2000), rng.choice([250.0, 400.0, 600.0]))
+    ranges = {}
+    macs = sorted(truth)
+    for i, a in enumerate(macs):
+        for b in macs[i + 1:]:
+            d = math.dist(truth[a], truth[b])
+            if d <= max_range_cm:
+                ranges[(a, b)] = d + rng.gauss(0.0, 2.0)
+    return truth, ranges
+
+
+def test_self_survey_sixteen_anchors():
+    truth, ranges = _layout()
+    bad = sorted(ranges)[5]
+    ranges[bad] += 200.0
+    heights = {m: p[2] for m, p in truth.items()}
+    t0 = time.perf_counter()
+    res = self_survey(ranges, "AA0000000000", "AA0000000001", xy_plane="AA0000000002", heights_cm=heights)
+    assert time.perf_counter() - t0 < 0.5
+    assert res.converged and res.filled_pairs > 0
+    for mac, pos in res.positions_cm.items():
+        assert math.dist((pos["x"], pos["y"], pos["z"]), truth[mac]) < 10.0
+        assert res.sigma_cm[mac]["x"] is not None
+    assert abs(res.residuals_cm[f"{bad[0]}-{bad[1]}"]) > 150.0
+
+
+def test_self_survey_without_heights_uses_gauge_plane():
+    truth, ranges = _layout(n=6, seed=5)
+    res = self_survey(ranges, "AA0000000000", "AA0000000001", xy_plane="AA0000000002")
+    # gauge anchors share z=0, everything else keeps its height above that plane
+    assert abs(res.positions_cm["AA0000000001"]["y"]) < 0.1
+    assert res.positions_cm["AA0000000002"]["y"] > 0
+    for mac, pos in res.positions_cm.items():
+        t = truth[mac]
+        # heights are weakly determined by few near-planar anchors; the error stays within the reported sigma
+        sig = math.sqrt(sum(v * v for v in res.sigma_cm[mac].values()))
+        assert math.dist((pos["x"], pos["y"], pos["z"]), (t[0], t[1], t[2] - 300.0)) < 3.0 * sig + 5.0
+
+
+def test_survey_collector_pools_both_directions():
+    col = SurveyCollector()
+    for d in (500.0, 502.0, 900.0):
+        col.record("B", "A", d)
+    col.record("A", "B", 501.0)
+    assert col.ranges() == {("A", "B"): 501.5}
+    assert col.status()["anchors"] == ["A", "B"]
+
+
+def test_survey_solve_api_applies_positions():
+    truth, ranges = _layout(n=5, seed=9)
+    payload = {
+        "ranges": [{"a": a, "b": b, "d_cm": d} for (a, b), d in ranges.items()],
+        "origin": "AA:00:00:00:00:00",
+        "x_axis": "AA0000000001",
+        "xy_plane": "AA0000000002",
+        "heights_cm": {m: p[2] for m, p in truth.items()},
+        "apply": True,
+    }
+    r = client.post("/api/v1/anchors/survey/solve", json=payload)
+    assert r.status_code == 200, r.text
+    assert r.json()["applied"] == 5
+    anchors = {a["mac"]: a for a in client.get("/api/v1/anchors").json()["anchors"]}
+    pos = anchors["AA0000000003"]["position_cm"]
+    assert math.dist((pos["x"], pos["y"], pos["z"]), truth["AA0000000003"]) < 10.0
+
+    bad = dict(payload, origin="FF0000000000", apply=False)
+    assert client.post("/api/v1/anchors/survey/solve", json=bad).status_code == 400
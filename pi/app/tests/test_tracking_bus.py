@@ -0,0 +1,99 @@
+import asyncio
+import dataclasses
+import threading
+
+import pytest
+
+from app.core.bus import PositionRecord, TrackingBus
+
+
+def test_latest_view_and_immutable_records():
+    bus = TrackingBus()
+    rec = bus.publish(PositionRecord("T1", "TRACKING", 100, position_cm=(1.0, 2.0, 3.0), anchors_used=("A", "B")))
+    assert rec.seq == 1
+    with pytest.raises(dataclasses.FrozenInstanceError):
+        rec.state = "LOST"
+    payload = bus.latest_payloads()["T1"]
+    assert payload["position_cm"] == {"x": 1.0, "y": 2.0, "z": 3.0}
+    assert payload["anchors_used"] == ["A", "B"]
+    with pytest.raises(TypeError):
+        bus.latest_payloads()["T2"] = {}
+    bus.publish(PositionRecord("T1", "LOST", 200))
+    assert bus.get("T1").state == "LOST" and bus.seq == 2
+
+
+def test_subscribers_wake_and_drop_oldest():
+    async def run():
+        bus = TrackingBus()
+        fast = bus.subscribe()
+        slow = bus.subscribe(maxsize=2)
+        got = []
+
+        async def consume():
+            async for rec in fast:
+                got.append(rec.ts_ms)
+                if rec.ts_ms == 4:
+                    return
+
+        task = asyncio.ensure_future(consume())
+        for ts in range(5):
+            bus.publish(PositionRecord("T1", "TRACKING", ts))
+            await asyncio.sleep(0)
+        await asyncio.wait_for(task, 1.0)
+        assert got == [0, 1, 2, 3, 4]
+        # the slow subscriber keeps only the newest records
+        assert [r.ts_ms for r in slow.drain()] == [3, 4]
+        assert slow.dropped == 3
+
+        # publishing from another thread is handed to the subscriber's loop
+        threading.Thread(target=bus.publish, args=(PositionRecord("T2", "TRACKING", 9),)).start()
+        rec = await asyncio.wait_for(fast.get(), 1.0)
+        assert rec.tag_mac == "T2"
+        fast.close()
+        slow.close()
+    asyncio.run(run())
+
+
+def test_engine_publishes_state_changes_once_and_dmx_consumes_the_bus():
+    import math
+    from app.core.tracking_engine import TrackingEngine
+    from app.dmx.dmx_engine import DmxEngine
+
+    anchors = {"A": (0.0, 0.0, 0.0), "B": (400.0, 0.0, 0.0), "C": (0.0, 400.0, 0.0), "D": (0.0, 0.0, 250.0)}
+
+    async def run():
+        te = TrackingEngine(anchor_positions_provider=lambda: anchors)
+        te.lost_timeout_ms = 30
+        eng = DmxEngine(tracking_engine=te, driver=None, state_provider=lambda: "SETUP")
+        eng.tick = lambda: None  # only the bus consumption is under test here
+        task = asyncio.ensure_future(eng.run(hz=200))
+        await asyncio.sleep(0.01)
+        watch = te.bus.subscribe()
+        for mac, pos in anchors.items():
+            te.enqueue_range_batch(mac, 0, [{"tag_mac": "T1", "d_m": math.dist(pos, (100.0, 100.0, 100.0)) / 100.0}])
+        await te._tick()
+        te.stale_timeout_ms = -1000  # every sample is too old from now on
+        for _ in range(6):
+            await te._tick()
+            await asyncio.sleep(0.02)
+        # each state change is published once, not once per tick
+        assert [r.state for r in watch.drain()] == ["TRACKING", "STALE", "LOST"]
+        await asyncio.sleep(0.02)
+        assert eng._sub is not None and eng._latest_positions()["T1"]["state"] == "LOST"
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        assert eng._sub is None and len(te.bus._subs) == 1
+        watch.close()
+    asyncio.run(run())
+
+
+def test_stamp_adds_times_to_the_latest_record_only():
+    bus = TrackingBus()
+    rec = bus.publish(PositionRecord("T1", "TRACKING", 1, trace=(("solved_ms", 5.0),)))
+    stamped = bus.stamp("T1", rec.seq, published_ms=7.0)
+    assert stamped.trace == (("solved_ms", 5.0), ("published_ms", 7.0))
+    assert bus.latest_payloads()["T1"]["trace"] == {"solved_ms": 5.0, "published_ms": 7.0}
+    assert rec.trace == (("solved_ms", 5.0),)
+    bus.publish(PositionRecord("T1", "TRACKING", 2, trace=(("solved_ms", 9.0),)))
+    assert bus.stamp("T1", rec.seq, published_ms=8.0) is None
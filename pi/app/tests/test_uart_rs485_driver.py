@@ -0,0 +1,99 @@
+import time
+
+from app.dmx import uart_rs485_driver
+from app.dmx.uart_rs485_driver import UartRs485Driver
+
+
+class FakeSerial:
+    def __init__(self, device, **kwargs):
+        self.device = device
+        self.kwargs = kwargs
+        self.breaks = 0
+        self.writes = []
+        self._break = False
+
+    @property
+    def break_condition(self):
+        return self._break
+
+    @break_condition.setter
+    def break_condition(self, value):
+        if value:
+            self.breaks += 1
+        self._break = value
+
+    def write(self, data):
+        self.writes.append(bytes(data))
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class FakeSerialModule:
+    Serial = FakeSerial
+
+
+def test_sync_mode_writes_from_caller(monkeypatch):
+    monkeypatch.setattr(uart_rs485_driver, "serial", FakeSerialModule)
+    drv = UartRs485Driver(device="/dev/fake")
+    frame = bytes(513)
+    drv.send_frame(frame)
+    assert drv.ser.writes == [frame]
+    assert drv.ser.breaks == 1
+    assert drv.ser.kwargs["baudrate"] == 250000
+
+
+class FakeClock:
+    def __init__(self):
+        self.t = 100.0
+
+    def __call__(self):
+        return self.t
+
+
+def test_threaded_mode_swaps_buffer_and_refreshes(monkeypatch):
+    monkeypatch.setattr(uart_rs485_driver, "serial", FakeSerialModule)
+    clock = FakeClock()
+    drv = UartRs485Driver(device="/dev/fake", threaded=True, refresh_hz=40, clock=clock)
+    # the test drives the writer step by step instead of a thread
+    monkeypatch.setattr(drv, "_ensure_writer", lambda: None)
+    first = bytes([0, 1] + [0] * 511)
+    second = bytes([0, 2] + [0] * 511)
+    drv.send_frame(first)
+    drv.send_frame(second)
+    # the tick only swaps the back buffer
+    assert drv.ser is None and drv.stats()["frames_swapped"] == 2
+    delays = []
+    for _ in range(52):  # 1.3 s at 40 Hz
+        delays.append(drv._writer_step())
+        clock.t += delays[-1]
+    writes = list(drv.ser.writes)
+    # latest frame wins, and it keeps being retransmitted without new input
+    assert len(writes) == 52 and set(writes) == {second}
+    assert all(abs(d - 0.025) < 1e-9 for d in delays)
+    stats = drv.stats()
+    assert stats["threaded"] is True and stats["frames_sent"] == 52
+    assert 39 <= stats["fps"] <= 41
+    # a slow port does not cause a catch-up burst
+    clock.t += 0.2
+    assert drv._writer_step() == 0.0
+    assert abs(drv._writer_step() - 0.025) < 1e-9
+
+
+def test_threaded_writer_thread_runs_and_closes(monkeypatch):
+    monkeypatch.setattr(uart_rs485_driver, "serial", FakeSerialModule)
+    drv = UartRs485Driver(device="/dev/fake", threaded=True, refresh_hz=40)
+    frame = bytes([0, 3] + [0] * 511)
+    try:
+        drv.send_frame(frame)
+        deadline = time.monotonic() + 5
+        while drv.stats()["frames_sent"] < 3 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert drv.stats()["frames_sent"] >= 3
+        assert set(drv.ser.writes) == {frame}
+    finally:
+        drv.close()
+    assert drv.ser is None
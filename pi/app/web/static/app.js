@@ -20,6 +20,7 @@ const LT_API = {
 
   trackingTags: "/api/v1/tracking/tags",
   trackingPos: (tagMac) => `/api/v1/tracking/position/${encodeURIComponent(tagMac)}`,
+  stream: "/api/v1/stream",
 
   events: "/api/v1/events",
   settings: "/api/v1/settings",
@@ -30,6 +31,7 @@ const LT_API = {
   deviceProvision: (mac) => `/api/v1/devices/${encodeURIComponent(mac)}/provision`,
   dmxConfig: "/api/v1/dmx/config",
   oflFixtures: "/api/v1/ofl/fixtures",
+  oflFixtureById: (id) => `/api/v1/ofl/fixtures/${id}`,
   oflImport: "/api/v1/ofl/fixtures/import",
   oflPatchedFixtures: "/api/v1/ofl/patched-fixtures",
   oflPatchedFixture: (id) => `/api/v1/ofl/patched-fixtures/${id}`,
@@ -799,20 +801,179 @@ async function ltCalibrationSolve(){
 }
 
 // ---------------- Live Monitor ----------------
+// Live data comes from /ws/live subscriptions (state + tags). When the WebSocket
+// cannot be opened, the same feed is read from /api/v1/stream as Server-Sent
+// Events, or by long-polling it (?since=<seq>) without EventSource support.
 let ltLiveTimer = null;
 let ltLiveColorTimer = null;
 let LT_LIVE_PATCH_CACHE = [];
+let ltLiveWs = null;
+let ltLiveEs = null;
+let ltLivePollGen = 0;
+let ltLiveWanted = false;
+const LT_LIVE = { state: null, trackingTag: "", tags: {}, tagIndex: [] };
+
+// Binary position frames (/ws/live?format=binary), see app/live_broadcaster.py:
+// header u8 kind, u8 version, u16 count; record u16 tag index, u8 state, u8 flags,
+// f64 ts_ms, f32 x/y/z (little-endian, 24 bytes)
+const LT_POS_STATES = ["UNKNOWN", "TRACKING", "STALE", "LOST"];
+const LT_POS_RECORD_SIZE = 24;
+
+function ltDecodePositions(buf, tagIndex){
+  const dv = new DataView(buf);
+  if (dv.byteLength < 4 || dv.getUint8(0) !== 1) return [];
+  const count = dv.getUint16(2, true);
+  const out = [];
+  for (let i = 0, off = 4; i < count && off + LT_POS_RECORD_SIZE <= dv.byteLength; i++, off += LT_POS_RECORD_SIZE){
+    const idx = dv.getUint16(off, true);
+    const ev = {
+      type: "tracking",
+      tag_mac: tagIndex[idx] || `#${idx}`,
+      state: LT_POS_STATES[dv.getUint8(off + 2)] || "UNKNOWN",
+      ts_ms: dv.getFloat64(off + 4, true),
+    };
+    if (dv.getUint8(off + 3) & 1){
+      ev.position_cm = {
+        x: dv.getFloat32(off + 12, true),
+        y: dv.getFloat32(off + 16, true),
+        z: dv.getFloat32(off + 20, true),
+      };
+    }
+    out.push(ev);
+  }
+  return out;
+}
+
+function ltLiveIntervalMs(){
+  const lpm = $("live_poll_ms");
+  return Math.max(50, Number(lpm ? lpm.value : 300));
+}
 
 function ltLiveStart(){
   ltLiveStop();
-  ltLiveTick();
-  const lpm = $("live_poll_ms");
-  const ms = Math.max(50, Number(lpm ? lpm.value : 300));
-  ltLiveTimer = setInterval(ltLiveTick, ms);
+  ltLiveWanted = true;
+  if (!("WebSocket" in window)) { ltLiveStartStream(); return; }
+  const proto = location.protocol === "https:" ? "wss:" : "ws:";
+  const lb = $("live_binary");
+  const binary = !!(lb && lb.checked);
+  let ws;
+  try { ws = new WebSocket(`${proto}//${location.host}/ws/live${binary ? "?format=binary" : ""}`); }
+  catch (e) { ltLiveStartStream(); return; }
+  ws.binaryType = "arraybuffer";
+  ltLiveWs = ws;
+  let opened = false;
+  ws.onopen = () => { opened = true; ltLiveSubscribe(); };
+  ws.onmessage = (ev) => {
+    if (ev.data instanceof ArrayBuffer){
+      ltLiveApply(ltDecodePositions(ev.data, LT_LIVE.tagIndex));
+      return;
+    }
+    let msg = null;
+    try { msg = JSON.parse(ev.data); } catch (e) { return; }
+    if (!msg) return;
+    if (msg.type === "tag_index") LT_LIVE.tagIndex = msg.tags || [];
+    else if (msg.type === "bulk") ltLiveApply(msg.events || []);
+  };
+  ws.onclose = () => {
+    if (ltLiveWs !== ws) return;
+    ltLiveWs = null;
+    if (!ltLiveWanted) return;
+    // never connected (proxy drops WebSockets): switch to the stream endpoint
+    if (!opened) { ltLiveStartStream(); return; }
+    // reconnect while the monitor is running
+    setTimeout(() => { if (ltLiveWanted && !ltLiveWs) ltLiveStart(); }, 2000);
+  };
+}
+
+function ltLiveStartStream(){
+  if (!("EventSource" in window)) { ltLiveLongPoll(0, ++ltLivePollGen); return; }
+  // EventSource resumes with Last-Event-ID on its own after a reconnect
+  const es = new EventSource(`${LT_API.stream}?topics=state,tags`);
+  ltLiveEs = es;
+  es.addEventListener("bulk", (ev) => {
+    let msg = null;
+    try { msg = JSON.parse(ev.data); } catch (e) { return; }
+    if (msg && msg.events) ltLiveApply(msg.events);
+  });
+}
+
+async function ltLiveLongPoll(since, gen){
+  while (ltLiveWanted && gen === ltLivePollGen){
+    const r = await ltFetchJson(`${LT_API.stream}?topics=state,tags&since=${since}&timeout=25`);
+    if (gen !== ltLivePollGen) return;
+    if (!r.ok || !r.json){
+      await new Promise(res => setTimeout(res, 2000));
+      continue;
+    }
+    since = r.json.seq || 0;
+    if (r.json.events && r.json.events.length) ltLiveApply(r.json.events);
+  }
 }
+
 function ltLiveStop(){
+  ltLiveWanted = false;
   if (ltLiveTimer) clearInterval(ltLiveTimer);
   ltLiveTimer = null;
+  ltLivePollGen++;
+  if (ltLiveEs){
+    try { ltLiveEs.close(); } catch (e) {}
+    ltLiveEs = null;
+  }
+  if (ltLiveWs){
+    const ws = ltLiveWs;
+    ltLiveWs = null;
+    try { ws.close(); } catch (e) {}
+  }
+}
+
+function ltLiveSubscribe(){
+  if (!ltLiveWs || ltLiveWs.readyState !== 1) return;
+  const ltm = $("live_tag_mac");
+  const tagMac = (ltm ? ltm.value : "").trim();
+  const tags = { topic: "tags", max_hz: 1000 / ltLiveIntervalMs() };
+  if (tagMac) tags.ids = [tagMac];
+  ltLiveWs.send(JSON.stringify({ type: "subscribe", topics: [{ topic: "state" }, tags] }));
+}
+
+function ltLiveApply(events){
+  for (const ev of events){
+    if (ev.type === "state"){
+      LT_LIVE.state = ev.state;
+      LT_LIVE.trackingTag = ev.tracking_tag_mac || "";
+    } else if (ev.type === "tracking"){
+      LT_LIVE.tags[ev.tag_mac] = ev;
+    }
+  }
+  if ($("live_state")) $("live_state").textContent = nz(LT_LIVE.state, "unknown");
+
+  const ltm = $("live_tag_mac");
+  let tagMac = (ltm ? ltm.value : "").trim() || LT_LIVE.trackingTag;
+  if (!tagMac){
+    const known = Object.keys(LT_LIVE.tags);
+    if (known.length) tagMac = known[0];
+  }
+  ltLiveRender(tagMac, LT_LIVE.tags[tagMac] || null);
+}
+
+function ltLiveRender(tagMac, payload){
+  const out = $("live_out");
+  if (!tagMac){
+    if ($("live_tracking")) $("live_tracking").textContent = "no tag selected";
+    if (out) out.textContent = "Set tracking.tag_mac in Settings oder trage tag_mac ein.";
+    return;
+  }
+  if (!payload){
+    if ($("live_tracking")) $("live_tracking").textContent = "waiting…";
+    return;
+  }
+  if (out) out.textContent = JSON.stringify(payload, null, 2);
+  const status = nz(payload.state, nz(payload.status, "OK"));
+  const age = payload.age_ms !== undefined ? payload.age_ms : (payload.ts_ms ? Math.max(0, Date.now() - payload.ts_ms) : "—");
+  const pos = nz(payload.position_cm, nz(payload.position, nz(payload.pos, {})));
+  const p = `${nz(pos.x, "?")}, ${nz(pos.y, "?")}, ${nz(pos.z, "?")}`;
+  if ($("live_tracking")) $("live_tracking").textContent = status;
+  if ($("live_age")) $("live_age").textContent = String(age);
+  if ($("live_pos")) $("live_pos").textContent = p;
 }
 
 async function ltLiveTick(){
@@ -842,21 +1003,12 @@ async function ltLiveTick(){
   }
 
   const r = await ltFetchJson(LT_API.trackingPos(tagMac));
-  if (out) out.textContent = JSON.stringify(r.json || r, null, 2);
-
   if (!r.ok || !r.json){
+    if (out) out.textContent = JSON.stringify(r.json || r, null, 2);
     if ($("live_tracking")) $("live_tracking").textContent = "ERR";
     return;
   }
-
-  const status = nz(r.json.state, nz(r.json.status, "OK"));
-  const age = nz(r.json.age_ms, nz(r.json.age, "—"));
-  const pos = nz(r.json.position_cm, nz(r.json.position, nz(r.json.pos, {})));
-  const p = `${nz(pos.x, "?")}, ${nz(pos.y, "?")}, ${nz(pos.z, "?")}`;
-
-  if ($("live_tracking")) $("live_tracking").textContent = status;
-  if ($("live_age")) $("live_age").textContent = String(age);
-  if ($("live_pos")) $("live_pos").textContent = p;
+  ltLiveRender(tagMac, r.json);
 }
 
 async function ltLiveLoadPatches(){
@@ -1196,6 +1348,8 @@ async function ltSaveSettings(){
 
 // ---------------- OFL Fixture Library ----------------
 let OFL_FIX_CACHE = [];
+let OFL_FIX_NEXT = null;
+let ltOflSearchTimer = null;
 let OFL_PATCH_CACHE = [];
 
 function ltOflParseOverrides(raw){
@@ -1254,23 +1408,43 @@ async function ltOflUpload(ev){
   }
 }
 
-async function ltOflLoadFixtures(){
+// The library is searched and paged on the server (/api/v1/ofl/fixtures?q=&after=);
+// "Mehr laden" appends the next page using the cursor from the previous one.
+async function ltOflLoadFixtures(append = false){
   const sel = $("ofl_sel_fixture") || $("patch_fixture");
   const table = $("ofl_library_tbody");
-  if (sel) sel.innerHTML = `<option>lade…</option>`;
-  if (table) table.innerHTML = `<tr><td colspan="4" class="muted">lade…</td></tr>`;
-  const r = await ltFetchJson(LT_API.oflFixtures);
+  const more = $("ofl_more");
+  const keep = sel ? sel.value : "";
+  if (!append){
+    if (sel) sel.innerHTML = `<option>lade…</option>`;
+    if (table) table.innerHTML = `<tr><td colspan="4" class="muted">lade…</td></tr>`;
+  }
+  const params = new URLSearchParams();
+  const q = ($("ofl_search") ? $("ofl_search").value : "").trim();
+  if (q) params.set("q", q);
+  if (append && OFL_FIX_NEXT !== null) params.set("after", OFL_FIX_NEXT);
+  const r = await ltFetchJson(`${LT_API.oflFixtures}?${params.toString()}`);
   if (!r.ok || !r.json){
     if (sel) sel.innerHTML = `<option>Fehler</option>`;
     if (table) table.innerHTML = `<tr><td colspan="4">Fehler: ${escapeHtml(JSON.stringify((r.json || r)))}</td></tr>`;
     return;
   }
-  OFL_FIX_CACHE = r.json.fixtures || [];
+  const page = r.json.fixtures || [];
+  OFL_FIX_CACHE = append ? OFL_FIX_CACHE.concat(page) : page;
+  OFL_FIX_NEXT = (r.json.next === undefined) ? null : r.json.next;
+  if (more) more.style.display = OFL_FIX_NEXT === null ? "none" : "";
+  ltOflRenderFixtures(keep);
+}
+
+function ltOflRenderFixtures(keep){
+  const sel = $("ofl_sel_fixture") || $("patch_fixture");
+  const table = $("ofl_library_tbody");
   if (sel){
     if (!OFL_FIX_CACHE.length){
       sel.innerHTML = `<option value="">Keine Fixtures</option>`;
     }else{
       sel.innerHTML = OFL_FIX_CACHE.map(f => `<option value="${f.id}">${escapeHtml(f.manufacturer)} – ${escapeHtml(f.model)}</option>`).join("\n");
+      if (keep && OFL_FIX_CACHE.some(f => String(f.id) === String(keep))) sel.value = keep;
     }
   }
   ltOflOnFixtureSelect();
@@ -1286,6 +1460,21 @@ async function ltOflLoadFixtures(){
   }
 }
 
+function ltOflSearch(){
+  if (ltOflSearchTimer) clearTimeout(ltOflSearchTimer);
+  ltOflSearchTimer = setTimeout(() => ltOflLoadFixtures(false), 250);
+}
+
+async function ltOflEnsureFixture(id){
+  // a patch may reference a fixture outside the loaded page: fetch its summary only
+  if (!id || OFL_FIX_CACHE.some(f => f.id === Number(id))) return;
+  const r = await ltFetchJson(`${LT_API.oflFixtureById(id)}?include_json=false`);
+  if (r.ok && r.json){
+    OFL_FIX_CACHE.unshift(r.json);
+    ltOflRenderFixtures(String(id));
+  }
+}
+
 function ltOflOnFixtureSelect(){
   const sel = $("ofl_sel_fixture") || $("patch_fixture");
   const modeSel = $("ofl_sel_mode") || $("patch_mode");
@@ -1377,6 +1566,7 @@ async function ltOflLoadPatchForEdit(id){
   if (!OFL_FIX_CACHE.length){
     await ltOflLoadFixtures();
   }
+  await ltOflEnsureFixture(patch.fixture_id);
   const selFx = $("ofl_sel_fixture");
   const selMode = $("ofl_sel_mode");
   if (selFx){
@@ -1490,6 +1680,8 @@ window.ltCalibrationSolve = ltCalibrationSolve;
 window.ltLiveStart = ltLiveStart;
 window.ltLiveStop = ltLiveStop;
 window.ltLiveTick = ltLiveTick;
+window.ltLiveSubscribe = ltLiveSubscribe;
+window.ltDecodePositions = ltDecodePositions;
 window.ltSetSystemState = ltSetSystemState;
 
 window.ltLoadEvents = ltLoadEvents;
@@ -1500,6 +1692,7 @@ window.ltLoadDmxConfig = ltLoadDmxConfig;
 window.ltSaveDmxConfig = ltSaveDmxConfig;
 window.ltOflUpload = ltOflUpload;
 window.ltOflLoadFixtures = ltOflLoadFixtures;
+window.ltOflSearch = ltOflSearch;
 window.ltOflOnFixtureSelect = ltOflOnFixtureSelect;
 window.ltOflCreatePatch = ltOflCreatePatch;
 window.ltOflTest = ltOflTest;